@@ -0,0 +1,49 @@
+from django.conf import settings
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OChange, OModel
+
+
+class OChangeFeedView(APIView):
+    """
+    Changes of a model, or of every model of the organisation of the user, after the revision given by `since`.
+    Pages are read with the `since` and `after` values of the previous response, see ModelRevision.feed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, model_id=None):
+        organisation = None
+        if hasattr(request.user, 'organisation'):
+            organisation = request.user.organisation
+        organisation_id = organisation.id if organisation is not None else None
+
+        since = self.get_int('since', 0)
+        after = self.get_int('after', None)
+        limit = min(self.get_int('limit', settings.CHANGE_FEED_PAGE_SIZE), settings.CHANGE_FEED_PAGE_SIZE)
+        if since < 0:
+            raise ValidationError({'since': 'Must be a positive number'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1'})
+
+        if model_id is not None:
+            # The feed of a deleted model stays readable
+            if not OModel.objects.filter(organisation_id=organisation_id, id=model_id).exists() \
+                    and not OChange.objects.filter(organisation_id=organisation_id, model_id=model_id).exists():
+                raise NotFound()
+        elif organisation_id is None:
+            raise NotFound()
+
+        return Response(ModelRevision.feed(model_id=model_id, organisation_id=organisation_id, since=since, after=after, limit=limit))
+
+    def get_int(self, name, default):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be a number'})
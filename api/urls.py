@@ -4,6 +4,7 @@ from graphene_django.views import GraphQLView
 from rest_framework import routers
 
 from api.rest import views
+from api.rest.views.o_change import OChangeFeedView
 from api.rest.views.o_concept_detail import OConceptRetriveView
 from api.rest.views.o_concept_query import OConceptQueryView
 from api.rest.views.o_instance_detail import OInstanceRetriveView
@@ -41,6 +42,9 @@ urlpatterns = [
     path('rest/model/<uuid:model_id>/instances/', OInstanceQueryView.as_view(), name='model_instances'),
     path('rest/model/<uuid:model_id>/slots/', OSlotQueryView.as_view(), name='model_slots'),
 
+    path('rest/model/<uuid:model_id>/changes/', OChangeFeedView.as_view(), name='model_changes'),
+    path('rest/changes/', OChangeFeedView.as_view(), name='changes'),
+
     path('token/', views.ObtainTokenView.as_view(), name='token'),
     path('token/refresh', views.RefreshTokenView.as_view(), name='token'),
     path('rest/', include(router.urls)),
@@ -9,4 +9,4 @@ class AuthorizationConfig(AppConfig):
         # you must import your modules here 
         # to avoid AppRegistryNotReady exception
         # startup code here
-        pass
+        import authorization.signals
@@ -1,7 +1,15 @@
 from typing import  Dict
 from authorization.models import AccessPermission, Permission
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.db.models import F
+
+from log.middleware.request import get_request
+from organisation.models import Organisation
+
+ACL_CACHE_PREFIX = 'acl'
 
 
 class AclDenied(PermissionDenied):
@@ -9,40 +17,112 @@ class AclDenied(PermissionDenied):
         self.message = message
         self.detail = {'message': message}
         self.detail.update(**extra)
-    
+
     def __str__(self):
         return "{}".format(self.message)
 
+
+class PermissionSet:
+    """
+    Permissions of one profile in one organisation, compiled to plain sets.
+
+    `entries` holds every (action, object_type, identifier) the organisation defines an
+    access permission for, `groups` the entries granted by each security group of the
+    profile. A group grants an entry when it holds every access permission defined for it.
+    """
+    def __init__(self, entries, groups):
+        self.entries = frozenset(entries)
+        self.groups = tuple(frozenset(x) for x in groups)
+
+    def allows(self, permissions_required):
+        if isinstance(permissions_required, tuple):
+            permissions_required = [permissions_required]
+        if len(permissions_required) == 0:
+            return len(self.groups) > 0
+
+        # Permissions the organisation does not define are ignored, but at least one must be defined
+        required = set(PermissionSet.entry(*x) for x in permissions_required) & self.entries
+        if not required:
+            return False
+        return any(required <= x for x in self.groups)
+
+    @staticmethod
+    def entry(action, object_type, identifier=None):
+        return (action, object_type, str(identifier) if identifier is not None else None)
+
+    @staticmethod
+    def compile(profile, organisation):
+        entry_accesspermissions = {}
+        accesspermission_entries = {}
+        query = AccessPermission.objects.filter(organisation=organisation).values_list('id', 'permission__action', 'permission__object_type', 'object_identifier')
+        for accesspermission_id, action, object_type, identifier in query:
+            entry = PermissionSet.entry(action, object_type, identifier)
+            entry_accesspermissions.setdefault(entry, set()).add(accesspermission_id)
+            accesspermission_entries[accesspermission_id] = entry
+
+        group_accesspermissions = {}
+        if profile is not None:
+            for security_group_id, accesspermission_id in profile.security_groups.filter(organisation=organisation).values_list('id', 'accesspermissions'):
+                accesspermissions = group_accesspermissions.setdefault(security_group_id, set())
+                if accesspermission_id is not None:
+                    accesspermissions.add(accesspermission_id)
+
+        groups = []
+        for accesspermissions in group_accesspermissions.values():
+            entries = set(accesspermission_entries[x] for x in accesspermissions if x in accesspermission_entries)
+            groups.append(frozenset(x for x in entries if entry_accesspermissions[x] <= accesspermissions))
+        return PermissionSet(entry_accesspermissions.keys(), groups)
+
+
 class Acl:
-    def __init__(self, user):
+    def __init__(self, user, cache=cache):
+        """
+        Args:
+            cache: Cache the compiled permission sets are shared through, the default cache by default
+        """
         self.user = user
+        self.cache = cache
+        self.permission_sets = {}
 
     def __str__(self):
-        return '<Acl id: %s>' % self.id
+        return '<Acl user: %s>' % self.user
 
     def check(self, organisation, permissions_required):
-        if isinstance(permissions_required, tuple):
-            permissions_required = [permissions_required]
-        can_access = False
-
-        try:
-            accesspermissions_required = self.get_accesspermissions(organisation=organisation, permissions_required=permissions_required)
-        except AclDenied as e:
-            return can_access
-        user_security_groups = self.user.active_profile.security_groups.filter(organisation=organisation)
-        
-        for security_group in user_security_groups.all():
-            access_perms = set(security_group.accesspermissions.all())
-            can_access = all([x in access_perms for x in accesspermissions_required])
-            if can_access:
-                break
-        return can_access
+        if organisation is None:
+            return False
+        return self.get_permission_set(organisation).allows(permissions_required)
+
+    def check_many(self, organisation, permissions_list):
+        """Check several permission requirements against one compiled permission set.
+
+        Returns:
+            list: One boolean per entry of permissions_list
+        """
+        if organisation is None:
+            return [False for x in permissions_list]
+        permission_set = self.get_permission_set(organisation)
+        return [permission_set.allows(x) for x in permissions_list]
 
     def check_raise(self, organisation, permissions_required):
         if not self.check(organisation=organisation, permissions_required=permissions_required):
             raise AclDenied('User {} does not have access permissions {} for organisation'.format(self.user, permissions_required), extra={'organisation': organisation})
         return True
 
+    def get_permission_set(self, organisation):
+        profile = getattr(self.user, 'active_profile', None)
+        profile_id = profile.id if profile is not None else None
+
+        # Memoized per request, shared across requests through the cache
+        permission_set = self.permission_sets.get((organisation.id, profile_id))
+        if permission_set is None:
+            key = Acl.cache_key(organisation.id, profile_id)
+            permission_set = self.cache.get(key)
+            if permission_set is None:
+                permission_set = PermissionSet.compile(profile, organisation)
+                self.cache.set(key, permission_set, settings.ACL_CACHE_TIMEOUT)
+            self.permission_sets[(organisation.id, profile_id)] = permission_set
+        return permission_set
+
     def get_accesspermissions(self, organisation, permissions_required):
         perms = []
         if len(permissions_required) > 0:
@@ -55,3 +135,27 @@ class Acl:
             if len(perms) == 0:
                 raise AclDenied('Organisation {} does not have permission : {}'.format(organisation.name, perm), extra={'organisation': organisation})
         return set(perms)
+
+    #======================================================================================
+    # Versioned invalidation
+
+    def cache_key(organisation_id, profile_id):
+        """Key of a compiled permission set, with the ACL version of the organisation read from the database.
+
+        The version is not kept in the cache: a per process cache would only see the invalidations
+        of its own process, and the other processes would keep granting revoked permissions.
+        """
+        version = Organisation._base_manager.filter(id=organisation_id).values_list('acl_version', flat=True).first()
+        return '{}:{}:{}:{}'.format(ACL_CACHE_PREFIX, organisation_id, profile_id, version)
+
+    def invalidate(organisation_id=None):
+        """Drop the compiled permission sets of an organisation, or of every organisation when None."""
+        query = Organisation._base_manager.all()
+        if organisation_id is not None:
+            query = query.filter(id=organisation_id)
+        query.update(acl_version=F('acl_version') + 1)
+
+        # The permission sets memoized by the current request are stale too
+        acl = getattr(getattr(get_request(), 'user', None), 'acl', None)
+        if acl is not None:
+            acl.permission_sets.clear()
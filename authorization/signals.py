@@ -0,0 +1,39 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from authorization.controllers.acl import Acl
+from authorization.models import AccessPermission, Permission, SecurityGroup
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_all_acls(sender, instance, **kwargs):
+    Acl.invalidate()
+
+
+@receiver(post_save, sender=SecurityGroup)
+@receiver(post_delete, sender=SecurityGroup)
+@receiver(post_save, sender=AccessPermission)
+@receiver(post_delete, sender=AccessPermission)
+def invalidate_organisation_acls(sender, instance, **kwargs):
+    Acl.invalidate(instance.organisation_id)
+
+
+@receiver(m2m_changed, sender=SecurityGroup.profiles.through)
+@receiver(m2m_changed, sender=SecurityGroup.accesspermissions.through)
+def invalidate_security_group_acls(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The cleared security groups are only known before the clear, the ACLs are invalidated after it
+        related_name = 'security_groups' if sender is SecurityGroup.profiles.through else 'security_group_accesspermissions'
+        instance._acl_cleared_organisation_ids = set(getattr(instance, related_name).values_list('organisation_id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    organisation_ids = {instance.organisation_id}
+    if pk_set and reverse:
+        # Reverse side, the profile or access permission changed its security groups
+        organisation_ids.update(SecurityGroup.objects.filter(id__in=pk_set).values_list('organisation_id', flat=True))
+    if action == 'post_clear' and reverse:
+        organisation_ids.update(instance.__dict__.pop('_acl_cleared_organisation_ids', ()))
+    for organisation_id in organisation_ids:
+        Acl.invalidate(organisation_id)
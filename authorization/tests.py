@@ -1,3 +1,129 @@
-from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from authorization.controllers.acl import Acl
+from log.middleware.request import local_thread
+from ontology.models import OInstance, OModel, OSlot
+from openea.constants import Utils
+from utils.test.helpers import (add_object_type_accesspermissions_to_security_group, create_accesspermission,
+                                create_organisation, create_security_group,
+                                create_user, create_user_profile)
+
+
+class AclTestCase(TestCase):
+    def setUp(self):
+        self.org_1 = create_organisation(name='Org 1', description='', location='test')
+        self.org_1_user_1 = create_user(username='org_1_user_1')
+        self.org_1_user_1_profile = create_user_profile(role='Admin', user=self.org_1_user_1, organisation=self.org_1)
+        self.org_1_security_group_1 = create_security_group(name='Org 1 SecG 1', description='', organisation=self.org_1)
+        self.org_1_security_group_1.profiles.add(self.org_1_user_1_profile)
+        add_object_type_accesspermissions_to_security_group(organisation=self.org_1, security_group=self.org_1_security_group_1, object_type=OSlot.get_object_type())
+
+        self.org_1_user_2 = create_user(username='org_1_user_2')
+        self.org_1_user_2_profile = create_user_profile(role='Admin', user=self.org_1_user_2, organisation=self.org_1)
+        self.org_1_security_group_2 = create_security_group(name='Org 1 SecG 2', description='', organisation=self.org_1)
+        self.org_1_security_group_2.profiles.add(self.org_1_user_2_profile)
+        create_accesspermission(security_group=self.org_1_security_group_2, action=Utils.PERMISSION_ACTION_VIEW, object_type=OModel.get_object_type())
+
+        self.view_slot = (Utils.PERMISSION_ACTION_VIEW, OSlot.get_object_type(), None)
+        self.update_slot = (Utils.PERMISSION_ACTION_UPDATE, OSlot.get_object_type(), None)
+        self.view_model = (Utils.PERMISSION_ACTION_VIEW, OModel.get_object_type(), None)
+        self.view_instance = (Utils.PERMISSION_ACTION_VIEW, OInstance.get_object_type(), None)
+
+    def acl(self, user, profile):
+        user.active_profile = profile
+        return Acl(user)
+
+    def test_check(self):
+        acl = self.acl(self.org_1_user_1, self.org_1_user_1_profile)
+        self.assertTrue(acl.check(organisation=self.org_1, permissions_required=self.view_slot))
+        self.assertTrue(acl.check(organisation=self.org_1, permissions_required=[self.view_slot, self.update_slot]))
+        # Defined for the organisation, but granted to another security group
+        self.assertFalse(acl.check(organisation=self.org_1, permissions_required=self.view_model))
+        self.assertFalse(acl.check(organisation=self.org_1, permissions_required=[self.view_slot, self.view_model]))
+        # Not defined for the organisation at all
+        self.assertFalse(acl.check(organisation=self.org_1, permissions_required=self.view_instance))
+        self.assertFalse(acl.check(organisation=None, permissions_required=self.view_slot))
+
+        acl = self.acl(self.org_1_user_2, self.org_1_user_2_profile)
+        self.assertTrue(acl.check(organisation=self.org_1, permissions_required=self.view_model))
+        self.assertFalse(acl.check(organisation=self.org_1, permissions_required=self.view_slot))
+
+    def test_check_many_compiles_once(self):
+        acl = self.acl(self.org_1_user_1, self.org_1_user_1_profile)
+        with CaptureQueriesContext(connection) as context:
+            checks = acl.check_many(organisation=self.org_1, permissions_list=[self.view_slot, self.view_model, self.view_instance])
+            self.assertTrue(acl.check(organisation=self.org_1, permissions_required=self.update_slot))
+        self.assertEqual(checks, [True, False, False])
+        # The ACL version, then the compilation
+        self.assertEqual(len(context.captured_queries), 3)
+
+        # Other requests of the same profile are served from the cache, only the version is read
+        acl = self.acl(self.org_1_user_1, self.org_1_user_1_profile)
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(acl.check(organisation=self.org_1, permissions_required=self.view_slot))
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_invalidation(self):
+        # Each check is a request of its own
+        def check(permissions_required):
+            return self.acl(self.org_1_user_1, self.org_1_user_1_profile).check(organisation=self.org_1, permissions_required=permissions_required)
+
+        self.assertFalse(check(self.view_model))
+
+        # Adding the profile to another security group
+        self.org_1_security_group_2.profiles.add(self.org_1_user_1_profile)
+        self.assertTrue(check(self.view_model))
+
+        # Removing an access permission from a security group
+        self.org_1_security_group_2.accesspermissions.clear()
+        self.assertFalse(check(self.view_model))
+
+        # Adding an access permission defined for the organisation
+        accesspermission = create_accesspermission(security_group=self.org_1_security_group_2, action=Utils.PERMISSION_ACTION_VIEW, object_type=OInstance.get_object_type())
+        self.assertTrue(check(self.view_instance))
+
+        # Deleting a security group
+        self.org_1_security_group_1.delete()
+        self.assertFalse(check(self.view_slot))
+
+        accesspermission.delete()
+        self.assertFalse(check(self.view_instance))
+
+    def test_invalidation_on_reverse_clear(self):
+        acl = self.acl(self.org_1_user_2, self.org_1_user_2_profile)
+        self.assertTrue(acl.check(organisation=self.org_1, permissions_required=self.view_model))
+
+        # Cleared from the profile side, the security groups are gone when the ACL is invalidated
+        self.org_1_user_2_profile.security_groups.clear()
+        acl = self.acl(self.org_1_user_2, self.org_1_user_2_profile)
+        self.assertFalse(acl.check(organisation=self.org_1, permissions_required=self.view_model))
+
+    def test_invalidation_in_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.org_1_user_1
+        request.user.organisation = self.org_1
+        request.user.acl = self.acl(self.org_1_user_1, self.org_1_user_1_profile)
+        local_thread.request = request
+        try:
+            self.assertFalse(request.user.acl.check(organisation=self.org_1, permissions_required=self.view_model))
+            # The request sees its own changes
+            self.org_1_security_group_2.profiles.add(self.org_1_user_1_profile)
+            self.assertTrue(request.user.acl.check(organisation=self.org_1, permissions_required=self.view_model))
+        finally:
+            local_thread.request = None
+
+    def test_invalidation_across_processes(self):
+        # Each worker process has a cache of its own
+        caches = [LocMemCache('acl-test-{}'.format(i), {}) for i in range(2)]
+        for cache in caches:
+            cache.clear()
+            self.org_1_user_2.active_profile = self.org_1_user_2_profile
+            self.assertTrue(Acl(self.org_1_user_2, cache=cache).check(organisation=self.org_1, permissions_required=self.view_model))
+
+        # Revoked in one process, neither grants it anymore
+        self.org_1_security_group_2.accesspermissions.clear()
+        for cache in caches:
+            self.assertFalse(Acl(self.org_1_user_2, cache=cache).check(organisation=self.org_1, permissions_required=self.view_model))
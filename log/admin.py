@@ -1,3 +1,26 @@
 from django.contrib import admin
+from django.shortcuts import redirect
+from django.utils.translation import gettext_lazy as _
+from django.views.generic import TemplateView
 
-# Register your models here.
+from log.controllers.profiling import get_profiler
+
+
+class SQLProfileView(TemplateView):
+    """Admin page listing the endpoints by total time, with the slowest recent requests."""
+    template_name = "log/sql_profile.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        views, slow_requests = get_profiler().collect()
+        context.update(admin.site.each_context(self.request))
+        context['title'] = _('SQL profile')
+        context['views'] = views
+        context['slow_requests'] = slow_requests
+        context['worker'] = get_profiler().worker
+        return context
+
+    def post(self, request, *args, **kwargs):
+        # Only the totals of this process, the other workers keep theirs
+        get_profiler().reset()
+        return redirect('sql_profile')
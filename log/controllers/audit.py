@@ -0,0 +1,200 @@
+"""
+Audit log writing.
+
+Log entries collected during a request (request.log_object) are turned into
+Log rows and written with batched bulk inserts. AuditLogWriter decides when:
+in 'request' mode at the end of the request, in 'thread' mode by a background
+thread fed through a bounded queue, so the request does not wait for the
+inserts. Batches that cannot be written in time (queue full, database error)
+are appended to a local JSON lines spool file and replayed later with
+`AuditLogWriter.replay_spool` (see the replay_audit_spool command).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from log.models import Log
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+
+MODE_REQUEST = 'request'
+MODE_THREAD = 'thread'
+
+
+class AuditLogController:
+    def build_log(log_entry, source_prefix='Unknown', user=None, uri=None, ip_address=None, timestamp=None):
+        """Turn a log entry dict (as collected in request.log_object) into an unsaved Log."""
+        return Log(
+            source=source_prefix + ':' + str(log_entry.get('source')),
+            target=log_entry.get('target'),
+            uri=uri,
+            ip_address=ip_address,
+            details=log_entry.get('detail'),
+            user=user if user is not None and user.is_authenticated else None,
+            organisation_id=log_entry['organisation'].id if log_entry.get('organisation') is not None else log_entry.get('organisation_id'),
+            timestamp=timestamp or timezone.now()
+        )
+
+    def build_logs(log_entries, source_prefix='Unknown', user=None, uri=None, ip_address=None, timestamp=None):
+        timestamp = timestamp or timezone.now()
+        return [AuditLogController.build_log(x, source_prefix=source_prefix, user=user, uri=uri, ip_address=ip_address, timestamp=timestamp) for x in log_entries]
+
+    def write(log_entries, source_prefix='Unknown', user=None, uri=None, ip_address=None, timestamp=None, batch_size=DEFAULT_BATCH_SIZE):
+        """Write log entry dicts with one bulk insert per batch.
+
+        Returns:
+            int: Number of Log rows written
+        """
+        logs = AuditLogController.build_logs(log_entries, source_prefix=source_prefix, user=user, uri=uri, ip_address=ip_address, timestamp=timestamp)
+        return AuditLogController.write_logs(logs, batch_size=batch_size)
+
+    def write_logs(logs, batch_size=DEFAULT_BATCH_SIZE):
+        written = 0
+        for i in range(0, len(logs), batch_size):
+            written += len(Log.objects.bulk_create(logs[i:i + batch_size]))
+        return written
+
+
+class AuditLogWriter:
+
+    def __init__(self, mode=None, queue_size=None, spool_path=None, batch_size=None):
+        """
+        Args:
+            mode: MODE_REQUEST or MODE_THREAD, defaults to settings.AUDIT_LOG_MODE
+            queue_size: Maximum number of batches waiting for the writer thread, defaults to settings.AUDIT_LOG_QUEUE_SIZE
+            spool_path: File batches are appended to when they cannot be written, defaults to settings.AUDIT_LOG_SPOOL_PATH
+            batch_size: Number of rows per bulk insert, defaults to settings.AUDIT_LOG_BATCH_SIZE
+        """
+        self.mode = mode or settings.AUDIT_LOG_MODE
+        self.spool_path = spool_path or settings.AUDIT_LOG_SPOOL_PATH
+        self.batch_size = max(batch_size or settings.AUDIT_LOG_BATCH_SIZE, 1)
+        self.queue = queue.Queue(maxsize=max(queue_size or settings.AUDIT_LOG_QUEUE_SIZE, 1))
+        self.spool_lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, logs):
+        """Write a batch of unsaved Log rows, or hand it to the writer thread."""
+        if not logs:
+            return
+        if self.mode != MODE_THREAD:
+            self.write(logs)
+            return
+
+        self.start()
+        try:
+            self.queue.put_nowait(logs)
+        except queue.Full:
+            # The database does not keep up, keep the batch out of the request's latency
+            logger.warning('Audit log queue full, spooling %s entries to %s', len(logs), self.spool_path)
+            self.spool(logs)
+
+    def write(self, logs):
+        try:
+            AuditLogController.write_logs(logs, batch_size=self.batch_size)
+        except DatabaseError:
+            logger.exception('Could not write %s audit log entries, spooling them to %s', len(logs), self.spool_path)
+            self.spool(logs)
+
+    #======================================================================================
+    # Writer thread
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self.run, name='audit-log-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.drain)
+
+    def run(self):
+        while True:
+            logs = self.queue.get()
+            # Merge what piled up meanwhile into fewer, larger inserts
+            while len(logs) < self.batch_size:
+                try:
+                    logs = logs + self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            close_old_connections()
+            try:
+                self.write(logs)
+            except Exception:
+                logger.exception('Audit log writer failed, spooling %s entries to %s', len(logs), self.spool_path)
+                self.spool(logs)
+
+    def drain(self):
+        """Spool the batches still queued, called when the process exits."""
+        while True:
+            try:
+                self.spool(self.queue.get_nowait())
+            except queue.Empty:
+                return
+
+    #======================================================================================
+    # Spool
+
+    def spool(self, logs):
+        fields = [x.attname for x in Log._meta.concrete_fields]
+        with self.spool_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                for log in logs:
+                    f.write(json.dumps({x: getattr(log, x) for x in fields}, default=str) + '\n')
+
+    def replay_spool(self):
+        """Write the spooled rows to the database and empty the spool.
+
+        A replay interrupted before its end leaves its rows in the .replay file, they
+        are written first, then the rows spooled since.
+
+        Returns:
+            int: Number of Log rows written
+        """
+        replay_path = self.spool_path + '.replay'
+        written = 0
+        if os.path.exists(replay_path):
+            written += self.replay_file(replay_path)
+        with self.spool_lock:
+            if not os.path.exists(self.spool_path):
+                return written
+            os.replace(self.spool_path, replay_path)
+        return written + self.replay_file(replay_path)
+
+    def replay_file(self, path):
+        """Write the rows of a spool file moved aside by replay_spool, then remove it."""
+        # Rows already written by an earlier, interrupted replay keep their id and are skipped
+        written = 0
+        logs = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    logs.append(Log(**json.loads(line)))
+                if len(logs) >= self.batch_size:
+                    written += len(Log.objects.bulk_create(logs, ignore_conflicts=True))
+                    logs = []
+        if logs:
+            written += len(Log.objects.bulk_create(logs, ignore_conflicts=True))
+        os.remove(path)
+        return written
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process wide AuditLogWriter, configured from the settings."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditLogWriter()
+    return _writer
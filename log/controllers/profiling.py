@@ -0,0 +1,200 @@
+"""
+Per-request SQL profiling.
+
+RequestProfile is installed with ``connection.execute_wrapper`` for the
+duration of a request: it counts the queries, sums their time and counts
+identical SQL strings. Nothing is parsed while the request runs. At the end
+the repeated statements are reduced to fingerprints (literals and IN lists
+collapsed), and a fingerprint run at least SQL_PROFILE_DUPLICATE_THRESHOLD
+times is reported as a duplicate, the usual sign of an N+1 loop.
+
+SQLProfiler keeps the totals per view and the slowest recent requests in a
+ring buffer, in memory and per process. Every worker publishes a snapshot to
+the cache every SQL_PROFILE_PUBLISH_INTERVAL seconds. With a shared cache
+backend the admin page merges the snapshots of every worker, with the local
+memory cache it only sees its own process.
+"""
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+PROFILE_CACHE_PREFIX = 'sqlprofile'
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def fingerprint(sql):
+    """Normalise a statement so the executions of one query compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('(...)', sql)
+
+
+class RequestProfile:
+    """execute_wrapper collecting the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold=None):
+        """Fingerprints executed at least `threshold` times, most repeated first.
+
+        Returns:
+            list: (fingerprint, count) tuples
+        """
+        threshold = max(threshold or settings.SQL_PROFILE_DUPLICATE_THRESHOLD, 2)
+        counts = Counter()
+        for sql, count in self.statements.items():
+            counts[fingerprint(sql)] += count
+        return [x for x in counts.most_common() if x[1] >= threshold]
+
+
+class SQLProfiler:
+
+    def __init__(self, buffer_size=None, slow_threshold=None, publish_interval=None):
+        """
+        Args:
+            buffer_size: Number of slow requests kept, defaults to settings.SQL_PROFILE_BUFFER_SIZE
+            slow_threshold: Duration in milliseconds above which a request is kept, defaults to settings.SQL_PROFILE_SLOW_THRESHOLD
+            publish_interval: Seconds between two snapshots written to the cache, defaults to settings.SQL_PROFILE_PUBLISH_INTERVAL
+        """
+        self.buffer_size = max(buffer_size or settings.SQL_PROFILE_BUFFER_SIZE, 1)
+        self.slow_threshold = slow_threshold if slow_threshold is not None else settings.SQL_PROFILE_SLOW_THRESHOLD
+        self.publish_interval = publish_interval if publish_interval is not None else settings.SQL_PROFILE_PUBLISH_INTERVAL
+        self.worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.lock = threading.Lock()
+        self.views = {}
+        self.slow_requests = deque(maxlen=self.buffer_size)
+        self.published_at = time.monotonic()
+
+    def record(self, view, method, path, status, duration, profile):
+        """Add a finished request to the totals of its view, and to the ring buffer when it is slow.
+
+        Args:
+            view: Name of the view, the key of the totals
+            duration: Duration of the request in seconds
+            profile: The RequestProfile of the request
+        """
+        duplicates = profile.duplicates() if profile.count else []
+        with self.lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = {'view': view, 'requests': 0, 'duration': 0.0, 'max_duration': 0.0, 'db_duration': 0.0,
+                                            'queries': 0, 'max_queries': 0, 'duplicate_requests': 0}
+            stats['requests'] += 1
+            stats['duration'] += duration
+            stats['max_duration'] = max(stats['max_duration'], duration)
+            stats['db_duration'] += profile.duration
+            stats['queries'] += profile.count
+            stats['max_queries'] = max(stats['max_queries'], profile.count)
+            if duplicates:
+                stats['duplicate_requests'] += 1
+
+            if duration * 1000 >= self.slow_threshold:
+                self.slow_requests.append({
+                    'timestamp': timezone.now().isoformat(),
+                    'worker': self.worker,
+                    'view': view,
+                    'method': method,
+                    'path': path,
+                    'status': status,
+                    'duration': duration,
+                    'db_duration': profile.duration,
+                    'queries': profile.count,
+                    'duplicates': duplicates[:5],
+                })
+
+        if self.publish_interval and time.monotonic() - self.published_at >= self.publish_interval:
+            self.publish()
+
+    def snapshot(self):
+        with self.lock:
+            return {'worker': self.worker, 'views': {x: dict(y) for x, y in self.views.items()}, 'slow_requests': list(self.slow_requests)}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.slow_requests.clear()
+
+    #======================================================================================
+    # Sharing between workers
+
+    def publish(self):
+        """Write the snapshot of this process to the cache, with the list of the workers."""
+        self.published_at = time.monotonic()
+        timeout = max(self.publish_interval, 1) * 10
+        cache.set(SQLProfiler.worker_key(self.worker), self.snapshot(), timeout)
+        # Read-modify-write, a lost update is repaired by the next publish of that worker
+        workers = set(cache.get(PROFILE_CACHE_PREFIX + ':workers') or [])
+        workers.add(self.worker)
+        cache.set(PROFILE_CACHE_PREFIX + ':workers', sorted(workers), timeout)
+
+    def collect(self):
+        """Merge the snapshots of every worker, the one of this process being current.
+
+        Returns:
+            tuple: (list of view totals with averages, worst first; list of slow requests, slowest first)
+        """
+        snapshots = {self.worker: self.snapshot()}
+        workers = [x for x in cache.get(PROFILE_CACHE_PREFIX + ':workers') or [] if x != self.worker]
+        if workers:
+            published = cache.get_many([SQLProfiler.worker_key(x) for x in workers])
+            snapshots.update({x['worker']: x for x in published.values()})
+
+        views = {}
+        slow_requests = []
+        for snapshot in snapshots.values():
+            for view, stats in snapshot['views'].items():
+                total = views.get(view)
+                if total is None:
+                    views[view] = dict(stats)
+                    continue
+                for key in ('requests', 'duration', 'db_duration', 'queries', 'duplicate_requests'):
+                    total[key] += stats[key]
+                for key in ('max_duration', 'max_queries'):
+                    total[key] = max(total[key], stats[key])
+            slow_requests.extend(snapshot['slow_requests'])
+
+        for stats in views.values():
+            stats['mean_duration'] = stats['duration'] / stats['requests']
+            stats['mean_queries'] = stats['queries'] / stats['requests']
+        views = sorted(views.values(), key=lambda x: x['duration'], reverse=True)
+        slow_requests.sort(key=lambda x: x['duration'], reverse=True)
+        return views, slow_requests
+
+    def worker_key(worker):
+        return '{}:worker:{}'.format(PROFILE_CACHE_PREFIX, worker)
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Profiler of this process."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SQLProfiler()
+    return _profiler
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from log.controllers.audit import AuditLogWriter
+
+
+class Command(BaseCommand):
+    help = 'Write the audit log entries spooled to the local file back to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', type=str, help='Spool file, defaults to settings.AUDIT_LOG_SPOOL_PATH')
+
+    def handle(self, *args, **options):
+        written = AuditLogWriter(spool_path=options['path']).replay_spool()
+        self.stdout.write('{} audit log entries written'.format(written))
@@ -1,6 +1,11 @@
-from django.utils import timezone
+import logging
 import traceback
-from log.models import Log
+
+from django.utils import timezone
+
+from log.controllers.audit import AuditLogController, get_writer
+
+logger = logging.getLogger(__name__)
 
 
 class ExecutionTimeMiddleware:
@@ -32,24 +37,19 @@ class ExecutionTimeMiddleware:
         if hasattr(request, 'timestamp') and request.timestamp is not None:
             execution_time = timezone.now() - request.timestamp
 
-        log_detail = []
-        if hasattr(request, 'log_object') and isinstance(request.log_object, list):
-            for log_event in request.log_object:
-                try:
-                    log_event = Log.objects.create(
-                        source=executed_view + ':' + str(log_event.get('source')),
-                        target=log_event.get('target'),
-                        uri=request.build_absolute_uri,
-                        ip_address=request.ip_address,
-                        details=log_detail,
-                        user=request.user,
-                        organisation=log_event.get('organisation'),
-                        timestamp=request.timestamp
-                    )
-                    log_event.save()
-                except Exception as e:
-                    traceback.print_exc()
-
-        print ("%s : %s s " % (executed_view, execution_time))
+        if hasattr(request, 'log_object') and isinstance(request.log_object, list) and request.log_object:
+            try:
+                logs = AuditLogController.build_logs(request.log_object,
+                                                     source_prefix=executed_view,
+                                                     user=request.user,
+                                                     uri=request.build_absolute_uri(),
+                                                     ip_address=request.ip_address,
+                                                     timestamp=request.timestamp)
+                get_writer().submit(logs)
+            except Exception as e:
+                traceback.print_exc()
+            request.log_object = []
+
+        logger.debug("%s : %s s", executed_view, execution_time)
 
         return response
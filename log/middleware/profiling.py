@@ -0,0 +1,36 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from log.controllers.profiling import RequestProfile, get_profiler
+
+
+class SQLProfilingMiddleware:
+    """Count the queries and the database time of every request, see log.controllers.profiling."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SQL_PROFILE_ENABLED:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        view = 'unresolved'
+        if request.resolver_match is not None:
+            view = request.resolver_match.view_name or request.resolver_match._func_path
+        get_profiler().record(view, request.method, request.path, response.status_code, duration, profile)
+
+        if settings.SQL_PROFILE_SERVER_TIMING:
+            response['Server-Timing'] = 'db;dur={:.1f};desc="{} queries", app;dur={:.1f}'.format(
+                profile.duration * 1000, profile.count, (duration - profile.duration) * 1000)
+        return response
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from organisation.models import Organisation
 
@@ -13,7 +14,8 @@ class Log(models.Model):
     uri = models.CharField(max_length=1024, blank=True, null=True)
     ip_address = models.CharField(max_length=45, blank=True, null=True) #  IPv4-mapped IPv6 address (https://www.rfc-editor.org/rfc/rfc4291#section-2.5.5.2)
     details = models.TextField(blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True, null=True)
+    # Not auto_now_add, that would overwrite the request time of rows written later by the audit log writer
+    timestamp = models.DateTimeField(default=timezone.now, null=True)
     user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, related_name='user_logs')
     organisation = models.ForeignKey(Organisation, on_delete=models.PROTECT, null=True, related_name='organisation_logs')
 
@@ -1,3 +1,238 @@
-from django.test import TestCase
+import datetime
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from log.controllers import profiling
+from log.controllers.audit import MODE_THREAD, AuditLogController, AuditLogWriter
+from log.controllers.profiling import SQLProfiler
+from log.middleware.log import ExecutionTimeMiddleware
+from log.middleware.profiling import SQLProfilingMiddleware
+from log.middleware.request import local_thread
+from log.models import Log
+from ontology.models import OConcept
+from utils.test.helpers import create_concept, create_model, create_organisation, create_repository, create_user
+
+
+class QueuedAuditLogWriter(AuditLogWriter):
+    # No writer thread, batches stay in the queue
+    def start(self):
+        pass
+
+
+class AuditLogWriterTestCase(TestCase):
+    def setUp(self):
+        self.org_1 = create_organisation(name='Org 1', description='', location='test')
+        self.org_1_user_1 = create_user(username='org_1_user_1')
+        self.path = tempfile.mkdtemp()
+        self.spool_path = os.path.join(self.path, 'audit.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def log_entries(self, count):
+        return [{'source': 'created OConcept', 'target': None, 'detail': str(i), 'organisation': self.org_1} for i in range(count)]
+
+    def test_middleware_writes_one_batch(self):
+        def get_response(request):
+            request.log_object.extend(self.log_entries(5))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.user = self.org_1_user_1
+        log_count = Log.objects.count()
+        with CaptureQueriesContext(connection) as context:
+            ExecutionTimeMiddleware(get_response)(request)
+        self.assertEqual(Log.objects.count(), log_count + 5)
+        self.assertEqual(len([x for x in context.captured_queries if x['sql'].startswith('INSERT')]), 1)
+
+        log = Log.objects.get(details='3')
+        self.assertEqual(log.source, 'Unknown:created OConcept')
+        self.assertEqual(log.user, self.org_1_user_1)
+        self.assertEqual(log.uri, 'http://testserver/')
+
+    def test_full_queue_spools(self):
+        writer = QueuedAuditLogWriter(mode=MODE_THREAD, queue_size=1, spool_path=self.spool_path)
+        log_count = Log.objects.count()
+        writer.submit(AuditLogController.build_logs(self.log_entries(2), user=self.org_1_user_1))
+        writer.submit(AuditLogController.build_logs(self.log_entries(3), user=self.org_1_user_1))
+        self.assertEqual(writer.queue.qsize(), 1)
+        self.assertEqual(Log.objects.count(), log_count)
+
+        with open(self.spool_path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        # Replaying writes the spooled rows once
+        self.assertEqual(writer.replay_spool(), 3)
+        self.assertEqual(writer.replay_spool(), 0)
+        self.assertEqual(Log.objects.count(), log_count + 3)
+        self.assertEqual(Log.objects.filter(user=self.org_1_user_1, organisation=self.org_1).count(), 3)
+        self.assertFalse(os.path.exists(self.spool_path))
+
+        # Batches left in the queue are spooled when the process exits
+        writer.drain()
+        self.assertEqual(writer.replay_spool(), 2)
+
+    def test_interrupted_replay_resumes(self):
+        writer = AuditLogWriter(spool_path=self.spool_path)
+        logs = AuditLogController.build_logs(self.log_entries(3), user=self.org_1_user_1)
+        writer.spool(logs)
+        log_count = Log.objects.count()
+
+        # A replay stopped after its first row, the other rows are still in the .replay file
+        os.replace(self.spool_path, self.spool_path + '.replay')
+        Log.objects.bulk_create(logs[:1])
+        writer.spool(AuditLogController.build_logs(self.log_entries(2), user=self.org_1_user_1))
+
+        # Neither the stranded rows nor the ones spooled since are lost, none is written twice
+        writer.replay_spool()
+        self.assertEqual(Log.objects.count(), log_count + 5)
+        self.assertFalse(os.path.exists(self.spool_path))
+        self.assertFalse(os.path.exists(self.spool_path + '.replay'))
+
+    def test_replay_keeps_request_time(self):
+        writer = AuditLogWriter(spool_path=self.spool_path)
+        timestamp = timezone.now() - datetime.timedelta(hours=6)
+        writer.spool(AuditLogController.build_logs(self.log_entries(2), user=self.org_1_user_1, timestamp=timestamp))
+
+        # Replayed hours later, the rows keep the time of their request
+        self.assertEqual(writer.replay_spool(), 2)
+        self.assertEqual(set(Log.objects.filter(user=self.org_1_user_1).values_list('timestamp', flat=True)), {timestamp})
+
+
+class GenericModelAuditTestCase(TestCase):
+    def setUp(self):
+        self.org_1 = create_organisation(name='Org 1', description='', location='test')
+        self.org_1_repo_1 = create_repository(organisation=self.org_1, name='org_1_repo_1')
+        self.org_1_model_1 = create_model(repository=self.org_1_repo_1, name='org_1_model_1')
+        self.org_1_concept_1 = create_concept(model=self.org_1_model_1, name='org_1_concept_1')
+        self.org_1_concept_2 = create_concept(model=self.org_1_model_1, name='org_1_concept_2')
+
+        self.request = RequestFactory().get('/')
+        self.request.user = create_user(username='org_1_user_1')
+        self.request.user.organisation = self.org_1
+        self.request.log_object = []
+        local_thread.request = self.request
+
+    def tearDown(self):
+        local_thread.request = None
+
+    def test_save_diffs_without_query(self):
+        concept = OConcept.objects.get(id=self.org_1_concept_1.id)
+        concept.description = 'changed'
+        with CaptureQueriesContext(connection) as context:
+            concept.save()
+        # The row, the revisions of its model and organisation, then the change feed
+        self.assertEqual([x['sql'].split(' ')[0] for x in context.captured_queries], ['UPDATE', 'UPDATE', 'UPDATE', 'INSERT'])
+        self.assertEqual(self.request.log_object[-1]['source'], 'updated OConcept')
+        self.assertEqual(self.request.log_object[-1]['detail'], str({'description': ('', 'changed')}))
+        self.assertEqual(self.request.log_object[-1]['organisation_id'], self.org_1.id)
+
+        # The snapshot follows the saved values
+        concept.save()
+        self.assertEqual(self.request.log_object[-1]['detail'], str({}))
+
+        with CaptureQueriesContext(connection) as context:
+            OConcept(name='new', model=self.org_1_model_1, organisation=self.org_1).save()
+        self.assertEqual([x['sql'].split(' ')[0] for x in context.captured_queries], ['INSERT', 'UPDATE', 'UPDATE', 'INSERT'])
+        self.assertEqual(self.request.log_object[-1]['source'], 'created OConcept')
+
+    def test_bulk_update(self):
+        concepts = list(OConcept.objects.filter(model=self.org_1_model_1).order_by('name'))
+        for concept in concepts:
+            concept.description = concept.name
+        OConcept.objects.bulk_update(concepts, ['description'])
+        self.assertEqual([x['detail'] for x in self.request.log_object[-2:]],
+                         [str({'description': ('', x.name)}) for x in concepts])
+        self.assertEqual(concepts[0].get_changes(), {})
+
+    def test_queryset_update(self):
+        with CaptureQueriesContext(connection) as context:
+            rows = OConcept.objects.filter(model=self.org_1_model_1).update(description='changed')
+        self.assertEqual(rows, 2)
+        # The old values, the rows, then the model ids, the revisions of the model and organisation, and the change feed
+        self.assertEqual([x['sql'].split(' ')[0] for x in context.captured_queries], ['SELECT', 'UPDATE', 'SELECT', 'UPDATE', 'UPDATE', 'INSERT'])
+        self.assertEqual({x['target'] for x in self.request.log_object[-2:]}, {self.org_1_concept_1.id, self.org_1_concept_2.id})
+        self.assertEqual(self.request.log_object[-1]['detail'], str({'description': ('', 'changed')}))
+
+        # Audit entries reach the log with their organisation
+        AuditLogController.write(self.request.log_object[-2:], user=self.request.user)
+        self.assertEqual(Log.objects.filter(target=self.org_1_concept_1.id, organisation=self.org_1, source='Unknown:updated OConcept').count(), 1)
+
+    def test_queryset_update_with_expression(self):
+        OConcept.objects.filter(id=self.org_1_concept_1.id).update(description='a')
+        OConcept.objects.filter(id=self.org_1_concept_1.id).update(description=Concat(F('description'), Value('b')))
+        # The value written by the database, not the expression
+        self.assertEqual(self.request.log_object[-1]['detail'], str({'description': ('a', 'ab')}))
+
+        # An expression leaving the value as it was is not a change
+        OConcept.objects.filter(id=self.org_1_concept_1.id).update(description=F('description'))
+        self.assertEqual(self.request.log_object[-1]['detail'], str({}))
+
+
+class SQLProfilingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.profiler = profiling._profiler = SQLProfiler(buffer_size=2, slow_threshold=0, publish_interval=0)
+
+    def tearDown(self):
+        profiling._profiler = None
+        cache.clear()
+
+    def get_response(self, request):
+        # An N+1 loop
+        for i in range(6):
+            Log.objects.filter(details=str(i)).exists()
+        return HttpResponse()
+
+    def test_middleware(self):
+        middleware = SQLProfilingMiddleware(self.get_response)
+        for i in range(3):
+            response = middleware(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[0-9.]+;desc="6 queries", app;dur=[0-9.]+$')
+
+        views, slow_requests = self.profiler.collect()
+        self.assertEqual([(x['view'], x['requests'], x['queries'], x['duplicate_requests']) for x in views], [('unresolved', 3, 18, 3)])
+        # Ring buffer
+        self.assertEqual(len(slow_requests), 2)
+        (sql, count), = slow_requests[0]['duplicates']
+        self.assertEqual(count, 6)
+        self.assertIn('"details" = %s', sql)
+
+    def test_fingerprint(self):
+        self.assertEqual(profiling.fingerprint('SELECT 1 FROM "t" WHERE "a" IN (%s, %s, %s) AND "b" = \'x\''),
+                         profiling.fingerprint('SELECT 2 FROM "t" WHERE "a" IN (%s, %s) AND "b" = \'y\''))
+
+    def test_workers_are_merged(self):
+        other = SQLProfiler(slow_threshold=10000, publish_interval=0)
+        other.worker = 'other:1'
+        profile = profiling.RequestProfile()
+        other.record('ontology:model_detail', 'GET', '/', 200, 0.5, profile)
+        other.publish()
+        self.profiler.record('ontology:model_detail', 'GET', '/', 200, 1.5, profile)
+        views, slow_requests = self.profiler.collect()
+        self.assertEqual([(x['view'], x['requests'], x['max_duration'], x['mean_duration']) for x in views], [('ontology:model_detail', 2, 1.5, 1.0)])
+        self.assertEqual([x['worker'] for x in slow_requests], [self.profiler.worker])
+
+    def test_admin_page(self):
+        user = get_user_model().objects.create_superuser(username='admin', password='password')
+        url = reverse('sql_profile')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'sql_profile')
+        # The reset request itself is recorded after the reset
+        self.client.post(url)
+        self.assertEqual([(x['view'], x['requests']) for x in self.profiler.collect()[0]], [('sql_profile', 1)])
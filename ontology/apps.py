@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class OntologyConfig(AppConfig):
     name = 'ontology'
+
+    def ready(self):
+        import ontology.signals
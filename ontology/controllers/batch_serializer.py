@@ -0,0 +1,277 @@
+"""
+Batch serialization of model objects.
+
+The ModelUtils *_to_dict helpers serialize one object at a time and lazy-load
+what they show of its foreign keys: a slot loads its predicate, subject and
+object, a predicate its relation and both concepts, a few queries per row.
+The functions below serialize whole querysets (or lists of objects) at once:
+the rows are read with one values() query, then each table they refer to is
+read with one more query into an id -> row map. The query count no longer
+depends on the number of rows, and the dicts have the same shapes as the
+ones of ModelUtils.
+
+Lists of objects are serialized from their attributes, and the related
+objects already loaded on them, select_related for instance, are not read
+again. Lookups go through the base managers, as the foreign keys of the one
+at a time helpers do.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+
+PREDICATE_FIELDS = ('id', 'description', 'subject_id', 'relation_id', 'object_id', 'cardinality_min', 'cardinality_max')
+INSTANCE_FIELDS = ('id', 'name', 'code', 'description', 'concept_id')
+SLOT_FIELDS = ('id', 'name', 'description', 'value', 'predicate_id', 'subject_id', 'object_id')
+
+
+def get_url(object_type, id):
+    # Imported late, ModelUtils imports this module
+    from ontology.controllers.o_model import ModelUtils
+    return ModelUtils.get_url(object_type, id)
+
+
+class BatchSerializer:
+
+    #======================================================================================
+    # Rows
+
+    def chunk_size():
+        """Ids per IN clause, two of them fit in one query."""
+        return max((connection.features.max_query_params or 2000) // 2 - 100, 100)
+
+    def chunks(ids):
+        ids = list(ids)
+        size = BatchSerializer.chunk_size()
+        for i in range(0, len(ids), size):
+            yield ids[i:i + size]
+
+    def rows(model_class, items, fields):
+        """Rows of a queryset, in its order, or of a list of objects, in the order of the list."""
+        if isinstance(items, QuerySet):
+            return list(items.values(*fields))
+        return [{x: getattr(item, x) for x in fields} for item in items]
+
+    def loaded(items, *names):
+        """Related objects by id already loaded on a list of objects, through any of the given foreign keys."""
+        related = {}
+        if isinstance(items, QuerySet):
+            return related
+        for item in items:
+            for name in names:
+                if item._meta.get_field(name).is_cached(item):
+                    value = getattr(item, name)
+                    if value is not None:
+                        related[value.pk] = value
+        return related
+
+    def lookup(model_class, ids, fields=('id', 'name')):
+        """Rows by id of the given objects of a table."""
+        rows = {}
+        for chunk in BatchSerializer.chunks(set(x for x in ids if x is not None)):
+            for row in model_class._base_manager.filter(id__in=chunk).values(*fields):
+                rows[row['id']] = row
+        return rows
+
+    def names(model_class, ids, known=None):
+        """Names by id of the given objects of a table, only the ones missing from the known names are read."""
+        names = dict(known or {})
+        missing = set(ids) - set(names)
+        names.update((x, row['name']) for x, row in BatchSerializer.lookup(model_class, missing).items())
+        return names
+
+    #======================================================================================
+    # Ontology
+
+    def concepts(items):
+        """Dicts of ModelUtils.concept_to_dict."""
+        return [{
+            "id": row['id'],
+            "name": row['name'],
+            "description": row['description'],
+            'url': get_url('concept', row['id'])
+        } for row in BatchSerializer.rows(OConcept, items, ('id', 'name', 'description'))]
+
+    def relations(items):
+        """Dicts of ModelUtils.relation_to_dict."""
+        return [{
+            "id": row['id'],
+            "name": row['name'],
+            "description": row['description'],
+            "type": row['type'],
+            'url': get_url('relation', row['id'])
+        } for row in BatchSerializer.rows(ORelation, items, ('id', 'name', 'description', 'type'))]
+
+    def predicates(items):
+        """Dicts of ModelUtils.predicate_to_dict."""
+        return [BatchSerializer.predicate_to_dict(row) for row in BatchSerializer.predicate_list(items)]
+
+    def predicate_list(items):
+        """Predicate rows of a queryset or a list of predicates, see with_names."""
+        return BatchSerializer.with_names(BatchSerializer.rows(OPredicate, items, PREDICATE_FIELDS),
+                                          concepts={x: y.name for x, y in BatchSerializer.loaded(items, 'subject', 'object').items()},
+                                          relations={x: y.name for x, y in BatchSerializer.loaded(items, 'relation').items()})
+
+    def predicate_rows(ids):
+        """Predicate rows by id, with the names of their concepts and relation, see with_names."""
+        return {row['id']: row for row in BatchSerializer.with_names(BatchSerializer.lookup(OPredicate, ids, PREDICATE_FIELDS).values())}
+
+    def with_names(rows, concepts=None, relations=None):
+        """Add the 'subject', 'relation', 'object' and 'name' of OPredicate.name to predicate rows.
+
+        Args:
+            concepts: Known concept names by id
+            relations: Known relation names by id
+        """
+        rows = list(rows)
+        concepts = BatchSerializer.names(OConcept, [x['subject_id'] for x in rows] + [x['object_id'] for x in rows], known=concepts)
+        relations = BatchSerializer.names(ORelation, [x['relation_id'] for x in rows], known=relations)
+        for row in rows:
+            row['subject'] = concepts.get(row['subject_id'])
+            row['relation'] = relations.get(row['relation_id'])
+            row['object'] = concepts.get(row['object_id'])
+            row['name'] = '{} {} {}'.format(row['subject'], row['relation'], row['object'])
+        return rows
+
+    def predicate_to_dict(row):
+        return {
+            "id": row['id'],
+            "description": row['description'],
+            "subject_id": row['subject_id'],
+            "subject": row['subject'],
+            "relation_id": row['relation_id'],
+            "relation": row['relation'],
+            "object_id": row['object_id'],
+            "object": row['object'],
+            "cardinality_min": row['cardinality_min'],
+            "cardinality_max": row['cardinality_max'],
+            'url': get_url('predicate', row['id'])
+        }
+
+    #======================================================================================
+    # Instances
+
+    def instances(items, predicates=None):
+        """Dicts of ModelUtils.instance_to_dict, with their own and in slots.
+
+        Args:
+            items: Queryset or list of OInstance
+            predicates: Predicate rows by id already loaded, see predicate_rows, completed with the missing ones
+        """
+        return list(BatchSerializer.instances_by_id(BatchSerializer.rows(OInstance, items, INSTANCE_FIELDS), predicates=predicates,
+                                                    concepts={x: y.name for x, y in BatchSerializer.loaded(items, 'concept').items()}).values())
+
+    def instances_by_id(rows, predicates=None, concepts=None):
+        """Instance dicts by id of instance rows with the INSTANCE_FIELDS, in the order of the rows.
+
+        Args:
+            predicates: Predicate rows by id already loaded, see predicate_rows, completed with the missing ones
+            concepts: Known concept names by id
+        """
+        rows = list(rows)
+        concepts = BatchSerializer.names(OConcept, [x['concept_id'] for x in rows], known=concepts)
+        instances = {}
+        for row in rows:
+            instances[row['id']] = {
+                "id": row['id'],
+                "name": row['name'],
+                'code': row['code'],
+                "description": row['description'],
+                "concept_id": row['concept_id'],
+                "concept": concepts.get(row['concept_id']),
+                "ownslots": {},
+                "inslots": {},
+                'url': get_url('instance', row['id'])
+            }
+
+        slots = []
+        for chunk in BatchSerializer.chunks(instances):
+            slots.extend(OSlot._base_manager.filter(Q(subject_id__in=chunk) | Q(object_id__in=chunk)).values(*SLOT_FIELDS))
+        for slot in BatchSerializer.with_slot_names(slots, predicates=predicates):
+            if slot['subject_id'] in instances:
+                instances[slot['subject_id']]["ownslots"][str(slot['id'])] = BatchSerializer.ownslot_to_dict(slot)
+            if slot['object_id'] in instances:
+                instances[slot['object_id']]["inslots"][str(slot['id'])] = BatchSerializer.inslot_to_dict(slot)
+        return instances
+
+    def slots(items, predicates=None):
+        """Dicts of ModelUtils.slot_to_dict."""
+        predicates = predicates if predicates is not None else {}
+        loaded = [x for x in BatchSerializer.loaded(items, 'predicate').values() if x.pk not in predicates]
+        if loaded:
+            predicates.update((x['id'], x) for x in BatchSerializer.predicate_list(loaded))
+        rows = BatchSerializer.with_slot_names(BatchSerializer.rows(OSlot, items, SLOT_FIELDS), predicates=predicates,
+                                               instances={x: y.name for x, y in BatchSerializer.loaded(items, 'subject', 'object').items()})
+        return [BatchSerializer.slot_to_dict(row) for row in rows]
+
+    def with_slot_names(rows, predicates=None, instances=None):
+        """Add their 'predicate' row and the names of their 'subject' and 'object' to slot rows.
+
+        Args:
+            predicates: Predicate rows by id already loaded, see predicate_rows, completed with the missing ones
+            instances: Known instance names by id
+        """
+        rows = list(rows)
+        predicates = predicates if predicates is not None else {}
+        missing = set(x['predicate_id'] for x in rows) - set(predicates)
+        if missing:
+            predicates.update(BatchSerializer.predicate_rows(missing))
+        instances = BatchSerializer.names(OInstance, [x['subject_id'] for x in rows] + [x['object_id'] for x in rows], known=instances)
+        for row in rows:
+            row['predicate'] = predicates[row['predicate_id']]
+            row['subject'] = instances.get(row['subject_id'])
+            row['object'] = instances.get(row['object_id'])
+        return rows
+
+    def ownslot_to_dict(slot):
+        predicate = slot['predicate']
+        return {
+            "id": slot['id'],
+            "name": slot['name'],
+            "description": slot['description'],
+            "predicate_id": slot['predicate_id'],
+            "predicate": predicate['name'],
+            "relation_id": predicate['relation_id'],
+            "relation": predicate['relation'],
+            "concept_id": predicate['object_id'],
+            "concept": predicate['object'],
+            "object_id": slot['object_id'],
+            "object": slot['object'],
+            "value": slot['value']
+        }
+
+    def inslot_to_dict(slot):
+        predicate = slot['predicate']
+        return {
+            "id": slot['id'],
+            "name": slot['name'],
+            "description": slot['description'],
+            "predicate_id": slot['predicate_id'],
+            "predicate": predicate['name'],
+            "relation_id": predicate['relation_id'],
+            "relation": predicate['relation'],
+            "concept_id": predicate['subject_id'],
+            "concept": predicate['subject'],
+            "subject_id": slot['subject_id'],
+            "subject": slot['subject']
+        }
+
+    def slot_to_dict(slot):
+        predicate = slot['predicate']
+        return {
+            "id": slot['id'],
+            "name": slot['name'],
+            "description": slot['description'],
+            "predicate_id": slot['predicate_id'],
+            "predicate": predicate['name'],
+            "relation_id": predicate['relation_id'],
+            "relation": predicate['relation'],
+            "concept_id": predicate['object_id'],
+            "concept": predicate['object'],
+            "subject_id": slot['subject_id'],
+            "subject": slot['subject'],
+            "object_id": slot['object_id'],
+            "object": slot['object'],
+            "value": slot['value']
+        }
@@ -0,0 +1,236 @@
+"""
+Benchmark suite over generated models.
+
+Every size gets a model from SyntheticModelGenerator.generate_graph and the
+hot operations run on it a few rounds each: filter, graph render, pathfinder,
+impact analysis, JSON export and import, copy and diff. Timings are kept per
+round and summarised the way pytest-benchmark does (min, max, mean, median,
+stddev), with the number of SQL queries of a round. Everything runs in a
+transaction that is rolled back, so the suite can point at any database.
+
+The results are a JSON document carrying the commit and the database, two
+documents are compared benchmark by benchmark on their medians.
+"""
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import django
+import graphviz
+from django.conf import settings
+from django.db import connection, transaction
+
+from ontology.controllers.graphviz import GraphvizController
+from ontology.controllers.model_copy import ModelCopier
+from ontology.controllers.model_diff import DIFF_SPECS, ModelDiff
+from ontology.controllers.o_model import ModelUtils
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.models import OInstance, OSlot
+from ontology.plugins.json import JSONPlugin
+
+BENCHMARKS = ('filter', 'graph_render', 'pathfinder', 'impact_analysis', 'export', 'import', 'copy', 'diff')
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_ROUNDS = 3
+
+
+class SkipBenchmark(Exception):
+    pass
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class FullAccess:
+    """ACL granting every permission, the suite times the model operations and not the permission checks."""
+
+    def check_many(self, organisation, permissions_list):
+        return [True for x in permissions_list]
+
+
+class BenchmarkUser:
+    acl = FullAccess()
+
+
+class BenchmarkSuite:
+
+    def __init__(self, organisation, benchmarks=None, rounds=DEFAULT_ROUNDS, generator_options=None, stdout=None):
+        """
+        Args:
+            organisation: Organisation the generated models belong to
+            benchmarks: Names of the benchmarks to run, defaults to BENCHMARKS
+            rounds: Number of timed rounds per benchmark
+            generator_options: Keyword arguments of SyntheticModelGenerator.generate_graph
+            stdout: Optional stream progress lines are written to
+        """
+        self.organisation = organisation
+        self.benchmarks = [x for x in BENCHMARKS if benchmarks is None or x in benchmarks]
+        self.rounds = max(rounds, 1)
+        self.generator_options = generator_options or {}
+        self.stdout = stdout
+        self.results = []
+
+    def run(self, sizes):
+        """Run the benchmarks on a generated model of every size.
+
+        Returns:
+            dict: The results document
+        """
+        started = datetime.now()
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as path:
+                with transaction.atomic():
+                    self.run_size(size, path)
+                    transaction.set_rollback(True)
+        return {
+            'datetime': started.isoformat(),
+            'commit_info': BenchmarkSuite.commit_info(),
+            'machine_info': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'database': connection.vendor,
+            },
+            'options': dict(self.generator_options, rounds=self.rounds, sizes=list(sizes)),
+            'benchmarks': self.results,
+        }
+
+    def run_size(self, size, path):
+        generator = SyntheticModelGenerator(self.organisation, name='benchmark_suite')
+        model = generator.generate_graph(size, **self.generator_options)
+        context = {'model': model, 'generator': generator, 'path': path}
+
+        # The busiest slot gives the filter and the endpoints of the traversals
+        hub = OSlot.objects.filter(model=model).select_related('predicate').order_by('subject__code').first()
+        if hub is not None:
+            context['filter'] = {
+                'model_id': model.id,
+                'relation_ids': [hub.predicate.relation_id],
+                'concept_ids': [hub.predicate.subject_id, hub.predicate.object_id],
+            }
+            context['start'] = OInstance.objects.get(id=hub.subject_id)
+            context['end'] = OInstance.objects.filter(model=model, concept_id=hub.predicate.object_id).order_by('-code').first()
+
+        for name in self.benchmarks:
+            self.measure(name, size, context)
+
+    def measure(self, name, size, context):
+        result = {'name': '{}[{}]'.format(name, size), 'group': name, 'size': size}
+        function = getattr(self, 'benchmark_' + name)
+        timings = []
+        queries = 0
+        try:
+            for i in range(self.rounds):
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    function(context)
+                    timings.append(time.perf_counter() - started)
+                queries = counter.count
+        except SkipBenchmark as e:
+            result['skipped'] = str(e)
+        else:
+            result['stats'] = BenchmarkSuite.stats(timings)
+            result['queries'] = queries
+        self.results.append(result)
+        if self.stdout is not None:
+            if 'skipped' in result:
+                self.stdout.write('{:<28} skipped: {}'.format(result['name'], result['skipped']))
+            else:
+                self.stdout.write('{:<28} {:>10.4f} s {:>8} queries'.format(result['name'], result['stats']['median'], result['queries']))
+        return result
+
+    #======================================================================================
+    # Benchmarks
+
+    def benchmark_filter(self, context):
+        if 'filter' not in context:
+            raise SkipBenchmark('The generated model has no slots')
+        data = ModelUtils.filter(BenchmarkUser(), dict(context['filter']))
+        return list(data['slots'].select_related('subject__concept', 'object__concept', 'predicate__relation'))
+
+    def benchmark_graph_render(self, context):
+        if 'filter' not in context:
+            raise SkipBenchmark('The generated model has no slots')
+        data = ModelUtils.filter(BenchmarkUser(), dict(context['filter']))
+        data['slots'] = data['slots'].select_related('subject__concept', 'object__concept', 'predicate__relation')[:settings.MAX_GRAPH_NODES]
+        data['model'] = context['model']
+        try:
+            return GraphvizController.render_model_graph(format='svg', model_data=data, knowledge_set='instances')
+        except graphviz.ExecutableNotFound as e:
+            raise SkipBenchmark('Graphviz is not installed: {}'.format(e))
+
+    def benchmark_pathfinder(self, context):
+        if context.get('end') is None:
+            raise SkipBenchmark('The generated model has no slots')
+        return ModelUtils.find_paths(context['start'], context['end'], max_paths=settings.PATHFINDER_MAX_PATHS, max_depth=settings.PATHFINDER_MAX_DEPTH)
+
+    def benchmark_impact_analysis(self, context):
+        if 'start' not in context:
+            raise SkipBenchmark('The generated model has no slots')
+        return ModelUtils.analyze_impact(context['start'], None, 4, node_budget=settings.IMPACT_ANALYSIS_NODE_BUDGET)
+
+    def benchmark_export(self, context):
+        JSONPlugin.export_ontology(context['model'], context['path'])
+        JSONPlugin.export_instances(context['model'], context['path'])
+        context['exported'] = True
+
+    def benchmark_import(self, context):
+        if not context.get('exported'):
+            self.benchmark_export(context)
+        target = context['generator'].create_model('import')
+        JSONPlugin.import_ontology(target, context['path'])
+        JSONPlugin.import_instances(target, context['path'])
+
+    def benchmark_copy(self, context):
+        context['copy'] = ModelCopier(context['model']).copy()
+
+    def benchmark_diff(self, context):
+        if 'copy' not in context:
+            context['copy'] = ModelCopier(context['model']).copy()
+        return ModelDiff(context['model'], context['copy']).pairs(list(DIFF_SPECS))
+
+    #======================================================================================
+    # Results
+
+    def stats(timings):
+        return {
+            'min': min(timings),
+            'max': max(timings),
+            'mean': statistics.mean(timings),
+            'median': statistics.median(timings),
+            'stddev': statistics.stdev(timings) if len(timings) > 1 else 0,
+            'rounds': len(timings),
+        }
+
+    def commit_info():
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+            dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return {'id': None, 'dirty': None}
+        return {'id': commit or None, 'dirty': bool(dirty)}
+
+    def compare(previous, current):
+        """Pair the benchmarks of two results documents by name.
+
+        Returns:
+            list: (name, previous median, current median, current / previous) tuples, None where a side is missing
+        """
+        medians = [{x['name']: x['stats']['median'] for x in results['benchmarks'] if 'stats' in x} for results in (previous, current)]
+        rows = []
+        for name in dict.fromkeys([x['name'] for x in current['benchmarks']] + [x['name'] for x in previous['benchmarks']]):
+            before = medians[0].get(name)
+            after = medians[1].get(name)
+            rows.append((name, before, after, after / before if before and after is not None else None))
+        return rows
+
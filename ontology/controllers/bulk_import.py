@@ -0,0 +1,329 @@
+"""
+Set-based import of ontology and instance payloads.
+
+The row-by-row import resolves every reference with its own ``get`` and goes
+through the ``get_or_create`` model helpers, which cost up to three lookups
+and a diffing ``save`` per row. Here each entity type is merged with a few
+``in_bulk``/``__in`` queries, new rows are written with chunked
+``bulk_create``, changed rows with chunked ``bulk_update`` and the audit
+entries with batched inserts. The matching rules of the model helpers are
+kept: an object is matched by id first, then by its natural key.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from log.controllers.audit import AuditLogController
+from log.middleware.request import get_request
+from ontology.controllers.concept_closure import ConceptClosure
+from ontology.controllers.org_units import OrgUnitIndex
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+
+
+class ImportStats:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {}
+
+    def add(self, entity, action, count=1):
+        entity_counts = self.counts.setdefault(entity, {'created': 0, 'updated': 0, 'unchanged': 0})
+        entity_counts[action] += count
+
+    @property
+    def rows(self):
+        return sum(sum(x.values()) for x in self.counts.values())
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(self.seconds, 1e-6)
+
+    def as_dict(self):
+        return {
+            'counts': self.counts,
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+    def __str__(self):
+        return '{} rows in {:.2f}s ({:.0f} rows/s) {}'.format(self.rows, self.seconds, self.rows_per_second, self.counts)
+
+
+class BulkImporter:
+
+    def __init__(self, model, chunk_size=None):
+        """
+        Args:
+            model: The OModel the payload is imported into
+            chunk_size: Number of rows per bulk query, defaults to settings.IMPORT_CHUNK_SIZE
+        """
+        self.model = model
+        self.chunk_size = max(chunk_size or settings.IMPORT_CHUNK_SIZE, 1)
+        self.organisation = model.organisation
+        self.stats = ImportStats()
+        self.log_entries = []
+        # (object type, id, action) of the written rows, appended to the change feed by flush_log
+        self.changes = []
+        self.now = timezone.now()
+
+        request = get_request()
+        self.request = request
+        self.user = request.user if request and request.user and request.user.is_authenticated else None
+
+        # Payload id -> database id, payload ids may be remapped when they clash with another model
+        self.concept_ids = {}
+        self.relation_ids = {}
+        self.predicate_ids = {}
+        self.instance_ids = {}
+
+    #======================================================================================
+    # Entry points
+
+    def import_ontology(self, data):
+        concepts = BulkImporter.as_rows(data.get('concepts', {}))
+        self.concept_ids = self.merge(OConcept, [
+            {
+                'id': x['id'],
+                'key': (x['name'],),
+                'values': {'name': x['name'], 'description': x.get('description')},
+            } for x in concepts], key_fields=('name',))
+
+        relations = BulkImporter.as_rows(data.get('relations', {}))
+        self.relation_ids = self.merge(ORelation, [
+            {
+                'id': x['id'],
+                'key': (x['name'],),
+                'values': {'name': x['name'], 'description': x.get('description'), 'type': x.get('type') or ORelation.PROPERTY},
+            } for x in relations], key_fields=('name',))
+
+        predicates = BulkImporter.as_rows(data.get('predicates', {}))
+        concept_ids = self.resolve(OConcept, self.concept_ids, [y for x in predicates for y in (x['subject_id'], x['object_id'])])
+        relation_ids = self.resolve(ORelation, self.relation_ids, [x['relation_id'] for x in predicates])
+        rows = []
+        for x in predicates:
+            subject_id = BulkImporter.lookup(OConcept, concept_ids, x['subject_id'])
+            object_id = BulkImporter.lookup(OConcept, concept_ids, x['object_id'])
+            relation_id = BulkImporter.lookup(ORelation, relation_ids, x['relation_id'])
+            rows.append({
+                'id': x['id'],
+                'key': (relation_id, subject_id, object_id),
+                'values': {
+                    'description': x.get('description'),
+                    'subject_id': subject_id,
+                    'relation_id': relation_id,
+                    'object_id': object_id,
+                    'cardinality_min': x.get('cardinality_min', 0),
+                    'cardinality_max': x.get('cardinality_max', 0),
+                },
+            })
+        self.predicate_ids = self.merge(OPredicate, rows, key_fields=('relation_id', 'subject_id', 'object_id'))
+
+        self.flush_log()
+        return self.stats
+
+    def import_instances(self, data):
+        instances = BulkImporter.as_rows(data.get('instances', {}))
+        concept_ids = self.resolve(OConcept, self.concept_ids, [x['concept_id'] for x in instances])
+        rows = []
+        for x in instances:
+            concept_id = BulkImporter.lookup(OConcept, concept_ids, x['concept_id'])
+            rows.append({
+                'id': x['id'],
+                'key': (x['name'], x.get('code', ''), concept_id),
+                'values': {'name': x['name'], 'code': x.get('code', ''), 'description': x.get('description'), 'concept_id': concept_id},
+            })
+        self.instance_ids = self.merge(OInstance, rows, key_fields=('name', 'code', 'concept_id'))
+
+        # Every slot shows up twice, as an ownslot of its subject and as an inslot of its object
+        slots = {}
+        for x in instances:
+            for slot_id, slot in (x.get('ownslots') or {}).items():
+                slot = slots.setdefault(str(slot_id), dict(slot, id=slot.get('id', slot_id)))
+                slot['subject_id'] = x['id']
+            for slot_id, slot in (x.get('inslots') or {}).items():
+                slot = slots.setdefault(str(slot_id), dict(slot, id=slot.get('id', slot_id)))
+                slot['object_id'] = x['id']
+        slots = list(slots.values())
+
+        instance_ids = self.resolve(OInstance, self.instance_ids, [y for x in slots for y in (x.get('subject_id'), x.get('object_id')) if y])
+        predicate_ids = self.resolve(OPredicate, self.predicate_ids, [x['predicate_id'] for x in slots])
+        rows = []
+        for x in slots:
+            subject_id = BulkImporter.lookup(OInstance, instance_ids, x.get('subject_id'))
+            object_id = BulkImporter.lookup(OInstance, instance_ids, x.get('object_id'))
+            predicate_id = BulkImporter.lookup(OPredicate, predicate_ids, x['predicate_id'])
+            rows.append({
+                'id': x['id'],
+                'key': (predicate_id, subject_id, object_id, x.get('value')),
+                'values': {
+                    'description': x.get('description'),
+                    'predicate_id': predicate_id,
+                    'subject_id': subject_id,
+                    'object_id': object_id,
+                    'value': x.get('value'),
+                },
+            })
+        self.merge(OSlot, rows, key_fields=('predicate_id', 'subject_id', 'object_id', 'value'))
+
+        self.flush_log()
+        return self.stats
+
+    #======================================================================================
+    # Merging
+
+    def merge(self, model_class, rows, key_fields):
+        """Create or update the rows of one entity type.
+
+        Args:
+            model_class: The model the rows belong to
+            rows: List of {'id': payload id, 'key': natural key tuple, 'values': {field: value}} dicts
+            key_fields: Field names of the natural key, in the order of the 'key' tuples
+
+        Returns:
+            dict: Payload id (as string), or natural key for rows without id -> database id of every merged row
+        """
+        id_map = {}
+        if not rows:
+            return id_map
+
+        field = model_class._meta.pk
+        for row in rows:
+            row['id'] = field.to_python(row['id']) if row['id'] else None
+
+        # 1. Match by id within the model
+        by_id = {}
+        for chunk in self.chunks([x['id'] for x in rows if x['id']]):
+            by_id.update(model_class.objects.filter(model=self.model).in_bulk(chunk))
+
+        # 2. Match the rest by natural key, ids used by another model are not reused
+        unmatched = [x for x in rows if x['id'] not in by_id]
+        taken_ids = set()
+        for chunk in self.chunks([x['id'] for x in unmatched if x['id']]):
+            taken_ids.update(model_class._base_manager.filter(id__in=chunk).values_list('id', flat=True))
+        by_key = {}
+        for chunk in self.chunks(list(set(x['key'][0] for x in unmatched))):
+            for obj in model_class.objects.filter(model=self.model, **{key_fields[0] + '__in': chunk}):
+                by_key.setdefault(tuple(getattr(obj, x) for x in key_fields), obj)
+
+        to_create = []
+        created_ids = set()
+        to_update = {}
+        update_fields = set()
+        for row in rows:
+            obj = by_id.get(row['id']) or by_key.get(row['key'])
+            if obj is None:
+                obj = model_class(id=row['id'] if row['id'] and row['id'] not in taken_ids else None, model=self.model, organisation=self.organisation, created_by=self.user, modified_by=self.user)
+                for name, value in row['values'].items():
+                    setattr(obj, name, value)
+                if obj.id is None:
+                    obj.id = field.get_default()
+                to_create.append(obj)
+                created_ids.add(obj.id)
+                # Later rows with the same natural key update this object, as get_or_create would
+                by_key[row['key']] = obj
+                by_id[obj.id] = obj
+            elif obj.id not in to_update and obj.id not in created_ids:
+                changes = {}
+                for name, value in row['values'].items():
+                    current = getattr(obj, name)
+                    if current != value:
+                        changes[name] = (str(current), str(value))
+                        setattr(obj, name, value)
+                if changes:
+                    to_update[obj.id] = obj
+                    update_fields.update(changes)
+                    self.log('updated', obj, detail=str(changes))
+                else:
+                    self.stats.add(model_class.__name__, 'unchanged')
+            else:
+                for name, value in row['values'].items():
+                    setattr(obj, name, value)
+            id_map[str(row['id']) if row['id'] else row['key']] = obj.id
+
+        for chunk in self.chunks(to_create):
+            model_class.objects.bulk_create(chunk)
+        for obj in to_create:
+            self.log('created', obj)
+        self.stats.add(model_class.__name__, 'created', len(to_create))
+
+        if to_update:
+            for obj in to_update.values():
+                obj.modified_at = self.now
+                obj.modified_by = self.user
+            fields = sorted(update_fields) + ['modified_at', 'modified_by']
+            # The base manager skips the request audit of AuditQuerySet, the importer logs the changes itself
+            for chunk in self.chunks(list(to_update.values())):
+                model_class._base_manager.bulk_update(chunk, fields)
+            self.stats.add(model_class.__name__, 'updated', len(to_update))
+
+        # Bulk writes send no signals, the inheritance closure is rebuilt once per merge instead
+        if (model_class is OPredicate and (to_create or to_update)) or (model_class is ORelation and 'type' in update_fields):
+            ConceptClosure.rebuild(self.model.id)
+        # The org unit index follows the slots, and the names and concepts they are matched on
+        if (model_class is OSlot and (to_create or to_update)) or update_fields & {'name', 'relation_id', 'concept_id'}:
+            OrgUnitIndex.rebuild(self.model.id)
+        return id_map
+
+    def resolve(self, model_class, id_map, ids):
+        """Map referenced payload ids to database ids, looking up the ones not imported in this run."""
+        resolved = dict(id_map)
+        missing = list(set(str(x) for x in ids if x and str(x) not in resolved))
+        field = model_class._meta.pk
+        for chunk in self.chunks(missing):
+            for obj_id in model_class.objects.filter(id__in=[field.to_python(x) for x in chunk]).values_list('id', flat=True):
+                resolved[str(obj_id)] = obj_id
+        return resolved
+
+    @staticmethod
+    def lookup(model_class, id_map, payload_id):
+        if not payload_id:
+            return None
+        try:
+            return id_map[str(payload_id)]
+        except KeyError:
+            raise model_class.DoesNotExist('{} matching query does not exist: {}'.format(model_class.__name__, payload_id))
+
+    @staticmethod
+    def as_rows(items):
+        return list(items.values()) if isinstance(items, dict) else list(items)
+
+    def chunks(self, items):
+        # Keep every chunk within the backend's bound parameter limit
+        size = min(self.chunk_size, connection.features.max_query_params or self.chunk_size)
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+    #======================================================================================
+    # Audit
+
+    def log(self, action, obj, detail=None):
+        log_entry = {
+            'source': action + ' ' + obj.__class__.__name__,
+            'target': obj.id,
+            'organisation': self.organisation,
+        }
+        if detail is not None:
+            log_entry['detail'] = detail
+        self.log_entries.append(log_entry)
+        self.changes.append((obj.get_object_type(), obj.id, action))
+
+    def flush_log(self):
+        if self.changes:
+            # Bulk writes send no signals, the model revision is bumped once per import
+            ModelRevision.bump(self.model.id, self.changes)
+            self.changes = []
+        uri = None
+        ip_address = None
+        if self.request is not None:
+            uri = self.request.build_absolute_uri()
+            ip_address = getattr(self.request, 'ip_address', None)
+        AuditLogController.write(self.log_entries, source_prefix=self.__class__.__name__, user=self.user, uri=uri, ip_address=ip_address, timestamp=self.now, batch_size=self.chunk_size)
+        self.log_entries = []
@@ -0,0 +1,171 @@
+"""
+Concept inheritance closure.
+
+The inheritance predicates of a model form a graph of concepts: with an
+INHERITANCE_SUPER_IS_SUBJECT relation the subject is the parent, with an
+INHERITANCE_SUPER_IS_OBJECT relation the object is. OConceptClosure stores
+every (ancestor, descendant) pair of that graph with the length of the
+shortest path between them, so the ancestors or descendants of a concept are
+one indexed query at any depth.
+
+A new inheritance predicate only adds paths and is folded in incrementally.
+Removing or rewiring one can remove paths, then the closure of the model is
+rebuilt from its inheritance predicates (one query and a bulk insert).
+"""
+from collections import deque
+
+from django.db import transaction
+
+from ontology.models import OConceptClosure, OPredicate, ORelation
+
+INHERITANCE_TYPES = (ORelation.INHERITANCE_SUPER_IS_SUBJECT, ORelation.INHERITANCE_SUPER_IS_OBJECT)
+
+CLOSURE_BATCH_SIZE = 1000
+
+
+class ConceptClosure:
+
+    #======================================================================================
+    # Lookups
+
+    def ancestors(concept, max_depth=None):
+        """Ancestors of a concept, nearest first.
+
+        Returns:
+            list: (OConcept, depth) tuples, depth 1 for the parents
+        """
+        query = OConceptClosure.objects.filter(descendant=concept)
+        if max_depth is not None:
+            query = query.filter(depth__lte=max_depth)
+        return [(x.ancestor, x.depth) for x in query.select_related('ancestor').order_by('depth', 'ancestor__name')]
+
+    def descendants(concept, max_depth=None):
+        """Descendants of a concept, nearest first.
+
+        Returns:
+            list: (OConcept, depth) tuples, depth 1 for the children
+        """
+        query = OConceptClosure.objects.filter(ancestor=concept)
+        if max_depth is not None:
+            query = query.filter(depth__lte=max_depth)
+        return [(x.descendant, x.depth) for x in query.select_related('descendant').order_by('depth', 'descendant__name')]
+
+    def lineages(model, max_depth=None):
+        """Ancestors and descendants of every concept of a model, in one query.
+
+        Returns:
+            tuple: (concept id -> [(ancestor id, ancestor name, depth)], concept id -> [(descendant id, descendant name, depth)])
+        """
+        ancestors = {}
+        descendants = {}
+        query = OConceptClosure.objects.filter(model=model)
+        if max_depth is not None:
+            query = query.filter(depth__lte=max_depth)
+        query = query.order_by('depth', 'ancestor__name', 'descendant__name').values_list(
+            'ancestor_id', 'ancestor__name', 'descendant_id', 'descendant__name', 'depth')
+        for ancestor_id, ancestor_name, descendant_id, descendant_name, depth in query:
+            ancestors.setdefault(descendant_id, []).append((ancestor_id, ancestor_name, depth))
+            descendants.setdefault(ancestor_id, []).append((descendant_id, descendant_name, depth))
+        return ancestors, descendants
+
+    #======================================================================================
+    # Maintenance
+
+    def edge(predicate, relation_type=None):
+        """The (parent id, child id) inheritance edge of a predicate, None when it is not an inheritance predicate."""
+        if relation_type is None:
+            relation_type = ORelation._base_manager.filter(id=predicate.relation_id).values_list('type', flat=True).first()
+        if predicate.subject_id is None or predicate.object_id is None:
+            return None
+        if relation_type == ORelation.INHERITANCE_SUPER_IS_SUBJECT:
+            return (predicate.subject_id, predicate.object_id)
+        if relation_type == ORelation.INHERITANCE_SUPER_IS_OBJECT:
+            return (predicate.object_id, predicate.subject_id)
+        return None
+
+    def add_edge(model_id, parent_id, child_id, closure_class=OConceptClosure):
+        """Fold a new parent -> child edge into the closure of a model.
+
+        Args:
+            closure_class: Closure table, with the model, ancestor, descendant and depth fields of OConceptClosure
+        """
+        if parent_id == child_id:
+            return
+        with transaction.atomic():
+            # Every ancestor of the parent becomes an ancestor of every descendant of the child
+            ancestors = {parent_id: 0}
+            ancestors.update(closure_class.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+            descendants = {child_id: 0}
+            descendants.update(closure_class.objects.filter(ancestor_id=child_id).values_list('descendant_id', 'depth'))
+
+            depths = {}
+            for ancestor_id, ancestor_depth in ancestors.items():
+                for descendant_id, descendant_depth in descendants.items():
+                    if ancestor_id != descendant_id:
+                        depths[(ancestor_id, descendant_id)] = ancestor_depth + descendant_depth + 1
+
+            existing = {}
+            for ancestor_ids in ConceptClosure.batches(list(ancestors)):
+                query = closure_class.objects.filter(ancestor_id__in=ancestor_ids, descendant_id__in=list(descendants))
+                existing.update({(x.ancestor_id, x.descendant_id): x for x in query})
+
+            to_update = []
+            for key, link in existing.items():
+                if depths[key] < link.depth:
+                    link.depth = depths[key]
+                    to_update.append(link)
+            to_create = [closure_class(model_id=model_id, ancestor_id=x[0], descendant_id=x[1], depth=y) for x, y in depths.items() if x not in existing]
+            closure_class.objects.bulk_update(to_update, ['depth'], batch_size=CLOSURE_BATCH_SIZE)
+            closure_class.objects.bulk_create(to_create, batch_size=CLOSURE_BATCH_SIZE)
+
+    def refresh(model_id):
+        """Rebuild the closure of a model after a delete whose cascade removed inheritance predicates,
+        when the closure has rows the cascade may have left stale."""
+        if OConceptClosure.objects.filter(model_id=model_id).exists():
+            ConceptClosure.rebuild(model_id)
+
+    def rebuild(model_id):
+        """Recompute the closure of a model from its inheritance predicates.
+
+        Returns:
+            int: Number of closure rows
+        """
+        children = {}
+        query = OPredicate._base_manager.filter(model_id=model_id, relation__type__in=INHERITANCE_TYPES,
+                                                subject__isnull=False, object__isnull=False).values_list('subject_id', 'object_id', 'relation__type')
+        for subject_id, object_id, relation_type in query:
+            if relation_type == ORelation.INHERITANCE_SUPER_IS_SUBJECT:
+                children.setdefault(subject_id, set()).add(object_id)
+            else:
+                children.setdefault(object_id, set()).add(subject_id)
+
+        links = [OConceptClosure(model_id=model_id, ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                 for ancestor_id, descendant_id, depth in ConceptClosure.paths(children)]
+        with transaction.atomic():
+            OConceptClosure.objects.filter(model_id=model_id).delete()
+            OConceptClosure.objects.bulk_create(links, batch_size=CLOSURE_BATCH_SIZE)
+        return len(links)
+
+    def paths(children):
+        """Shortest path length from every concept to each of its descendants, breadth first.
+
+        Args:
+            children: Parent id -> set of child ids
+
+        Yields:
+            tuple: (ancestor id, descendant id, depth)
+        """
+        for ancestor_id in children:
+            depths = {ancestor_id: 0}
+            queue = deque([ancestor_id])
+            while queue:
+                current = queue.popleft()
+                for child_id in children.get(current, ()):
+                    if child_id not in depths:
+                        depths[child_id] = depths[current] + 1
+                        queue.append(child_id)
+                        yield ancestor_id, child_id, depths[child_id]
+
+    def batches(items):
+        for i in range(0, len(items), CLOSURE_BATCH_SIZE):
+            yield items[i:i + CLOSURE_BATCH_SIZE]
@@ -0,0 +1,104 @@
+"""
+Rendered graph cache.
+
+A graph render (filter, fdp layout, SVG clean-up) only depends on the model
+data, on the request payload and on what the user may see. Renders are kept in
+the configured Django cache under a key made of the model revision, the
+version of the graph presets of its organisation (both read from the
+database, so a write in one process is seen by all of them), a hash of the normalised
+payload, the knowledge set, the display mode and the access scope of the user.
+A write to the model bumps its revision and saving the presets bumps their
+version, so stale renders are never served and simply expire.
+
+Only one process renders a missing key at a time: the first one takes a lock
+with cache.add, the others poll the cache until the render shows up, or take
+the render over once the lock expires.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OConcept, OInstance, OPredicate, ORelation
+from ontology.services.graph_presets import GraphPresetService
+from openea.constants import Utils
+
+GRAPH_CACHE_PREFIX = 'graph'
+
+LOCK_POLL_INTERVAL = 0.1
+
+
+class GraphRenderCache:
+
+    def key(model, data, user, kind='render', revision=None):
+        """Cache key of a render of a model for a graph payload and a user.
+
+        Args:
+            kind: What is cached, 'render' or 'layout'
+            revision: Revision of the model in the key, defaults to the current one
+        """
+        payload = GraphRenderCache.normalize(data)
+        digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        revision = revision if revision is not None else ModelRevision.get(model.id)
+        # The presets choose the layers, relations and org units of the graph
+        presets_version = GraphPresetService.get_presets_version(model.organisation_id)
+        return '{}:{}:{}:{}:{}:{}:{}:{}:{}'.format(
+            GRAPH_CACHE_PREFIX, kind, model.id, revision, presets_version, data.get('knowledge_set') or 'instances',
+            data.get('display_mode') or 'context', GraphRenderCache.scope(model, user), digest)
+
+    def normalize(data):
+        """The payload with its id lists sorted and deduplicated, their order does not change the graph."""
+        normalized = {}
+        for name, value in data.items():
+            if isinstance(value, list) and all(isinstance(x, (str, int)) for x in value):
+                value = sorted(set(str(x) for x in value))
+            normalized[name] = value
+        return normalized
+
+    def scope(model, user):
+        """What the user may see of the model: the view permissions the filter checks and the organisation filter."""
+        permissions = user.acl.check_many(organisation=model.organisation, permissions_list=[
+            (Utils.PERMISSION_ACTION_VIEW, x.get_object_type(), None) for x in (ORelation, OConcept, OPredicate, OInstance)])
+        organisation = getattr(user, 'organisation', None)
+        organisation_id = organisation.id if organisation is not None and not user.is_superuser else '*'
+        return '{}-{}'.format(organisation_id, ''.join('1' if x else '0' for x in permissions))
+
+    def get_or_render(key, render, timeout=None, lock_timeout=None, cache=cache):
+        """Return the cached render of a key, rendering and caching it when missing.
+
+        Args:
+            key: Cache key, see GraphRenderCache.key
+            render: Callable returning the render
+            timeout: Seconds a render is kept, defaults to settings.GRAPH_RENDER_CACHE_TIMEOUT
+            lock_timeout: Seconds a render may take before another process takes it over, defaults to settings.GRAPH_RENDER_LOCK_TIMEOUT
+            cache: Cache the renders are kept in, the default cache by default
+        """
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        timeout = timeout if timeout is not None else settings.GRAPH_RENDER_CACHE_TIMEOUT
+        lock_timeout = lock_timeout if lock_timeout is not None else settings.GRAPH_RENDER_LOCK_TIMEOUT
+        lock_key = key + ':lock'
+        deadline = time.monotonic() + lock_timeout
+        locked = cache.add(lock_key, 1, lock_timeout)
+        while not locked:
+            # Another process renders the same graph, wait for it rather than render it twice
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if time.monotonic() > deadline:
+                break
+            locked = cache.add(lock_key, 1, lock_timeout)
+
+        try:
+            value = render()
+            cache.set(key, value, timeout)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return value
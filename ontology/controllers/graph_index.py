@@ -0,0 +1,273 @@
+"""
+Model-scoped in-memory index of the slot graph.
+
+Instances are mapped to compact integer node ids and slots to integer edge
+ids. Adjacency is stored CSR-style (one offsets array per direction plus flat
+edge arrays), so a 200k-slot model costs a handful of ``array`` buffers instead
+of one Python object per slot. Indexes are built once per process and reused
+until the revision of the model changes, see ontology.controllers.revision.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from uuid import UUID
+
+from django.conf import settings
+
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OInstance, OPredicate, OSlot
+
+DIRECTION_OUT = 'out'
+DIRECTION_IN = 'in'
+DIRECTION_BOTH = 'both'
+
+_INDEXES = OrderedDict()
+_LOCK = threading.Lock()
+
+
+class GraphIndex:
+
+    def __init__(self, model_id, revision):
+        self.model_id = model_id
+        # Revision of the model the index was built at
+        self.revision = revision
+
+        # Nodes (instances)
+        self.node_ids = []
+        self.node_lookup = {}
+        self.node_concepts = array('l')
+        self.concept_ids = []
+        self.concept_lookup = {}
+
+        # Edges (slots)
+        self.slot_ids = []
+        self.edge_subjects = array('l')
+        self.edge_objects = array('l')
+        self.edge_predicates = array('l')
+
+        # Predicates and relations
+        self.predicate_ids = []
+        self.predicate_lookup = {}
+        self.predicate_relations = array('l')
+        self.relation_ids = []
+        self.relation_lookup = {}
+
+        # CSR adjacency, outgoing (node is subject) and incoming (node is object)
+        self.out_offsets = array('l')
+        self.out_edges = array('l')
+        self.in_offsets = array('l')
+        self.in_edges = array('l')
+
+    @classmethod
+    def for_model(cls, model):
+        """Return the index of a model, building it if missing or stale.
+
+        Args:
+            model: The OModel (or its id)
+
+        Returns:
+            GraphIndex: The up-to-date index of the model
+        """
+        model_id = getattr(model, 'id', model)
+        # Read before building, a write meanwhile leaves an index that is rebuilt at the next lookup
+        revision = ModelRevision.get(model_id)
+        with _LOCK:
+            index = _INDEXES.get(model_id)
+            if index is not None and index.revision == revision:
+                _INDEXES.move_to_end(model_id)
+                return index
+
+        index = cls.build(model_id, revision)
+
+        with _LOCK:
+            _INDEXES[model_id] = index
+            _INDEXES.move_to_end(model_id)
+            while len(_INDEXES) > max(settings.GRAPH_INDEX_CACHE_SIZE, 1):
+                _INDEXES.popitem(last=False)
+        return index
+
+    @staticmethod
+    def invalidate(model_id=None):
+        """Drop the cached index of a model, or all indexes when no model is given."""
+        with _LOCK:
+            if model_id is None:
+                _INDEXES.clear()
+            else:
+                _INDEXES.pop(model_id, None)
+
+    @classmethod
+    def build(cls, model_id, revision=None):
+        index = cls(model_id, revision)
+
+        for predicate_id, relation_id in OPredicate.objects.filter(model_id=model_id).values_list('id', 'relation_id').iterator():
+            index.add_predicate(predicate_id, relation_id)
+
+        for instance_id, concept_id in OInstance.objects.filter(model_id=model_id).values_list('id', 'concept_id').iterator():
+            index.add_node(instance_id, concept_id)
+
+        slots = OSlot.objects.filter(model_id=model_id, subject__isnull=False, object__isnull=False) \
+            .values_list('id', 'subject_id', 'object_id', 'predicate_id', 'predicate__relation_id')
+        for slot_id, subject_id, object_id, predicate_id, relation_id in slots.iterator(chunk_size=5000):
+            index.slot_ids.append(slot_id)
+            index.edge_subjects.append(index.add_node(subject_id))
+            index.edge_objects.append(index.add_node(object_id))
+            index.edge_predicates.append(index.add_predicate(predicate_id, relation_id))
+
+        index.out_offsets, index.out_edges = GraphIndex.compress(len(index.node_ids), index.edge_subjects)
+        index.in_offsets, index.in_edges = GraphIndex.compress(len(index.node_ids), index.edge_objects)
+        return index
+
+    @staticmethod
+    def compress(node_count, edge_sources):
+        """Counting sort of edge ids by source node into CSR offsets and edges arrays."""
+        offsets = array('l', [0]) * (node_count + 1)
+        for source in edge_sources:
+            offsets[source + 1] += 1
+        for node in range(node_count):
+            offsets[node + 1] += offsets[node]
+
+        cursor = array('l', offsets)
+        edges = array('l', [0]) * len(edge_sources)
+        for edge, source in enumerate(edge_sources):
+            edges[cursor[source]] = edge
+            cursor[source] += 1
+        return offsets, edges
+
+    def add_node(self, instance_id, concept_id=None):
+        node = self.node_lookup.get(instance_id)
+        if node is None:
+            node = len(self.node_ids)
+            self.node_ids.append(instance_id)
+            self.node_lookup[instance_id] = node
+            self.node_concepts.append(self.intern(concept_id, self.concept_ids, self.concept_lookup))
+        return node
+
+    def add_predicate(self, predicate_id, relation_id):
+        code = self.predicate_lookup.get(predicate_id)
+        if code is None:
+            code = len(self.predicate_ids)
+            self.predicate_ids.append(predicate_id)
+            self.predicate_lookup[predicate_id] = code
+            self.predicate_relations.append(self.intern(relation_id, self.relation_ids, self.relation_lookup))
+        return code
+
+    @staticmethod
+    def intern(value, values, lookup):
+        if value is None:
+            return -1
+        code = lookup.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            lookup[value] = code
+        return code
+
+    #======================================================================================
+    # Lookups
+
+    @staticmethod
+    def normalize(value):
+        """Index keys are UUID objects, while request payloads usually carry strings."""
+        if isinstance(value, str):
+            try:
+                return UUID(value)
+            except ValueError:
+                return value
+        return value
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.slot_ids)
+
+    def node(self, instance_id):
+        return self.node_lookup.get(GraphIndex.normalize(instance_id))
+
+    def nodes(self, instance_ids):
+        """Translate instance ids into node ids, skipping instances unknown to the index."""
+        lookup = self.node_lookup
+        return [lookup[x] for x in map(GraphIndex.normalize, instance_ids) if x in lookup]
+
+    def instance_id(self, node):
+        return self.node_ids[node]
+
+    def concept_id(self, node):
+        code = self.node_concepts[node]
+        return self.concept_ids[code] if code >= 0 else None
+
+    def slot_id(self, edge):
+        return self.slot_ids[edge]
+
+    def edge_relation(self, edge):
+        return self.predicate_relations[self.edge_predicates[edge]]
+
+    def edge_endpoints(self, edge):
+        return self.edge_subjects[edge], self.edge_objects[edge]
+
+    def relation_codes(self, relation_ids):
+        """Translate relation ids into the index's relation codes, None meaning no filter."""
+        if relation_ids is None:
+            return None
+        lookup = self.relation_lookup
+        return {lookup[x] for x in map(GraphIndex.normalize, relation_ids) if x in lookup}
+
+    def predicate_codes(self, predicate_ids):
+        """Translate predicate ids into the index's predicate codes, None meaning no filter."""
+        if predicate_ids is None:
+            return None
+        lookup = self.predicate_lookup
+        return {lookup[x] for x in map(GraphIndex.normalize, predicate_ids) if x in lookup}
+
+    def concept_codes(self, concept_ids):
+        """Translate concept ids into the index's concept codes, None meaning no filter."""
+        if concept_ids is None:
+            return None
+        lookup = self.concept_lookup
+        return {lookup[x] for x in map(GraphIndex.normalize, concept_ids) if x in lookup}
+
+    def neighbours(self, node, direction=DIRECTION_BOTH, relation_codes=None, predicate_codes=None):
+        """Yield (edge, neighbour node) pairs for the slots touching a node.
+
+        Args:
+            node: The node to expand
+            direction: DIRECTION_OUT (node is subject), DIRECTION_IN (node is object) or DIRECTION_BOTH
+            relation_codes: Optional set of relation codes the edge must use
+            predicate_codes: Optional set of predicate codes the edge must use
+        """
+        if direction != DIRECTION_IN:
+            for position in range(self.out_offsets[node], self.out_offsets[node + 1]):
+                edge = self.out_edges[position]
+                if self.accepts(edge, relation_codes, predicate_codes):
+                    yield edge, self.edge_objects[edge]
+        if direction != DIRECTION_OUT:
+            for position in range(self.in_offsets[node], self.in_offsets[node + 1]):
+                edge = self.in_edges[position]
+                if self.accepts(edge, relation_codes, predicate_codes):
+                    yield edge, self.edge_subjects[edge]
+
+    def accepts(self, edge, relation_codes=None, predicate_codes=None):
+        predicate = self.edge_predicates[edge]
+        if predicate_codes is not None and predicate not in predicate_codes:
+            return False
+        if relation_codes is not None and self.predicate_relations[predicate] not in relation_codes:
+            return False
+        return True
+
+    #======================================================================================
+    # Materialisation
+
+    def slots(self, edges):
+        """Load the OSlot objects of the given edges in one query, keyed by edge."""
+        edges = set(edges)
+        slots = OSlot.objects.select_related('subject', 'object', 'predicate__relation') \
+            .in_bulk([self.slot_ids[x] for x in edges])
+        return {x: slots[self.slot_ids[x]] for x in edges if self.slot_ids[x] in slots}
+
+    def instances(self, nodes):
+        """Load the OInstance objects of the given nodes in one query, keyed by node."""
+        nodes = set(nodes)
+        instances = OInstance.objects.select_related('concept').in_bulk([self.node_ids[x] for x in nodes])
+        return {x: instances[self.node_ids[x]] for x in nodes if self.node_ids[x] in instances}
@@ -0,0 +1,289 @@
+"""
+Server-side graph layout.
+
+Graphviz lays a graph out from scratch on every render and returns a drawing,
+that is too slow for big graphs and is redone for the smallest change. Here
+the coordinates of the nodes are computed once per model revision and graph
+payload, with a force-directed layout, and returned as compact JSON (nodes with
+their positions, edges as pairs of node indexes) that the browser draws as is.
+
+The last layout of a payload is also kept whatever the revision: after a
+change of the model, the nodes still in the graph keep their position and
+only the new nodes are placed, next to their neighbours. The whole graph is
+only laid out again when a large part of it is new.
+"""
+import math
+import random
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ontology.controllers.graph_cache import GraphRenderCache
+from ontology.controllers.revision import ModelRevision
+
+# Ideal distance between two linked nodes
+NODE_DISTANCE = 150.0
+
+# Node iterations a full layout may run, shared among its nodes
+LAYOUT_WORK = 500000
+MIN_ITERATIONS = 10
+MAX_ITERATIONS = 50
+INCREMENTAL_ITERATIONS = 20
+
+# Nodes of a grid cell past which the cell repels from its centroid, rather than node by node
+CROWDED_CELL = 8
+
+# Share of new nodes up to which a layout is updated rather than computed again
+INCREMENTAL_SHARE = 0.25
+
+
+class GraphLayout:
+
+    #======================================================================================
+    # Graph
+
+    def new_graph(knowledge_set='instances', max_nodes=None):
+        """Empty graph: 'nodes' by id with their 'label' and 'group', 'edges' as (source, target, label)
+        tuples, 'groups' names by id and whether nodes were left out past max_nodes."""
+        return {'knowledge_set': knowledge_set, 'nodes': {}, 'edges': [], 'groups': {}, 'truncated': False,
+                'max_nodes': max_nodes or settings.GRAPH_LAYOUT_MAX_NODES}
+
+    def build(model_data, knowledge_set='instances', max_nodes=None):
+        """Graph of filtered model data, see ModelUtils.filter: the predicates between concepts of
+        the ontology, or the slots between instances."""
+        graph = GraphLayout.new_graph(knowledge_set, max_nodes=max_nodes)
+        if knowledge_set == 'ontology':
+            predicates = model_data.get('predicates') or []
+            if hasattr(predicates, 'select_related'):
+                predicates = predicates.select_related('subject', 'object', 'relation')
+            GraphLayout.add_predicates(graph, predicates)
+        elif knowledge_set == 'instances':
+            slots = model_data.get('slots') or []
+            if hasattr(slots, 'select_related'):
+                slots = slots.select_related('subject__concept', 'object__concept', 'predicate')
+            GraphLayout.add_slots(graph, slots)
+        return graph
+
+    def build_impact_analysis(levels):
+        """Graph of an impact analysis, see ImpactAnalysis.as_objects: the root instance and the slots reaching each level."""
+        graph = GraphLayout.new_graph('instances')
+        GraphLayout.add_instance(graph, levels[0][0][1])
+        for level, x_list in levels.items():
+            GraphLayout.add_slots(graph, [x[0] for x in x_list if x[0]])
+        return graph
+
+    def add_predicates(graph, predicates):
+        for predicate in predicates:
+            if not GraphLayout.has_room(graph, predicate.subject, predicate.object):
+                break
+            for concept in (predicate.subject, predicate.object):
+                graph['nodes'].setdefault(str(concept.id), {'label': concept.name, 'group': str(concept.id)})
+            graph['edges'].append((str(predicate.subject.id), str(predicate.object.id), predicate.relation.name))
+
+    def add_slots(graph, slots):
+        for slot in slots:
+            if not GraphLayout.has_room(graph, slot.subject, slot.object):
+                break
+            for instance in (slot.subject, slot.object):
+                if instance is not None:
+                    GraphLayout.add_instance(graph, instance)
+            if slot.subject is not None and slot.object is not None:
+                graph['edges'].append((str(slot.subject.id), str(slot.object.id), slot.predicate.name))
+
+    def add_instance(graph, instance):
+        concept_id = str(instance.concept_id)
+        graph['groups'].setdefault(concept_id, instance.concept.name)
+        graph['nodes'].setdefault(str(instance.id), {'label': instance.name, 'group': concept_id})
+
+    def has_room(graph, *nodes):
+        new = len({str(x.id) for x in nodes if x is not None and str(x.id) not in graph['nodes']})
+        if len(graph['nodes']) + new > graph['max_nodes']:
+            graph['truncated'] = True
+            return False
+        return True
+
+    #======================================================================================
+    # Layout
+
+    def compute(nodes, edges, previous=None, iterations=None, seed=0):
+        """Positions of the nodes of a graph.
+
+        Args:
+            nodes: Node ids
+            edges: (source, target, ...) tuples, edges to unknown nodes are ignored
+            previous: Positions of an earlier layout of the graph by node id, kept for the nodes still there
+            iterations: Number of iterations, defaults to what the size of the graph allows
+            seed: Seed of the initial positions, the same graph gets the same layout
+
+        Returns:
+            dict: (x, y) position by node id
+        """
+        ids = sorted(str(x) for x in nodes)
+        neighbours = {x: set() for x in ids}
+        for edge in edges:
+            source, target = str(edge[0]), str(edge[1])
+            if source != target and source in neighbours and target in neighbours:
+                neighbours[source].add(target)
+                neighbours[target].add(source)
+
+        positions = {x: [float(p[0]), float(p[1])] for x, p in (previous or {}).items() if x in neighbours}
+        new = [x for x in ids if x not in positions]
+        if not new:
+            return {x: tuple(p) for x, p in positions.items()}
+
+        rng = random.Random(seed)
+        if positions and len(new) <= INCREMENTAL_SHARE * len(ids):
+            # Only the new nodes move, from next to their neighbours
+            GraphLayout.place(positions, new, neighbours, rng)
+            movable = new
+            iterations = iterations or INCREMENTAL_ITERATIONS
+            temperature = NODE_DISTANCE
+        else:
+            side = NODE_DISTANCE * math.sqrt(len(ids))
+            for x in new:
+                positions[x] = [rng.uniform(0, side), rng.uniform(0, side)]
+            movable = ids
+            iterations = iterations or max(MIN_ITERATIONS, min(MAX_ITERATIONS, LAYOUT_WORK // len(ids)))
+            temperature = side / 10
+
+        GraphLayout.relax(positions, movable, neighbours, iterations, temperature, rng)
+        return {x: (round(p[0], 1), round(p[1], 1)) for x, p in positions.items()}
+
+    def place(positions, new, neighbours, rng):
+        """Initial positions of new nodes: around their placed neighbours, breadth first, and the
+        nodes linked to none of them in a grid right of the layout."""
+        queue = deque(x for x in new if any(y in positions for y in neighbours[x]))
+        while queue:
+            x = queue.popleft()
+            if x in positions:
+                continue
+            anchors = [positions[y] for y in neighbours[x] if y in positions]
+            angle = rng.uniform(0, 2 * math.pi)
+            positions[x] = [sum(p[0] for p in anchors) / len(anchors) + NODE_DISTANCE * math.cos(angle),
+                            sum(p[1] for p in anchors) / len(anchors) + NODE_DISTANCE * math.sin(angle)]
+            queue.extend(y for y in neighbours[x] if y not in positions)
+
+        islands = [x for x in new if x not in positions]
+        if islands:
+            left = max(p[0] for p in positions.values()) + NODE_DISTANCE if positions else 0.0
+            top = min(p[1] for p in positions.values()) if positions else 0.0
+            columns = math.ceil(math.sqrt(len(islands)))
+            for i, x in enumerate(islands):
+                positions[x] = [left + NODE_DISTANCE * (i % columns), top + NODE_DISTANCE * (i // columns)]
+
+    def relax(positions, movable, neighbours, iterations, temperature, rng):
+        """Fruchterman-Reingold iterations moving the movable nodes in place. Nodes only repel the nodes
+        of the neighbouring cells of a grid, and a crowded cell as a whole from its centroid, an
+        iteration takes a time linear in the number of nodes."""
+        k2 = NODE_DISTANCE * NODE_DISTANCE
+        cell = 2 * NODE_DISTANCE
+        cutoff = cell * cell
+        moving = set(movable)
+        pairs = [(x, y) for x in movable for y in neighbours[x] if x < y or y not in moving]
+
+        for i in range(iterations):
+            grid = {}
+            for x, p in positions.items():
+                grid.setdefault((int(p[0] // cell), int(p[1] // cell)), []).append(x)
+            centroids = {}
+            for c, members in grid.items():
+                if len(members) > CROWDED_CELL:
+                    centroids[c] = (sum(positions[x][0] for x in members) / len(members),
+                                    sum(positions[x][1] for x in members) / len(members), len(members))
+
+            displacements = {}
+            for x in movable:
+                px, py = positions[x]
+                gx, gy = int(px // cell), int(py // cell)
+                fx = fy = 0.0
+                for c in ((gx - 1, gy - 1), (gx - 1, gy), (gx - 1, gy + 1), (gx, gy - 1), (gx, gy),
+                          (gx, gy + 1), (gx + 1, gy - 1), (gx + 1, gy), (gx + 1, gy + 1)):
+                    if c in centroids:
+                        cx, cy, weight = centroids[c]
+                        sources = ((cx, cy, weight),)
+                    else:
+                        sources = ((positions[y][0], positions[y][1], 1) for y in grid.get(c, ()) if y != x)
+                    for qx, qy, weight in sources:
+                        dx, dy = px - qx, py - qy
+                        d2 = dx * dx + dy * dy
+                        if d2 >= cutoff:
+                            continue
+                        if d2 < 0.01:
+                            # Same place, push apart in a random direction
+                            dx, dy, d2 = rng.uniform(-1, 1), rng.uniform(-1, 1), 1.0
+                        fx += dx * k2 * weight / d2
+                        fy += dy * k2 * weight / d2
+                displacements[x] = [fx, fy]
+
+            for x, y in pairs:
+                p, q = positions[x], positions[y]
+                dx, dy = p[0] - q[0], p[1] - q[1]
+                f = math.sqrt(dx * dx + dy * dy) / NODE_DISTANCE
+                if x in displacements:
+                    displacements[x][0] -= dx * f
+                    displacements[x][1] -= dy * f
+                if y in displacements:
+                    displacements[y][0] += dx * f
+                    displacements[y][1] += dy * f
+
+            # Moves shrink as the layout settles
+            limit = temperature * (1 - i / iterations)
+            for x, (dx, dy) in displacements.items():
+                length = math.sqrt(dx * dx + dy * dy)
+                scale = limit / length if length > limit else 1.0
+                p = positions[x]
+                p[0] += dx * scale
+                p[1] += dy * scale
+
+    #======================================================================================
+    # Serialization
+
+    def serialize(graph, positions, revision=None, reused=0):
+        """JSON of a laid out graph: nodes with their position, edges as [source index, target index, label]."""
+        index = {}
+        nodes = []
+        for x, node in graph['nodes'].items():
+            index[x] = len(nodes)
+            px, py = positions[x]
+            nodes.append({'id': x, 'label': node['label'], 'group': node['group'], 'x': px, 'y': py})
+        return {
+            'revision': revision,
+            'knowledge_set': graph['knowledge_set'],
+            'nodes': nodes,
+            'edges': [[index[source], index[target], label] for source, target, label in graph['edges']],
+            'groups': graph['groups'],
+            'truncated': graph['truncated'],
+            'reused': reused,
+        }
+
+    def layout(graph, previous=None, revision=None):
+        previous = previous or {}
+        positions = GraphLayout.compute(graph['nodes'], graph['edges'], previous=previous)
+        return GraphLayout.serialize(graph, positions, revision=revision, reused=sum(1 for x in graph['nodes'] if x in previous))
+
+    #======================================================================================
+    # Cache
+
+    def get_or_layout(model, data, user, build):
+        """Layout of a model graph for a graph payload and a user, computed once per model revision.
+
+        Args:
+            model: OModel
+            data: Graph payload, see GraphRenderCache.key
+            user: User the graph is filtered for
+            build: Callable returning the graph, see GraphLayout.build
+        """
+        revision = ModelRevision.get(model.id)
+        key = GraphRenderCache.key(model, data, user, kind='layout', revision=revision)
+        latest_key = GraphRenderCache.key(model, data, user, kind='layout', revision='latest')
+
+        def layout():
+            latest = cache.get(latest_key)
+            result = GraphLayout.layout(build(), previous=latest['positions'] if latest else None, revision=revision)
+            # The starting point of the layout of the next revision
+            cache.set(latest_key, {'revision': revision, 'positions': {x['id']: (x['x'], x['y']) for x in result['nodes']}},
+                      settings.GRAPH_LAYOUT_CACHE_TIMEOUT)
+            return result
+
+        return GraphRenderCache.get_or_render(key, layout, timeout=settings.GRAPH_LAYOUT_CACHE_TIMEOUT)
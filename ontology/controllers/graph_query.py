@@ -0,0 +1,196 @@
+"""
+Graph query planner.
+
+A graph payload selects relations, concepts, predicates, instances and slots,
+and the graph view narrows it further: the org unit scope, the strict display
+mode (both ends of a slot are of the selected concepts) and the transitive
+filtering (the items of the selected concepts connected to what the org unit
+owns). ModelUtils.filter used to evaluate each selection as a queryset and
+feed it to the next one as an IN (subquery), and the strict mode then went
+through the slots in Python, loading the instances and concepts of each one.
+
+The planner turns the whole payload into conditions on the instance columns,
+applied through the subject and object joins of the slot query: the slots of
+a graph are read with one statement, with their instances, concepts and
+predicates joined in, whatever the size of the graph.
+"""
+import logging
+
+from django.db.models import Exists, Q
+
+from ontology.models import (OConcept, OInstance, OModel, OPredicate,
+                             ORelation, OSlot)
+from ontology.services.graph_presets import GraphPresetService
+from openea.constants import Utils
+
+logger = logging.getLogger(__name__)
+
+DISPLAY_MODE_CONTEXT = 'context'
+DISPLAY_MODE_STRICT = 'strict'
+
+# Related objects the graph drawings and layouts use
+SLOT_RELATED = ('subject__concept', 'object__concept', 'predicate__subject', 'predicate__relation', 'predicate__object')
+PREDICATE_RELATED = ('subject', 'relation', 'object')
+
+
+def get_filtering_param(data, key, default=None):
+    # Imported late, ModelUtils imports this module
+    from ontology.controllers.o_model import ModelUtils
+    return ModelUtils.get_filtering_param(data, key, default)
+
+
+class GraphQueryPlanner:
+
+    def __init__(self, user, data, model=None):
+        """Plan of a filter payload, see ModelUtils.filter.
+
+        Args:
+            user: User the model data is filtered for
+            data: Filter payload
+            model: OModel of the payload, read from its 'model_id' if not given
+        """
+        self.data = data
+        self.model = model or OModel.objects.get(id=data.get('model_id'))
+
+        show_relations, show_concepts, show_predicates, show_instances = user.acl.check_many(organisation=self.model.organisation, permissions_list=[
+            (Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None),
+            (Utils.PERMISSION_ACTION_VIEW, OConcept.get_object_type(), None),
+            (Utils.PERMISSION_ACTION_VIEW, OPredicate.get_object_type(), None),
+            (Utils.PERMISSION_ACTION_VIEW, OInstance.get_object_type(), None),
+        ])
+        self.relation_ids = get_filtering_param(data, 'relation_ids', []) if show_relations else []
+        self.concept_ids = get_filtering_param(data, 'concept_ids', []) if show_concepts else []
+        # Empty predicate or instance selections select by concepts
+        self.predicate_ids = (get_filtering_param(data, 'predicate_ids', None) or None) if show_predicates else None
+        self.instance_ids = (get_filtering_param(data, 'instance_ids', None) or None) if show_instances else None
+        self.slot_ids = get_filtering_param(data, 'slot_ids', None) if show_instances else []
+
+        # Set by scope()
+        self.connected_to = None
+        self.strict_concept_ids = None
+
+    #======================================================================================
+    # Graph scope
+
+    def scope(self):
+        """Apply the org unit scope and the display mode of a graph payload.
+
+        The instances owned by the org unit restrict the selected instances. In strict mode
+        with selected concepts, only the slots between instances of the selected concepts are
+        kept, and when these concepts are not Application ones, the graph is made of the
+        instances of the selected concepts connected to the owned instances instead.
+        """
+        org_unit_id = self.data.get('org_unit_id')
+        display_mode = self.data.get('display_mode', DISPLAY_MODE_CONTEXT)
+        selected_concept_ids = [str(x) for x in self.data.get('selected_concept_ids') or []]
+        strict = display_mode == DISPLAY_MODE_STRICT and bool(selected_concept_ids)
+
+        if org_unit_id:
+            owned_ids = GraphPresetService.get_instances_by_org_unit(self.model, org_unit_id, include_children=self.data.get('include_subordinates', True))
+            if strict and not set(selected_concept_ids) & set(GraphPresetService.get_application_concept_ids(self.model)):
+                # An empty result is an empty graph
+                self.connected_to = owned_ids
+                self.instance_ids = None
+            else:
+                owned = set(owned_ids)
+                self.instance_ids = [x for x in self.instance_ids or [] if x in owned] or owned_ids
+
+        if strict:
+            self.strict_concept_ids = selected_concept_ids
+        logger.debug('Graph query of model %s: display mode %s, %s selected concepts, org unit %s, transitive %s',
+                     self.model.id, display_mode, len(selected_concept_ids), org_unit_id, self.transitive)
+        return self
+
+    @property
+    def transitive(self):
+        return self.connected_to is not None
+
+    #======================================================================================
+    # Querysets
+
+    def relations(self):
+        return ORelation.objects.filter(model=self.model, id__in=self.relation_ids).order_by('name')
+
+    def concepts(self):
+        return OConcept.objects.filter(model=self.model, id__in=self.concept_ids).order_by('name')
+
+    def predicates(self):
+        return OPredicate.objects.filter(self.predicate_q(), model=self.model).order_by('object__name')
+
+    def instances(self):
+        instances = OInstance.objects.filter(self.instance_q(), model=self.model)
+        if self.strict_concept_ids is not None and not self.transitive:
+            instances = instances.filter(concept_id__in=self.strict_concept_ids)
+        return instances.order_by('name')
+
+    def slots(self):
+        slots = OSlot.objects.filter(self.instance_q('subject__') | self.instance_q('object__'), self.predicate_q('predicate__'), model=self.model)
+        if self.strict_concept_ids is not None and not self.transitive:
+            slots = slots.filter(subject__concept_id__in=self.strict_concept_ids, object__concept_id__in=self.strict_concept_ids)
+        if isinstance(self.slot_ids, list):
+            slots = slots.filter(id__in=self.slot_ids)
+        return slots.select_related(*SLOT_RELATED)
+
+    def filter(self, target=None):
+        """Filtered model data, see ModelUtils.filter. The querysets are lazy, reading the slots
+        is one statement.
+
+        Args:
+            target: 'relations', 'concepts', 'predicates' or 'instances' to stop there
+        """
+        filtered_data = {
+            'relations': [],
+            'concepts': [],
+            'predicates': [],
+            'instances': [],
+            'slots': [],
+        }
+        for name in ('relations', 'concepts', 'predicates', 'instances', 'slots'):
+            filtered_data[name] = getattr(self, name)()
+            if target == name:
+                break
+        return filtered_data
+
+    def graph(self):
+        """Model data of a graph payload, with its scope applied, see GraphvizController.build_model_graph."""
+        self.scope()
+        data = self.filter()
+        data['predicates'] = data['predicates'].select_related(*PREDICATE_RELATED)
+        data['model'] = self.model
+        data['_transitive_filtered'] = self.transitive
+        return data
+
+    #======================================================================================
+    # Conditions
+
+    def predicate_q(self, prefix=''):
+        """Condition on the predicates of the payload, through a foreign key prefix."""
+        if self.predicate_ids:
+            return Q(**{prefix + 'id__in': self.predicate_ids})
+        return Q(**{
+            prefix + 'relation_id__in': self.relation_ids,
+            prefix + 'subject_id__in': self.concept_ids,
+            prefix + 'object_id__in': self.concept_ids,
+        })
+
+    def instance_q(self, prefix=''):
+        """Condition on the instances of the payload, through a foreign key prefix.
+
+        The instances selected by id, else the ones connected to the owned instances of the
+        transitive filtering, else the instances of the selected concepts, or of the concepts of
+        the selected predicates when there are some.
+        """
+        def q(**kwargs):
+            return Q(**{prefix + x: y for x, y in kwargs.items()})
+
+        if self.transitive:
+            connected = OSlot.objects.filter(model=self.model)
+            return q(concept_id__in=self.strict_concept_ids) & (q(id__in=connected.filter(subject_id__in=self.connected_to).values('object_id')) |
+                                                                q(id__in=connected.filter(object_id__in=self.connected_to).values('subject_id')))
+        if self.instance_ids:
+            return q(id__in=self.instance_ids)
+        if self.data.get('filter_by_selected_concepts', False) and self.concept_ids:
+            return q(concept_id__in=self.concept_ids)
+        predicates = OPredicate.objects.filter(self.predicate_q(), model=self.model)
+        return (q(concept_id__in=predicates.values('subject_id')) | q(concept_id__in=predicates.values('object_id')) |
+                (q(concept_id__in=self.concept_ids) & ~Exists(predicates)))
@@ -0,0 +1,286 @@
+"""
+Asynchronous Graphviz layouts.
+
+The fdp/sfdp layout of a big graph takes from seconds to minutes, run inside
+the request it ties the web worker up for as long, with no limit. Here a
+layout is a job run by a bounded pool of threads of the web process, each
+waiting on its own Graphviz subprocess. A job is killed once it ran for
+GRAPH_RENDER_JOB_TIMEOUT seconds or when it is cancelled. A process holds at
+most GRAPH_RENDER_QUEUE_SIZE unfinished jobs, past that submitting fails and
+the client tries again later.
+
+A job is identified by a hash of its engine, output format and DOT source.
+Its state and output are kept in the Django cache: any process sharing the
+cache answers the polls of a job, and a job already submitted by this process
+or another one is not run twice. A finished layout stays in the cache for
+GRAPH_RENDER_CACHE_TIMEOUT seconds, submitting it again returns it at once.
+The state of an unfinished job expires when its process stops updating it,
+the job is then unknown and submitted again by the client.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+import graphviz
+from django.conf import settings
+from django.core.cache import cache
+
+from organisation.models import (TASK_STATUS_CANCELLED, TASK_STATUS_FAILURE,
+                                 TASK_STATUS_PENDING, TASK_STATUS_STARTED,
+                                 TASK_STATUS_SUCCESS)
+
+logger = logging.getLogger(__name__)
+
+RENDER_CACHE_PREFIX = 'graph:job'
+
+FINISHED = (TASK_STATUS_SUCCESS, TASK_STATUS_FAILURE, TASK_STATUS_CANCELLED)
+
+# Seconds between two looks at the timeout and the cancellation of a running job
+POLL_INTERVAL = 0.2
+
+REASON_TIMEOUT = 'timeout'
+REASON_NOT_FOUND = 'not_found'
+REASON_ERROR = 'error'
+
+
+class GraphRenderError(Exception):
+    pass
+
+
+class GraphRenderTimeout(GraphRenderError):
+    pass
+
+
+class GraphRenderBusy(GraphRenderError):
+    pass
+
+
+class GraphRenderJob:
+
+    def __init__(self, job_id, args, source, timeout, meta=None):
+        """
+        Args:
+            job_id: Id of the job, see GraphRenderService.job_id
+            args: Command line of the layout, the DOT source is written to its standard input
+            source: DOT source
+            timeout: Seconds the layout may run
+            meta: Dict kept with the state of the job for the pollers
+        """
+        self.id = job_id
+        self.args = args
+        self.source = source
+        self.timeout = timeout
+        self.meta = meta or {}
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+
+class GraphRenderService:
+
+    def __init__(self, workers=None, queue_size=None, job_timeout=None, result_timeout=None, state_timeout=None):
+        """
+        Args:
+            workers: Number of layouts run at once, defaults to settings.GRAPH_RENDER_WORKERS
+            queue_size: Maximum number of unfinished jobs of the process, defaults to settings.GRAPH_RENDER_QUEUE_SIZE
+            job_timeout: Seconds a layout may run, defaults to settings.GRAPH_RENDER_JOB_TIMEOUT
+            result_timeout: Seconds a finished job is kept, defaults to settings.GRAPH_RENDER_CACHE_TIMEOUT
+            state_timeout: Seconds the state of an unfinished job is kept without update, defaults to settings.GRAPH_RENDER_LOCK_TIMEOUT
+        """
+        self.workers = max(workers or settings.GRAPH_RENDER_WORKERS, 1)
+        self.queue_size = max(queue_size or settings.GRAPH_RENDER_QUEUE_SIZE, 1)
+        self.job_timeout = job_timeout or settings.GRAPH_RENDER_JOB_TIMEOUT
+        self.result_timeout = result_timeout or settings.GRAPH_RENDER_CACHE_TIMEOUT
+        self.state_timeout = state_timeout or settings.GRAPH_RENDER_LOCK_TIMEOUT
+        # A waiting job may have a full queue of layouts to wait for
+        self.pending_timeout = self.state_timeout + self.job_timeout * (self.queue_size // self.workers + 1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='graph-render')
+        self.lock = threading.Lock()
+        # Unfinished jobs run by this process
+        self.jobs = {}
+
+    def job_id(engine, format, source):
+        return hashlib.sha1('{}\n{}\n{}'.format(engine, format, source).encode('utf-8')).hexdigest()
+
+    def state_key(job_id):
+        return '{}:{}'.format(RENDER_CACHE_PREFIX, job_id)
+
+    #======================================================================================
+    # Jobs
+
+    def submit(self, source, engine, format='svg', meta=None, args=None):
+        """Submit a layout, unless the same one is running or finished.
+
+        Args:
+            source: DOT source
+            engine: Graphviz layout engine, 'dot', 'fdp', 'sfdp'...
+            format: Output format
+            meta: Dict kept with the state of the job, what the pollers need to use the result
+            args: Command line run instead of the Graphviz engine
+
+        Returns:
+            dict: State of the job, see GraphRenderService.state
+        """
+        job_id = GraphRenderService.job_id(engine, format, source)
+        key = GraphRenderService.state_key(job_id)
+        state = {'id': job_id, 'status': TASK_STATUS_PENDING, 'submitted_at': time.time(), 'started_at': None, 'finished_at': None,
+                 'reason': None, 'error': None, 'meta': meta or {}}
+        with self.lock:
+            current = cache.get(key)
+            if job_id in self.jobs or (current is not None and current['status'] not in (TASK_STATUS_FAILURE, TASK_STATUS_CANCELLED)):
+                # Finished, or waiting or running here or in another process
+                return current or state
+            if len(self.jobs) >= self.queue_size:
+                raise GraphRenderBusy('{} graph layouts are already waiting or running'.format(len(self.jobs)))
+
+            if current is None:
+                if not cache.add(key, state, self.pending_timeout):
+                    # Submitted by another process in the meantime
+                    return cache.get(key) or state
+            else:
+                # Failed or cancelled before, run it again
+                cache.set(key, state, self.pending_timeout)
+            job = GraphRenderJob(job_id, args or [engine, '-T' + format], source, self.job_timeout, meta=meta)
+            self.jobs[job_id] = job
+        self.executor.submit(self.run, job)
+        return state
+
+    def state(self, job_id):
+        """State of a job: 'status', 'reason' and 'error' of a failure, 'submitted_at', 'started_at' and
+        'finished_at' timestamps, 'meta' and, once the job succeeded, 'output'. None for an unknown job."""
+        return cache.get(GraphRenderService.state_key(job_id))
+
+    def cancel(self, job_id):
+        """Cancel an unfinished job, the layout is killed by the process running it.
+
+        Returns:
+            bool: Whether the job was unfinished
+        """
+        key = GraphRenderService.state_key(job_id)
+        state = cache.get(key)
+        if state is None or state['status'] in FINISHED:
+            return False
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            job.cancelled.set()
+        # Seen by the process running the job at its next look
+        cache.set(key + ':cancel', True, self.pending_timeout)
+        return True
+
+    def render(self, source, engine, format='svg', args=None):
+        """Submit a layout and wait for its output.
+
+        Raises:
+            graphviz.ExecutableNotFound: The engine is not installed
+            GraphRenderBusy: Too many layouts are waiting or running
+            GraphRenderTimeout: The layout did not finish in time
+            GraphRenderError: The layout failed or was cancelled
+        """
+        state = self.submit(source, engine, format=format, args=args)
+        job_id = state['id']
+        with self.lock:
+            job = self.jobs.get(job_id)
+        deadline = time.monotonic() + self.pending_timeout
+        while state is not None and state['status'] not in FINISHED:
+            if job is not None:
+                job.done.wait(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+            if time.monotonic() > deadline:
+                raise GraphRenderTimeout('Graph layout {} did not finish in time'.format(job_id))
+            state = self.state(job_id)
+
+        if state is None:
+            raise GraphRenderError('Graph layout {} was lost'.format(job_id))
+        if state['status'] == TASK_STATUS_SUCCESS:
+            return state['output']
+        if state['reason'] == REASON_NOT_FOUND:
+            raise graphviz.ExecutableNotFound(args or [engine])
+        if state['reason'] == REASON_TIMEOUT:
+            raise GraphRenderTimeout(state['error'])
+        raise GraphRenderError(state['error'] or state['status'])
+
+    #======================================================================================
+    # Running
+
+    def run(self, job):
+        key = GraphRenderService.state_key(job.id)
+        try:
+            state = cache.get(key) or {'id': job.id, 'submitted_at': time.time(), 'meta': job.meta}
+            if job.cancelled.is_set() or cache.get(key + ':cancel'):
+                self.finish(key, state, TASK_STATUS_CANCELLED)
+                return
+
+            state.update(status=TASK_STATUS_STARTED, started_at=time.time())
+            cache.set(key, state, self.state_timeout + job.timeout)
+            try:
+                # In its own process group, so that a kill reaches whatever the command started
+                process = subprocess.Popen(job.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+            except FileNotFoundError as e:
+                self.finish(key, state, TASK_STATUS_FAILURE, reason=REASON_NOT_FOUND, error=str(e))
+                return
+
+            deadline = time.monotonic() + job.timeout
+            data = job.source.encode('utf-8')
+            while True:
+                try:
+                    output, errors = process.communicate(data, timeout=POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    # The input was written, later calls only read
+                    data = None
+                    cancelled = job.cancelled.is_set() or cache.get(key + ':cancel')
+                    if cancelled or time.monotonic() > deadline:
+                        GraphRenderService.kill(process)
+                        if cancelled:
+                            self.finish(key, state, TASK_STATUS_CANCELLED)
+                        else:
+                            logger.warning('Graph layout %s killed after %s seconds', job.id, job.timeout)
+                            self.finish(key, state, TASK_STATUS_FAILURE, reason=REASON_TIMEOUT, error='Graph layout killed after {} seconds'.format(job.timeout))
+                        return
+
+            if process.returncode:
+                self.finish(key, state, TASK_STATUS_FAILURE, reason=REASON_ERROR, error=errors.decode('utf-8', 'replace').strip())
+                return
+            self.finish(key, state, TASK_STATUS_SUCCESS, output=output.decode('utf-8'))
+        except Exception as e:
+            logger.exception('Graph layout %s failed', job.id)
+            self.finish(key, {'id': job.id, 'meta': job.meta}, TASK_STATUS_FAILURE, reason=REASON_ERROR, error=str(e))
+        finally:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+            job.done.set()
+
+    def kill(process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.communicate()
+
+    def finish(self, key, state, status, reason=None, error=None, output=None):
+        state.update(status=status, reason=reason, error=error, finished_at=time.time())
+        if output is not None:
+            state['output'] = output
+        # Failures are kept as long as a poller needs to see them, a new submission runs the job again
+        cache.set(key, state, self.result_timeout if status == TASK_STATUS_SUCCESS else self.state_timeout)
+        cache.delete(key + ':cancel')
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Layout service of this process."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = GraphRenderService()
+    return _service
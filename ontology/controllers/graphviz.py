@@ -3,15 +3,16 @@ import textwrap as tr
 import graphviz
 from django.conf import settings
 
+from ontology.controllers.graph_render import get_render_service
 from ontology.controllers.o_model import ModelUtils
 
 palette = ['#eeefef', '#fff3bf', '#d5ecc0', '#a2e0ec']
 class GraphvizController:
     
     def render_model_graph (format, model_data, knowledge_set='instances'):
-        if not format:
-            format = 'svg'
+        return GraphvizController.pipe(GraphvizController.build_model_graph(model_data, knowledge_set=knowledge_set), format)
 
+    def build_model_graph (model_data, knowledge_set='instances'):
         model = model_data.get('model')
         node_colors = {}
         dot = graphviz.Digraph( engine='fdp',
@@ -52,8 +53,11 @@ class GraphvizController:
             GraphvizController.render_instances (dot, node_colors=node_colors, slots_data=model_data['slots'])
         
         #dot_ = dot.unflatten(stagger=1)
-        dot.format = format
-        return dot.pipe(encoding='utf-8')
+        return dot
+
+    def pipe(dot, format='svg'):
+        # Laid out by the render pool, with a timeout, rather than in the calling thread
+        return get_render_service().render(dot.source, dot.engine, format=format or 'svg')
 
     def render_ontology (dot, node_colors, predicates_data):
         nbr_edges = 0
@@ -103,9 +107,9 @@ class GraphvizController:
 
 
     def render_impact_analysis (format, data):
-        if not format:
-            format = 'svg'
-        
+        return GraphvizController.pipe(GraphvizController.build_impact_analysis(data), format)
+
+    def build_impact_analysis (data):
         model = data.get('model')
         nodes = data.get('nodes')
         node_colors = {}
@@ -142,9 +146,7 @@ class GraphvizController:
         for level, x_list in nodes.items():
             GraphvizController.render_instances(dot=dot, node_colors=node_colors, slots_data=[x[0] for x in x_list if x[0]])
         dot.graph_attr['root'] = str(nodes[0][0][1].id)
-    
-        dot.format = format
-        return dot.pipe(encoding='utf-8')
+        return dot
 
     def get_node_color(node_colors, node_id):
         if node_id not in node_colors:
@@ -0,0 +1,137 @@
+"""
+Set-based breadth-first impact analysis.
+
+The traversal keeps a frontier of instance ids and expands a whole level at
+once, either against the shared in-memory graph index, with a single
+``subject__in``/``object__in`` slot query per level, or against the slots in
+reach of the root read with one recursive query, see SlotTraversal. Display
+data for the result is then loaded in bulk instead of per instance.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from ontology.controllers.graph_index import GraphIndex
+from ontology.controllers.traversal import SlotTraversal
+from ontology.models import OInstance, OSlot
+
+SOURCE_INDEX = 'index'
+SOURCE_QUERY = 'query'
+SOURCE_CTE = 'cte'
+
+
+class ImpactAnalysisResult:
+    """Instances reached per level, as (slot id, instance id) pairs."""
+
+    def __init__(self, root_instance):
+        self.root_instance = root_instance
+        self.levels = {}
+        self.visited = 1
+        self.truncated = False
+
+    def instance_ids(self):
+        return set(instance_id for pairs in self.levels.values() for slot_id, instance_id in pairs)
+
+    def slot_ids(self):
+        return set(slot_id for pairs in self.levels.values() for slot_id, instance_id in pairs)
+
+    def as_objects(self):
+        """Legacy shape: {0: [(None, root)], level: {(OSlot, OInstance), ...}} loaded with two queries."""
+        slots = OSlot.objects.select_related('subject__concept', 'object__concept', 'predicate__subject', 'predicate__relation', 'predicate__object').in_bulk(list(self.slot_ids()))
+        instances = OInstance.objects.select_related('concept').in_bulk(list(self.instance_ids()))
+
+        results = {0: [(None, self.root_instance)]}
+        for level, pairs in self.levels.items():
+            results[level] = set((slots[slot_id], instances[instance_id]) for slot_id, instance_id in pairs if slot_id in slots and instance_id in instances)
+        return results
+
+
+class ImpactAnalysis:
+
+    def __init__(self, root_instance, predicate_ids=None, max_level=3, node_budget=None, source=None):
+        """
+        Args:
+            root_instance: The OInstance the analysis starts from
+            predicate_ids: Optional list of predicate ids the traversed slots must use
+            max_level: Number of levels of the result, root level included
+            node_budget: Optional maximum number of instances to reach before stopping early
+            source: SOURCE_INDEX to expand against the graph index, SOURCE_QUERY for one slot query per level,
+                SOURCE_CTE for one recursive query, defaults to SOURCE_CTE where the deployment traverses
+                the slots in the database, see SlotTraversal.enabled, else to SOURCE_INDEX
+        """
+        self.root_instance = root_instance
+        self.predicate_ids = list(predicate_ids) if predicate_ids and isinstance(predicate_ids, list) else None
+        self.max_level = max_level
+        self.node_budget = node_budget if node_budget is None else max(int(node_budget), 1)
+        self.source = source or (SOURCE_CTE if SlotTraversal.enabled() else SOURCE_INDEX)
+
+    def run(self):
+        result = ImpactAnalysisResult(self.root_instance)
+        if self.source == SOURCE_QUERY:
+            expand = self.expand_with_query
+        elif self.source == SOURCE_CTE:
+            expand = self.expand_with_cte()
+        else:
+            expand = self.expand_with_index()
+
+        already_found = {self.root_instance.id}
+        frontier = {self.root_instance.id}
+        level = 1
+        while frontier and level < self.max_level:
+            pairs = set()
+            reached = set()
+            for slot_id, instance_id in expand(frontier):
+                if instance_id in already_found:
+                    continue
+                if instance_id not in reached:
+                    if self.node_budget is not None and result.visited >= self.node_budget:
+                        result.truncated = True
+                        continue
+                    reached.add(instance_id)
+                    result.visited += 1
+                pairs.add((slot_id, instance_id))
+
+            result.levels[level] = pairs
+            already_found.update(reached)
+            frontier = reached
+            if result.truncated:
+                break
+            level += 1
+        return result
+
+    def expand_with_index(self):
+        index = GraphIndex.for_model(self.root_instance.model_id)
+        predicate_codes = index.predicate_codes(self.predicate_ids)
+
+        def expand(frontier):
+            for node in index.nodes(frontier):
+                for edge, neighbour in index.neighbours(node, predicate_codes=predicate_codes):
+                    yield index.slot_id(edge), index.instance_id(neighbour)
+        return expand
+
+    def expand_with_cte(self):
+        # Every slot the levels may use is read at once, levels are still built here
+        neighbours = {}
+        for instance_id, slot_id, neighbour_id in SlotTraversal.walk(self.root_instance.model_id, [self.root_instance.id], self.max_level - 1,
+                                                                     predicate_ids=self.predicate_ids):
+            neighbours.setdefault(instance_id, []).append((slot_id, neighbour_id))
+
+        def expand(frontier):
+            for instance_id in frontier:
+                yield from neighbours.get(instance_id, ())
+        return expand
+
+    def expand_with_query(self, frontier):
+        frontier = list(frontier)
+        # Both sides of the OR share the chunk, so keep room for two id lists plus the filters
+        chunk_size = max((connection.features.max_query_params or 2000) // 2 - 100, 100)
+        for i in range(0, len(frontier), chunk_size):
+            chunk = frontier[i:i + chunk_size]
+            slots = OSlot.objects.filter(Q(subject_id__in=chunk) | Q(object_id__in=chunk), model_id=self.root_instance.model_id, subject__isnull=False, object__isnull=False)
+            if self.predicate_ids is not None:
+                slots = slots.filter(predicate_id__in=self.predicate_ids)
+            chunk = set(chunk)
+            for slot_id, subject_id, object_id in slots.values_list('id', 'subject_id', 'object_id'):
+                if subject_id in chunk:
+                    yield slot_id, object_id
+                if object_id in chunk:
+                    yield slot_id, subject_id
@@ -0,0 +1,172 @@
+"""
+Set-based copy of a model.
+
+The row-by-row copy looks every copied row up by name in the new model and
+resolves each of its references with further name lookups before saving it,
+so copying a model costs several queries per row. Here each entity type is
+read once with ``values_list``, its rows are inserted with chunked
+``bulk_create`` and the foreign keys are rewritten from the old id -> new id
+maps of the entity types copied before it. Progress is reported after every
+chunk, so the copy can run as a background task.
+"""
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from log.controllers.audit import AuditLogController
+from log.middleware.request import get_request
+from ontology.controllers.concept_closure import ConceptClosure
+from ontology.controllers.org_units import OrgUnitIndex
+from ontology.controllers.revision import ModelRevision
+from ontology.models import (OConcept, OInstance, OModel, OPredicate,
+                             ORelation, OReport, OSlot)
+
+logger = logging.getLogger(__name__)
+
+# Set on the copied rows by the copier, never taken from the source rows
+COPY_EXCLUDED_FIELDS = ('id', 'model', 'created_at', 'created_by', 'modified_at', 'modified_by')
+
+# Copy order, with the foreign keys rewritten from the entity types copied before
+COPY_PLAN = (
+    (OConcept, {}),
+    (ORelation, {'concept_id': OConcept}),
+    (OPredicate, {'subject_id': OConcept, 'object_id': OConcept, 'relation_id': ORelation}),
+    (OInstance, {'concept_id': OConcept}),
+    (OSlot, {'subject_id': OInstance, 'object_id': OInstance, 'predicate_id': OPredicate}),
+    (OReport, {}),
+)
+
+
+class ModelCopier:
+
+    def __init__(self, model, chunk_size=None, user=None, progress=None):
+        """
+        Args:
+            model: The OModel to copy
+            chunk_size: Number of rows per bulk insert, defaults to settings.IMPORT_CHUNK_SIZE
+            user: User recorded as creator of the copy, defaults to the user of the current request
+            progress: Callable receiving (rows copied, total rows) after every chunk
+        """
+        self.source = model
+        self.chunk_size = max(chunk_size or settings.IMPORT_CHUNK_SIZE, 1)
+        self.progress = progress
+        self.now = timezone.now()
+
+        request = get_request()
+        self.request = request
+        if user is None and request and request.user and request.user.is_authenticated:
+            user = request.user
+        self.user = user
+
+        # Source id -> copy id, per entity type
+        self.id_maps = {}
+        self.counts = {}
+        self.total = 0
+        self.done = 0
+
+    def copy(self, name=None):
+        """Copy the model with its concepts, relations, predicates, instances, slots and reports.
+
+        Args:
+            name: Name of the copy, defaults to the source name suffixed with '_copy'
+
+        Returns:
+            OModel: The copy
+        """
+        self.total = sum(model_class._base_manager.filter(model_id=self.source.id).count() for model_class, remap in COPY_PLAN)
+        self.report()
+
+        target = OModel._base_manager.get(id=self.source.id)
+        target.id = OModel._meta.pk.get_default()
+        target.name = name or self.source.name + '_' + _('copy')
+        target.created_at = self.now
+        target.created_by = self.user
+        target.modified_at = self.now
+        target.modified_by = self.user
+        target.revision = 0
+        # Logged with the copied rows by write_log
+        OModel._base_manager.bulk_create([target])
+
+        try:
+            for model_class, remap in COPY_PLAN:
+                self.copy_entity(model_class, target, remap)
+        except Exception:
+            # Chunks are committed as they go so the progress can be seen, drop the partial copy
+            logger.exception('Copy of model %s failed, deleting the partial copy %s', self.source.id, target.id)
+            ModelCopier.delete_copy(target)
+            raise
+
+        ConceptClosure.rebuild(target.id)
+        OrgUnitIndex.rebuild(target.id)
+        # The copied rows are not listed in the change feed, the copy shows up as a new model
+        ModelRevision.bump(target.id, [(OModel.get_object_type(), target.id, 'created')])
+        self.write_log(target)
+        self.report()
+        return target
+
+    def copy_entity(self, model_class, target, remap):
+        fields = [x for x in model_class._meta.concrete_fields if x.name not in COPY_EXCLUDED_FIELDS]
+        attnames = [x.attname for x in fields]
+        id_map = self.id_maps.setdefault(model_class, {})
+        maps = {x: self.id_maps[y] for x, y in remap.items()}
+
+        objs = []
+        query = model_class._base_manager.filter(model_id=self.source.id).order_by().values_list('id', *attnames)
+        for row in query.iterator(chunk_size=self.chunk_size):
+            values = dict(zip(attnames, row[1:]))
+            for attname, ids in maps.items():
+                # References outside the source model are kept as they are
+                values[attname] = ids.get(values[attname], values[attname])
+            obj = model_class(model_id=target.id, created_at=self.now, created_by=self.user, modified_at=self.now, modified_by=self.user, **values)
+            id_map[row[0]] = obj.id
+            objs.append(obj)
+            if len(objs) >= self.chunk_size:
+                self.insert(model_class, objs)
+                objs = []
+        if objs:
+            self.insert(model_class, objs)
+
+    def insert(self, model_class, objs):
+        model_class._base_manager.bulk_create(objs, batch_size=self.chunk_size)
+        self.counts[model_class.__name__] = self.counts.get(model_class.__name__, 0) + len(objs)
+        self.done += len(objs)
+        self.report()
+
+    def report(self):
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+
+    @staticmethod
+    def delete_copy(target):
+        # Dependants first, every step is a single DELETE
+        for model_class, remap in reversed(COPY_PLAN):
+            model_class._base_manager.filter(model_id=target.id).delete()
+        OModel._base_manager.filter(id=target.id).delete()
+
+    #======================================================================================
+    # Audit
+
+    def write_log(self, target):
+        log_entries = [{
+            'source': 'created OModel',
+            'target': target.id,
+            'detail': str({'copy_of': str(self.source.id)}),
+            'organisation_id': target.organisation_id,
+        }]
+        for model_class, remap in COPY_PLAN:
+            if self.counts.get(model_class.__name__):
+                log_entries.append({
+                    'source': 'copied ' + model_class.__name__,
+                    'target': target.id,
+                    'detail': str({'count': self.counts[model_class.__name__]}),
+                    'organisation_id': target.organisation_id,
+                })
+
+        uri = None
+        ip_address = None
+        if self.request is not None:
+            uri = self.request.build_absolute_uri()
+            ip_address = getattr(self.request, 'ip_address', None)
+        AuditLogController.write(log_entries, source_prefix=self.__class__.__name__, user=self.user, uri=uri, ip_address=ip_address, timestamp=self.now)
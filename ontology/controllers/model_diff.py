@@ -0,0 +1,181 @@
+"""
+Gap analysis between two models.
+
+Entities of the two models are matched by a natural key made of names (the
+name of a concept, the subject, relation and object names of a predicate,
+...), never by id or position, so a model and its copy or a later version
+of it line up. Both sides are streamed from the database sorted by that key
+and merged like a sort-merge join: only the rows sharing the current key are
+held in memory, whatever the size of the models. Rows only in the first
+model are removed, rows only in the second added, and matched rows whose
+compared fields differ are changed, with their field-level changes.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+
+DEFAULT_MAX_ENTRIES = 1000
+
+DIFF_ADDED = 'added'
+DIFF_REMOVED = 'removed'
+DIFF_CHANGED = 'changed'
+DIFF_UNCHANGED = 'unchanged'
+
+# Entity -> (model class, natural key fields, compared fields)
+DIFF_SPECS = {
+    'relations': (ORelation, ('name',), ('description', 'type', 'native', 'quality_status', 'concept__name')),
+    'concepts': (OConcept, ('name',), ('description', 'native', 'quality_status')),
+    'predicates': (OPredicate, ('subject__name', 'relation__name', 'object__name'), ('description', 'cardinality_min', 'cardinality_max', 'quality_status')),
+    'instances': (OInstance, ('concept__name', 'name'), ('code', 'description', 'quality_status')),
+    'slots': (OSlot, ('predicate__subject__name', 'predicate__relation__name', 'predicate__object__name', 'subject__name', 'object__name'), ('value', 'name', 'description', 'order')),
+}
+
+# Collations sorting like Python compares strings, so the merge sees both sides in the same order
+BINARY_COLLATIONS = {
+    'postgresql': 'C',
+    'sqlite': 'BINARY',
+    'mysql': 'utf8mb4_bin',
+}
+
+
+class ModelDiff:
+
+    def __init__(self, model_1, model_2, chunk_size=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            model_1: The model compared from
+            model_2: The model compared to
+            chunk_size: Number of rows fetched at once from each side, defaults to settings.EXPORT_CHUNK_SIZE
+            max_entries: Differences listed per entity type by `pairs`, every difference is still counted
+        """
+        self.model_1 = model_1
+        self.model_2 = model_2
+        self.chunk_size = max(chunk_size or settings.EXPORT_CHUNK_SIZE, 1)
+        self.max_entries = max_entries
+        self.counts = {}
+
+    def pairs(self, entities):
+        """The differences in the format of the gap analysis view.
+
+        Returns:
+            dict: Entity -> list of (model_1 item, model_2 item) tuples, None for the side missing the item
+        """
+        result = {x: [] for x in DIFF_SPECS}
+        for entity in DIFF_SPECS:
+            if entity not in entities:
+                continue
+            for status, row_1, row_2, changes in self.diff(entity):
+                if status == DIFF_UNCHANGED or (self.max_entries is not None and len(result[entity]) >= self.max_entries):
+                    continue
+                item_1 = ModelDiff.item(entity, row_1)
+                item_2 = ModelDiff.item(entity, row_2)
+                if changes:
+                    item_2['changes'] = changes
+                result[entity].append((item_1, item_2))
+        return result
+
+    def diff(self, entity):
+        """Stream the differences of one entity type.
+
+        Yields:
+            tuple: (status, model_1 row, model_2 row, {field: (model_1 value, model_2 value)} for changed rows)
+        """
+        model_class, key_fields, fields = DIFF_SPECS[entity]
+        counts = self.counts[entity] = {DIFF_ADDED: 0, DIFF_REMOVED: 0, DIFF_CHANGED: 0, DIFF_UNCHANGED: 0}
+
+        groups_1 = self.groups(model_class, self.model_1, key_fields, fields)
+        groups_2 = self.groups(model_class, self.model_2, key_fields, fields)
+        group_1 = next(groups_1, None)
+        group_2 = next(groups_2, None)
+        while group_1 is not None or group_2 is not None:
+            if group_2 is None or (group_1 is not None and group_1[0] < group_2[0]):
+                rows_1, rows_2 = group_1[1], []
+                group_1 = next(groups_1, None)
+            elif group_1 is None or group_2[0] < group_1[0]:
+                rows_1, rows_2 = [], group_2[1]
+                group_2 = next(groups_2, None)
+            else:
+                rows_1, rows_2 = group_1[1], group_2[1]
+                group_1 = next(groups_1, None)
+                group_2 = next(groups_2, None)
+
+            for status, row_1, row_2, changes in ModelDiff.match(rows_1, rows_2, fields):
+                counts[status] += 1
+                yield status, row_1, row_2, changes
+
+    #======================================================================================
+    # Merge
+
+    def groups(self, model_class, model, key_fields, fields):
+        """Rows of one model sorted by natural key, grouped by key."""
+        collation = BINARY_COLLATIONS.get(connection.vendor)
+        ordering = [(Collate(F(x), collation) if collation else F(x)).asc(nulls_first=True) for x in key_fields]
+        query = model_class._base_manager.filter(model=model).order_by(*ordering, 'id').values_list('id', *key_fields, *fields)
+
+        size = len(key_fields)
+        current_key = None
+        rows = []
+        for row in query.iterator(chunk_size=self.chunk_size):
+            key = ModelDiff.sort_key(row[1:size + 1])
+            if key != current_key:
+                if rows:
+                    if key < current_key:
+                        raise ValueError('DIFF_STREAM_NOT_SORTED:{}'.format(model_class.__name__))
+                    yield current_key, rows
+                current_key = key
+                rows = []
+            rows.append({'id': row[0], 'key': row[1:size + 1], 'values': dict(zip(fields, row[size + 1:]))})
+        if rows:
+            yield current_key, rows
+
+    @staticmethod
+    def match(rows_1, rows_2, fields):
+        """Pair the rows sharing one natural key, identical rows first."""
+        unmatched_2 = {}
+        for row in rows_2:
+            unmatched_2.setdefault(ModelDiff.values_key(row, fields), []).append(row)
+
+        unmatched_1 = []
+        for row in rows_1:
+            same = unmatched_2.get(ModelDiff.values_key(row, fields))
+            if same:
+                yield DIFF_UNCHANGED, row, same.pop(0), None
+            else:
+                unmatched_1.append(row)
+
+        left = set(id(y) for x in unmatched_2.values() for y in x)
+        unmatched_2 = [x for x in rows_2 if id(x) in left]
+        for row_1, row_2 in zip(unmatched_1, unmatched_2):
+            changes = {x: (row_1['values'][x], row_2['values'][x]) for x in fields if row_1['values'][x] != row_2['values'][x]}
+            yield DIFF_CHANGED, row_1, row_2, changes
+        for row in unmatched_1[len(unmatched_2):]:
+            yield DIFF_REMOVED, row, None, None
+        for row in unmatched_2[len(unmatched_1):]:
+            yield DIFF_ADDED, None, row, None
+
+    @staticmethod
+    def sort_key(key):
+        # None sorts first, as NULLS FIRST in the database
+        return tuple((0, '') if x is None else (1, x) for x in key)
+
+    @staticmethod
+    def values_key(row, fields):
+        return tuple(row['values'][x] for x in fields)
+
+    @staticmethod
+    def item(entity, row):
+        if row is None:
+            return None
+        if entity == 'instances':
+            name = '{} :: {}'.format(row['key'][1], row['key'][0])
+        elif entity == 'slots':
+            subject_name, relation_name, object_name = row['key'][3] or row['key'][0], row['key'][1], row['key'][4] or row['key'][2]
+            name = '{} {} {}'.format(subject_name, relation_name, object_name)
+            if row['values']['value']:
+                name += ' : ' + str(row['values']['value'])
+        else:
+            name = ' '.join(str(x) for x in row['key'] if x is not None)
+        return {'id': str(row['id']), 'name': name}
@@ -1,14 +1,18 @@
 from uuid import UUID
 
-from django.db import transaction
-from django.db.models import Q
-from django.utils.translation import gettext as _
-
 from authorization.models import Permission
-from ontology.controllers.utils import KnowledgeBaseUtils
-from ontology.models import (OConcept, OInstance, OModel, OPredicate,
-                             ORelation, OReport, OSlot)
-from openea.constants import Utils
+from ontology.controllers.batch_serializer import BatchSerializer
+from ontology.controllers.bulk_import import BulkImporter
+from ontology.controllers.concept_closure import ConceptClosure
+from ontology.controllers.graph_query import GraphQueryPlanner
+from ontology.controllers.impact_analysis import ImpactAnalysis
+from ontology.controllers.model_copy import ModelCopier
+from ontology.controllers.model_diff import DEFAULT_MAX_ENTRIES, ModelDiff
+from ontology.controllers.pathfinder import (DEFAULT_MAX_DEPTH,
+                                             DEFAULT_MAX_PATHS,
+                                             RELATION_SCOPE_FIRST)
+from ontology.controllers.utils import DEFAULT_MAX_LEVEL as INHERITANCE_MAX_LEVEL, KnowledgeBaseUtils
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
 
 DEFAULT_MAX_LEVEL = 100
 
@@ -18,105 +22,8 @@ class ModelUtils:
         return ModelUtils.filter(user, data)
 
     def filter(user, data):
-        model_id = data.get('model_id')
-        model = OModel.objects.get(id=model_id)
-        target = data.get('target')
-
-        relation_ids = ModelUtils.get_filtering_param(data, 'relation_ids', [])
-        show_relations = user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None))
-        if not show_relations:
-            relation_ids = []
-        
-            
-        concept_ids = ModelUtils.get_filtering_param(data, 'concept_ids', [])
-        show_concepts = user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OConcept.get_object_type(), None))
-        if not show_concepts:
-            concept_ids = []
-        
-            
-        predicate_ids = ModelUtils.get_filtering_param(data, 'predicate_ids', None)
-        if not predicate_ids:
-            predicate_ids = None
-        show_predicates = user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OPredicate.get_object_type(), None))
-        if not show_predicates:
-            predicate_ids = []
-        
-            
-        instance_ids = ModelUtils.get_filtering_param(data, 'instance_ids', None)
-        if not instance_ids:
-            instance_ids = None
-        show_instances = user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OInstance.get_object_type(), None))
-        if not show_instances:
-            instance_ids = []
-        
-            
-        slot_ids = ModelUtils.get_filtering_param(data, 'slot_ids', None)
-        if not show_instances:
-            slot_ids = []
-        
-        filtered_data = {
-            'relations': [],
-            'concepts': [],
-            'predicates': [],
-            'instances': [],
-            'slots': [],
-        }
-
-        filtered_data['relations'] = ORelation.objects.filter(model=model, id__in=relation_ids).order_by('name')
-        if target == 'relations':
-            return filtered_data
-
-        filtered_data['concepts'] = OConcept.objects.filter(model=model, id__in=concept_ids).order_by('name')
-        if target == 'concepts':
-            return filtered_data
-
-        # If predicate_ids are explicitly provided, use them directly
-        # Otherwise, filter by concepts and relations
-        if isinstance(predicate_ids, list) and len(predicate_ids) > 0:
-            filtered_data['predicates'] = OPredicate.objects.filter(model=model, id__in=predicate_ids).order_by('subject__name').order_by('relation__name').order_by('object__name')
-        else:
-            filtered_data['predicates'] = OPredicate.objects.filter(model=model, relation__in=filtered_data['relations'], subject__in=filtered_data['concepts'], object__in=filtered_data['concepts']).order_by('subject__name').order_by('relation__name').order_by('object__name')
-        if target == 'predicates':
-            return filtered_data
-
-        # If instance_ids are explicitly provided, use them directly
-        if isinstance(instance_ids, list) and len(instance_ids) > 0:
-            filtered_data['instances'] = OInstance.objects.filter(model=model, id__in=instance_ids).order_by('name')
-        else:
-            # Check if we should filter by selected concepts only (for simplified mode)
-            filter_by_selected_concepts = data.get('filter_by_selected_concepts', False)
-
-            if filter_by_selected_concepts and filtered_data['concepts']:
-                # Filter instances to only include selected concept types
-                # This prevents "Application supports BusinessProcess" from including BusinessProcess instances
-                filtered_data['instances'] = OInstance.objects.filter(
-                    model=model,
-                    concept__in=filtered_data['concepts']
-                ).order_by('name')
-            elif filtered_data['predicates']:
-                # Get all instances that could participate in the selected predicates
-                # This includes both subject and object concepts from predicates
-                available_concept_ids = set()
-                for pred in filtered_data['predicates']:
-                    available_concept_ids.add(pred.subject.id)
-                    available_concept_ids.add(pred.object.id)
-                filtered_data['instances'] = OInstance.objects.filter(
-                    model=model,
-                    concept_id__in=available_concept_ids
-                ).order_by('name')
-            else:
-                # Fall back to filtering by selected concepts
-                filtered_data['instances'] = OInstance.objects.filter(
-                    model=model,
-                    concept__in=filtered_data['concepts']
-                ).order_by('name')
-        if target == 'instances':
-            return filtered_data
-        
-        filtered_data['slots'] = OSlot.objects.filter((Q(subject__in=filtered_data['instances'])|Q(object__in=filtered_data['instances'])), model=model, predicate__in=filtered_data['predicates'])
-        if isinstance(slot_ids, list):
-            filtered_data['slots'] = filtered_data['slots'].filter(id__in=slot_ids)
-        return filtered_data
+        """Model data selected by a filter payload, see GraphQueryPlanner."""
+        return GraphQueryPlanner(user, data).filter(target=data.get('target'))
 
 
     
@@ -178,7 +85,34 @@ class ModelUtils:
         }
     
     def instance_to_dict(instance):  
-        data = {
+        data = ModelUtils.instance_header_to_dict(instance)
+        for slot in OSlot.objects.filter(subject=instance).all():
+            data["ownslots"][str(slot.id)] = ModelUtils.ownslot_to_dict(slot)
+        for slot in OSlot.objects.filter(object=instance).all():
+            data["inslots"][str(slot.id)] = ModelUtils.inslot_to_dict(slot)
+        return data
+
+    def instances_to_dicts(instances):
+        """Bulk variant of instance_to_dict, see BatchSerializer.
+
+        Args:
+            instances: Queryset or list of OInstance objects
+
+        Returns:
+            dict: Mapping of instance ID -> instance dict
+        """
+        return {x['id']: x for x in BatchSerializer.instances(instances)}
+
+    def slots_to_dicts(slots):
+        """Bulk variant of slot_to_dict, see BatchSerializer.
+
+        Returns:
+            dict: Mapping of slot ID -> slot dict
+        """
+        return {x['id']: x for x in BatchSerializer.slots(slots)}
+
+    def instance_header_to_dict(instance):
+        return {
             "id": instance.id,
             "name": instance.name,
             'code': instance.code,
@@ -189,36 +123,37 @@ class ModelUtils:
             "inslots": {},
             'url': ModelUtils.get_url('instance', instance.id)
         }
-        for slot in OSlot.objects.filter(subject=instance).all():
-            data["ownslots"][str(slot.id)] = {
-                "id": slot.id,
-                "name": slot.name,
-                "description": slot.description,
-                "predicate_id": slot.predicate.id,
-                "predicate": slot.predicate.name,
-                "relation_id": slot.predicate.relation.id,
-                "relation": slot.predicate.relation.name,
-                "concept_id": slot.predicate.object.id,
-                "concept": slot.predicate.object.name,
-                "object_id": slot.object.id if slot.object is not None else None,
-                "object": slot.object.name if slot.object is not None else None,
-                "value": slot.value
-            }
-        for slot in OSlot.objects.filter(object=instance).all():
-            data["inslots"][str(slot.id)] = {
-                "id": slot.id,
-                "name": slot.name,
-                "description": slot.description,
-                "predicate_id": slot.predicate.id,
-                "predicate": slot.predicate.name,
-                "relation_id": slot.predicate.relation.id,
-                "relation": slot.predicate.relation.name,
-                "concept_id": slot.predicate.subject.id,
-                "concept": slot.predicate.subject.name,
-                "subject_id": slot.subject.id if slot.subject is not None else None,
-                "subject": slot.subject.name if slot.subject is not None else None
-            }
-        return data
+
+    def ownslot_to_dict(slot):
+        return {
+            "id": slot.id,
+            "name": slot.name,
+            "description": slot.description,
+            "predicate_id": slot.predicate.id,
+            "predicate": slot.predicate.name,
+            "relation_id": slot.predicate.relation.id,
+            "relation": slot.predicate.relation.name,
+            "concept_id": slot.predicate.object.id,
+            "concept": slot.predicate.object.name,
+            "object_id": slot.object.id if slot.object is not None else None,
+            "object": slot.object.name if slot.object is not None else None,
+            "value": slot.value
+        }
+
+    def inslot_to_dict(slot):
+        return {
+            "id": slot.id,
+            "name": slot.name,
+            "description": slot.description,
+            "predicate_id": slot.predicate.id,
+            "predicate": slot.predicate.name,
+            "relation_id": slot.predicate.relation.id,
+            "relation": slot.predicate.relation.name,
+            "concept_id": slot.predicate.subject.id,
+            "concept": slot.predicate.subject.name,
+            "subject_id": slot.subject.id if slot.subject is not None else None,
+            "subject": slot.subject.name if slot.subject is not None else None
+        }
     
     def slot_to_dict(slot):
         return {
@@ -253,19 +188,35 @@ class ModelUtils:
             return None
         
 
-    def find_paths(start_instance, end_instance, relation_ids=None):
-        paths = []
+    def find_paths(start_instance, end_instance, relation_ids=None, max_paths=DEFAULT_MAX_PATHS, max_depth=DEFAULT_MAX_DEPTH, relation_scope=RELATION_SCOPE_FIRST):
+        """Find the k shortest simple paths between two instances.
+
+        Args:
+            start_instance: The starting OInstance
+            end_instance: The target OInstance
+            relation_ids: Optional set of relation IDs to filter paths by.
+            max_paths: Maximum number of paths to return (k)
+            max_depth: Maximum number of slots in a path
+            relation_scope: Whether the relation filter applies to the first edge only or to every edge
+
+        Returns:
+            list: Paths as lists of slot dicts, shortest first
+        """
+        slot_paths = []
         q = KnowledgeBaseUtils.get_instances_paths(
             start_instance=start_instance,
             end_instance=end_instance,
-            relation_ids=relation_ids
+            relation_ids=relation_ids,
+            max_level=max_depth,
+            max_paths=max_paths,
+            relation_scope=relation_scope
         )
         while not q.empty():
-            best_path = q.get()
-            paths.append([ModelUtils.slot_to_dict(x) for x in best_path[1]])
-        return paths
+            slot_paths.append(q.get()[1])
+        slots = ModelUtils.slots_to_dicts([x for path in slot_paths for x in path])
+        return [[slots[x.id] for x in path] for path in slot_paths]
 
-    def find_paths_to_concept(start_instance, end_concept, max_results=50, relation_ids=None):
+    def find_paths_to_concept(start_instance, end_concept, max_results=50, relation_ids=None, max_depth=DEFAULT_MAX_DEPTH, relation_scope=RELATION_SCOPE_FIRST):
         """Find paths from one instance to ALL instances of a target concept.
 
         Args:
@@ -273,6 +224,8 @@ class ModelUtils:
             end_concept: The target OConcept type
             max_results: Maximum number of target instances to search (default 50)
             relation_ids: Optional set of relation IDs to filter paths by.
+            max_depth: Maximum number of slots in a path
+            relation_scope: Whether the relation filter applies to the first edge only or to every edge
 
         Returns:
             dict: Contains paths, target_instances, truncated flag, total_found count, and concept_name
@@ -284,15 +237,18 @@ class ModelUtils:
         ).exclude(id=start_instance.id)
 
         total_count = target_query.count()
-        target_instances = list(target_query[:max_results])
+        target_instances = list(target_query.select_related('concept')[:max_results])
 
         # Use optimized multi-target BFS
         paths_by_target = KnowledgeBaseUtils.get_instances_paths_to_multiple(
             start_instance=start_instance,
             end_instances=target_instances,
-            relation_ids=relation_ids
+            max_level=max_depth,
+            relation_ids=relation_ids,
+            relation_scope=relation_scope
         )
 
+        slots = ModelUtils.slots_to_dicts([x for path in paths_by_target.values() for x in path])
         results = {
             'paths': {},
             'target_instances': {},
@@ -313,179 +269,45 @@ class ModelUtils:
                 'url': ModelUtils.get_url('instance', target.id)
             }
             if target.id in paths_by_target:
-                results['paths'][instance_id] = [ModelUtils.slot_to_dict(x) for x in paths_by_target[target.id]]
+                results['paths'][instance_id] = [slots[x.id] for x in paths_by_target[target.id]]
             else:
                 results['paths'][instance_id] = None
 
         return results
 
-    def analyze_impact(root_instance, predicate_ids, level):
-        return KnowledgeBaseUtils.get_related_instances(root_instance, predicate_ids, level)
+    def analyze_impact(root_instance, predicate_ids, level, node_budget=None):
+        return ImpactAnalysis(root_instance=root_instance, predicate_ids=predicate_ids, max_level=level, node_budget=node_budget).run()
     
     def dictify_impact_analysis(results):
+        instances = [x[1] for slots in results.values() for x in slots if x[1] is not None]
+        instances_data = ModelUtils.instances_to_dicts(instances)
+        slots_data = ModelUtils.slots_to_dicts([x[0] for slots in results.values() for x in slots if x[0]])
         dictified_results = {}
         for level, slots in results.items():
             dictified_results[level] = []
             for x in slots:
                 slot_data = None
                 if x[0]:
-                    slot_data = ModelUtils.slot_to_dict(x[0])
+                    slot_data = slots_data[x[0].id]
                 if x[1] is not None:
-                    dictified_results[level].append((slot_data, ModelUtils.instance_to_dict(x[1])))
+                    dictified_results[level].append((slot_data, instances_data[x[1].id]))
         return dictified_results
     
-    def model_diff(model_1, model_2, filters):
-        result = {
-            'relations': [],
-            'predicates': [],
-            'concepts': [],
-            'instances': [],
-            'slots': [],
-        }
+    def model_diff(model_1, model_2, filters, max_entries=DEFAULT_MAX_ENTRIES):
+        return ModelDiff(model_1, model_2, max_entries=max_entries).pairs(filters)
 
-        if 'relations' in filters:
-            ModelUtils.compare(result, ORelation, 'relations', model_1, model_2)
-        if 'predicates' in filters:
-            ModelUtils.compare(result, OPredicate, 'predicates', model_1, model_2)
-        if 'concepts' in filters:
-            ModelUtils.compare(result, OConcept, 'concepts', model_1, model_2)
-        if 'instances' in filters:
-            ModelUtils.compare(result, OInstance, 'instances', model_1, model_2)
-        if 'slots' in filters:
-            ModelUtils.compare(result, OSlot, 'slots', model_1, model_2)
-
-        return result
-
-    def compare(result, class_name, key, model_1, model_2):
-        if key == 'predicates':
-            model_1_query = class_name.objects.filter(model=model_1).order_by('subject__name').order_by('relation__name').order_by('object__name')
-            model_2_query = class_name.objects.filter(model=model_2).order_by('subject__name').order_by('relation__name').order_by('object__name')
-        elif key == 'slots':
-            model_1_query = class_name.objects.filter(model=model_1).order_by('subject__name').order_by('predicate__relation__name').order_by('object__name')
-            model_2_query = class_name.objects.filter(model=model_2).order_by('subject__name').order_by('predicate__relation__name').order_by('object__name')
-        else:
-            model_1_query = class_name.objects.filter(model=model_1).order_by('name')
-            model_2_query = class_name.objects.filter(model=model_2).order_by('name')
-
-        model_1_item_list = [x for x in model_1_query.all()]
-        model_2_item_list = [x for x in model_2_query.all()]
-        is_model_1_larger_than_model_2 = len(model_1_item_list) > len(model_2_item_list)
-
-        smaller_list = model_1_item_list
-        larger_list = model_2_item_list
-        if is_model_1_larger_than_model_2:
-            smaller_list = model_2_item_list
-            larger_list = model_1_item_list
-        
-        i = 0
-        while i < len(larger_list):
-            if i < len(smaller_list):
-                ModelUtils.compare_objects(result, key, model_1_item_list[i], model_2_item_list[i])
-            else:
-                if is_model_1_larger_than_model_2:
-                    result[key].append( (None, {"id": str(larger_list[i].id), "name": str(larger_list[i])}) )
-                else:
-                    result[key].append( ({"id": str(larger_list[i].id), "name": str(larger_list[i])}, None) )
-            i = i + 1
-
-        #tuples.sort(key=lambda x: x[0], reverse=True)
-    
-    def compare_objects(result, key, item_1, item_2):
-        if item_1.name == item_2.name:
-            result[key].append( ({"id": str(item_1.id), "name": item_1.name}, {"id": str(item_2.id), "name": item_2.name}) )
-        else:
-            if item_1.name < item_2.name:
-                result[key].append( ({"id": str(item_1.id), "name": item_1.name}, None) )
-            else:
-                result[key].append( (None, {"id": str(item_2.id), "name": item_2.name}) )
-
-    def model_copy(model):
-        with transaction.atomic():
-            old_model_id = model.id
-            model_name = model.name + '_' + _('copy')
-            new_model = OModel.objects.get(id=old_model_id)
-            new_model.id = None
-            new_model.name = model_name
-            new_model.save()
-
-            for relation in ORelation.objects.filter(model__id=old_model_id).order_by('name'):
-                try:
-                    ORelation.objects.get(model=new_model, name=relation.name)
-                except ORelation.DoesNotExist:
-                    new_relation = relation
-                    new_relation.id = None
-                    new_relation.model = new_model
-                    new_relation.save()
-
-            for concept in OConcept.objects.filter(model__id=old_model_id).order_by('name'):
-                try:
-                    OConcept.objects.get(model=new_model, name=concept.name)
-                except OConcept.DoesNotExist:
-                    new_concept = concept
-                    new_concept.id = None
-                    new_concept.model = new_model
-                    new_concept.save()
-
-            for instance in OInstance.objects.filter(model__id=old_model_id).order_by('name'):
-                try:
-                    OInstance.objects.get(model=new_model, name=instance.name, concept__name=instance.concept.name)
-                except OInstance.DoesNotExist:
-                    new_instance = instance
-                    new_instance.id = None
-                    new_instance.model = new_model
-                    new_instance.concept = new_model.concepts.filter(name=instance.concept.name).first()
-                    new_instance.save()
-            
-            for predicate in OPredicate.objects.filter(model__id=old_model_id).order_by('subject__name').order_by('relation__name').order_by('object__name'):
-                try:
-                    OPredicate.objects.get(model=new_model, subject__name=predicate.subject.name, relation__name=predicate.relation.name, object__name=predicate.object.name)
-                except OPredicate.DoesNotExist:
-                    new_predicate = predicate
-                    new_predicate.id = None
-                    new_predicate.model = new_model
-                    new_predicate.subject = new_model.concepts.filter(name=predicate.subject.name).first()
-                    new_predicate.relation = new_model.relations.filter(name=predicate.relation.name).first()
-                    new_predicate.object = new_model.concepts.filter(name=predicate.object.name).first()
-                    new_predicate.save()
-
-            for slot in OSlot.objects.filter(model__id=old_model_id).order_by('subject__name').order_by('predicate__relation__name').order_by('object__name'):
-                try:
-                    slot_query = OSlot.objects.filter(model=new_model, predicate__relation__name=slot.predicate.relation.name)
-                    if slot.subject:
-                        slot_query = slot_query.filter(subject__name=slot.subject.name)
-                    if slot.object:
-                        slot_query = slot_query.filter(object__name=slot.object.name)
-                    slot_query.get()
-                except OSlot.DoesNotExist:
-                    new_slot = OSlot.objects.get(id=slot.id)
-                    new_slot.id = None
-                    new_slot.model = new_model
-                    new_slot.subject = None
-                    if slot.subject:
-                        new_slot.subject = new_model.model_instances.filter(name=slot.subject.name, concept__name=slot.subject.concept.name).first()
-                    new_slot.predicate = new_model.predicates.filter(subject__name=slot.predicate.subject.name, relation__name=slot.predicate.relation.name, object__name=slot.predicate.object.name).first()
-                    new_slot.object = None
-                    if slot.object:
-                        new_slot.object = new_model.model_instances.filter(name=slot.object.name, concept__name=slot.object.concept.name).first()
-                    new_slot.save()
-
-            for report in OReport.objects.filter(model__id=old_model_id).all():
-                try:
-                    OReport.objects.get(model=new_model, name=report.name)
-                except OReport.DoesNotExist:
-                    new_report = report
-                    new_report.id = None
-                    new_report.model = new_model
-                    new_report.save()
-
-        return new_model
+    def model_copy(model, name=None, progress=None):
+        return ModelCopier(model, progress=progress).copy(name=name)
 
 
     def model_delete():
         pass
 
 
-    def ontology_from_dict(model, data=None, filters=None):
+    def ontology_from_dict(model, data=None, filters=None, bulk=False):
+        if bulk:
+            return BulkImporter(model).import_ontology(data)
+
         concepts = data.get('concepts', {})
         if isinstance(concepts, list):
             concepts = {x['id']:x for x in concepts}
@@ -535,44 +357,45 @@ class ModelUtils:
             data['relations'] = []
             data['predicates'] = []
 
+        if compute_inheritance:
+            ancestors, descendants = ConceptClosure.lineages(model, max_depth=INHERITANCE_MAX_LEVEL + 1)
+
         concept_query = OConcept.objects.filter(model=model)
         if concept_ids:
             concept_query = concept_query.filter(id__in=concept_ids)
-        for concept in concept_query.order_by('name'):
-            concept_data = ModelUtils.concept_to_dict(concept=concept)
+        for concept_data in BatchSerializer.concepts(concept_query.order_by('name')):
             if use_dicts:
-                data['concepts'][str(concept.id)] = concept_data
+                data['concepts'][str(concept_data['id'])] = concept_data
             else:
                 data['concepts'].append(concept_data)
             if compute_inheritance:
-                parents = KnowledgeBaseUtils.get_parent_concepts(concept=concept)
-                children = KnowledgeBaseUtils.get_child_concepts(concept=concept)
-                concept_data['parents'] = [{str(x[0].id): x[0].name} for x in parents]
-                concept_data['children'] = [{str(x[0].id): x[0].name} for x in children]
+                concept_data['parents'] = [{str(x[0]): x[1]} for x in ancestors.get(concept_data['id'], [])]
+                concept_data['children'] = [{str(x[0]): x[1]} for x in descendants.get(concept_data['id'], [])]
             
         relation_query = ORelation.objects.filter(model=model)
         if relation_ids:
             relation_query = relation_query.filter(id__in=relation_ids)
-        for relation in relation_query.order_by('name'):
-            relation_data = ModelUtils.relation_to_dict(relation=relation)
+        for relation_data in BatchSerializer.relations(relation_query.order_by('name')):
             if use_dicts:
-                data['relations'][str(relation.id)] = relation_data
+                data['relations'][str(relation_data['id'])] = relation_data
             else:
                 data['relations'].append(relation_data)
         
         predicate_query = OPredicate.objects.filter(model=model)
         if predicate_ids:
             predicate_query = predicate_query.filter(id__in=predicate_ids)
-        for predicate in predicate_query.order_by('subject__name').order_by('relation__name').order_by('object__name'):
-            predicate_data = ModelUtils.predicate_to_dict(predicate=predicate)
+        for predicate_data in BatchSerializer.predicates(predicate_query.order_by('subject__name').order_by('relation__name').order_by('object__name')):
             if use_dicts:
-                data['predicates'][str(predicate.id)] = predicate_data
+                data['predicates'][str(predicate_data['id'])] = predicate_data
             else:
                 data['predicates'].append(predicate_data)
         
         return data
 
-    def instances_from_dict(model, data=None):
+    def instances_from_dict(model, data=None, bulk=False):
+        if bulk:
+            return BulkImporter(model).import_instances(data)
+
         instances = data.get('instances', {})
         if isinstance(instances, list):
             instances = {x['id']:x for x in instances}
@@ -616,10 +439,9 @@ class ModelUtils:
         predicate_query = OPredicate.objects.filter(model=model)
         if predicate_ids:
             predicate_query = predicate_query.filter(id__in=predicate_ids)
-        for predicate in predicate_query.order_by('subject__name').order_by('relation__name').order_by('object__name'):
-            predicate_data = ModelUtils.predicate_to_dict(predicate=predicate)
+        for predicate_data in BatchSerializer.predicates(predicate_query.order_by('subject__name').order_by('relation__name').order_by('object__name')):
             if use_dicts:
-                data['predicates'][str(predicate.id)] = predicate_data
+                data['predicates'][str(predicate_data['id'])] = predicate_data
             else:
                 data['predicates'].append(predicate_data)
                 
@@ -627,10 +449,9 @@ class ModelUtils:
         instance_query = OInstance.objects.filter(model=model)
         if instance_ids:
             instance_query = instance_query.filter(id__in=instance_ids)
-        for instance in instance_query.order_by('name'):
-            instance_data = ModelUtils.instance_to_dict(instance=instance)
+        for instance_data in BatchSerializer.instances(instance_query.order_by('name')):
             if use_dicts:
-                data['instances'][str(instance.id)] = instance_data
+                data['instances'][str(instance_data['id'])] = instance_data
             else:
                 data['instances'].append(instance_data)
 
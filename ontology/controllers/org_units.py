@@ -0,0 +1,248 @@
+"""
+Org unit hierarchy and ownership index.
+
+The graph presets scope a graph to an org unit: the instances it owns, and
+the ones owned by the units under it. Read from the slots, that matches
+relation names and walks the hierarchy one unit at a time, a few queries per
+unit. OOrgUnitClosure stores every (ancestor, descendant) pair of the
+hierarchy with the length of the shortest path between them, and
+OOrgUnitOwnership every (org unit, owned instance) pair, so the instances in
+the scope of an org unit are one indexed query at any depth.
+
+The hierarchy edges are the slots from an org unit to its parent ("reports
+to", "part of"...) or to its children ("contains", "has"...), the child
+being an instance of an Organisation concept. The ownership pairs are the
+slots from an instance to the unit owning it, with the ownership relation of
+the organisation presets, or from a unit to what it owns ("owns",
+"manages"...).
+
+A new slot only adds pairs and is folded in incrementally, the hierarchy
+edges as the concept closure ones. A removed slot removes its ownership pair
+unless another slot still gives it. A removed or rewired hierarchy slot,
+renamed relations or concepts, or another ownership relation rebuild the
+index of the model from its slots (a few queries and bulk inserts). Slots
+removed by the cascade of a concept, relation, predicate or instance send no
+signal, the index of the model is rebuilt once per delete instead.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from ontology.controllers.concept_closure import CLOSURE_BATCH_SIZE, ConceptClosure
+from ontology.controllers.revision import ModelRevision
+from ontology.models import (OConcept, OInstance, OModel, OOrgUnitClosure,
+                             OOrgUnitOwnership, OPredicate, OSlot)
+
+# Relation name patterns of the org unit hierarchy and ownership slots
+CHILD_TO_PARENT_RELATIONS = ['reports', 'part-of', 'belongs', 'subordinate', 'member']
+PARENT_TO_CHILD_RELATIONS = ['contains', 'has', 'includes', 'comprises']
+OWNS_RELATIONS = ['owns', 'manages', 'responsible']
+# Concept name pattern of the org units of the hierarchy
+ORG_UNIT_CONCEPT_PATTERN = 'Organisation'
+DEFAULT_OWNERSHIP_RELATION = 'ownedBy'
+
+# Kinds of the hierarchy and ownership predicates
+CHILD_TO_PARENT = 'child_to_parent'
+PARENT_TO_CHILD = 'parent_to_child'
+OWNED_BY = 'owned_by'
+OWNS = 'owns'
+
+
+def get_ownership_relation(organisation):
+    # Imported late, GraphPresetService imports this module
+    from ontology.services.graph_presets import GraphPresetService
+    return GraphPresetService.get_ownership_relation(GraphPresetService.get_presets(organisation))
+
+
+class OrgUnitIndex:
+
+    #======================================================================================
+    # Lookups
+
+    def owned_instance_ids(model_id, org_unit_id, include_children=True):
+        """Ids of the instances owned by an org unit, and by the units under it, in one query.
+
+        Args:
+            model_id: Model of the org unit
+            org_unit_id: Instance id of the org unit
+            include_children: Whether the instances owned by the units under it are included
+        """
+        units = Q(org_unit_id=org_unit_id)
+        if include_children:
+            units |= Q(org_unit_id__in=OOrgUnitClosure.objects.filter(ancestor_id=org_unit_id).values('descendant_id'))
+        query = OOrgUnitOwnership.objects.filter(units, model_id=model_id).values_list('instance_id', flat=True).distinct()
+        return [str(x) for x in query]
+
+    def subordinate_ids(org_unit_id):
+        """Instance ids of all the units under an org unit, nearest first."""
+        return list(OOrgUnitClosure.objects.filter(ancestor_id=org_unit_id).order_by('depth').values_list('descendant_id', flat=True))
+
+    def level():
+        """Level of the org units of an instance query in the hierarchy, 0 for the top ones."""
+        deepest = OOrgUnitClosure.objects.filter(descendant_id=OuterRef('id')).order_by('-depth').values('depth')[:1]
+        return Coalesce(Subquery(deepest), 0)
+
+    #======================================================================================
+    # Maintenance
+
+    def ownership_relation(model_id):
+        """Relation name pattern of the "owned by" slots in the presets of the organisation of a model."""
+        organisation_id = OModel._base_manager.filter(id=model_id).values_list('organisation_id', flat=True).first()
+        return get_ownership_relation(organisation_id)
+
+    def kinds(relation_name, ownership_relation):
+        """Kinds of a predicate from the name of its relation, see the relation patterns."""
+        relation_name = (relation_name or '').lower()
+        kinds = set()
+        if any(x in relation_name for x in CHILD_TO_PARENT_RELATIONS):
+            kinds.add(CHILD_TO_PARENT)
+        if any(x in relation_name for x in PARENT_TO_CHILD_RELATIONS):
+            kinds.add(PARENT_TO_CHILD)
+        if ownership_relation and ownership_relation.lower() in relation_name:
+            kinds.add(OWNED_BY)
+        if any(x in relation_name for x in OWNS_RELATIONS):
+            kinds.add(OWNS)
+        return kinds
+
+    def predicate_kinds(model_id, ownership_relation, predicate_ids=None):
+        """Kinds by id of the hierarchy and ownership predicates of a model.
+
+        Args:
+            predicate_ids: Optional predicate ids to restrict the lookup to
+        """
+        query = OPredicate._base_manager.filter(model_id=model_id)
+        if predicate_ids is not None:
+            query = query.filter(id__in=predicate_ids)
+        kinds = {}
+        for predicate_id, relation_name in query.values_list('id', 'relation__name'):
+            predicate_kinds = OrgUnitIndex.kinds(relation_name, ownership_relation)
+            if predicate_kinds:
+                kinds[predicate_id] = predicate_kinds
+        return kinds
+
+    def unit_concept_ids(model_id):
+        """Concept ids of the org units of the hierarchy."""
+        return set(OConcept._base_manager.filter(model_id=model_id, name__icontains=ORG_UNIT_CONCEPT_PATTERN).values_list('id', flat=True))
+
+    def links(kinds, subject_id, object_id, subject_concept_id, object_concept_id, unit_concept_ids):
+        """Hierarchy edges and ownership pairs of a slot.
+
+        Returns:
+            tuple: ([(parent id, child id)], [(org unit id, owned instance id)])
+        """
+        edges = []
+        owned = []
+        if subject_id is None or object_id is None:
+            return edges, owned
+        if CHILD_TO_PARENT in kinds and subject_concept_id in unit_concept_ids:
+            edges.append((object_id, subject_id))
+        if PARENT_TO_CHILD in kinds and object_concept_id in unit_concept_ids:
+            edges.append((subject_id, object_id))
+        if OWNED_BY in kinds:
+            owned.append((object_id, subject_id))
+        if OWNS in kinds:
+            owned.append((subject_id, object_id))
+        return edges, owned
+
+    def slot_links(slot):
+        """Hierarchy edges and ownership pairs of a slot, see links."""
+        if slot.subject_id is None or slot.object_id is None:
+            return [], []
+        relation_name = OPredicate._base_manager.filter(id=slot.predicate_id).values_list('relation__name', flat=True).first()
+        kinds = OrgUnitIndex.kinds(relation_name, OrgUnitIndex.ownership_relation(slot.model_id))
+        if not kinds:
+            return [], []
+        concept_ids = {}
+        unit_concept_ids = set()
+        if kinds & {CHILD_TO_PARENT, PARENT_TO_CHILD}:
+            concept_ids = dict(OInstance._base_manager.filter(id__in=[slot.subject_id, slot.object_id]).values_list('id', 'concept_id'))
+            unit_concept_ids = set(OConcept._base_manager.filter(id__in=list(concept_ids.values()), name__icontains=ORG_UNIT_CONCEPT_PATTERN)
+                                   .values_list('id', flat=True))
+        return OrgUnitIndex.links(kinds, slot.subject_id, slot.object_id, concept_ids.get(slot.subject_id), concept_ids.get(slot.object_id), unit_concept_ids)
+
+    def add_slot(slot):
+        """Fold a new slot into the index of its model."""
+        edges, owned = OrgUnitIndex.slot_links(slot)
+        with transaction.atomic():
+            for parent_id, child_id in edges:
+                ConceptClosure.add_edge(slot.model_id, parent_id, child_id, closure_class=OOrgUnitClosure)
+            OOrgUnitOwnership.objects.bulk_create([OOrgUnitOwnership(model_id=slot.model_id, org_unit_id=x, instance_id=y) for x, y in owned],
+                                                  ignore_conflicts=True)
+
+    def remove_slot(slot):
+        """Remove a deleted slot from the index of its model."""
+        edges, owned = OrgUnitIndex.slot_links(slot)
+        if edges:
+            # Removing a hierarchy edge can remove paths
+            OrgUnitIndex.rebuild(slot.model_id)
+            return
+        if not owned:
+            return
+        kinds = OrgUnitIndex.predicate_kinds(slot.model_id, OrgUnitIndex.ownership_relation(slot.model_id))
+        owned_by_ids = [x for x, y in kinds.items() if OWNED_BY in y]
+        owns_ids = [x for x, y in kinds.items() if OWNS in y]
+        for org_unit_id, instance_id in owned:
+            remaining = OSlot._base_manager.filter(Q(subject_id=instance_id, object_id=org_unit_id, predicate_id__in=owned_by_ids) |
+                                                   Q(subject_id=org_unit_id, object_id=instance_id, predicate_id__in=owns_ids), model_id=slot.model_id)
+            if not remaining.exists():
+                OOrgUnitOwnership.objects.filter(org_unit_id=org_unit_id, instance_id=instance_id).delete()
+
+    def remove_instance(instance):
+        """Clean the index of a model after the delete of one of its instances.
+
+        The cascade removed the slots, ownership pairs and hierarchy links of the instance. An org
+        unit can also be on the paths between other units, which are then rebuilt. Other
+        instances are only ever the top of a hierarchy.
+        """
+        if OConcept._base_manager.filter(id=instance.concept_id, name__icontains=ORG_UNIT_CONCEPT_PATTERN).exists():
+            OrgUnitIndex.refresh(instance.model_id, hierarchy_only=True)
+
+    def refresh(model_id, hierarchy_only=False):
+        """Rebuild the index of a model after a delete whose cascade removed slots or instances, when
+        the index has rows the cascade may have left stale.
+
+        Args:
+            hierarchy_only: Whether only the hierarchy paths can be stale, the cascade of an instance
+                removes its ownership pairs
+        """
+        stale = OOrgUnitClosure.objects.filter(model_id=model_id).exists()
+        if not stale and not hierarchy_only:
+            stale = OOrgUnitOwnership.objects.filter(model_id=model_id).exists()
+        if stale:
+            OrgUnitIndex.rebuild(model_id)
+
+    def rebuild(model_id):
+        """Recompute the org unit index of a model from its slots.
+
+        Returns:
+            tuple: Number of (closure rows, ownership rows)
+        """
+        kinds = OrgUnitIndex.predicate_kinds(model_id, OrgUnitIndex.ownership_relation(model_id))
+        children = {}
+        owned = set()
+        if kinds:
+            unit_concept_ids = OrgUnitIndex.unit_concept_ids(model_id)
+            query = OSlot._base_manager.filter(model_id=model_id, predicate_id__in=list(kinds), subject__isnull=False, object__isnull=False).values_list(
+                'predicate_id', 'subject_id', 'object_id', 'subject__concept_id', 'object__concept_id')
+            for predicate_id, subject_id, object_id, subject_concept_id, object_concept_id in query.iterator():
+                edges, pairs = OrgUnitIndex.links(kinds[predicate_id], subject_id, object_id, subject_concept_id, object_concept_id, unit_concept_ids)
+                for parent_id, child_id in edges:
+                    children.setdefault(parent_id, set()).add(child_id)
+                owned.update(pairs)
+
+        links = [OOrgUnitClosure(model_id=model_id, ancestor_id=x, descendant_id=y, depth=z) for x, y, z in ConceptClosure.paths(children)]
+        ownerships = [OOrgUnitOwnership(model_id=model_id, org_unit_id=x, instance_id=y) for x, y in owned]
+        with transaction.atomic():
+            OOrgUnitClosure.objects.filter(model_id=model_id).delete()
+            OOrgUnitOwnership.objects.filter(model_id=model_id).delete()
+            OOrgUnitClosure.objects.bulk_create(links, batch_size=CLOSURE_BATCH_SIZE)
+            OOrgUnitOwnership.objects.bulk_create(ownerships, batch_size=CLOSURE_BATCH_SIZE)
+        return len(links), len(ownerships)
+
+    def rebuild_organisation(organisation):
+        """Recompute the org unit index of every model of an organisation, and bump their revisions,
+        the org unit scope of their cached graphs changed."""
+        for model_id in OModel._base_manager.filter(organisation=organisation).values_list('id', flat=True):
+            with transaction.atomic():
+                OrgUnitIndex.rebuild(model_id)
+                ModelRevision.bump(model_id, [(OModel.get_object_type(), model_id, 'updated')])
@@ -0,0 +1,167 @@
+"""
+Path search between instances over the per-model graph index.
+
+Shortest paths are found with a bidirectional breadth-first search that keeps
+one parent pointer per reached node, so memory grows with the number of
+reached nodes instead of with the number of partial paths. The k shortest
+simple paths are enumerated Yen-style on top of it: each new path deviates
+from an already accepted one at a spur node, with the accepted prefixes'
+next edges removed from the graph for that spur search.
+"""
+import heapq
+
+from ontology.controllers.graph_index import GraphIndex
+
+RELATION_SCOPE_FIRST = 'first'
+RELATION_SCOPE_ALL = 'all'
+RELATION_SCOPES = (RELATION_SCOPE_FIRST, RELATION_SCOPE_ALL)
+
+DEFAULT_MAX_DEPTH = 5
+DEFAULT_MAX_PATHS = 5
+
+
+class PathFinder:
+
+    def __init__(self, model, relation_ids=None, relation_scope=RELATION_SCOPE_FIRST, max_depth=DEFAULT_MAX_DEPTH):
+        """
+        Args:
+            model: The OModel (or its id) whose graph is searched
+            relation_ids: Optional set of relation ids the filtered edges must use
+            relation_scope: RELATION_SCOPE_FIRST to filter only the edge leaving the start instance,
+                            RELATION_SCOPE_ALL to filter every hop of the path
+            max_depth: Maximum number of edges of a path
+        """
+        self.index = GraphIndex.for_model(model)
+        self.relation_codes = self.index.relation_codes(relation_ids) if relation_ids else None
+        self.relation_scope = relation_scope if relation_scope in RELATION_SCOPES else RELATION_SCOPE_FIRST
+        self.max_depth = max_depth
+
+    def shortest_path(self, start_instance_id, end_instance_id):
+        """Return the edges of one shortest path, or None when the instances are not connected."""
+        start = self.index.node(start_instance_id)
+        end = self.index.node(end_instance_id)
+        if start is None or end is None or start == end:
+            return None
+        path = self.search(start, end, start, self.max_depth)
+        return path[1] if path else None
+
+    def k_shortest_paths(self, start_instance_id, end_instance_id, k=DEFAULT_MAX_PATHS):
+        """Return up to k shortest simple paths as tuples of edges, shortest first."""
+        start = self.index.node(start_instance_id)
+        end = self.index.node(end_instance_id)
+        if start is None or end is None or start == end or k < 1:
+            return []
+
+        first = self.search(start, end, start, self.max_depth)
+        if first is None:
+            return []
+
+        accepted = [first]
+        seen = {first[1]}
+        candidates = []
+        while len(accepted) < k:
+            nodes, edges = accepted[-1]
+            for i in range(len(edges)):
+                root_nodes = nodes[:i + 1]
+                root_edges = edges[:i]
+                banned_edges = set(path_edges[i] for path_nodes, path_edges in accepted if len(path_edges) > i and path_nodes[:i + 1] == root_nodes)
+                spur = self.search(nodes[i], end, start, self.max_depth - i, banned_nodes=set(root_nodes[:-1]), banned_edges=banned_edges)
+                if spur is None:
+                    continue
+                candidate = (root_nodes[:-1] + spur[0], root_edges + spur[1])
+                if candidate[1] not in seen:
+                    seen.add(candidate[1])
+                    heapq.heappush(candidates, (len(candidate[1]), candidate[1], candidate[0]))
+            if not candidates:
+                break
+            length, path_edges, path_nodes = heapq.heappop(candidates)
+            accepted.append((path_nodes, path_edges))
+        return [edges for nodes, edges in accepted]
+
+    def slots(self, paths):
+        """Materialise paths of edges into lists of OSlot objects with one query."""
+        slots = self.index.slots(edge for path in paths for edge in path)
+        return [[slots[edge] for edge in path] for path in paths if all(edge in slots for edge in path)]
+
+    #======================================================================================
+    # Search
+
+    def allows(self, edge, node, neighbour, origin):
+        if self.relation_codes is None:
+            return True
+        # A simple path only touches its origin once, so an edge at the origin is the first edge
+        if self.relation_scope == RELATION_SCOPE_FIRST and origin not in (node, neighbour):
+            return True
+        return self.index.accepts(edge, relation_codes=self.relation_codes)
+
+    def expand(self, frontier, parents, other_parents, origin, banned_nodes, banned_edges):
+        """Expand one whole BFS level, returning the next frontier and the nodes met from the other side."""
+        next_frontier = []
+        meetings = []
+        for node in frontier:
+            for edge, neighbour in self.index.neighbours(node):
+                if neighbour in parents or neighbour in banned_nodes or edge in banned_edges:
+                    continue
+                if not self.allows(edge, node, neighbour, origin):
+                    continue
+                parents[neighbour] = (node, edge)
+                next_frontier.append(neighbour)
+                if neighbour in other_parents:
+                    meetings.append(neighbour)
+        return next_frontier, meetings
+
+    def search(self, source, target, origin, max_depth, banned_nodes=frozenset(), banned_edges=frozenset()):
+        """Bidirectional BFS from source to target.
+
+        Args:
+            source: Node the search starts from
+            target: Node the search ends at
+            origin: Start node of the whole path, used by the first-edge relation filter
+            max_depth: Maximum number of edges of the returned path
+            banned_nodes: Nodes the path must not go through
+            banned_edges: Edges the path must not use
+
+        Returns:
+            tuple: (nodes, edges) tuples of the path, or None
+        """
+        if max_depth < 1 or source in banned_nodes or target in banned_nodes:
+            return None
+
+        forward = {source: None}
+        backward = {target: None}
+        forward_frontier = [source]
+        backward_frontier = [target]
+        forward_depth = backward_depth = 0
+        meetings = [source] if source == target else []
+
+        while not meetings and forward_frontier and backward_frontier and forward_depth + backward_depth < max_depth:
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meetings = self.expand(forward_frontier, forward, backward, origin, banned_nodes, banned_edges)
+                forward_depth += 1
+            else:
+                backward_frontier, meetings = self.expand(backward_frontier, backward, forward, origin, banned_nodes, banned_edges)
+                backward_depth += 1
+
+        if not meetings:
+            return None
+
+        # The meeting nodes of a level can sit at different depths of the other side, keep the shortest
+        best = None
+        for meeting in meetings:
+            forward_nodes, forward_edges = PathFinder.rebuild(forward, meeting)
+            backward_nodes, backward_edges = PathFinder.rebuild(backward, meeting)
+            if best is None or len(forward_edges) + len(backward_edges) < len(best[1]):
+                best = (tuple(forward_nodes[::-1]) + tuple(backward_nodes[1:]), tuple(forward_edges[::-1]) + tuple(backward_edges))
+        return best
+
+    @staticmethod
+    def rebuild(parents, node):
+        """Follow parent pointers from a node back to the root of its search tree."""
+        nodes = [node]
+        edges = []
+        step = parents[node]
+        while step is not None:
+            nodes.append(step[0])
+            edges.append(step[1])
+            step = parents[step[0]]
+        return nodes, edges
@@ -0,0 +1,177 @@
+"""
+Model revisions and change feed.
+
+OModel.revision is incremented in the database on every write to the model or
+to one of its concepts, relations, predicates, instances, slots or reports,
+Organisation.revision on every write to one of its models. Every increment
+appends OChange rows (entity type, id, action) carrying both new revisions:
+the entity_written signal does it in the transaction of a single save or
+delete, BulkImporter and ModelCopier once per import or copy. Rows removed by
+a cascade are not listed, the change of the deleted parent implies them.
+Bulk writes that do not list their rows (model copies, generated models)
+record a single change of the model itself.
+
+Anything derived from a model (rendered graphs, exports, indexes) can be
+cached under the revision it was computed at and is never served once the
+model changed. Consumers that keep a copy poll the feed with the last revision
+they saw, ``ModelRevision.changes(model_id, since=n)``, or the last revision
+of the organisation.
+
+The increment holds the row lock of the model and of its organisation until
+the writing transaction commits, so revisions become visible in order: a
+reader that saw revision n never misses a change committed later with a
+smaller revision, which an auto-increment id would not guarantee. Both
+revisions grow by one per increment and every increment writes at least one
+change, a gap in the feed means that rows were pruned.
+"""
+from sqlite3 import sqlite_version_info
+
+from django.db import connection
+from django.db.models import F, Max, Q
+
+from ontology.models import OChange, OModel
+from organisation.models import Organisation
+
+CHANGE_FIELDS = ('id', 'revision', 'organisation_revision', 'model_id', 'object_type', 'target', 'action', 'created_at')
+
+CHANGE_BATCH_SIZE = 1000
+
+
+class ModelRevision:
+
+    def get(model_id):
+        """Current revision of a model, None when it does not exist."""
+        return OModel._base_manager.filter(id=model_id).values_list('revision', flat=True).first()
+
+    def get_organisation(organisation_id):
+        """Current revision of an organisation, None when it does not exist."""
+        return Organisation._base_manager.filter(id=organisation_id).values_list('revision', flat=True).first()
+
+    def bump(model_id, changes, organisation_id=None):
+        """Increment the revision of a model and of its organisation, and append the changes to the feed.
+
+        Args:
+            model_id: Id of the written model
+            changes: Non empty list of (object type, target id, action) tuples
+            organisation_id: Organisation of a deleted model, read from the model row otherwise
+
+        Returns:
+            int: The new revision of the model
+        """
+        row = ModelRevision.increment(OModel, model_id, 'organisation_id')
+        if row is not None:
+            revision, organisation_id = row
+        else:
+            # The model was just deleted, its feed goes on from the last change
+            revision = (OChange.objects.filter(model_id=model_id).aggregate(revision=Max('revision'))['revision'] or 0) + 1
+
+        organisation_revision = None
+        if organisation_id is not None:
+            organisation_revision = ModelRevision.increment(Organisation, organisation_id)
+            organisation_revision = organisation_revision[0] if organisation_revision is not None else None
+            if organisation_revision is None:
+                organisation_id = None
+
+        OChange.objects.bulk_create([
+            OChange(organisation_id=organisation_id, organisation_revision=organisation_revision, model_id=model_id, revision=revision,
+                    object_type=object_type, target=target, action=action)
+            for object_type, target, action in changes], batch_size=CHANGE_BATCH_SIZE)
+        return revision
+
+    def increment(model_class, pk, *fields):
+        """Increment the revision column of a row.
+
+        Returns:
+            tuple: The new revision followed by the values of `fields`, None when the row does not exist
+        """
+        if ModelRevision.update_returning():
+            # One statement instead of an UPDATE and a SELECT
+            quote = connection.ops.quote_name
+            columns = ', '.join(quote(model_class._meta.get_field(x).column) for x in ('revision',) + fields)
+            sql = 'UPDATE {table} SET {revision} = {revision} + 1 WHERE {pk} = %s RETURNING {columns}'.format(
+                table=quote(model_class._meta.db_table), revision=quote('revision'), pk=quote(model_class._meta.pk.column), columns=columns)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [model_class._meta.pk.get_db_prep_value(pk, connection)])
+                return cursor.fetchone()
+
+        query = model_class._base_manager.filter(pk=pk)
+        if not query.update(revision=F('revision') + 1):
+            return None
+        return query.values_list('revision', *fields).first()
+
+    def update_returning():
+        if connection.vendor == 'postgresql':
+            return True
+        return connection.vendor == 'sqlite' and sqlite_version_info >= (3, 35)
+
+    #======================================================================================
+    # Feed
+
+    def changes(model_id=None, organisation_id=None, since=0, after=None, limit=None):
+        """Changes of a model, or of every model of an organisation, written after a revision, oldest first.
+
+        The changes of one bulk write share a revision, a page may stop in the middle of it: the next page is
+        read with the revision and the id of the last change read, `since` and `after`.
+
+        Args:
+            model_id: Model whose changes are read, by model revision
+            organisation_id: Organisation whose changes are read, by organisation revision when no model is given
+            since: Last revision read
+            after: Id of the last change read within revision `since`, its remaining changes are returned first
+            limit: Maximum number of changes
+
+        Returns:
+            list: Change dicts with the CHANGE_FIELDS keys
+        """
+        query = OChange.objects.all()
+        if model_id is not None:
+            revision_field = 'revision'
+            query = query.filter(model_id=model_id)
+        else:
+            revision_field = 'organisation_revision'
+        if organisation_id is not None or model_id is None:
+            query = query.filter(organisation_id=organisation_id)
+
+        condition = Q(**{revision_field + '__gt': since})
+        if after is not None:
+            condition |= Q(**{revision_field: since, 'id__gt': after})
+        query = query.filter(condition).order_by(revision_field, 'id').values(*CHANGE_FIELDS)
+        return list(query[:limit] if limit else query)
+
+    def feed(model_id=None, organisation_id=None, since=0, after=None, limit=None):
+        """A page of changes with the current revision and the position to read the next page from.
+
+        Returns:
+            dict: 'revision', the current revision; 'changes'; 'since' and 'after', the arguments of the next
+                call; 'more', whether more changes were written; 'reset', whether changes after `since` were
+                pruned, the client then reloads everything and reads on from 'revision'
+        """
+        if model_id is not None:
+            revision_field = 'revision'
+            revision = ModelRevision.get(model_id)
+            if revision is None:
+                # Deleted model, its feed ends with the deletion
+                revision = OChange.objects.filter(model_id=model_id).aggregate(revision=Max('revision'))['revision'] or 0
+        else:
+            revision_field = 'organisation_revision'
+            revision = ModelRevision.get_organisation(organisation_id) or 0
+
+        changes = ModelRevision.changes(model_id=model_id, organisation_id=organisation_id, since=since, after=after, limit=limit + 1 if limit else None)
+        more = bool(limit) and len(changes) > limit
+        changes = changes[:limit] if limit else changes
+        # A client ahead of the database or behind the pruned changes cannot catch up incrementally
+        reset = since > revision or (after is None and since < revision and (not changes or changes[0][revision_field] > since + 1))
+
+        if changes:
+            since, after = changes[-1][revision_field], changes[-1]['id']
+            if not more:
+                after = None
+        return {'revision': revision, 'changes': changes, 'since': since, 'after': after, 'more': more, 'reset': reset}
+
+    def prune(before):
+        """Delete the changes created before a datetime.
+
+        Returns:
+            int: Number of deleted changes
+        """
+        return OChange.objects.filter(created_at__lt=before).delete()[0]
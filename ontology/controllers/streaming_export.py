@@ -0,0 +1,105 @@
+"""
+Streaming JSON export of a model's instances.
+
+``ModelUtils.instances_to_dict`` builds the whole document in memory. The
+exporter below walks the instances in keyset-paginated pages (``name``,
+``id``), serializes a page with the BatchSerializer, reusing the predicate
+rows loaded once per export, and writes every instance to the file as soon
+as it is complete. Memory is bounded by the page size and
+the query count by the number of pages. The output is the same document
+``json.dump(ModelUtils.instances_to_dict(...))`` produces.
+"""
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+from ontology.controllers.batch_serializer import (INSTANCE_FIELDS,
+                                                   PREDICATE_FIELDS,
+                                                   BatchSerializer)
+from ontology.controllers.o_model import ModelUtils
+from ontology.models import OInstance, OPredicate
+
+
+class StreamingExporter:
+
+    def __init__(self, model, filters=None, chunk_size=None):
+        """
+        Args:
+            model: The OModel to export
+            filters: Optional task config with 'predicate_ids' and 'instance_ids' filters
+            chunk_size: Number of instances per page, defaults to settings.EXPORT_CHUNK_SIZE
+        """
+        self.model = model
+        self.chunk_size = max(chunk_size or settings.EXPORT_CHUNK_SIZE, 1)
+        self.predicate_ids = ModelUtils.get_filter(filters, 'predicate_ids')
+        self.instance_ids = ModelUtils.get_filter(filters, 'instance_ids')
+        self.predicates = {}
+
+    def write_instances(self, f):
+        """Write the instances document of the model to an open text file."""
+        self.load_predicates()
+
+        f.write('{')
+        for key, value in (('id', self.model.id), ('type', 'model'), ('name', self.model.name), ('version', self.model.version),
+                           ('description', self.model.description), ('concepts', {}), ('relations', {})):
+            f.write(StreamingExporter.dumps(key) + ': ' + StreamingExporter.dumps(value) + ', ')
+
+        f.write('"predicates": {')
+        separator = ''
+        for predicate_id, predicate in self.exported_predicates():
+            f.write(separator + StreamingExporter.dumps(str(predicate_id)) + ': ' + StreamingExporter.dumps(BatchSerializer.predicate_to_dict(predicate)))
+            separator = ', '
+        f.write('}, ')
+
+        f.write('"instances": {')
+        separator = ''
+        for page in self.instance_pages():
+            for instance in BatchSerializer.instances_by_id(page, predicates=self.predicates).values():
+                f.write(separator + StreamingExporter.dumps(str(instance['id'])) + ': ' + StreamingExporter.dumps(instance))
+                separator = ', '
+        f.write('}, ')
+
+        f.write('"url": ' + StreamingExporter.dumps(ModelUtils.get_url('model', self.model.id)) + '}')
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, default=str, ensure_ascii=False)
+
+    #======================================================================================
+    # Lookups
+
+    def load_predicates(self):
+        """Rows of every predicate of the model, so slots never load them again."""
+        query = OPredicate.objects.filter(model=self.model)
+        self.predicates = {row['id']: row for row in BatchSerializer.with_names(query.values(*PREDICATE_FIELDS).iterator())}
+
+    def exported_predicates(self):
+        query = OPredicate.objects.filter(model=self.model)
+        if self.predicate_ids:
+            query = query.filter(id__in=self.predicate_ids)
+        for predicate_id in query.order_by('object__name').values_list('id', flat=True).iterator():
+            yield predicate_id, self.predicates[predicate_id]
+
+    #======================================================================================
+    # Instances
+
+    def instance_pages(self):
+        """Yield lists of instance rows, keyset-paginated on (name, id)."""
+        query = OInstance.objects.filter(model=self.model)
+        if self.instance_ids:
+            query = query.filter(id__in=self.instance_ids)
+        query = query.order_by('name', 'id').values(*INSTANCE_FIELDS)
+
+        last = None
+        while True:
+            page_query = query
+            if last is not None:
+                page_query = page_query.filter(Q(name__gt=last['name']) | Q(name=last['name'], id__gt=last['id']))
+            page = list(page_query[:self.chunk_size])
+            if not page:
+                return
+            yield page
+            if len(page) < self.chunk_size:
+                return
+            last = page[-1]
@@ -0,0 +1,173 @@
+"""
+Generated models for benchmarks.
+
+The generator writes through BulkImporter and chunked bulk_create, so models
+with millions of slots can be built in minutes. Nothing is logged: the
+benchmarks run inside a transaction and roll the model back, the audit
+entries the importer collects are dropped. The change feed gets a single
+change of the generated model.
+
+``generate`` builds the fixed two-concept shape the import and index
+benchmarks use. ``generate_graph`` builds a random ontology and draws the
+slot ends with power-law weights, so a few hub instances hold most of the
+slots as in real landscapes. Both are reproducible: the same arguments and
+seed give the same model, up to the ids.
+"""
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+from ontology.controllers.bulk_import import BulkImporter
+from ontology.controllers.revision import ModelRevision
+from ontology.models import (OConcept, OInstance, OModel, OPredicate,
+                             ORelation, OSlot, Repository)
+
+
+class SyntheticModelGenerator:
+
+    def __init__(self, organisation, name='synthetic', chunk_size=None):
+        """
+        Args:
+            organisation: Organisation the generated repository and models belong to
+            name: Prefix of the generated repository and model names
+            chunk_size: Number of rows per bulk query, defaults to settings.IMPORT_CHUNK_SIZE
+        """
+        self.organisation = organisation
+        self.name = name
+        self.chunk_size = chunk_size
+        self.repository = None
+
+    def create_model(self, suffix):
+        if self.repository is None:
+            self.repository = Repository.objects.create(name=self.name, organisation=self.organisation)
+        return OModel.objects.create(name='{}_{}'.format(self.name, suffix), version='1', repository=self.repository, organisation=self.organisation)
+
+    def generate(self, size, fan_out=4, suffix='source'):
+        """Create a model with `size` slots, each application subject using `fan_out` shared components.
+
+        Returns:
+            OModel: The generated model
+        """
+        model = self.create_model(suffix)
+        importer = BulkImporter(model, chunk_size=self.chunk_size)
+
+        concept_ids = importer.merge(OConcept, [{'id': None, 'key': (x,), 'values': {'name': x}} for x in ('Application', 'Component')], key_fields=('name',))
+        relation_ids = importer.merge(ORelation, [{'id': None, 'key': ('uses',), 'values': {'name': 'uses'}}], key_fields=('name',))
+        subject_concept_id = concept_ids[('Application',)]
+        object_concept_id = concept_ids[('Component',)]
+        relation_id = relation_ids[('uses',)]
+        key = (relation_id, subject_concept_id, object_concept_id)
+        predicate_id = importer.merge(OPredicate, [{'id': None, 'key': key, 'values': {'subject_id': subject_concept_id, 'relation_id': relation_id, 'object_id': object_concept_id}}],
+                                      key_fields=('relation_id', 'subject_id', 'object_id'))[key]
+
+        # Objects are shared between subjects, so the instance count stays well below the slot count
+        object_count = max(size // (fan_out * 4), 1)
+        object_ids = list(importer.merge(OInstance, [
+            {'id': None, 'key': ('component_{}'.format(i), str(i), object_concept_id), 'values': {'name': 'component_{}'.format(i), 'code': str(i), 'concept_id': object_concept_id}}
+            for i in range(object_count)], key_fields=('name', 'code', 'concept_id')).values())
+
+        chunk_size = importer.chunk_size
+        subject_count = (size + fan_out - 1) // fan_out
+        slot_count = 0
+        for start in range(0, subject_count, chunk_size):
+            subjects = [('application_{}'.format(i), str(i), subject_concept_id) for i in range(start, min(start + chunk_size, subject_count))]
+            subject_ids = importer.merge(OInstance, [
+                {'id': None, 'key': x, 'values': {'name': x[0], 'code': x[1], 'concept_id': subject_concept_id}} for x in subjects], key_fields=('name', 'code', 'concept_id'))
+            slots = []
+            for index, subject in enumerate(subjects, start):
+                for i in range(min(fan_out, size - slot_count)):
+                    object_id = object_ids[(index * fan_out + i) % object_count]
+                    slots.append(OSlot(model=model, organisation=self.organisation, predicate_id=predicate_id, subject_id=subject_ids[subject], object_id=object_id, order=str(i)))
+                    slot_count += 1
+            OSlot.objects.bulk_create(slots, batch_size=chunk_size)
+            importer.log_entries = []
+            importer.changes = []
+        ModelRevision.bump(model.id, [(OModel.get_object_type(), model.id, 'updated')])
+        return model
+
+    def generate_graph(self, size, concepts=10, relations=5, predicates=20, instances=None, exponent=1.0, seed=0, suffix='graph'):
+        """Create a model with a random ontology and up to `size` distinct slots between its instances.
+
+        Instance i belongs to concept i modulo `concepts`. The subject and object of a slot are drawn from the
+        instances of its predicate's concepts with weight 1 / rank ** exponent, the first instances of every
+        concept become the hubs.
+
+        Args:
+            size: Number of slots
+            concepts: Number of concepts
+            relations: Number of relations
+            predicates: Number of predicates, at most concepts * concepts * relations
+            instances: Number of instances, defaults to a quarter of the slots
+            exponent: Exponent of the degree distribution, 0 for a uniform one
+            seed: Seed of the random generator
+
+        Returns:
+            OModel: The generated model
+        """
+        rng = random.Random(seed)
+        concepts = max(concepts, 1)
+        relations = max(relations, 1)
+        predicates = min(max(predicates, 1), concepts * concepts * relations)
+        instance_count = max(instances or size // 4, concepts)
+
+        model = self.create_model(suffix)
+        importer = BulkImporter(model, chunk_size=self.chunk_size)
+        chunk_size = importer.chunk_size
+
+        names = ['concept_{}'.format(i) for i in range(concepts)]
+        ids = importer.merge(OConcept, [{'id': None, 'key': (x,), 'values': {'name': x}} for x in names], key_fields=('name',))
+        concept_ids = [ids[(x,)] for x in names]
+        names = ['relation_{}'.format(i) for i in range(relations)]
+        ids = importer.merge(ORelation, [{'id': None, 'key': (x,), 'values': {'name': x}} for x in names], key_fields=('name',))
+        relation_ids = [ids[(x,)] for x in names]
+
+        # (relation, subject concept, object concept) indexes
+        triples = set()
+        while len(triples) < predicates:
+            triples.add((rng.randrange(relations), rng.randrange(concepts), rng.randrange(concepts)))
+        triples = sorted(triples)
+        keys = [(relation_ids[r], concept_ids[s], concept_ids[o]) for r, s, o in triples]
+        ids = importer.merge(OPredicate, [{'id': None, 'key': x, 'values': {'relation_id': x[0], 'subject_id': x[1], 'object_id': x[2]}} for x in keys],
+                             key_fields=('relation_id', 'subject_id', 'object_id'))
+        predicate_ids = [ids[x] for x in keys]
+
+        instance_ids = []
+        for start in range(0, instance_count, chunk_size):
+            keys = [('instance_{}'.format(i), str(i), concept_ids[i % concepts]) for i in range(start, min(start + chunk_size, instance_count))]
+            ids = importer.merge(OInstance, [{'id': None, 'key': x, 'values': {'name': x[0], 'code': x[1], 'concept_id': x[2]}} for x in keys],
+                                 key_fields=('name', 'code', 'concept_id'))
+            instance_ids.extend(ids[x] for x in keys)
+            importer.log_entries = []
+            importer.changes = []
+
+        # Instance indexes of every concept by rank, with the cumulative weights of the ranks
+        members = [range(i, instance_count, concepts) for i in range(concepts)]
+        weights = [list(accumulate(1 / (rank + 1) ** exponent for rank in range(len(x)))) for x in members]
+
+        def draw(concept):
+            cumulative = weights[concept]
+            return members[concept][min(bisect_right(cumulative, rng.random() * cumulative[-1]), len(cumulative) - 1)]
+
+        # Slots are kept distinct, encoded as one integer per (predicate, subject, object)
+        seen = set()
+        slots = []
+        for i in range(size):
+            for attempt in range(100):
+                predicate = rng.randrange(predicates)
+                subject_concept, object_concept = triples[predicate][1:]
+                subject = draw(subject_concept)
+                target = draw(object_concept)
+                key = (predicate * instance_count + subject) * instance_count + target
+                if subject != target and key not in seen:
+                    break
+            else:
+                continue
+            seen.add(key)
+            slots.append(OSlot(model=model, organisation=self.organisation, predicate_id=predicate_ids[predicate],
+                               subject_id=instance_ids[subject], object_id=instance_ids[target], order='0'))
+            if len(slots) >= chunk_size:
+                OSlot.objects.bulk_create(slots, batch_size=chunk_size)
+                slots = []
+        OSlot.objects.bulk_create(slots, batch_size=chunk_size)
+        ModelRevision.bump(model.id, [(OModel.get_object_type(), model.id, 'updated')])
+        return model
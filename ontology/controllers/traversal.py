@@ -0,0 +1,125 @@
+"""
+Slot graph traversal inside the database.
+
+The impact analysis walks the shared in-memory graph index, which needs the
+model in the web process. On deployments with models too large for that,
+GRAPH_TRAVERSAL_BACKEND = cte runs the same traversal as a WITH RECURSIVE
+query over the slot table, with a depth limit and the relation or predicate
+filters applied in the query. The org unit scoping of the graph presets reads
+the materialized index of ontology.controllers.org_units instead.
+
+UNION, not UNION ALL, is the cycle guard: a row the recursion already produced
+is not expanded again, so a cycle of slots ends the recursion, at the latest
+at the depth limit. The walk rows of the impact analysis carry their depth,
+an instance may be expanded once per depth it is reached at, a walk costs at
+most the slots in reach times the depth.
+
+The recursive queries are only used on the databases of CTE_VENDORS, the
+Python implementations are used elsewhere, SQLite included.
+"""
+from django.conf import settings
+from django.db import connection
+
+from ontology.models import OPredicate, OSlot
+
+BACKEND_PYTHON = 'python'
+BACKEND_CTE = 'cte'
+
+# Databases the recursive queries run on
+CTE_VENDORS = ('postgresql',)
+
+
+class SlotTraversal:
+
+    def enabled():
+        """Whether the deployment traverses the slots in the database."""
+        return settings.GRAPH_TRAVERSAL_BACKEND == BACKEND_CTE and connection.vendor in CTE_VENDORS
+
+    #======================================================================================
+    # SQL
+
+    def tables():
+        """Quoted table and column names of the queries."""
+        quote = connection.ops.quote_name
+        names = {}
+        for prefix, model_class, fields in [('slot', OSlot, ('id', 'subject', 'object', 'predicate', 'model')),
+                                            ('predicate', OPredicate, ('id', 'relation'))]:
+            names[prefix] = quote(model_class._meta.db_table)
+            for field in fields:
+                names['{}_{}'.format(prefix, field)] = quote(model_class._meta.get_field(field).column)
+        return names
+
+    def uuids(values):
+        field = OSlot._meta.pk
+        return [field.get_db_prep_value(x, connection) for x in values]
+
+    def in_list(column, values):
+        """IN condition and its parameters, a condition matching nothing without values."""
+        values = list(values)
+        if not values:
+            return '1 = 0', []
+        return '{} IN ({})'.format(column, ', '.join(['%s'] * len(values))), SlotTraversal.uuids(values)
+
+    def fetch(sql, params):
+        to_python = OSlot._meta.pk.to_python
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [tuple(None if x is None else to_python(x) for x in row) for row in cursor.fetchall()]
+
+    #======================================================================================
+    # Walk
+
+    def walk(model_id, root_ids, max_depth, predicate_ids=None, relation_ids=None):
+        """Slots in reach of instances, both ways, up to a depth.
+
+        Args:
+            model_id: Model of the slots
+            root_ids: Instance ids the walk starts from
+            max_depth: Number of slots from the roots to the farthest reached instance
+            predicate_ids: Optional predicate ids the slots must use
+            relation_ids: Optional relation ids the predicates of the slots must use
+
+        Returns:
+            list: (instance id, slot id, neighbour id) of every slot from an instance reached in
+            less than max_depth slots, an instance and its neighbours are linked by the slot
+        """
+        if max_depth < 1 or not root_ids:
+            return []
+        names = SlotTraversal.tables()
+        join = ''
+        filters = ['s.{slot_model} = %s'.format(**names), 's.{slot_subject} IS NOT NULL'.format(**names), 's.{slot_object} IS NOT NULL'.format(**names)]
+        params = SlotTraversal.uuids([model_id])
+        if predicate_ids is not None:
+            condition, values = SlotTraversal.in_list('s.{slot_predicate}'.format(**names), predicate_ids)
+            filters.append(condition)
+            params += values
+        if relation_ids is not None:
+            join = 'JOIN {predicate} p ON p.{predicate_id} = s.{slot_predicate}'.format(**names)
+            condition, values = SlotTraversal.in_list('p.{predicate_relation}'.format(**names), relation_ids)
+            filters.append(condition)
+            params += values
+        filters = ' AND '.join(filters)
+        subject_roots, subject_params = SlotTraversal.in_list('s.{slot_subject}'.format(**names), root_ids)
+        object_roots, object_params = SlotTraversal.in_list('s.{slot_object}'.format(**names), root_ids)
+
+        sql = '''
+            WITH RECURSIVE walk(source_id, slot_id, target_id, depth) AS (
+                SELECT s.{slot_subject}, s.{slot_id}, s.{slot_object}, 1
+                FROM {slot} s {join}
+                WHERE {subject_roots} AND {filters}
+                UNION
+                SELECT s.{slot_object}, s.{slot_id}, s.{slot_subject}, 1
+                FROM {slot} s {join}
+                WHERE {object_roots} AND {filters}
+                UNION
+                SELECT w.target_id, s.{slot_id},
+                       CASE WHEN s.{slot_subject} = w.target_id THEN s.{slot_object} ELSE s.{slot_subject} END,
+                       w.depth + 1
+                FROM walk w
+                JOIN {slot} s ON (s.{slot_subject} = w.target_id OR s.{slot_object} = w.target_id) AND s.{slot_id} <> w.slot_id
+                {join}
+                WHERE w.depth < %s AND {filters}
+            )
+            SELECT DISTINCT source_id, slot_id, target_id FROM walk
+        '''.format(join=join, filters=filters, subject_roots=subject_roots, object_roots=object_roots, **names)
+        return SlotTraversal.fetch(sql, subject_params + params + object_params + params + [max_depth] + params)
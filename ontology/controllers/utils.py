@@ -1,9 +1,15 @@
-from queue import PriorityQueue
+from queue import Queue
 from uuid import UUID
 
 from django.db.models import Q
 
-from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+from ontology.controllers.concept_closure import ConceptClosure
+from ontology.controllers.graph_index import GraphIndex
+from ontology.controllers.impact_analysis import ImpactAnalysis
+from ontology.controllers.pathfinder import (DEFAULT_MAX_PATHS,
+                                             RELATION_SCOPE_ALL,
+                                             RELATION_SCOPE_FIRST, PathFinder)
+from ontology.models import OConcept, OInstance, OPredicate, OSlot
 
 DEFAULT_MAX_LEVEL = 5
 
@@ -11,30 +17,20 @@ DEFAULT_MAX_LEVEL = 5
 class KnowledgeBaseUtils:
 
     def get_parent_concepts(concept, max_level=DEFAULT_MAX_LEVEL):
-        return KnowledgeBaseUtils.get_recursive_parent_concepts(concept, results=[], level=0, max_level=max_level)
+        """Ancestors of a concept, from the inheritance closure, as (concept, level) tuples, level 0 for the parents."""
+        return [(x, depth - 1) for x, depth in ConceptClosure.ancestors(concept, max_depth=max_level + 1)]
 
     def get_recursive_parent_concepts(concept, results, level, max_level=DEFAULT_MAX_LEVEL):
-        if level > max_level:
-            return results
-        parents = [x.subject for x in OPredicate.objects.filter(object=concept, relation__type=ORelation.INHERITANCE_SUPER_IS_SUBJECT)] + [
-            x.object for x in OPredicate.objects.filter(subject=concept, relation__type=ORelation.INHERITANCE_SUPER_IS_OBJECT)]
-        for x in parents:
-            results = results + KnowledgeBaseUtils.get_recursive_parent_concepts(
-                concept=x, results=results, level=level+1, max_level=DEFAULT_MAX_LEVEL)
-        return [(x, level) for x in parents] + results
+        """Deprecated: Use get_parent_concepts, served by the inheritance closure."""
+        return results + [(x, depth + level) for x, depth in KnowledgeBaseUtils.get_parent_concepts(concept, max_level=max_level - level)]
 
     def get_child_concepts(concept, max_level=DEFAULT_MAX_LEVEL):
-        return KnowledgeBaseUtils.get_recursive_child_concepts(concept, results=[], level=0, max_level=max_level)
+        """Descendants of a concept, from the inheritance closure, as (concept, level) tuples, level 0 for the children."""
+        return [(x, depth - 1) for x, depth in ConceptClosure.descendants(concept, max_depth=max_level + 1)]
 
     def get_recursive_child_concepts(concept, results, level, max_level=DEFAULT_MAX_LEVEL):
-        if level > max_level:
-            return results
-        children = [x.subject for x in OPredicate.objects.filter(object=concept, relation__type=ORelation.INHERITANCE_SUPER_IS_OBJECT)] + [
-            x.object for x in OPredicate.objects.filter(subject=concept, relation__type=ORelation.INHERITANCE_SUPER_IS_SUBJECT)]
-        for x in children:
-            results = results + KnowledgeBaseUtils.get_recursive_child_concepts(
-                concept=x, results=results, level=level+1, max_level=DEFAULT_MAX_LEVEL)
-        return [(x, level) for x in children] + results
+        """Deprecated: Use get_child_concepts, served by the inheritance closure."""
+        return results + [(x, depth + level) for x, depth in KnowledgeBaseUtils.get_child_concepts(concept, max_level=max_level - level)]
 
     def get_related_object_concepts(concept, predicate_ids, level=0, max_level=DEFAULT_MAX_LEVEL):
         predicates = OPredicate.objects.filter(subject=concept)
@@ -63,137 +59,94 @@ class KnowledgeBaseUtils:
         return [(x.subject, level) for x in predicates] + results
 
 
-    def get_instances_paths(start_instance, end_instance, relation_ids=None):
-        """Find paths between two instances using BFS for efficiency.
+    def get_instances_paths(start_instance, end_instance, relation_ids=None, max_level=DEFAULT_MAX_LEVEL, max_paths=DEFAULT_MAX_PATHS, relation_scope=RELATION_SCOPE_FIRST):
+        """Find the shortest simple paths between two instances.
 
         Args:
             start_instance: The starting OInstance
             end_instance: The target OInstance
-            relation_ids: Optional set of relation IDs to filter the FIRST edge only.
-                          If provided, only first edges from start_instance using these
-                          relations are traversed. Subsequent edges can use any relation.
+            relation_ids: Optional set of relation IDs to filter edges by.
+            max_level: Maximum path depth (default 5)
+            max_paths: Maximum number of paths to return (default 5)
+            relation_scope: RELATION_SCOPE_FIRST (default) filters the FIRST edge only, subsequent
+                            edges can use any relation. RELATION_SCOPE_ALL filters every edge.
 
         Returns:
-            PriorityQueue containing (path_length, path) tuples
+            Queue containing (path_length, path) tuples, shortest first
         """
-        q = PriorityQueue(maxsize=5)
-
-        # Load all slots into memory for the same model (much faster than per-query)
-        all_slots = list(OSlot.objects.filter(model=start_instance.model).select_related('subject', 'object', 'predicate__relation'))
-
-        # Build FULL adjacency list (no filtering here - filter applied during BFS)
-        adjacency = {}
-        for slot in all_slots:
-            if slot.subject_id:
-                if slot.subject_id not in adjacency:
-                    adjacency[slot.subject_id] = []
-                adjacency[slot.subject_id].append((slot, slot.object_id))
-            if slot.object_id:
-                if slot.object_id not in adjacency:
-                    adjacency[slot.object_id] = []
-                adjacency[slot.object_id].append((slot, slot.subject_id))
-
-        # BFS to find paths
-        from collections import deque
-        queue = deque()
-        queue.append((start_instance.id, [], set()))
-
-        while queue:
-            current_id, path, visited = queue.popleft()
-
-            if current_id == end_instance.id and path:
-                q.put((len(path), path))
-                if q.full():
-                    break
-                continue
-
-            if len(path) >= DEFAULT_MAX_LEVEL:
-                continue
-
-            for slot, next_id in adjacency.get(current_id, []):
-                if slot.id not in visited and next_id:
-                    # Only apply relation filter on FIRST edge (from start instance)
-                    if len(path) == 0 and relation_ids:
-                        if slot.predicate.relation_id not in relation_ids:
-                            continue
-
-                    new_visited = visited.copy()
-                    new_visited.add(slot.id)
-                    new_path = path + [slot]
-                    queue.append((next_id, new_path, new_visited))
-
+        q = Queue(maxsize=max(max_paths, 1))
+        path_finder = PathFinder(model=start_instance.model_id, relation_ids=relation_ids, relation_scope=relation_scope, max_depth=max_level)
+        paths = path_finder.k_shortest_paths(start_instance.id, end_instance.id, k=max_paths)
+        for path in path_finder.slots(paths):
+            q.put((len(path), path))
         return q
 
-    def get_instances_paths_to_multiple(start_instance, end_instances, max_level=DEFAULT_MAX_LEVEL, relation_ids=None):
+    def get_instances_paths_to_multiple(start_instance, end_instances, max_level=DEFAULT_MAX_LEVEL, relation_ids=None, relation_scope=RELATION_SCOPE_FIRST):
         """Find shortest paths to multiple target instances in a single BFS traversal.
 
         Args:
             start_instance: The starting OInstance
             end_instances: List of target OInstance objects
             max_level: Maximum path depth (default 5)
-            relation_ids: Optional set of relation IDs to filter the FIRST edge only.
-                          If provided, only first edges from start_instance using these
-                          relations are traversed. Subsequent edges can use any relation.
+            relation_ids: Optional set of relation IDs to filter edges by.
+            relation_scope: RELATION_SCOPE_FIRST (default) filters the FIRST edge only, subsequent
+                            edges can use any relation. RELATION_SCOPE_ALL filters every edge.
 
         Returns:
             dict: Mapping of target instance ID -> list of OSlot objects representing the path
         """
         from collections import deque
 
-        target_ids = set(inst.id for inst in end_instances)
         found_paths = {}
-
-        if not target_ids:
+        if not end_instances:
             return found_paths
 
-        # Load all slots into memory (same optimization as existing get_instances_paths)
-        all_slots = list(OSlot.objects.filter(model=start_instance.model).select_related('subject', 'object', 'predicate'))
-
-        # Build FULL adjacency list (no filtering here - filter applied during BFS)
-        adjacency = {}
-        for slot in all_slots:
-            if slot.subject_id:
-                if slot.subject_id not in adjacency:
-                    adjacency[slot.subject_id] = []
-                adjacency[slot.subject_id].append((slot, slot.object_id))
-            if slot.object_id:
-                if slot.object_id not in adjacency:
-                    adjacency[slot.object_id] = []
-                adjacency[slot.object_id].append((slot, slot.subject_id))
+        index = GraphIndex.for_model(start_instance.model_id)
+        start = index.node(start_instance.id)
+        if start is None:
+            return found_paths
+        target_nodes = set(index.nodes([inst.id for inst in end_instances]))
+        relation_filter = index.relation_codes(relation_ids) if relation_ids else None
 
-        # BFS to find shortest paths to all targets
-        queue = deque([(start_instance.id, [], set())])
-        visited_nodes = {start_instance.id}
+        # BFS over nodes, each node is reached once through its parent edge
+        parents = {start: None}
+        depths = {start: 0}
+        found_nodes = []
+        queue = deque([start])
 
-        while queue and len(found_paths) < len(target_ids):
-            current_id, path, visited_slots = queue.popleft()
+        while queue and len(found_nodes) < len(target_nodes):
+            current = queue.popleft()
 
             # Check if we've reached a target (and have a path to it)
-            if current_id in target_ids and path:
-                if current_id not in found_paths:
-                    found_paths[current_id] = path
+            if current in target_nodes and current != start:
+                found_nodes.append(current)
                 # Don't use continue - we still need to explore from this node
                 # to find paths to other targets that may be reachable through it
 
             # Respect max level
-            if len(path) >= max_level:
+            if depths[current] >= max_level:
                 continue
 
-            # Explore neighbors
-            for slot, next_id in adjacency.get(current_id, []):
-                if slot.id not in visited_slots and next_id:
-                    # Only apply relation filter on FIRST edge (from start instance)
-                    if len(path) == 0 and relation_ids:
-                        if slot.predicate.relation_id not in relation_ids:
-                            continue
-
-                    # Allow visiting nodes if they haven't been visited yet
-                    if next_id not in visited_nodes:
-                        new_visited = visited_slots.copy()
-                        new_visited.add(slot.id)
-                        queue.append((next_id, path + [slot], new_visited))
-                        visited_nodes.add(next_id)
-
+            # Unless every edge is filtered, only apply relation filter on FIRST edge (from start instance)
+            relation_codes = relation_filter if current == start or relation_scope == RELATION_SCOPE_ALL else None
+            for edge, next_node in index.neighbours(current, relation_codes=relation_codes):
+                if next_node not in parents:
+                    parents[next_node] = (current, edge)
+                    depths[next_node] = depths[current] + 1
+                    queue.append(next_node)
+
+        edge_paths = {}
+        for node in found_nodes:
+            edges = []
+            step = parents[node]
+            while step is not None:
+                edges.append(step[1])
+                step = parents[step[0]]
+            edge_paths[index.instance_id(node)] = edges[::-1]
+
+        slots = index.slots(edge for edges in edge_paths.values() for edge in edges)
+        for instance_id, edges in edge_paths.items():
+            found_paths[instance_id] = [slots[x] for x in edges]
         return found_paths
 
     def get_instances_path_recursive(slot, end_instance, path, visited_ids, paths, level=0, max_level=DEFAULT_MAX_LEVEL):
@@ -214,25 +167,5 @@ class KnowledgeBaseUtils:
                 KnowledgeBaseUtils.get_instances_path_recursive(slot=x, end_instance=end_instance, path=new_path, visited_ids=new_visited, paths=paths, level=level + 1, max_level=max_level)
         
      
-    def get_related_instances(root_instance, predicate_ids, level):
-        results = {}
-        predicates = OPredicate.objects.filter(model=root_instance.model)
-        if predicate_ids and isinstance(predicate_ids, list):
-            predicates = predicates.filter(id__in=predicate_ids)
-        
-        results[0] = [(None, root_instance)]
-        already_found = set([root_instance])
-        KnowledgeBaseUtils.get_related_instances_recusrsive(results=results, already_found=already_found, instance=root_instance, predicates=predicates, level=1, max_level=level)
-        return results
-
-    def get_related_instances_recusrsive(results, already_found, instance, predicates, level, max_level):
-        tmp_results = []
-        if level >= max_level:
-            return tmp_results
-        
-        for i in results[level-1]:
-            tmp_results += [(x, x.object) for x in OSlot.objects.filter(subject=i[1], predicate__in=predicates).all() if x.object not in already_found] + [(x, x.subject) for x in OSlot.objects.filter(object=i[1], predicate__in=predicates).all() if x.subject not in already_found]
-        
-        already_found.update([x[1] for x in tmp_results])
-        results[level] = set(tmp_results)
-        KnowledgeBaseUtils.get_related_instances_recusrsive(results=results, already_found=already_found, instance=instance, predicates=predicates, level=level + 1, max_level=max_level)
+    def get_related_instances(root_instance, predicate_ids, level, node_budget=None):
+        return ImpactAnalysis(root_instance=root_instance, predicate_ids=predicate_ids, max_level=level, node_budget=node_budget).run().as_objects()
@@ -0,0 +1,33 @@
+"""
+Search indexes that cannot be declared in the models' Meta.
+
+The REST query views filter names with ``name__icontains``, which PostgreSQL
+runs as ``UPPER("name"::text) LIKE UPPER('%...%')``. A B-tree cannot serve a
+leading wildcard, a trigram GIN index on that same expression can. They need
+the pg_trgm extension and are only created on PostgreSQL, elsewhere no index
+serves a substring search.
+"""
+
+# (index name, table, column)
+TRIGRAM_INDEXES = [
+    ('concept_name_trgm', 'ontology_oconcept', 'name'),
+    ('relation_name_trgm', 'ontology_orelation', 'name'),
+    ('instance_name_trgm', 'ontology_oinstance', 'name'),
+    ('slot_name_trgm', 'ontology_oslot', 'name'),
+]
+
+
+def create_trigram_indexes(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS {} ON {} USING gin ((UPPER({}::text)) gin_trgm_ops)'.format(
+            schema_editor.quote_name(name), schema_editor.quote_name(table), schema_editor.quote_name(column)))
+
+
+def drop_trigram_indexes(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS {}'.format(schema_editor.quote_name(name)))
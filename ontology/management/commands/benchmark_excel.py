@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.plugins.excel import ExcelPlugin
+from organisation.models import Organisation
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+class Command(BaseCommand):
+    help = 'Time the Excel export and import of generated models, every change is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, help='Number of slot rows per run, defaults to {}'.format(DEFAULT_SIZES))
+        parser.add_argument('--organisation', type=str, help='Organisation id the generated models belong to, defaults to the first one')
+        parser.add_argument('--fan-out', type=int, default=4, help='Slots per subject instance')
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'] or DEFAULT_SIZES
+        if options['organisation']:
+            organisation = Organisation.objects.filter(id=options['organisation']).first()
+        else:
+            organisation = Organisation.objects.order_by('name').first()
+        if organisation is None:
+            raise CommandError('No organisation to create the benchmark models in')
+
+        self.stdout.write('{:>10} {:>12} {:>12} {:>12} {:>12} {:>10}'.format('rows', 'export s', 'export r/s', 'import s', 'import r/s', 'file MB'))
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as path:
+                with transaction.atomic():
+                    source, target = self.generate(organisation, size, options['fan_out'])
+
+                    started = time.monotonic()
+                    ExcelPlugin.export_instances(source, path)
+                    export_seconds = time.monotonic() - started
+                    file_size = os.path.getsize(os.path.join(path, 'instances.xlsx')) / 1024 / 1024
+
+                    started = time.monotonic()
+                    ExcelPlugin.import_instances(target, path)
+                    import_seconds = time.monotonic() - started
+
+                    transaction.set_rollback(True)
+
+            self.stdout.write('{:>10} {:>12.2f} {:>12.0f} {:>12.2f} {:>12.0f} {:>10.1f}'.format(
+                size, export_seconds, size / max(export_seconds, 1e-6), import_seconds, size / max(import_seconds, 1e-6), file_size))
+
+    def generate(self, organisation, size, fan_out):
+        """Create a source model with `size` slots and an empty target model."""
+        generator = SyntheticModelGenerator(organisation, name='benchmark_excel')
+        source = generator.generate(size, fan_out=fan_out, suffix='source')
+        target = generator.create_model('target')
+        return source, target
@@ -0,0 +1,106 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.indexes import create_trigram_indexes, drop_trigram_indexes
+from ontology.models import OInstance, OSlot
+from organisation.models import Organisation
+
+DEFAULT_SIZE = 1000000
+
+
+class Command(BaseCommand):
+    help = 'Record query plans and timings of the hot slot and instance queries without and with the indexes, every change is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help='Number of slot rows of the generated model, defaults to {}'.format(DEFAULT_SIZE))
+        parser.add_argument('--organisation', type=str, help='Organisation id the generated model belongs to, defaults to the first one')
+        parser.add_argument('--fan-out', type=int, default=4, help='Slots per subject instance')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the median is recorded')
+        parser.add_argument('--output', type=str, help='JSON file the plans and timings are written to')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError('The indexes are dropped and restored in a transaction, {} cannot roll back DDL'.format(connection.vendor))
+        if options['organisation']:
+            organisation = Organisation.objects.filter(id=options['organisation']).first()
+        else:
+            organisation = Organisation.objects.order_by('name').first()
+        if organisation is None:
+            raise CommandError('No organisation to create the benchmark model in')
+
+        results = {'database': connection.vendor, 'size': options['size'], 'fan_out': options['fan_out'], 'phases': {}}
+        # SQLite cannot alter the schema inside a transaction with the foreign key checks on
+        connection.disable_constraint_checking()
+        try:
+            queries = self.benchmark(organisation, options, results)
+        finally:
+            connection.enable_constraint_checking()
+
+        self.stdout.write('{:<28} {:>12} {:>12}'.format('query', 'before ms', 'after ms'))
+        for label in queries:
+            self.stdout.write('{:<28} {:>12.2f} {:>12.2f}'.format(
+                label, results['phases']['before'][label]['milliseconds'], results['phases']['after'][label]['milliseconds']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write('Plans and timings written to {}'.format(options['output']))
+
+    def benchmark(self, organisation, options, results):
+        """Generate the model, time the queries without and with the indexes, then roll everything back."""
+        with transaction.atomic():
+            model = SyntheticModelGenerator(organisation, name='benchmark_indexes').generate(options['size'], fan_out=options['fan_out'])
+            queries = self.queries(model)
+
+            indexes = [(x, y) for x in (OSlot, OInstance) for y in x._meta.indexes]
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for model_class, index in indexes:
+                    schema_editor.remove_index(model_class, index)
+                drop_trigram_indexes(schema_editor)
+            self.analyze()
+            results['phases']['before'] = self.run(queries, options['repeat'])
+
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for model_class, index in indexes:
+                    schema_editor.add_index(model_class, index)
+                create_trigram_indexes(schema_editor)
+            self.analyze()
+            results['phases']['after'] = self.run(queries, options['repeat'])
+
+            transaction.set_rollback(True)
+        return queries
+
+    def queries(self, model):
+        """The hot paths, keyed by label, as querysets on one subject and object of the generated model."""
+        slot = OSlot.objects.filter(model=model).order_by('subject__name').first()
+        subject_ids = list(OSlot.objects.filter(model=model).values_list('subject_id', flat=True)[:100])
+        object_ids = list(OSlot.objects.filter(model=model).values_list('object_id', flat=True)[:100])
+        return {
+            'slot model+subject': OSlot._base_manager.filter(model=model, subject_id=slot.subject_id),
+            'slot model+object': OSlot._base_manager.filter(model=model, object_id=slot.object_id),
+            'slot model+predicate': OSlot._base_manager.filter(model=model, predicate_id=slot.predicate_id)[:1000],
+            'slot subject__in': OSlot._base_manager.filter(subject_id__in=subject_ids).values_list('predicate_id', 'object_id'),
+            'slot object__in': OSlot._base_manager.filter(object_id__in=object_ids).values_list('predicate_id', 'subject_id'),
+            'instance model+concept': OInstance._base_manager.filter(model=model, concept_id=slot.subject.concept_id)[:1000],
+            'instance model+name': OInstance._base_manager.filter(model=model, name=slot.subject.name),
+            'instance name__icontains': OInstance._base_manager.filter(model=model, name__icontains='tion_12345'),
+        }
+
+    def run(self, queries, repeat):
+        results = {}
+        for label, query in queries.items():
+            timings = []
+            for i in range(max(repeat, 1)):
+                started = time.perf_counter()
+                list(query.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = {'milliseconds': statistics.median(timings), 'plan': query.explain()}
+        return results
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
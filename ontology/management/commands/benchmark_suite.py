@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ontology.controllers.benchmark import BENCHMARKS, DEFAULT_ROUNDS, DEFAULT_SIZES, BenchmarkSuite
+from organisation.models import Organisation
+
+
+class Command(BaseCommand):
+    help = 'Time filter, graph render, pathfinder, impact analysis, import/export, copy and diff on generated models, every change is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, help='Number of slots per generated model, defaults to {}'.format(DEFAULT_SIZES))
+        parser.add_argument('--organisation', type=str, help='Organisation id the generated models belong to, defaults to the first one')
+        parser.add_argument('--benchmark', action='append', choices=BENCHMARKS, help='Benchmark to run, may be repeated, defaults to all')
+        parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='Timed rounds per benchmark')
+        parser.add_argument('--concepts', type=int, default=10, help='Number of concepts of the generated models')
+        parser.add_argument('--relations', type=int, default=5, help='Number of relations of the generated models')
+        parser.add_argument('--predicates', type=int, default=20, help='Number of predicates of the generated models')
+        parser.add_argument('--exponent', type=float, default=1.0, help='Exponent of the power-law degree distribution, 0 for a uniform one')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--output', type=str, help='JSON file the results are written to')
+        parser.add_argument('--compare', type=str, help='JSON results of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        if options['organisation']:
+            organisation = Organisation.objects.filter(id=options['organisation']).first()
+        else:
+            organisation = Organisation.objects.order_by('name').first()
+        if organisation is None:
+            raise CommandError('No organisation to create the benchmark models in')
+
+        previous = None
+        if options['compare']:
+            with open(options['compare'], 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+
+        generator_options = {x: options[x] for x in ('concepts', 'relations', 'predicates', 'exponent', 'seed')}
+        suite = BenchmarkSuite(organisation, benchmarks=options['benchmark'], rounds=options['rounds'], generator_options=generator_options, stdout=self.stdout)
+        results = suite.run(options['sizes'] or DEFAULT_SIZES)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write('Results written to {}'.format(options['output']))
+
+        if previous is not None:
+            self.stdout.write('{:<28} {:>12} {:>12} {:>8}'.format('benchmark', 'before s', 'after s', 'ratio'))
+            for name, before, after, ratio in BenchmarkSuite.compare(previous, results):
+                self.stdout.write('{:<28} {:>12} {:>12} {:>8}'.format(
+                    name, '-' if before is None else '{:.4f}'.format(before), '-' if after is None else '{:.4f}'.format(after), '-' if ratio is None else '{:.2f}'.format(ratio)))
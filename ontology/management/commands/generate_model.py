@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.models import OConcept, OInstance, OPredicate, OSlot
+from organisation.models import Organisation
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic model with a power-law slot degree distribution'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slots', type=int, help='Number of slots')
+        parser.add_argument('--organisation', type=str, help='Organisation id the generated model belongs to, defaults to the first one')
+        parser.add_argument('--name', type=str, default='synthetic', help='Name of the generated repository, prefix of the model name')
+        parser.add_argument('--concepts', type=int, default=10, help='Number of concepts')
+        parser.add_argument('--relations', type=int, default=5, help='Number of relations')
+        parser.add_argument('--predicates', type=int, default=20, help='Number of predicates')
+        parser.add_argument('--instances', type=int, help='Number of instances, defaults to a quarter of the slots')
+        parser.add_argument('--exponent', type=float, default=1.0, help='Exponent of the power-law degree distribution, 0 for a uniform one')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+
+    def handle(self, *args, **options):
+        if options['organisation']:
+            organisation = Organisation.objects.filter(id=options['organisation']).first()
+        else:
+            organisation = Organisation.objects.order_by('name').first()
+        if organisation is None:
+            raise CommandError('No organisation to create the model in')
+
+        with transaction.atomic():
+            model = SyntheticModelGenerator(organisation, name=options['name']).generate_graph(
+                options['slots'], concepts=options['concepts'], relations=options['relations'], predicates=options['predicates'],
+                instances=options['instances'], exponent=options['exponent'], seed=options['seed'], suffix=str(options['seed']))
+
+        counts = ', '.join('{} {}'.format(x.objects.filter(model=model).count(), x._meta.verbose_name_plural) for x in (OConcept, OPredicate, OInstance, OSlot))
+        self.stdout.write('Generated model {} ({}): {}'.format(model.name, model.id, counts))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ontology.controllers.revision import ModelRevision
+
+
+class Command(BaseCommand):
+    help = 'Delete the change feed entries older than a number of days, clients behind them are told to reload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('days', type=int, help='Number of days of changes kept')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('Keep at least one day of changes')
+        deleted = ModelRevision.prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write('Deleted {} changes'.format(deleted))
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:29
+
+from collections import deque
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_concept_closure(apps, schema_editor):
+    OPredicate = apps.get_model('ontology', 'OPredicate')
+    OConceptClosure = apps.get_model('ontology', 'OConceptClosure')
+
+    children = {}
+    query = OPredicate.objects.filter(relation__type__in=('HESL', 'HESR'), subject__isnull=False, object__isnull=False).values_list(
+        'model_id', 'subject_id', 'object_id', 'relation__type')
+    for model_id, subject_id, object_id, relation_type in query:
+        parent_id, child_id = (subject_id, object_id) if relation_type == 'HESL' else (object_id, subject_id)
+        children.setdefault(model_id, {}).setdefault(parent_id, set()).add(child_id)
+
+    for model_id, model_children in children.items():
+        links = []
+        for ancestor_id in model_children:
+            depths = {ancestor_id: 0}
+            queue = deque([ancestor_id])
+            while queue:
+                current = queue.popleft()
+                for child_id in model_children.get(current, ()):
+                    if child_id not in depths:
+                        depths[child_id] = depths[current] + 1
+                        queue.append(child_id)
+                        links.append(OConceptClosure(model_id=model_id, ancestor_id=ancestor_id, descendant_id=child_id, depth=depths[child_id]))
+        OConceptClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ontology', '0003_remove_opredicate_native_oslot_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OConceptClosure',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='ontology.oconcept')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='ontology.oconcept')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='concept_closure', to='ontology.omodel')),
+            ],
+            options={
+                'verbose_name': 'Concept closure',
+                'verbose_name_plural': 'Concept closures',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='concept_closure_ancestor'), models.Index(fields=['descendant', 'depth'], name='concept_closure_descendant')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='oconceptclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_concept_closure_pair'),
+        ),
+        migrations.RunPython(build_concept_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+from ontology.indexes import create_trigram_indexes, drop_trigram_indexes
+
+
+def create_search_indexes(apps, schema_editor):
+    create_trigram_indexes(schema_editor)
+
+
+def drop_search_indexes(apps, schema_editor):
+    drop_trigram_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ontology', '0004_concept_closure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='oinstance',
+            index=models.Index(fields=['model', 'concept'], name='instance_model_concept'),
+        ),
+        migrations.AddIndex(
+            model_name='oinstance',
+            index=models.Index(fields=['model', 'name'], name='instance_model_name'),
+        ),
+        migrations.AddIndex(
+            model_name='oslot',
+            index=models.Index(fields=['subject', 'predicate', 'object'], name='slot_subject_adjacency'),
+        ),
+        migrations.AddIndex(
+            model_name='oslot',
+            index=models.Index(fields=['object', 'predicate', 'subject'], name='slot_object_adjacency'),
+        ),
+        migrations.AddIndex(
+            model_name='oslot',
+            index=models.Index(fields=['model', 'predicate'], name='slot_model_predicate'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
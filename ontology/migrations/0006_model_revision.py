@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ontology', '0005_slot_instance_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='omodel',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
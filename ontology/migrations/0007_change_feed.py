@@ -0,0 +1,34 @@
+# Generated by Django 4.2.13 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0004_organisation_revision'),
+        ('ontology', '0006_model_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('organisation_revision', models.PositiveBigIntegerField(null=True)),
+                ('revision', models.PositiveBigIntegerField()),
+                ('object_type', models.CharField(max_length=60)),
+                ('target', models.UUIDField()),
+                ('action', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('model', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ontology.omodel')),
+                ('organisation', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='organisation.organisation')),
+            ],
+            options={
+                'verbose_name': 'Change',
+                'verbose_name_plural': 'Changes',
+                'indexes': [models.Index(fields=['model', 'revision'], name='change_model_revision'), models.Index(fields=['organisation', 'organisation_revision'], name='change_organisation_revision')],
+            },
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.13 on 2026-10-18 16:36
+
+from collections import deque
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_org_unit_index(apps, schema_editor):
+    Configuration = apps.get_model('configuration', 'Configuration')
+    OModel = apps.get_model('ontology', 'OModel')
+    OConcept = apps.get_model('ontology', 'OConcept')
+    OPredicate = apps.get_model('ontology', 'OPredicate')
+    OSlot = apps.get_model('ontology', 'OSlot')
+    OOrgUnitClosure = apps.get_model('ontology', 'OOrgUnitClosure')
+    OOrgUnitOwnership = apps.get_model('ontology', 'OOrgUnitOwnership')
+
+    ownership_relations = {}
+    for organisation_id, content in Configuration.objects.filter(name='graph_presets').values_list('organisation_id', 'content'):
+        if isinstance(content, dict):
+            ownership_relations[organisation_id] = content.get('org_unit_config', {}).get('ownership_relation', 'ownedBy')
+
+    for model_id, organisation_id in OModel.objects.values_list('id', 'organisation_id'):
+        ownership_relation = ownership_relations.get(organisation_id, 'ownedBy').lower()
+        kinds = {}
+        for predicate_id, relation_name in OPredicate.objects.filter(model_id=model_id).values_list('id', 'relation__name'):
+            relation_name = (relation_name or '').lower()
+            kinds[predicate_id] = (
+                any(x in relation_name for x in ['reports', 'part-of', 'belongs', 'subordinate', 'member']),
+                any(x in relation_name for x in ['contains', 'has', 'includes', 'comprises']),
+                bool(ownership_relation) and ownership_relation in relation_name,
+                any(x in relation_name for x in ['owns', 'manages', 'responsible']),
+            )
+        kinds = {x: y for x, y in kinds.items() if any(y)}
+        if not kinds:
+            continue
+        unit_concept_ids = set(OConcept.objects.filter(model_id=model_id, name__icontains='Organisation').values_list('id', flat=True))
+
+        children = {}
+        owned = set()
+        query = OSlot.objects.filter(model_id=model_id, predicate_id__in=list(kinds), subject__isnull=False, object__isnull=False).values_list(
+            'predicate_id', 'subject_id', 'object_id', 'subject__concept_id', 'object__concept_id')
+        for predicate_id, subject_id, object_id, subject_concept_id, object_concept_id in query.iterator():
+            child_to_parent, parent_to_child, owned_by, owns = kinds[predicate_id]
+            if child_to_parent and subject_concept_id in unit_concept_ids:
+                children.setdefault(object_id, set()).add(subject_id)
+            if parent_to_child and object_concept_id in unit_concept_ids:
+                children.setdefault(subject_id, set()).add(object_id)
+            if owned_by:
+                owned.add((object_id, subject_id))
+            if owns:
+                owned.add((subject_id, object_id))
+
+        links = []
+        for ancestor_id in children:
+            depths = {ancestor_id: 0}
+            queue = deque([ancestor_id])
+            while queue:
+                current = queue.popleft()
+                for child_id in children.get(current, ()):
+                    if child_id not in depths:
+                        depths[child_id] = depths[current] + 1
+                        queue.append(child_id)
+                        links.append(OOrgUnitClosure(model_id=model_id, ancestor_id=ancestor_id, descendant_id=child_id, depth=depths[child_id]))
+        OOrgUnitClosure.objects.bulk_create(links, batch_size=1000)
+        OOrgUnitOwnership.objects.bulk_create([OOrgUnitOwnership(model_id=model_id, org_unit_id=x, instance_id=y) for x, y in owned], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('configuration', '0001_initial'),
+        ('ontology', '0007_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OOrgUnitClosure',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='org_unit_descendant_links', to='ontology.oinstance')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='org_unit_ancestor_links', to='ontology.oinstance')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='org_unit_closure', to='ontology.omodel')),
+            ],
+            options={
+                'verbose_name': 'Org unit closure',
+                'verbose_name_plural': 'Org unit closures',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='org_unit_closure_descendant')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OOrgUnitOwnership',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owner_links', to='ontology.oinstance')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='org_unit_ownership', to='ontology.omodel')),
+                ('org_unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owned_links', to='ontology.oinstance')),
+            ],
+            options={
+                'verbose_name': 'Org unit ownership',
+                'verbose_name_plural': 'Org unit ownerships',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='oorgunitclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_org_unit_closure_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='oorgunitownership',
+            constraint=models.UniqueConstraint(fields=('org_unit', 'instance'), name='unique_org_unit_ownership_pair'),
+        ),
+        migrations.RunPython(build_org_unit_index, migrations.RunPython.noop),
+    ]
@@ -82,6 +82,9 @@ class OModel(GenericModel, models.Model):
     repository = models.ForeignKey(Repository, on_delete=models.CASCADE, null=True, related_name='models')
     tags = models.ManyToManyField(Tag, blank=True)
     organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, null=True, related_name='organisation_models')
+    # Incremented on every write to the model or one of its entities, see ModelRevision
+    revision = models.PositiveBigIntegerField(default=0, editable=False)
+    counter_fields = ('revision',)
 
     created_at = models.DateTimeField(verbose_name=_("Created at"), auto_now_add=True, null=True)
     created_by = models.ForeignKey(User, verbose_name=_("Created by"), on_delete=models.PROTECT, null=True, related_name='model_created')
@@ -379,6 +382,10 @@ class OInstance(GenericModel, models.Model):
                 deferrable=models.Deferrable.DEFERRED,
             )
         ]
+        indexes = [
+            models.Index(name='instance_model_concept', fields=['model', 'concept']),
+            models.Index(name='instance_model_name', fields=['model', 'name']),
+        ]
 
 class OSlot(GenericModel, models.Model):
     """
@@ -470,6 +477,13 @@ class OSlot(GenericModel, models.Model):
                 deferrable=models.Deferrable.DEFERRED,
             )
         ]
+        indexes = [
+            # Adjacency in both directions, covering: traversals read the predicate and the other end from the index alone.
+            # An instance belongs to one model, so they also serve the (model, subject) and (model, object) filters.
+            models.Index(name='slot_subject_adjacency', fields=['subject', 'predicate', 'object']),
+            models.Index(name='slot_object_adjacency', fields=['object', 'predicate', 'subject']),
+            models.Index(name='slot_model_predicate', fields=['model', 'predicate']),
+        ]
 
 class OReport(GenericModel, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -521,3 +535,112 @@ class OReport(GenericModel, models.Model):
     class Meta:
         verbose_name = _('Report')
         verbose_name_plural = _('Reports')
+
+
+class OConceptClosure(models.Model):
+    """
+    Transitive closure of the concept inheritance of a model: one row per
+    (ancestor, descendant) pair, with the length of the shortest inheritance
+    path between them. Derived from the inheritance predicates and maintained
+    by ontology.controllers.concept_closure.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.ForeignKey(OModel, on_delete=models.CASCADE, related_name='concept_closure')
+    ancestor = models.ForeignKey(OConcept, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(OConcept, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = _('Concept closure')
+        verbose_name_plural = _('Concept closures')
+
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_concept_closure_pair',
+                fields=['ancestor', 'descendant'],
+            )
+        ]
+        indexes = [
+            models.Index(name='concept_closure_ancestor', fields=['ancestor', 'depth']),
+            models.Index(name='concept_closure_descendant', fields=['descendant', 'depth']),
+        ]
+
+
+class OOrgUnitClosure(models.Model):
+    """
+    Materialized org unit hierarchy of a model: one row per (ancestor,
+    descendant) pair of org units, with the length of the shortest path
+    between them. The hierarchy edges are the "reports to" and "contains"
+    slots of the graph presets. Maintained by ontology.controllers.org_units.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.ForeignKey(OModel, on_delete=models.CASCADE, related_name='org_unit_closure')
+    ancestor = models.ForeignKey(OInstance, on_delete=models.CASCADE, related_name='org_unit_descendant_links')
+    descendant = models.ForeignKey(OInstance, on_delete=models.CASCADE, related_name='org_unit_ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = _('Org unit closure')
+        verbose_name_plural = _('Org unit closures')
+
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_org_unit_closure_pair',
+                fields=['ancestor', 'descendant'],
+            )
+        ]
+        indexes = [
+            models.Index(name='org_unit_closure_descendant', fields=['descendant', 'depth']),
+        ]
+
+
+class OOrgUnitOwnership(models.Model):
+    """
+    Ownership index of a model: one row per (org unit, instance) pair linked
+    by an "owned by" or "owns" slot of the graph presets. Maintained by
+    ontology.controllers.org_units.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.ForeignKey(OModel, on_delete=models.CASCADE, related_name='org_unit_ownership')
+    org_unit = models.ForeignKey(OInstance, on_delete=models.CASCADE, related_name='owned_links')
+    instance = models.ForeignKey(OInstance, on_delete=models.CASCADE, related_name='owner_links')
+
+    class Meta:
+        verbose_name = _('Org unit ownership')
+        verbose_name_plural = _('Org unit ownerships')
+
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_org_unit_ownership_pair',
+                fields=['org_unit', 'instance'],
+            )
+        ]
+
+
+class OChange(models.Model):
+    """
+    Append-only change feed: one row per write to a model or to one of its
+    entities, with the revisions of the model and of its organisation after
+    the write. Caches, indexes and API clients poll it with the last revision
+    they saw, see ontology.controllers.revision. The rows of a deleted model
+    are kept so that its deletion can be read.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # Both foreign keys are covered by the composite indexes
+    organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, null=True, db_index=False, related_name='+')
+    organisation_revision = models.PositiveBigIntegerField(null=True)
+    model = models.ForeignKey(OModel, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    revision = models.PositiveBigIntegerField()
+    object_type = models.CharField(max_length=60)
+    target = models.UUIDField()
+    action = models.CharField(max_length=20)
+    created_at = models.DateTimeField(verbose_name=_("Created at"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Change')
+        verbose_name_plural = _('Changes')
+
+        indexes = [
+            models.Index(name='change_model_revision', fields=['model', 'revision']),
+            models.Index(name='change_organisation_revision', fields=['organisation', 'organisation_revision']),
+        ]
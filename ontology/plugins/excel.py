@@ -1,17 +1,33 @@
+import logging
 import os
+import uuid
 
+from django.conf import settings
 from django.db import transaction
 from openpyxl import Workbook, load_workbook
-from openpyxl.styles import (Alignment, Border, Font, PatternFill, Protection,
-                             Side)
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import (Alignment, Border, Font, NamedStyle, PatternFill,
+                             Protection, Side)
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
 
-from ontology.controllers.knowledge_base import KnowledgeBaseController
+from ontology.controllers.bulk_import import BulkImporter
 from ontology.controllers.o_model import ModelUtils
 from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
 from ontology.plugins.plugin import CAPABILITY_EXPORT, CAPABILITY_IMPORT, Plugin_v1
 
+logger = logging.getLogger(__name__)
 
+HEADER_STYLE = 'openea_header'
+
+INSTANCE_COLUMNS = ['InstanceID', 'Instance', 'Instance Code', 'Description',
+                    'ConceptID', 'Concept',
+                    'SlotID', 'Slot' , 'Slot Order', 'Slot Description',
+                    'PredicateID', 'Cardinality Min', 'Cardinality Max',
+                    'RelationID', 'Relation',
+                    'Object ConceptID', 'Object Concept',
+                    'ObjectID', 'Object', 'Object Code', 'Object Description',
+                    'Value']
 
 
 class ExcelPlugin(Plugin_v1):
@@ -25,80 +41,72 @@ class ExcelPlugin(Plugin_v1):
         return 'xlsx'
 
     def import_ontology(model, path, filename='ontology.xlsx', filters=None):
+        filters = filters or {}
+        importer = BulkImporter(model)
 
         with transaction.atomic():
             wb = load_workbook(os.path.join(path, filename), read_only=True)
-            sheet_names = wb.get_sheet_names()                        
+            sheet_names = wb.sheetnames
 
             if 'concepts' in sheet_names and get_boolean_filter(filters, 'concepts'):
-                ws = wb['concepts']
-                max_row=ws.max_row
-                for index in range(2, max_row+1):
-                    id = ws['A' + str(index)].value or None
-                    name = name_from_excel(ws['B' + str(index)].value)
-                    description = ws['C' + str(index)].value or ''
-                    if name:
-                        oconcept = OConcept.get_or_create(name=name, model=model, description=description, id=None)
-                        oconcept.description = description
-                        oconcept.save()
-
-                    
-            if 'relations' in sheet_names and get_boolean_filter(filters, 'relations'):
-                ws = wb['relations']
-                max_row=ws.max_row
-                for index in range(2, max_row+1):
-                    id = ws['A' + str(index)].value or None
-                    name = name_from_excel(ws['B' + str(index)].value)
-                    description = ws['C' + str(index)].value or ''
-                    type = ws['D' + str(index)].value
-                    if name:
-                        relation = ORelation.get_or_create(model=model, name=name, type=type, description=description, id=id)
-                        relation.description = description
-                        relation.type = type
-                        relation.save()
+                for rows in read_chunks(wb['concepts'], columns=3, chunk_size=importer.chunk_size):
+                    concepts = {}
+                    for id, name, description in rows:
+                        name = name_from_excel(name)
+                        if name:
+                            concepts[excel_ref(id, (name,))] = {'id': id or None, 'key': (name,), 'values': {'name': name, 'description': description or ''}}
+                    importer.merge(OConcept, list(concepts.values()), key_fields=('name',))
 
+            if 'relations' in sheet_names and get_boolean_filter(filters, 'relations'):
+                for rows in read_chunks(wb['relations'], columns=4, chunk_size=importer.chunk_size):
+                    relations = {}
+                    for id, name, description, type in rows:
+                        name = name_from_excel(name)
+                        if name:
+                            relations[excel_ref(id, (name,))] = {'id': id or None, 'key': (name,), 'values': {'name': name, 'description': description or '', 'type': type or ORelation.PROPERTY}}
+                    importer.merge(ORelation, list(relations.values()), key_fields=('name',))
 
             if 'ontology' in sheet_names and get_boolean_filter(filters, 'predicates'):
-                ws = wb['ontology']
-                max_row=ws.max_row
-                for index in range(2, max_row+1):
-                    id = ws['A' + str(index)].value or None
-                    subject_id = ws['B' + str(index)].value or None
-                    subject_name = name_from_excel(ws['C' + str(index)].value)
-                    predicate_id = ws['D' + str(index)].value or None
-                    predicate_name = name_from_excel(ws['E' + str(index)].value)
-                    object_id = ws['F' + str(index)].value or None
-                    object_name = name_from_excel(ws['G' + str(index)].value)
-                    cardinality_min = ws['H' + str(index)].value or 0
-                    cardinality_max = ws['I' + str(index)].value or 0
-
-                    #print(id,' ',subject_id,' ',subject_name,' ',predicate_id,' ',predicate_name,' ',object_id,' ',object_name)
-                    if predicate_name:
-                        relation = ORelation.get_or_create(model=model, name=predicate_name)
-                        subject = OConcept.get_or_create(model=model, name=subject_name, id=subject_id)
-                        object = OConcept.get_or_create(model=model, name=object_name, id=object_id)
-
-                        OPredicate.get_or_create(model=model, relation=relation, subject=subject, object=object, cardinality_min=cardinality_min, cardinality_max=cardinality_max)
-                 
+                for rows in read_chunks(wb['ontology'], columns=9, chunk_size=importer.chunk_size):
+                    rows = [x for x in rows if name_from_excel(x[4])]
+                    concepts = {}
+                    relations = {}
+                    for id, subject_id, subject_name, relation_id, relation_name, object_id, object_name, cardinality_min, cardinality_max in rows:
+                        for concept_id, concept_name in ((subject_id, subject_name), (object_id, object_name)):
+                            concept_name = name_from_excel(concept_name)
+                            concepts[excel_ref(concept_id, (concept_name,))] = {'id': concept_id or None, 'key': (concept_name,), 'values': {'name': concept_name}}
+                        relation_name = name_from_excel(relation_name)
+                        relations[(relation_name,)] = {'id': None, 'key': (relation_name,), 'values': {'name': relation_name}}
+                    concept_ids = importer.merge(OConcept, list(concepts.values()), key_fields=('name',))
+                    relation_ids = importer.merge(ORelation, list(relations.values()), key_fields=('name',))
+
+                    predicates = {}
+                    for id, subject_id, subject_name, relation_id, relation_name, object_id, object_name, cardinality_min, cardinality_max in rows:
+                        subject_id = concept_ids[excel_ref(subject_id, (name_from_excel(subject_name),))]
+                        object_id = concept_ids[excel_ref(object_id, (name_from_excel(object_name),))]
+                        relation_id = relation_ids[(name_from_excel(relation_name),)]
+                        key = (relation_id, subject_id, object_id)
+                        predicates[key] = {'id': None, 'key': key, 'values': {
+                            'subject_id': subject_id, 'relation_id': relation_id, 'object_id': object_id,
+                            'cardinality_min': cardinality_min or 0, 'cardinality_max': cardinality_max or 0}}
+                    importer.merge(OPredicate, list(predicates.values()), key_fields=('relation_id', 'subject_id', 'object_id'))
 
             # Close the workbook after reading
             wb.close()
+            importer.flush_log()
+        logger.info('Imported ontology of model %s: %s', model.id, importer.stats)
 
     def export_ontology(model, path, filename='ontology.xlsx', filters=None):
         relation_ids = ModelUtils.get_filter(filters, 'relation_ids')
         concept_ids = ModelUtils.get_filter(filters, 'concept_ids')
         predicate_ids = ModelUtils.get_filter(filters, 'predicate_ids')
 
-        wb = Workbook()
-        
-        sheet_names = ['ontology', 'concepts', 'relations']
-        for sheet_name in sheet_names:
-            wb.create_sheet(sheet_name)
+        wb = Workbook(write_only=True)
+        StyleController.add_named_styles(wb)
 
         # Write ontology
-        sheet = wb['ontology']
-        sheet.append(['Entry ID', 'Concept ID', 'Concept', 'Relation ID', 'Relation', 'Related Concept ID', 'Related Concept', 'Cardinality Minimal', 'Cardinality Maximal'])
-        count = 1
+        sheet = wb.create_sheet('ontology')
+        headers = ['Entry ID', 'Concept ID', 'Concept', 'Relation ID', 'Relation', 'Related Concept ID', 'Related Concept', 'Cardinality Minimal', 'Cardinality Maximal']
         sheet.column_dimensions['A'].hidden = True
 
         sheet.column_dimensions['B'].hidden = True
@@ -112,150 +120,103 @@ class ExcelPlugin(Plugin_v1):
 
         sheet.column_dimensions['H'].width = 10
         sheet.column_dimensions['I'].width = 10
+        sheet.append(StyleController.header_row(sheet, headers))
+        count = 1
 
         predicate_query = OPredicate.objects.filter(model=model)
         if predicate_ids:
             predicate_query = predicate_query.filter(id__in=predicate_ids)
-        for predicate in predicate_query.order_by('subject__name').order_by('relation__name').order_by('object__name'):
+        predicate_query = predicate_query.order_by('object__name').values_list(
+            'id', 'subject_id', 'subject__name', 'relation_id', 'relation__name', 'object_id', 'object__name', 'cardinality_min', 'cardinality_max')
+        for id, subject_id, subject_name, relation_id, relation_name, object_id, object_name, cardinality_min, cardinality_max in predicate_query.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
             count = count + 1
-            sheet.append([str(predicate.id),
-                        str(predicate.subject.id),
-                        name_to_excel(predicate.subject.name),
-                        str(relation.id),
-                        name_to_excel(relation.name),
-                        str(predicate.object.id),
-                        name_to_excel(predicate.object.name),
-                        predicate.cardinality_min,
-                        predicate.cardinality_max])
-
-        table = Table(displayName="ontology", ref="A1:G{}".format(count))
-        StyleController.apply_table_style(table)
-        sheet.add_table(table)
+            sheet.append([id_to_excel(id),
+                          id_to_excel(subject_id),
+                          name_to_excel(subject_name),
+                          id_to_excel(relation_id),
+                          name_to_excel(relation_name),
+                          id_to_excel(object_id),
+                          name_to_excel(object_name),
+                          cardinality_min,
+                          cardinality_max])
+
+        StyleController.add_table(sheet, "ontology", headers, count)
 
         # Write concepts
-        sheet = wb['concepts']
-        sheet.append(['ID', 'Name', 'Description'])
+        sheet = wb.create_sheet('concepts')
+        headers = ['ID', 'Name', 'Description']
         sheet.column_dimensions['A'].hidden = True
         sheet.column_dimensions['B'].width = 25
         sheet.column_dimensions['C'].width = 60
+        sheet.append(StyleController.header_row(sheet, headers))
         count = 1
 
         concept_query = OConcept.objects.filter(model=model)
         if concept_ids:
             concept_query = concept_query.filter(id__in=concept_ids)
-        for concept in concept_query.order_by('name'):
-            sheet.append([str(concept.id),
-                          name_to_excel(concept.name),
-                          concept.description])
+        for id, name, description in concept_query.order_by('name').values_list('id', 'name', 'description').iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            sheet.append([id_to_excel(id),
+                          name_to_excel(name),
+                          description])
             count = count + 1
         sheet.append(['', '', ''])
         count = count + 1
 
-        table = Table(displayName="concepts", ref="A1:C{}".format(count))
-        StyleController.apply_table_style(table)
-        sheet.add_table(table)
+        StyleController.add_table(sheet, "concepts", headers, count)
 
         # Write relations
-        sheet = wb['relations']
-        sheet.append(['ID', 'Name', 'Description', 'Type'])
+        sheet = wb.create_sheet('relations')
+        headers = ['ID', 'Name', 'Description', 'Type']
         sheet.column_dimensions['A'].hidden = True
         sheet.column_dimensions['B'].width = 25
         sheet.column_dimensions['C'].width = 60
         sheet.column_dimensions['D'].width = 25
+        sheet.append(StyleController.header_row(sheet, headers))
         count = 1
 
         relation_query = ORelation.objects.filter(model=model)
         if relation_ids:
             relation_query = relation_query.filter(id__in=relation_ids)
-        for relation in relation_query.order_by('name'):
-            sheet.append([str(relation.id),
-                          name_to_excel(relation.name),
-                          relation.description,
-                          relation.type])
+        for id, name, description, type in relation_query.order_by('name').values_list('id', 'name', 'description', 'type').iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            sheet.append([id_to_excel(id),
+                          name_to_excel(name),
+                          description,
+                          type])
             count = count + 1
-        sheet.append(['', '', ''])
+        sheet.append(['', '', '', ''])
         count = count + 1
 
-        table = Table(displayName="predicates", ref="A1:C{}".format(count))
-        StyleController.apply_table_style(table)
-        sheet.add_table(table)
+        StyleController.add_table(sheet, "predicates", headers, count)
 
-        sheet = wb['Sheet']
-        wb.remove(sheet)
         wb.save(os.path.join(path, filename))
 
 
     def import_instances(model, path, filename='instances.xlsx', filters=None):
-         
+        filters = filters or {}
+        importer = BulkImporter(model)
+
         with transaction.atomic():
             wb = load_workbook(os.path.join(path, filename), read_only=True)
-            sheet_names = wb.get_sheet_names()                        
-
-            if 'instances' in sheet_names  and get_boolean_filter(filters, 'instances'):
-                ws = wb['instances']
-                max_row=ws.max_row
-                for index in range(2, max_row+1):
-                    instance_id = ws['A' + str(index)].value or None
-                    instance_name = name_from_excel(ws['B' + str(index)].value)
-                    instance_code = name_from_excel(ws['C' + str(index)].value)
-                    instance_description = ws['D' + str(index)].value or ''
-
-                    concept_id = ws['E' + str(index)].value or None
-                    concept_name = name_from_excel(ws['F' + str(index)].value)
-                    
-                    slot_id = ws['G' + str(index)].value or None
-                    slot_name = name_from_excel(ws['H' + str(index)].value)
-                    slot_order  = ws['I' + str(index)].value or '0'
-                    slot_description = ws['J' + str(index)].value or ''
-
-                    predicate_id = ws['K' + str(index)].value or None
-                    predicate_cardinality_min = ws['L' + str(index)].value or 0
-                    predicate_cardinality_max = ws['M' + str(index)].value or 0
-
-                    relation_id = ws['N' + str(index)].value or None
-                    relation_id_name = name_from_excel(ws['O' + str(index)].value)
-
-                    object_concept_id = ws['P' + str(index)].value or None
-                    object_concept_name = name_from_excel(ws['Q' + str(index)].value)
-
-                    object_id = ws['R' + str(index)].value or None
-                    object_name = name_from_excel(ws['S' + str(index)].value)
-                    object_code = name_from_excel(ws['T' + str(index)].value)
-                    object_description = ws['U' + str(index)].value or ''
-
-                    if instance_name:
-                        concept, created = OConcept.get_or_create(model=model, name=concept_name, id=concept_id)
-                        relation, created = ORelation.get_or_create(model=model, name=relation_id_name, id=relation_id)
-                        object_concept, created = OConcept.get_or_create(model=model, name=object_concept_name, id=object_concept_id)
-                        predicate, created = OPredicate.get_or_create(model=model, relation=relation, subject=concept, object=object_concept, cardinality_min=predicate_cardinality_min, cardinality_max=predicate_cardinality_max, id=predicate_id)
-                        
-                        instance, created = OInstance.get_or_create(model=model, name=instance_name, code=instance_code, concept=concept, id=instance_id, description=instance_description)
-                        object, created = OInstance.get_or_create(model=model, name=object_name, code=object_code, concept=object_concept, id=object_id, description=object_description)
-                        
-                        slot, created = OSlot.get_or_create(model=model, predicate=predicate, name=slot_name, order=slot_order, description=slot_description, subject=instance, object=object, id=slot_id)
+            sheet_names = wb.sheetnames
+
+            if 'instances' in sheet_names and get_boolean_filter(filters, 'instances'):
+                for rows in read_chunks(wb['instances'], columns=len(INSTANCE_COLUMNS), chunk_size=importer.chunk_size):
+                    import_instance_rows(importer, [x for x in rows if name_from_excel(x[1])])
 
             # Close the workbook after reading
             wb.close()
+            importer.flush_log()
+        logger.info('Imported instances of model %s: %s', model.id, importer.stats)
 
     def export_instances(model, path, filename='instances.xlsx', filters=None):
         predicate_ids = ModelUtils.get_filter(filters, 'predicate_ids')
         instance_ids = ModelUtils.get_filter(filters, 'instance_ids')
-        
-        wb = Workbook()
-        
-        sheet_names = ['instances']
-        for sheet_name in sheet_names:
-            wb.create_sheet(sheet_name)
+
+        wb = Workbook(write_only=True)
+        StyleController.add_named_styles(wb)
 
         # Write instances
-        sheet = wb['instances']
-        sheet.append(['InstanceID', 'Instance', 'Instance Code', 'Description',
-                      'ConceptID', 'Concept',
-                      'SlotID', 'Slot' , 'Slot Order', 'Slot Description',
-                      'PredicateID', 'Cardinality Min', 'Cardinality Max',
-                      'RelationID', 'Relation',
-                      'Object ConceptID', 'Object Concept',
-                      'ObjectID', 'Object', 'Object Code', 'Object Description'])
+        sheet = wb.create_sheet('instances')
         sheet.column_dimensions['A'].hidden = True
         sheet.column_dimensions['B'].width = 25
         sheet.column_dimensions['C'].width = 10
@@ -283,31 +244,43 @@ class ExcelPlugin(Plugin_v1):
         sheet.column_dimensions['S'].width = 25
         sheet.column_dimensions['T'].width = 10
         sheet.column_dimensions['U'].hidden = True
-        
-        count = 1
-        instance_query = OInstance.objects.filter(model=model)
+
+        sheet.column_dimensions['V'].width = 25
+        sheet.append(StyleController.header_row(sheet, INSTANCE_COLUMNS))
+
+        # One slot query streamed in batches instead of one slot query per instance
+        slot_query = OSlot.objects.filter(model=model, subject__model=model)
         if instance_ids:
-            instance_query = instance_query.filter(id__in=instance_ids)
-
-        for instance in instance_query.order_by('name'):
-            for slot in OSlot.objects.filter(model=model, subject=instance).all():
-                sheet.append([str(instance.id), name_to_excel(instance.name), name_to_excel(instance.code), instance.description,
-                              str(instance.concept.id), name_to_excel(instance.concept.name),
-                              str(slot.id), name_to_excel(slot.name), slot.order, slot.description,
-                              str(slot.predicate.id), str(slot.predicate.cardinality_min), str(slot.predicate.cardinality_max),
-                              str(slot.predicate.relation.id),  name_to_excel(slot.predicate.relation.name),
-                              str(slot.object.concept.id), name_to_excel(slot.object.concept.name),
-                              str(slot.object.id), name_to_excel(slot.object.name), name_to_excel(slot.object.code), slot.object.description])
-                count = count + 1
-
-        table = Table(displayName="instances", ref="A1:U{}".format(count))
-        StyleController.apply_table_style(table)
-        sheet.add_table(table)
+            slot_query = slot_query.filter(subject_id__in=instance_ids)
+        slot_query = slot_query.order_by('subject__name', 'subject_id', 'id').values_list(
+            'subject_id', 'subject__name', 'subject__code', 'subject__description',
+            'subject__concept_id', 'subject__concept__name',
+            'id', 'name', 'order', 'description',
+            'predicate_id', 'predicate__cardinality_min', 'predicate__cardinality_max',
+            'predicate__relation_id', 'predicate__relation__name',
+            'object__concept_id', 'object__concept__name',
+            'object_id', 'object__name', 'object__code', 'object__description',
+            'value', 'predicate__object_id', 'predicate__object__name')
+
+        count = 1
+        for row in slot_query.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            if row[17] is None:
+                # Value slot, the object concept is the one of its predicate
+                row = row[:15] + row[22:24] + row[17:22]
+            sheet.append([id_to_excel(row[0]), name_to_excel(row[1]), name_to_excel(row[2]), row[3],
+                          id_to_excel(row[4]), name_to_excel(row[5]),
+                          id_to_excel(row[6]), name_to_excel(row[7]), row[8], row[9],
+                          id_to_excel(row[10]), str(row[11]), str(row[12]),
+                          id_to_excel(row[13]), name_to_excel(row[14]),
+                          id_to_excel(row[15]), name_to_excel(row[16]),
+                          id_to_excel(row[17]), name_to_excel(row[18]), name_to_excel(row[19]), row[20],
+                          row[21]])
+            count = count + 1
+
+        StyleController.add_table(sheet, "instances", INSTANCE_COLUMNS, count)
 
-        sheet = wb['Sheet']
-        wb.remove(sheet)
         wb.save(os.path.join(path, filename))
-        
+
 class StyleController:
     @staticmethod
     def apply_default_style(cell):
@@ -360,6 +333,30 @@ class StyleController:
         table.tableStyleInfo = TableStyleInfo(name="TableStyleLight13", showFirstColumn=False,
                        showLastColumn=False, showRowStripes=True, showColumnStripes=True)
 
+    @staticmethod
+    def add_named_styles(wb):
+        """Register the header style once per workbook, cells then only reference it by name."""
+        header = NamedStyle(name=HEADER_STYLE)
+        StyleController.apply_header_style(header)
+        wb.add_named_style(header)
+
+    @staticmethod
+    def header_row(sheet, headers):
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(sheet, value=header)
+            cell.style = HEADER_STYLE
+            cells.append(cell)
+        return cells
+
+    @staticmethod
+    def add_table(sheet, name, headers, count):
+        # Write-only sheets cannot derive the table columns from the header cells
+        table = Table(displayName=name, ref="A1:{}{}".format(get_column_letter(len(headers)), count))
+        table.tableColumns = [TableColumn(id=index + 1, name=header) for index, header in enumerate(headers)]
+        StyleController.apply_table_style(table)
+        sheet.add_table(table)
+
 #=================================================================================================
 # Useful functions
 
@@ -380,4 +377,84 @@ def name_to_excel(name):
 def get_boolean_filter(filters, varname):
     if varname in filters and not filters[varname]:
         return False
-    return True
\ No newline at end of file
+    return True
+
+def id_to_excel(id):
+    return str(id) if id else ''
+
+def excel_ref(id, key):
+    """Reference of a row within one import, its normalised id or its natural key."""
+    if id:
+        return str(uuid.UUID(str(id)))
+    return key
+
+def read_chunks(ws, columns, chunk_size):
+    """Yield lists of data rows (header skipped), padded to the expected number of columns."""
+    chunk = []
+    for row in ws.iter_rows(min_row=2, max_col=columns, values_only=True):
+        row = tuple(row) + (None,) * (columns - len(row))
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_instance_rows(importer, rows):
+    """Merge one chunk of rows of the instances sheet, entity type by entity type.
+
+    The rows of value slots have blank object columns, their object concept is the
+    one of the predicate and may be blank as well.
+    """
+    concepts = {}
+    relations = {}
+    for row in rows:
+        for concept_id, concept_name in ((row[4], row[5]), (row[15], row[16])):
+            if not (concept_id or concept_name):
+                continue
+            concept_name = name_from_excel(concept_name)
+            concepts[excel_ref(concept_id, (concept_name,))] = {'id': concept_id or None, 'key': (concept_name,), 'values': {'name': concept_name}}
+        relation_name = name_from_excel(row[14])
+        relations[excel_ref(row[13], (relation_name,))] = {'id': row[13] or None, 'key': (relation_name,), 'values': {'name': relation_name}}
+    concept_ids = importer.merge(OConcept, list(concepts.values()), key_fields=('name',))
+    relation_ids = importer.merge(ORelation, list(relations.values()), key_fields=('name',))
+
+    predicates = {}
+    for row in rows:
+        subject_id = concept_ids[excel_ref(row[4], (name_from_excel(row[5]),))]
+        object_id = concept_ids[excel_ref(row[15], (name_from_excel(row[16]),))] if row[15] or row[16] else None
+        relation_id = relation_ids[excel_ref(row[13], (name_from_excel(row[14]),))]
+        key = (relation_id, subject_id, object_id)
+        predicates[excel_ref(row[10], key)] = {'id': row[10] or None, 'key': key, 'values': {
+            'subject_id': subject_id, 'relation_id': relation_id, 'object_id': object_id,
+            'cardinality_min': int(row[11] or 0), 'cardinality_max': int(row[12] or 0)}}
+    predicate_ids = importer.merge(OPredicate, list(predicates.values()), key_fields=('relation_id', 'subject_id', 'object_id'))
+
+    instances = {}
+    for row in rows:
+        for instance_id, name, code, description, concept_id, concept_name in ((row[0], row[1], row[2], row[3], row[4], row[5]),
+                                                                               (row[17], row[18], row[19], row[20], row[15], row[16])):
+            if not (instance_id or name):
+                continue
+            name = name_from_excel(name)
+            code = name_from_excel(code)
+            concept_id = concept_ids[excel_ref(concept_id, (name_from_excel(concept_name),))]
+            key = (name, code, concept_id)
+            instances[excel_ref(instance_id, key)] = {'id': instance_id or None, 'key': key, 'values': {
+                'name': name, 'code': code, 'description': description or '', 'concept_id': concept_id}}
+    instance_ids = importer.merge(OInstance, list(instances.values()), key_fields=('name', 'code', 'concept_id'))
+
+    slots = {}
+    for row in rows:
+        subject_concept_id = concept_ids[excel_ref(row[4], (name_from_excel(row[5]),))]
+        object_concept_id = concept_ids[excel_ref(row[15], (name_from_excel(row[16]),))] if row[15] or row[16] else None
+        subject_id = instance_ids[excel_ref(row[0], (name_from_excel(row[1]), name_from_excel(row[2]), subject_concept_id))]
+        object_id = instance_ids[excel_ref(row[17], (name_from_excel(row[18]), name_from_excel(row[19]), object_concept_id))] if row[17] or row[18] else None
+        relation_id = relation_ids[excel_ref(row[13], (name_from_excel(row[14]),))]
+        predicate_id = predicate_ids[excel_ref(row[10], (relation_id, subject_concept_id, object_concept_id))]
+        value = str(row[21]) if row[21] is not None else None
+        key = (predicate_id, subject_id, object_id, value)
+        slots[excel_ref(row[6], key)] = {'id': row[6] or None, 'key': key, 'values': {
+            'name': name_from_excel(row[7]), 'order': str(row[8] or '0'), 'description': row[9] or '',
+            'predicate_id': predicate_id, 'subject_id': subject_id, 'object_id': object_id, 'value': value}}
+    importer.merge(OSlot, list(slots.values()), key_fields=('predicate_id', 'subject_id', 'object_id', 'value'))
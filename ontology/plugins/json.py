@@ -4,15 +4,17 @@
 {License_info}
 """
 import json
+import logging
 import os
 from uuid import UUID
 
 from django.db import transaction
 
 from ontology.controllers.o_model import ModelUtils
+from ontology.controllers.streaming_export import StreamingExporter
 from ontology.plugins.plugin import CAPABILITY_EXPORT, CAPABILITY_IMPORT, Plugin_v1
 
-
+logger = logging.getLogger(__name__)
 
 
 class GenericEncoder(json.JSONEncoder):
@@ -36,7 +38,8 @@ class JSONPlugin(Plugin_v1):
         with transaction.atomic():
             with open(os.path.join(path, filename), 'r') as f:
                 data = json.load(f)
-                ModelUtils.ontology_from_dict(model, data=data)
+                stats = ModelUtils.ontology_from_dict(model, data=data, bulk=True)
+                logger.info('Imported ontology of model %s: %s', model.id, stats)
 
     def export_ontology(model, path, filename='ontology.json', filters=None):
         with transaction.atomic():
@@ -47,9 +50,10 @@ class JSONPlugin(Plugin_v1):
         with transaction.atomic():
             with open(os.path.join(path, filename), 'r') as f:
                 data = json.load(f)
-                ModelUtils.instances_from_dict(model, data=data)
+                stats = ModelUtils.instances_from_dict(model, data=data, bulk=True)
+                logger.info('Imported instances of model %s: %s', model.id, stats)
 
     def export_instances(model, path, filename='instances.json', filters=None):
         with transaction.atomic():
             with open(os.path.join(path, filename), 'w') as f:
-                json.dump(ModelUtils.instances_to_dict(model, filters=filters), f, cls=GenericEncoder, ensure_ascii=False)
+                StreamingExporter(model, filters=filters).write_instances(f)
@@ -3,17 +3,38 @@ Graph Preset Service for managing architect role presets and layer configuration
 
 This service provides preset configurations for different EA architect roles
 (Business, Application, Data, Technology) and BDAT layer filtering.
+
+The presets of an organisation are kept in the Django cache under
+Organisation.presets_version, incremented in the database on every write to
+their Configuration row so that every process sees it. The concepts and relations
+matching each role and layer are compiled once per model revision and presets
+version, resolving a preset is then a dictionary lookup.
 """
 import json
 from typing import Optional
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+
 from configuration.models import Configuration
+from ontology.controllers.graph_index import GraphIndex
+from ontology.controllers.org_units import (CHILD_TO_PARENT_RELATIONS,
+                                            DEFAULT_OWNERSHIP_RELATION,
+                                            ORG_UNIT_CONCEPT_PATTERN,
+                                            OWNS_RELATIONS,
+                                            PARENT_TO_CHILD_RELATIONS,
+                                            OrgUnitIndex)
 from ontology.models import OModel, OConcept, ORelation, OInstance, OSlot
+from organisation.models import Organisation
 
 
 # Configuration key for graph presets
 GRAPH_PRESETS_CONFIG_NAME = 'graph_presets'
 
+# Cache key prefix of the presets and of their compiled matches
+PRESETS_CACHE_PREFIX = 'graph_presets'
+
 # Default presets for BDAT architect roles
 DEFAULT_PRESETS = {
     "roles": {
@@ -187,18 +208,37 @@ class GraphPresetService:
     @staticmethod
     def get_presets(organisation) -> dict:
         """
-        Get graph presets for an organisation.
+        Get graph presets for an organisation, from the cache when they are in it.
         Returns organisation-specific presets if available, otherwise returns defaults.
 
         Args:
-            organisation: The organisation to get presets for
+            organisation: The organisation, or its ID, to get presets for
+
+        Returns:
+            dict: The presets configuration
+        """
+        organisation_id = getattr(organisation, 'id', organisation)
+        key = '{}:{}:{}'.format(PRESETS_CACHE_PREFIX, organisation_id, GraphPresetService.get_presets_version(organisation_id))
+        presets = cache.get(key)
+        if presets is None:
+            presets = GraphPresetService.read_presets(organisation_id)
+            cache.set(key, presets, settings.GRAPH_PRESETS_CACHE_TIMEOUT)
+        return presets
+
+    @staticmethod
+    def read_presets(organisation_id) -> dict:
+        """
+        Read graph presets for an organisation from the database.
+
+        Args:
+            organisation_id: The ID of the organisation
 
         Returns:
             dict: The presets configuration
         """
         try:
             config = Configuration.objects.get(
-                organisation=organisation,
+                organisation=organisation_id,
                 name=GRAPH_PRESETS_CONFIG_NAME
             )
             if config.content:
@@ -208,6 +248,33 @@ class GraphPresetService:
 
         return DEFAULT_PRESETS
 
+    @staticmethod
+    def get_presets_version(organisation_id) -> int:
+        """
+        Get the version of the cached presets of an organisation.
+
+        The version is read from the database, a per process cache would only see the
+        invalidations of its own process.
+
+        Args:
+            organisation_id: The ID of the organisation
+
+        Returns:
+            int: The presets version, None when the organisation does not exist
+        """
+        return Organisation._base_manager.filter(id=organisation_id).values_list('presets_version', flat=True).first()
+
+    @staticmethod
+    def invalidate_presets(organisation_id) -> None:
+        """
+        Drop the cached presets of an organisation, and the concepts and relations compiled
+        from them.
+
+        Args:
+            organisation_id: The ID of the organisation
+        """
+        Organisation._base_manager.filter(id=organisation_id).update(presets_version=F('presets_version') + 1)
+
     @staticmethod
     def save_presets(organisation, presets: dict) -> Configuration:
         """
@@ -220,15 +287,33 @@ class GraphPresetService:
         Returns:
             Configuration: The saved configuration object
         """
+        ownership_relation = GraphPresetService.get_ownership_relation(GraphPresetService.get_presets(organisation))
         config = Configuration.get_or_create(
             organisation=organisation,
             name=GRAPH_PRESETS_CONFIG_NAME,
             content=presets
         )
         config.content = presets
+        # Drops the cached presets too, see invalidate_presets
         config.save()
+        if GraphPresetService.get_ownership_relation(presets) != ownership_relation:
+            # The ownership pairs of the org unit index come from the ownership relation
+            OrgUnitIndex.rebuild_organisation(organisation)
         return config
 
+    @staticmethod
+    def get_ownership_relation(presets: dict) -> str:
+        """
+        Get the relation name pattern of the "ownedBy" slots of presets.
+
+        Args:
+            presets: The presets configuration
+
+        Returns:
+            str: The ownership relation name pattern
+        """
+        return presets.get('org_unit_config', {}).get('ownership_relation', DEFAULT_OWNERSHIP_RELATION)
+
     @staticmethod
     def get_role_preset(organisation, role_id: str) -> Optional[dict]:
         """
@@ -264,7 +349,7 @@ class GraphPresetService:
     @staticmethod
     def get_concept_ids_for_preset(model: OModel, role_id: str = None, layer_ids: list = None) -> list:
         """
-        Get concept IDs that match a preset configuration.
+        Get concept IDs that match a preset configuration, see get_compiled_presets.
 
         Args:
             model: The OModel to search in
@@ -274,38 +359,22 @@ class GraphPresetService:
         Returns:
             list: List of matching concept IDs
         """
-        presets = GraphPresetService.get_presets(model.organisation)
-        concept_names = set()
-
-        # Collect concept names from role preset
-        if role_id:
-            role = presets.get('roles', {}).get(role_id, {})
-            concept_names.update(role.get('default_concepts', []))
-
-        # Collect concept names from layer presets
-        if layer_ids:
-            for layer_id in layer_ids:
-                layer = presets.get('layers', {}).get(layer_id, {})
-                concept_names.update(layer.get('concepts', []))
-
-        if not concept_names:
+        if not role_id and not layer_ids:
             return []
 
-        # Find matching concepts in the model (case-insensitive partial match)
-        matching_ids = []
-        for concept in OConcept.objects.filter(model=model):
-            concept_name_lower = concept.name.lower()
-            for name in concept_names:
-                if name.lower() in concept_name_lower or concept_name_lower in name.lower():
-                    matching_ids.append(str(concept.id))
-                    break
+        compiled = GraphPresetService.get_compiled_presets(model)
+        matching_ids = set()
+        if role_id:
+            matching_ids.update(compiled['role_concepts'].get(role_id, ()))
+        for layer_id in layer_ids or []:
+            matching_ids.update(compiled['layer_concepts'].get(layer_id, ()))
 
-        return matching_ids
+        return [x for x in compiled['concept_ids'] if x in matching_ids]
 
     @staticmethod
     def get_relation_ids_for_preset(model: OModel, role_id: str = None) -> list:
         """
-        Get relation IDs that match a preset configuration.
+        Get relation IDs that match a preset configuration, see get_compiled_presets.
 
         Args:
             model: The OModel to search in
@@ -317,23 +386,64 @@ class GraphPresetService:
         if not role_id:
             return []
 
-        presets = GraphPresetService.get_presets(model.organisation)
-        role = presets.get('roles', {}).get(role_id, {})
-        relation_names = set(role.get('default_relations', []))
+        compiled = GraphPresetService.get_compiled_presets(model)
+        matching_ids = compiled['role_relations'].get(role_id, frozenset())
 
-        if not relation_names:
-            return []
+        return [x for x in compiled['relation_ids'] if x in matching_ids]
+
+    @staticmethod
+    def get_compiled_presets(model: OModel) -> dict:
+        """
+        Get the concepts and relations of a model matching the roles and layers of the presets
+        of its organisation, compiled once per model revision and presets version.
 
-        # Find matching relations in the model (case-insensitive partial match)
-        matching_ids = []
-        for relation in ORelation.objects.filter(model=model):
-            relation_name_lower = relation.name.lower()
-            for name in relation_names:
-                if name.lower() in relation_name_lower or relation_name_lower in name.lower():
-                    matching_ids.append(str(relation.id))
-                    break
+        Args:
+            model: The OModel
 
-        return matching_ids
+        Returns:
+            dict: See compile_presets
+        """
+        # The model revision and the presets version in one query
+        revision, presets_version = OModel._base_manager.filter(id=model.id).values_list(
+            'revision', 'organisation__presets_version').first() or (None, None)
+        key = '{}:compiled:{}:{}:{}'.format(PRESETS_CACHE_PREFIX, model.id, revision, presets_version)
+        compiled = cache.get(key)
+        if compiled is None:
+            compiled = GraphPresetService.compile_presets(model, GraphPresetService.get_presets(model.organisation_id))
+            cache.set(key, compiled, settings.GRAPH_PRESETS_CACHE_TIMEOUT)
+        return compiled
+
+    @staticmethod
+    def compile_presets(model: OModel, presets: dict) -> dict:
+        """
+        Match the concepts and relations of a model against the names of presets. A name
+        matches when one of them contains the other, case-insensitively.
+
+        Args:
+            model: The OModel
+            presets: The presets configuration
+
+        Returns:
+            dict: 'concept_ids' and 'relation_ids' of the model in their default order,
+            'role_concepts' and 'layer_concepts', the matching concept ID sets by role and layer,
+            and 'role_relations', the matching relation ID sets by role
+        """
+        concepts = [(str(x), y.lower()) for x, y in OConcept._base_manager.filter(model=model).values_list('id', 'name')]
+        relations = [(str(x), y.lower()) for x, y in ORelation._base_manager.filter(model=model).values_list('id', 'name')]
+
+        def matches(items, names):
+            names = {x.lower() for x in names}
+            return frozenset(x for x, item_name in items if any(name in item_name or item_name in name for name in names))
+
+        roles = presets.get('roles', {})
+        layers = presets.get('layers', {})
+        return {
+            'concept_ids': [x for x, y in concepts],
+            'relation_ids': [x for x, y in relations],
+            'role_concepts': {x: matches(concepts, y.get('default_concepts', [])) for x, y in roles.items()},
+            'layer_concepts': {x: matches(concepts, y.get('concepts', [])) for x, y in layers.items()},
+            'role_relations': {x: matches(relations, y.get('default_relations', [])) for x, y in roles.items()},
+        }
 
     @staticmethod
     def get_org_units(model: OModel) -> list:
@@ -347,7 +457,7 @@ class GraphPresetService:
         Returns:
             list: List of org unit dicts with id, name, code, and level
         """
-        presets = GraphPresetService.get_presets(model.organisation)
+        presets = GraphPresetService.get_presets(model.organisation_id)
         org_config = presets.get('org_unit_config', {})
         concept_name = org_config.get('concept_name', 'Organisation Unit')
 
@@ -366,41 +476,34 @@ class GraphPresetService:
             'Unit',
         ]
 
-        org_unit_concepts = []
+        # One query for all the patterns, the units are listed by pattern, then by concept
+        names = Q()
         for pattern in org_unit_patterns:
-            concepts = OConcept.objects.filter(
-                model=model,
-                name__icontains=pattern,
-                native=False  # Exclude native/system concepts
-            )
-            for c in concepts:
-                if c not in org_unit_concepts:
-                    org_unit_concepts.append(c)
-
-        if not org_unit_concepts:
-            return []
-
-        # Get all instances of Organisation Unit concepts
-        org_units = []
-        seen_ids = set()
-        for concept in org_unit_concepts:
-            for instance in OInstance.objects.filter(concept=concept).order_by('name'):
-                if str(instance.id) not in seen_ids:
-                    seen_ids.add(str(instance.id))
-                    org_units.append({
-                        'id': str(instance.id),
-                        'name': instance.name,
-                        'code': instance.code or '',
-                        'concept': concept.name,
-                        'level': 0  # TODO: Calculate hierarchy level from parent relationships
-                    })
-
-        return org_units
+            names |= Q(concept__name__icontains=pattern)
+        instances = OInstance.objects.filter(
+            names,
+            model=model,
+            concept__native=False  # Exclude native/system concepts
+        ).annotate(level=OrgUnitIndex.level()).values('id', 'name', 'code', 'concept_id', 'concept__name', 'level')
+
+        def rank(instance):
+            concept_name = instance['concept__name'].lower()
+            pattern = next(i for i, x in enumerate(org_unit_patterns) if x.lower() in concept_name)
+            return (pattern, concept_name, str(instance['concept_id']), instance['name'])
+
+        return [{
+            'id': str(instance['id']),
+            'name': instance['name'],
+            'code': instance['code'] or '',
+            'concept': instance['concept__name'],
+            'level': instance['level']
+        } for instance in sorted(instances, key=rank)]
 
     @staticmethod
     def get_instances_by_org_unit(model: OModel, org_unit_id: str, include_children: bool = True) -> list:
         """
-        Get instance IDs that are owned by a specific organizational unit.
+        Get instance IDs that are owned by a specific organizational unit, with one query on
+        the org unit index, see OrgUnitIndex.
         Checks multiple ownership patterns:
         - Instance "ownedBy" OrgUnit
         - OrgUnit "owns" Instance
@@ -413,15 +516,23 @@ class GraphPresetService:
         Returns:
             list: List of instance IDs owned by the org unit
         """
-        presets = GraphPresetService.get_presets(model.organisation)
-        org_config = presets.get('org_unit_config', {})
-        ownership_relation = org_config.get('ownership_relation', 'ownedBy')
+        return OrgUnitIndex.owned_instance_ids(model.id, org_unit_id, include_children=include_children)
 
-        try:
-            org_unit = OInstance.objects.get(id=org_unit_id)
-        except OInstance.DoesNotExist:
-            return []
+    @staticmethod
+    def _get_instances_by_org_unit_from_slots(model: OModel, org_unit: OInstance, ownership_relation: str, include_children: bool = True) -> list:
+        """
+        Get instance IDs owned by an org unit from the slots, one unit at a time. Reference
+        implementation of the org unit index.
 
+        Args:
+            model: The OModel to search in
+            org_unit: The org unit instance
+            ownership_relation: Relation name pattern of the "ownedBy" slots
+            include_children: Whether to include instances owned by child org units
+
+        Returns:
+            list: List of instance IDs owned by the org unit
+        """
         owned_instance_ids = set()
 
         # Pattern 1: Instance "ownedBy" OrgUnit (instance is subject, org unit is object)
@@ -437,8 +548,7 @@ class GraphPresetService:
 
         # Pattern 2: OrgUnit "owns" Instance (org unit is subject, instance is object)
         # Also check for "manages", "responsible-for" relationships
-        ownership_patterns = ['owns', 'manages', 'responsible']
-        for pattern in ownership_patterns:
+        for pattern in OWNS_RELATIONS:
             slots_owns = OSlot.objects.filter(
                 model=model,
                 subject=org_unit,
@@ -451,19 +561,37 @@ class GraphPresetService:
 
         if include_children:
             # Get ALL subordinate org units recursively
-            all_subordinates = GraphPresetService._get_all_subordinate_units(model, org_unit)
+            all_subordinates = GraphPresetService._get_all_subordinate_units_from_slots(model, org_unit)
             for subordinate in all_subordinates:
-                subordinate_owned = GraphPresetService.get_instances_by_org_unit(
-                    model, str(subordinate.id), include_children=False
+                subordinate_owned = GraphPresetService._get_instances_by_org_unit_from_slots(
+                    model, subordinate, ownership_relation, include_children=False
                 )
                 owned_instance_ids.update(subordinate_owned)
 
         return list(owned_instance_ids)
 
     @staticmethod
-    def _get_all_subordinate_units(model: OModel, parent_org_unit: OInstance, visited: set = None) -> list:
+    def _get_all_subordinate_units(model: OModel, parent_org_unit: OInstance) -> list:
+        """
+        Get ALL subordinate organizational units, with one query on the org unit index.
+
+        Args:
+            model: The OModel
+            parent_org_unit: The parent org unit instance
+
+        Returns:
+            list: List of all subordinate OInstance objects, nearest first
+        """
+        return list(OInstance.objects.filter(
+            model=model,
+            org_unit_ancestor_links__ancestor=parent_org_unit
+        ).order_by('org_unit_ancestor_links__depth', 'name'))
+
+    @staticmethod
+    def _get_all_subordinate_units_from_slots(model: OModel, parent_org_unit: OInstance, visited: set = None) -> list:
         """
-        Recursively get ALL subordinate organizational units.
+        Recursively get ALL subordinate organizational units from the slots. Reference
+        implementation of the org unit index.
 
         Args:
             model: The OModel
@@ -486,7 +614,7 @@ class GraphPresetService:
 
         # Recursively get subordinates of each child
         for child in direct_children:
-            grandchildren = GraphPresetService._get_all_subordinate_units(model, child, visited)
+            grandchildren = GraphPresetService._get_all_subordinate_units_from_slots(model, child, visited)
             all_subordinates.extend(grandchildren)
 
         return all_subordinates
@@ -506,40 +634,36 @@ class GraphPresetService:
         Returns:
             list: List of child OInstance objects
         """
-        from django.db.models import Q
-
         children = []
         seen_ids = {parent_org_unit.id}  # Exclude parent from results
 
         # Pattern 1: Child points to Parent (child is subject, parent is object)
         # ONLY for "reports-to", "part-of", "belongs-to" type relationships (NOT "contains")
-        child_to_parent_relations = ['reports', 'part-of', 'belongs', 'subordinate', 'member']
         child_to_parent_slots = OSlot.objects.filter(
             model=model,
             object=parent_org_unit,
-            subject__concept__name__icontains='Organisation'
+            subject__concept__name__icontains=ORG_UNIT_CONCEPT_PATTERN
         ).select_related('subject', 'predicate__relation')
 
         for slot in child_to_parent_slots:
             # Skip if this is a "contains" type relationship (parent contains child)
             relation_name = slot.predicate.relation.name.lower()
-            is_child_to_parent = any(r in relation_name for r in child_to_parent_relations)
+            is_child_to_parent = any(r in relation_name for r in CHILD_TO_PARENT_RELATIONS)
             if is_child_to_parent and slot.subject and slot.subject.id not in seen_ids:
                 seen_ids.add(slot.subject.id)
                 children.append(slot.subject)
 
         # Pattern 2: Parent points to Child (parent is subject, child is object)
         # For "contains", "has-department", "has-unit", "includes" type relationships
-        parent_to_child_relations = ['contains', 'has', 'includes', 'comprises']
         parent_to_child_slots = OSlot.objects.filter(
             model=model,
             subject=parent_org_unit,
-            object__concept__name__icontains='Organisation'
+            object__concept__name__icontains=ORG_UNIT_CONCEPT_PATTERN
         ).select_related('object', 'predicate__relation')
 
         for slot in parent_to_child_slots:
             relation_name = slot.predicate.relation.name.lower()
-            is_parent_to_child = any(r in relation_name for r in parent_to_child_relations)
+            is_parent_to_child = any(r in relation_name for r in PARENT_TO_CHILD_RELATIONS)
             if is_parent_to_child and slot.object and slot.object.id not in seen_ids:
                 seen_ids.add(slot.object.id)
                 children.append(slot.object)
@@ -664,30 +788,14 @@ class GraphPresetService:
         if not source_instance_ids:
             return []
 
-        # Convert string IDs to proper format for query
-        source_ids = [str(sid) for sid in source_instance_ids]
+        # Walk the shared graph index: source as subject -> objects, source as object -> subjects
+        index = GraphIndex.for_model(model)
+        concept_codes = index.concept_codes(target_concept_ids)
 
-        # Find slots where source is subject → get objects
-        slots_as_subject = OSlot.objects.filter(
-            model=model,
-            subject__id__in=source_ids
-        ).select_related('object', 'object__concept')
-
-        for slot in slots_as_subject:
-            if slot.object:
-                if target_concept_ids is None or str(slot.object.concept.id) in target_concept_ids:
-                    connected_ids.add(str(slot.object.id))
-
-        # Find slots where source is object → get subjects
-        slots_as_object = OSlot.objects.filter(
-            model=model,
-            object__id__in=source_ids
-        ).select_related('subject', 'subject__concept')
-
-        for slot in slots_as_object:
-            if slot.subject:
-                if target_concept_ids is None or str(slot.subject.concept.id) in target_concept_ids:
-                    connected_ids.add(str(slot.subject.id))
+        for node in index.nodes(source_instance_ids):
+            for edge, neighbour in index.neighbours(node):
+                if concept_codes is None or index.node_concepts[neighbour] in concept_codes:
+                    connected_ids.add(str(index.instance_id(neighbour)))
 
         return list(connected_ids)
 
@@ -0,0 +1,130 @@
+from django.db.models.signals import post_delete, post_save
+from django.db import connection
+from django.dispatch import receiver
+
+from configuration.models import Configuration
+from ontology.controllers.concept_closure import INHERITANCE_TYPES, ConceptClosure
+from ontology.controllers.org_units import OrgUnitIndex
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation, OReport, OSlot
+from ontology.services.graph_presets import GRAPH_PRESETS_CONFIG_NAME, GraphPresetService
+from utils.generic import entities_updated, entity_written
+
+MODEL_ENTITIES = (OConcept, ORelation, OPredicate, OInstance, OSlot, OReport)
+
+# Fields the org unit index depends on, besides the slots
+ORG_UNIT_FIELDS = {
+    OPredicate: ['relation_id'],
+    ORelation: ['name'],
+    OConcept: ['name'],
+    OInstance: ['concept_id'],
+}
+
+
+@receiver(post_save, sender=OPredicate)
+def update_concept_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and instance.get_changes(['subject_id', 'object_id', 'relation_id']):
+        # A rewired predicate can remove inheritance paths
+        ConceptClosure.rebuild(instance.model_id)
+        return
+    if created:
+        edge = ConceptClosure.edge(instance)
+        if edge is not None:
+            ConceptClosure.add_edge(instance.model_id, *edge)
+
+
+@receiver(entity_written)
+def remove_from_concept_closure(sender, instance, pk, action, **kwargs):
+    # Not a post_delete receiver, the predicates removed by a cascade keep their fast delete
+    if action != 'deleted' or sender not in (OPredicate, ORelation, OConcept) or instance.model_id is None:
+        return
+    if sender is OPredicate:
+        if ConceptClosure.edge(instance) is not None:
+            ConceptClosure.rebuild(instance.model_id)
+    elif sender is ORelation:
+        if instance.type in INHERITANCE_TYPES:
+            ConceptClosure.rebuild(instance.model_id)
+    else:
+        # The cascade removed the predicates of the concept without a signal, rebuilt once here
+        ConceptClosure.refresh(instance.model_id)
+
+
+@receiver(post_save, sender=ORelation)
+def update_relation_concept_closure(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created and instance.get_changes(['type']):
+        ConceptClosure.rebuild(instance.model_id)
+
+
+@receiver(post_save, sender=OSlot)
+def update_org_unit_index(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        OrgUnitIndex.add_slot(instance)
+    elif instance.get_changes(['subject_id', 'object_id', 'predicate_id']):
+        # A rewired slot can remove hierarchy paths and ownership pairs
+        OrgUnitIndex.rebuild(instance.model_id)
+
+
+@receiver(entity_written)
+def remove_from_org_unit_index(sender, instance, pk, action, **kwargs):
+    # Not a post_delete receiver, the slots removed by a cascade keep their fast delete
+    if action != 'deleted' or (sender is not OSlot and sender not in ORG_UNIT_FIELDS) or instance.model_id is None:
+        return
+    if sender is OSlot:
+        OrgUnitIndex.remove_slot(instance)
+    elif sender is OInstance:
+        OrgUnitIndex.remove_instance(instance)
+    else:
+        # The cascade removed slots, or instances, of the model without a signal, cleaned once here
+        OrgUnitIndex.refresh(instance.model_id)
+
+
+@receiver(post_save, sender=OPredicate)
+@receiver(post_save, sender=ORelation)
+@receiver(post_save, sender=OConcept)
+@receiver(post_save, sender=OInstance)
+def rebuild_org_unit_index(sender, instance, created, raw=False, **kwargs):
+    # The slots of the index are matched on relation and concept names
+    if not raw and not created and instance.get_changes(ORG_UNIT_FIELDS[sender]):
+        OrgUnitIndex.rebuild(instance.model_id)
+
+
+@receiver(post_save, sender=Configuration)
+@receiver(post_delete, sender=Configuration)
+def invalidate_graph_presets(sender, instance, **kwargs):
+    if instance.name == GRAPH_PRESETS_CONFIG_NAME:
+        GraphPresetService.invalidate_presets(instance.organisation_id)
+
+
+@receiver(entity_written)
+def bump_model_revision(sender, instance, pk, action, **kwargs):
+    if sender in MODEL_ENTITIES and instance.model_id is not None:
+        ModelRevision.bump(instance.model_id, [(sender.get_object_type(), pk, action)])
+    elif sender is OModel:
+        ModelRevision.bump(pk, [(sender.get_object_type(), pk, action)], organisation_id=instance.organisation_id)
+
+
+@receiver(entities_updated, sender=OModel)
+@receiver(entities_updated, sender=OConcept)
+@receiver(entities_updated, sender=ORelation)
+@receiver(entities_updated, sender=OPredicate)
+@receiver(entities_updated, sender=OInstance)
+@receiver(entities_updated, sender=OSlot)
+@receiver(entities_updated, sender=OReport)
+def bump_model_revisions(sender, pks, **kwargs):
+    # QuerySet.update and bulk_update, one bump per model they wrote to
+    object_type = sender.get_object_type()
+    if sender is OModel:
+        for pk in pks:
+            ModelRevision.bump(pk, [(object_type, pk, 'updated')])
+        return
+    changes = {}
+    size = connection.features.max_query_params or len(pks)
+    for i in range(0, len(pks), size):
+        for model_id, pk in sender._base_manager.filter(pk__in=pks[i:i + size], model_id__isnull=False).values_list('model_id', 'pk'):
+            changes.setdefault(model_id, []).append((object_type, pk, 'updated'))
+    for model_id, model_changes in changes.items():
+        ModelRevision.bump(model_id, model_changes)
@@ -0,0 +1,82 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from log.middleware.request import local_thread
+from ontology.controllers.batch_serializer import BatchSerializer
+from ontology.controllers.o_model import ModelUtils
+from ontology.models import (OConcept, OInstance, OModel, OPredicate,
+                             ORelation, OSlot)
+from utils.test.helpers import (
+    add_object_type_accesspermissions_to_security_group,
+    populate_test_env,
+)
+
+
+class BatchSerializerTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def tearDown(self):
+        local_thread.request = None
+
+    def add_slots(self, count):
+        for i in range(count):
+            instance = OInstance.objects.create(name='new_{}'.format(i), model=self.org_1_model_1, organisation=self.org_1, concept=self.org_1_predicate_1.subject)
+            OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=instance, predicate=self.org_1_predicate_1, object=self.org_1_instance_2)
+
+    def test_same_dicts(self):
+        model = self.org_1_model_1
+        self.assertEqual(BatchSerializer.concepts(OConcept.objects.filter(model=model)), [ModelUtils.concept_to_dict(x) for x in OConcept.objects.filter(model=model)])
+        self.assertEqual(BatchSerializer.relations(ORelation.objects.filter(model=model)), [ModelUtils.relation_to_dict(x) for x in ORelation.objects.filter(model=model)])
+        self.assertEqual(BatchSerializer.predicates(OPredicate.objects.filter(model=model)), [ModelUtils.predicate_to_dict(x) for x in OPredicate.objects.filter(model=model)])
+        self.assertEqual(BatchSerializer.instances(OInstance.objects.filter(model=model).order_by('name')), [ModelUtils.instance_to_dict(x) for x in OInstance.objects.filter(model=model).order_by('name')])
+        self.assertEqual(BatchSerializer.slots(OSlot.objects.filter(model=model)), [ModelUtils.slot_to_dict(x) for x in OSlot.objects.filter(model=model)])
+
+        # Lists keep their order
+        slots = list(OSlot.objects.filter(model=model))[::-1]
+        self.assertEqual(BatchSerializer.slots(slots), [ModelUtils.slot_to_dict(x) for x in slots])
+
+    def test_query_count(self):
+        model = self.org_1_model_1
+        # Rows, then one lookup per table: concepts, and slots, predicates, concepts, relations, instances
+        with self.assertNumQueries(7):
+            BatchSerializer.instances(OInstance.objects.filter(model=model))
+        self.add_slots(20)
+        with self.assertNumQueries(7):
+            BatchSerializer.instances(OInstance.objects.filter(model=model))
+        with self.assertNumQueries(5):
+            BatchSerializer.slots(OSlot.objects.filter(model=model))
+        with self.assertNumQueries(3):
+            BatchSerializer.predicates(OPredicate.objects.filter(model=model))
+
+    def test_filter_view(self):
+        for object_type in [OModel.get_object_type(), OConcept.get_object_type(), ORelation.get_object_type(),
+                            OPredicate.get_object_type(), OInstance.get_object_type(), OSlot.get_object_type()]:
+            add_object_type_accesspermissions_to_security_group(organisation=self.org_1, security_group=self.org_1_security_group_1, object_type=object_type)
+        self.client.login(username='org_1_user_1', password='12345')
+        self.client.post(reverse('profile_activate', kwargs={'pk': str(self.org_1_user_1_profile.id)}))
+        model = self.org_1_model_1
+        data = json.dumps({
+            'model_id': str(model.id),
+            'concept_ids': [str(x) for x in OConcept.objects.filter(model=model).values_list('id', flat=True)],
+            'relation_ids': [str(x) for x in ORelation.objects.filter(model=model).values_list('id', flat=True)],
+        })
+        url = reverse('o_model_filter_json', kwargs={'model_id': model.id})
+
+        def post():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, data=data, content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+            return response.json(), len(queries)
+
+        # The first request fills the access control cache
+        post()
+        result, count = post()
+        self.add_slots(20)
+        bigger, bigger_count = post()
+        self.assertEqual(len(bigger['slots']), len(result['slots']) + 20)
+        self.assertEqual(bigger_count, count)
@@ -0,0 +1,72 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from log.models import Log
+from ontology.controllers.bulk_import import BulkImporter
+from ontology.controllers.o_model import ModelUtils
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+from ontology.plugins.json import GenericEncoder
+from utils.test.helpers import populate_test_env
+
+
+class BulkImporterTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        # Round-trip through JSON so the payload looks like an uploaded file
+        self.ontology = json.loads(json.dumps(ModelUtils.ontology_to_dict(self.org_1_model_1), cls=GenericEncoder))
+        self.instances = json.loads(json.dumps(ModelUtils.instances_to_dict(self.org_1_model_1), cls=GenericEncoder))
+
+    def counts(self, model):
+        return [x.objects.filter(model=model).count() for x in (OConcept, ORelation, OPredicate, OInstance, OSlot)]
+
+    def test_import_into_other_model(self):
+        # One importer for both payloads, so instances follow the remapped ontology ids
+        importer = BulkImporter(self.org_1_model_2)
+        stats = importer.import_ontology(self.ontology)
+        importer.import_instances(self.instances)
+        self.assertEqual(self.counts(self.org_1_model_2), self.counts(self.org_1_model_1))
+        self.assertEqual(stats.counts['OConcept']['created'], len(self.ontology['concepts']))
+
+        # Ids already used by the source model are not reused, references follow the new ids
+        slot = OSlot.objects.get(model=self.org_1_model_2, subject__name='org_1_instance_2', object__name='org_1_instance_3')
+        self.assertNotEqual(slot.id, self.model_1_slot_2.id)
+        self.assertEqual(slot.predicate.model, self.org_1_model_2)
+        self.assertEqual(slot.subject.concept.model, self.org_1_model_2)
+        self.assertEqual(slot.organisation, self.org_1_model_2.organisation)
+
+    def test_reimport_updates_in_place(self):
+        counts = self.counts(self.org_1_model_1)
+        self.ontology['concepts'][str(self.org_1_concept_1.id)]['description'] = 'changed'
+
+        log_count = Log.objects.count()
+        stats = ModelUtils.ontology_from_dict(self.org_1_model_1, data=self.ontology, bulk=True)
+        ModelUtils.instances_from_dict(self.org_1_model_1, data=self.instances, bulk=True)
+
+        self.assertEqual(self.counts(self.org_1_model_1), counts)
+        self.assertEqual(stats.counts['OConcept']['updated'], 1)
+        self.assertEqual(stats.counts['OConcept']['unchanged'], len(self.ontology['concepts']) - 1)
+        self.org_1_concept_1.refresh_from_db()
+        self.assertEqual(self.org_1_concept_1.description, 'changed')
+
+        log = Log.objects.filter(target=self.org_1_concept_1.id).order_by('-timestamp').first()
+        self.assertEqual(Log.objects.count(), log_count + 1)
+        self.assertEqual(log.source, 'BulkImporter:updated OConcept')
+
+    def test_queries_do_not_grow_with_rows(self):
+        importer = BulkImporter(self.org_1_model_2, chunk_size=1000)
+        with CaptureQueriesContext(connection) as context:
+            importer.import_ontology(self.ontology)
+            importer.import_instances(self.instances)
+        # Includes the revision and change feed writes of both flushes, and the org unit index rebuild
+        self.assertLess(len(context.captured_queries), 45)
+        self.assertGreater(importer.stats.rows_per_second, 0)
+
+    def test_missing_reference(self):
+        concept_id = self.instances['instances'][str(self.org_1_instance_1.id)]['concept_id']
+        self.instances['instances'][str(self.org_1_instance_1.id)]['concept_id'] = str(self.org_1_model_1.id)
+        with self.assertRaises(OConcept.DoesNotExist):
+            ModelUtils.instances_from_dict(self.org_1_model_1, data=self.instances, bulk=True)
+        self.assertNotEqual(concept_id, str(self.org_1_model_1.id))
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from log.middleware.request import local_thread
+from ontology.controllers.bulk_import import BulkImporter
+from ontology.controllers.model_copy import ModelCopier
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OChange, OConcept, OModel
+from organisation.models import Organisation
+from utils.test.helpers import populate_test_env
+
+
+class ChangeFeedTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def tearDown(self):
+        # The API requests leave their request in the thread
+        local_thread.request = None
+
+    def feed(self, model, since):
+        return [(x['object_type'], x['target'], x['action']) for x in ModelRevision.changes(model_id=model.id, since=since)]
+
+    def test_changes(self):
+        model = self.org_1_model_1
+        revision = ModelRevision.get(model.id)
+        organisation_revision = ModelRevision.get_organisation(self.org_1.id)
+
+        concept = OConcept.objects.create(name='new', model=model, organisation=self.org_1)
+        concept.description = 'changed'
+        concept.save()
+        concept_id = concept.id
+        concept.delete()
+        self.assertEqual(ModelRevision.get(model.id), revision + 3)
+        self.assertEqual(ModelRevision.get_organisation(self.org_1.id), organisation_revision + 3)
+        self.assertEqual(self.feed(model, revision), [('OCONCEPT', concept_id, x) for x in ('created', 'updated', 'deleted')])
+        self.assertEqual(self.feed(model, revision + 2), [('OCONCEPT', concept_id, 'deleted')])
+
+        # The organisation feed interleaves its models, by organisation revision
+        self.org_1_concept_1.save()
+        self.org_1_model_2.save()
+        changes = ModelRevision.changes(organisation_id=self.org_1.id, since=organisation_revision + 3)
+        self.assertEqual([(x['model_id'], x['organisation_revision']) for x in changes],
+                         [(model.id, organisation_revision + 4), (self.org_1_model_2.id, organisation_revision + 5)])
+
+        # Saving an organisation or a model loaded before the increments does not write a stale revision back
+        self.org_1.description = 'changed'
+        self.org_1.save()
+        self.assertEqual(ModelRevision.get_organisation(self.org_1.id), organisation_revision + 5)
+        self.assertEqual(Organisation.objects.get(id=self.org_1.id).description, 'changed')
+
+        # The feed of a deleted model ends with its deletion
+        model_id = model.id
+        revision = ModelRevision.get(model_id)
+        model.delete()
+        feed = ModelRevision.feed(model_id=model_id, since=revision)
+        self.assertEqual(feed['revision'], revision + 1)
+        self.assertEqual([(x['object_type'], x['action']) for x in feed['changes']], [('OMODEL', 'deleted')])
+
+    def test_queryset_updates(self):
+        model = self.org_1_model_1
+        revision = ModelRevision.get(model.id)
+        other_revision = ModelRevision.get(self.org_1_model_2.id)
+
+        # One bump per update, listing the updated rows
+        rows = OConcept.objects.filter(id__in=[self.org_1_concept_1.id, self.org_1_concept_2.id]).update(description='changed')
+        self.assertEqual(rows, 2)
+        self.assertEqual(ModelRevision.get(model.id), revision + 1)
+        self.assertEqual(sorted(self.feed(model, revision)), sorted(('OCONCEPT', x.id, 'updated') for x in (self.org_1_concept_1, self.org_1_concept_2)))
+
+        concepts = [self.org_1_concept_1, self.org_1_concept_2]
+        for concept in concepts:
+            concept.name = concept.name + ' renamed'
+        OConcept.objects.bulk_update(concepts, ['name'])
+        self.assertEqual(ModelRevision.get(model.id), revision + 2)
+
+        # Nothing matched, nothing bumped, and the other models keep their revision
+        OConcept.objects.filter(id__in=[]).update(description='changed')
+        self.assertEqual(ModelRevision.get(model.id), revision + 2)
+        self.assertEqual(ModelRevision.get(self.org_1_model_2.id), other_revision)
+
+    def test_bulk_paging(self):
+        model = self.org_1_model_1
+        revision = ModelRevision.get(model.id)
+        BulkImporter(model).import_ontology({'concepts': {str(i): {'id': None, 'name': 'new_{}'.format(i)} for i in range(5)}})
+        self.assertEqual(ModelRevision.get(model.id), revision + 1)
+        self.assertEqual(OChange.objects.filter(model=model, revision=revision + 1).count(), 5)
+
+        # The five changes share a revision, pages follow the id within it
+        read = []
+        since, after = revision, None
+        while True:
+            page = ModelRevision.feed(model_id=model.id, since=since, after=after, limit=2)
+            self.assertFalse(page['reset'])
+            read.extend(x['target'] for x in page['changes'])
+            since, after = page['since'], page['after']
+            if not page['more']:
+                break
+        self.assertEqual(sorted(read), sorted(OConcept.objects.filter(model=model, name__startswith='new_').values_list('id', flat=True)))
+        self.assertEqual((since, after), (revision + 1, None))
+        self.assertEqual(ModelRevision.feed(model_id=model.id, since=since)['changes'], [])
+
+    def test_copy_and_prune(self):
+        copy = ModelCopier(self.org_1_model_1, user=self.org_1_user_1).copy()
+        self.assertEqual(ModelRevision.get(copy.id), 1)
+        self.assertEqual(self.feed(copy, 0), [('OMODEL', copy.id, 'created')])
+
+        revision = ModelRevision.get(self.org_1_model_1.id)
+        self.org_1_concept_1.save()
+        old = OChange.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.org_1_concept_1.save()
+        self.assertEqual(ModelRevision.prune(timezone.now() - timedelta(days=1)), old)
+
+        # A client behind the pruned changes reloads, one that read them goes on
+        self.assertTrue(ModelRevision.feed(model_id=self.org_1_model_1.id, since=revision)['reset'])
+        feed = ModelRevision.feed(model_id=self.org_1_model_1.id, since=revision + 1)
+        self.assertFalse(feed['reset'])
+        self.assertEqual(len(feed['changes']), 1)
+        self.assertTrue(ModelRevision.feed(model_id=self.org_1_model_1.id, since=revision + 5)['reset'])
+
+    def test_api(self):
+        self.org_1_user_1_profile.is_active = True
+        self.org_1_user_1_profile.save()
+        client = APIClient()
+        client.login(username='org_1_user_1', password='12345')
+        revision = ModelRevision.get(self.org_1_model_1.id)
+        self.org_1_concept_1.save()
+
+        response = client.get('/api/rest/model/{}/changes/'.format(self.org_1_model_1.id), {'since': revision}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual(data['revision'], revision + 1)
+        self.assertEqual([(x['object_type'], x['target']) for x in data['changes']], [('OCONCEPT', str(self.org_1_concept_1.id))])
+
+        response = client.get('/api/rest/changes/', {'since': ModelRevision.get_organisation(self.org_1.id) - 1}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['changes']), 1)
+
+        self.assertEqual(client.get('/api/rest/changes/', {'since': 'x'}, format='json').status_code, 400)
+        other = OModel.objects.create(name='other', organisation=Organisation.objects.create(name='org_other'))
+        self.assertEqual(client.get('/api/rest/model/{}/changes/'.format(other.id), format='json').status_code, 404)
@@ -0,0 +1,82 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ontology.controllers.concept_closure import ConceptClosure
+from ontology.controllers.utils import KnowledgeBaseUtils
+from ontology.models import OConceptClosure, ORelation
+from utils.test.helpers import create_concept, create_predicate, populate_test_env
+
+
+class ConceptClosureTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def closure(self):
+        return set(OConceptClosure.objects.filter(model=self.org_1_model_1).values_list('ancestor__name', 'descendant__name', 'depth'))
+
+    def test_maintained_on_predicate_save_and_delete(self):
+        self.assertEqual(self.closure(), {
+            ('org_1_concept_3', 'org_1_concept_2', 1),
+            ('org_1_concept_0', 'org_1_concept_1', 1),
+            ('org_1_concept_1', 'org_1_concept_4', 1),
+            ('org_1_concept_0', 'org_1_concept_4', 2),
+        })
+
+        # A diamond: concept_4 reaches concept_0 through concept_1 and directly
+        predicate = create_predicate(model=self.org_1_model_1, subject=self.org_1_concept_0, relation=self.org_1_relation_3, object=self.org_1_concept_4)
+        self.assertIn(('org_1_concept_0', 'org_1_concept_4', 1), self.closure())
+        parents = KnowledgeBaseUtils.get_parent_concepts(concept=self.org_1_concept_4)
+        self.assertEqual(parents, [(self.org_1_concept_0, 0), (self.org_1_concept_1, 0)])
+
+        predicate.delete()
+        self.assertIn(('org_1_concept_0', 'org_1_concept_4', 2), self.closure())
+
+        # Rewiring concept_1 under concept_3 moves concept_4 along
+        self.org_1_predicate_4.object = self.org_1_concept_3
+        self.org_1_predicate_4.save()
+        self.assertEqual(self.closure(), {
+            ('org_1_concept_3', 'org_1_concept_2', 1),
+            ('org_1_concept_3', 'org_1_concept_1', 1),
+            ('org_1_concept_1', 'org_1_concept_4', 1),
+            ('org_1_concept_3', 'org_1_concept_4', 2),
+        })
+
+        # A relation no longer describing inheritance
+        self.org_1_relation_2.type = ORelation.PROPERTY
+        self.org_1_relation_2.save()
+        self.assertEqual(self.closure(), {('org_1_concept_1', 'org_1_concept_4', 1)})
+
+    def test_rebuilt_once_per_cascade(self):
+        for i in range(30):
+            concept = create_concept(model=self.org_1_model_1, name='extra_{}'.format(i))
+            create_predicate(model=self.org_1_model_1, subject=self.org_1_concept_4, relation=self.org_1_relation_3, object=concept)
+
+        # The predicates of a deleted relation go with it in a fast delete, whatever their number
+        with CaptureQueriesContext(connection) as context:
+            self.org_1_relation_3.delete()
+        self.assertLess(len(context.captured_queries), 20)
+        self.assertEqual(self.closure(), {('org_1_concept_3', 'org_1_concept_2', 1), ('org_1_concept_0', 'org_1_concept_1', 1)})
+
+        # The paths through a deleted concept
+        self.org_1_concept_1.delete()
+        self.assertEqual(self.closure(), {('org_1_concept_3', 'org_1_concept_2', 1)})
+        closure = self.closure()
+        ConceptClosure.rebuild(self.org_1_model_1.id)
+        self.assertEqual(self.closure(), closure)
+
+    def test_cycle(self):
+        concept_5 = create_concept(model=self.org_1_model_1, name='org_1_concept_5')
+        create_predicate(model=self.org_1_model_1, subject=concept_5, relation=self.org_1_relation_2, object=self.org_1_concept_4)
+        create_predicate(model=self.org_1_model_1, subject=self.org_1_concept_0, relation=self.org_1_relation_2, object=concept_5)
+        self.assertEqual(ConceptClosure.rebuild(self.org_1_model_1.id), len(self.closure()))
+        # Every concept of the cycle is an ancestor of concept_0, but not concept_0 itself
+        self.assertEqual([(x.name, depth) for x, depth in ConceptClosure.ancestors(self.org_1_concept_0)],
+                         [('org_1_concept_5', 1), ('org_1_concept_4', 2), ('org_1_concept_1', 3)])
+
+    def test_lineage_is_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            children = KnowledgeBaseUtils.get_child_concepts(concept=self.org_1_concept_0)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(children, [(self.org_1_concept_1, 0), (self.org_1_concept_4, 1)])
+        self.assertEqual(KnowledgeBaseUtils.get_child_concepts(concept=self.org_1_concept_0, max_level=0), [(self.org_1_concept_1, 0)])
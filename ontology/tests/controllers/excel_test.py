@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+from ontology.plugins.excel import INSTANCE_COLUMNS, ExcelPlugin
+from utils.test.helpers import create_instance, create_slot, populate_test_env
+
+
+class ExcelPluginTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def counts(self, model):
+        return [x.objects.filter(model=model).count() for x in (OConcept, ORelation, OPredicate, OInstance, OSlot)]
+
+    def test_export_instances(self):
+        ExcelPlugin.export_instances(self.org_1_model_1, self.path)
+        ws = load_workbook(self.path + '/instances.xlsx')['instances']
+        self.assertEqual([x.value for x in ws[1]], INSTANCE_COLUMNS)
+        self.assertEqual(ws['A1'].style, 'openea_header')
+        self.assertEqual(ws.max_row, OSlot.objects.filter(model=self.org_1_model_1).count() + 1)
+        self.assertEqual(ws.tables['instances'].ref, 'A1:V{}'.format(ws.max_row))
+
+    def test_round_trip_into_other_model(self):
+        ExcelPlugin.export_ontology(self.org_1_model_1, self.path)
+        ExcelPlugin.export_instances(self.org_1_model_1, self.path)
+        ExcelPlugin.import_instances(self.org_1_model_2, self.path)
+
+        slot = OSlot.objects.get(model=self.org_1_model_2, subject__name='org_1_instance_2', object__name='org_1_instance_3')
+        self.assertNotEqual(slot.id, self.model_1_slot_2.id)
+        self.assertEqual(slot.predicate.model, self.org_1_model_2)
+        self.assertEqual(slot.predicate.relation.name, self.org_1_relation_2.name)
+        self.assertEqual(OSlot.objects.filter(model=self.org_1_model_2).count(), OSlot.objects.filter(model=self.org_1_model_1).count())
+
+        # Importing again matches every row instead of duplicating it
+        counts = self.counts(self.org_1_model_2)
+        ExcelPlugin.import_instances(self.org_1_model_2, self.path)
+        self.assertEqual(self.counts(self.org_1_model_2), counts)
+
+    def test_round_trip_of_value_slots(self):
+        predicate = OPredicate.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=self.org_1_concept_1, relation=self.org_1_relation_1)
+        OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=self.org_1_instance_1, predicate=predicate, value='42')
+        OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=self.org_1_instance_1, predicate=self.org_1_predicate_1, value='Free text')
+        ExcelPlugin.export_instances(self.org_1_model_1, self.path)
+        ExcelPlugin.import_instances(self.org_1_model_2, self.path)
+
+        slots = OSlot.objects.filter(model=self.org_1_model_2, object__isnull=True)
+        self.assertEqual(set(slots.values_list('subject__name', 'predicate__object__name', 'value')),
+                         {('org_1_instance_1', None, '42'), ('org_1_instance_1', self.org_1_predicate_1.object.name, 'Free text')})
+        # No blank concept, instance or slot object stands in for the missing object
+        self.assertFalse(OConcept.objects.filter(model=self.org_1_model_2, name='').exists())
+        self.assertFalse(OInstance.objects.filter(model=self.org_1_model_2, name='').exists())
+        self.assertEqual(OSlot.objects.filter(model=self.org_1_model_2).count(), OSlot.objects.filter(model=self.org_1_model_1).count())
+
+        counts = self.counts(self.org_1_model_2)
+        ExcelPlugin.import_instances(self.org_1_model_2, self.path)
+        self.assertEqual(self.counts(self.org_1_model_2), counts)
+
+    def test_reimport_into_same_model(self):
+        counts = self.counts(self.org_1_model_1)
+        ExcelPlugin.export_ontology(self.org_1_model_1, self.path)
+        ExcelPlugin.export_instances(self.org_1_model_1, self.path)
+        ExcelPlugin.import_ontology(self.org_1_model_1, self.path)
+        ExcelPlugin.import_instances(self.org_1_model_1, self.path)
+        self.assertEqual(self.counts(self.org_1_model_1), counts)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def run():
+            with CaptureQueriesContext(connection) as context:
+                ExcelPlugin.export_instances(self.org_1_model_1, self.path)
+                ExcelPlugin.import_instances(self.org_1_model_2, self.path)
+            return len(context.captured_queries)
+
+        query_count = run()
+        for i in range(20):
+            instance = create_instance(model=self.org_1_model_1, concept=self.org_1_concept_2, name='extra_{}'.format(i))
+            create_slot(model=self.org_1_model_1, subject=self.org_1_instance_1, predicate=self.org_1_predicate_1, object=instance)
+        self.assertLessEqual(run(), query_count + 5)
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+
+from authorization.controllers.acl import Acl
+from ontology.controllers.bulk_import import BulkImporter
+from ontology.controllers.graph_cache import GraphRenderCache
+from ontology.controllers.revision import ModelRevision
+from ontology.models import OConcept, OModel, OSlot
+from ontology.services.graph_presets import DEFAULT_PRESETS, GraphPresetService
+from utils.test.helpers import populate_test_env
+
+
+class GraphRenderCacheTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        cache.clear()
+        self.user = self.org_1_user_1
+        self.user.active_profile = self.org_1_user_1_profile
+        self.user.organisation = self.org_1
+        self.user.acl = Acl(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_revision(self):
+        model_id = self.org_1_model_1.id
+        revision = ModelRevision.get(model_id)
+        self.org_1_concept_1.description = 'changed'
+        self.org_1_concept_1.save()
+        self.assertEqual(ModelRevision.get(model_id), revision + 1)
+        OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=self.org_1_instance_1, predicate=self.org_1_predicate_1, object=self.org_1_instance_2)
+        self.assertEqual(ModelRevision.get(model_id), revision + 2)
+        # Cascaded slot deletes do not bump one by one
+        self.org_1_instance_1.delete()
+        self.assertEqual(ModelRevision.get(model_id), revision + 3)
+
+        # Saving a model loaded before the bumps does not write its stale revision back
+        self.org_1_model_1.name = 'renamed'
+        self.org_1_model_1.save()
+        self.assertEqual(ModelRevision.get(model_id), revision + 4)
+        self.assertEqual(OModel.objects.get(id=model_id).name, 'renamed')
+
+        # One bump per import, none when nothing changed
+        importer = BulkImporter(self.org_1_model_1)
+        importer.import_ontology({'concepts': {'1': {'id': None, 'name': 'new'}, '2': {'id': None, 'name': 'other'}}})
+        self.assertEqual(ModelRevision.get(model_id), revision + 5)
+        BulkImporter(self.org_1_model_1).import_ontology({'concepts': {'1': {'id': None, 'name': 'new'}}})
+        self.assertEqual(ModelRevision.get(model_id), revision + 5)
+        self.assertEqual(OConcept.objects.filter(model=self.org_1_model_1, name='new').count(), 1)
+
+    def test_key(self):
+        data = {'knowledge_set': 'instances', 'concept_ids': [str(self.org_1_concept_2.id), str(self.org_1_concept_1.id)]}
+        key = GraphRenderCache.key(self.org_1_model_1, data, self.user)
+        reordered = {'concept_ids': [str(self.org_1_concept_1.id), str(self.org_1_concept_2.id), str(self.org_1_concept_1.id)], 'knowledge_set': 'instances'}
+        self.assertEqual(GraphRenderCache.key(self.org_1_model_1, reordered, self.user), key)
+        self.assertNotEqual(GraphRenderCache.key(self.org_1_model_1, dict(data, display_mode='strict'), self.user), key)
+        self.assertNotEqual(GraphRenderCache.key(self.org_1_model_2, data, self.user), key)
+
+        self.org_1_concept_1.save()
+        self.assertNotEqual(GraphRenderCache.key(self.org_1_model_1, data, self.user), key)
+
+        # Renders made with the former presets are not served
+        key = GraphRenderCache.key(self.org_1_model_1, data, self.user)
+        GraphPresetService.save_presets(self.org_1, dict(DEFAULT_PRESETS, layers={}))
+        self.assertNotEqual(GraphRenderCache.key(self.org_1_model_1, data, self.user), key)
+
+    def test_presets_invalidation_across_processes(self):
+        data = {'knowledge_set': 'instances', 'concept_ids': [str(self.org_1_concept_1.id)]}
+        # Each worker process has a cache of its own
+        caches = [LocMemCache('graph-test-{}'.format(i), {}) for i in range(2)]
+        for process_cache in caches:
+            process_cache.clear()
+            key = GraphRenderCache.key(self.org_1_model_1, data, self.user)
+            self.assertEqual(GraphRenderCache.get_or_render(key, lambda: '<svg>old</svg>', cache=process_cache), '<svg>old</svg>')
+
+        # Presets saved in one process, neither serves the renders made with the former ones
+        GraphPresetService.save_presets(self.org_1, dict(DEFAULT_PRESETS, layers={}))
+        for process_cache in caches:
+            key = GraphRenderCache.key(self.org_1_model_1, data, self.user)
+            self.assertEqual(GraphRenderCache.get_or_render(key, lambda: '<svg>new</svg>', cache=process_cache), '<svg>new</svg>')
+
+    def test_get_or_render(self):
+        renders = []
+
+        def render():
+            renders.append(1)
+            return '<svg/>'
+
+        self.assertEqual(GraphRenderCache.get_or_render('graph:test', render), '<svg/>')
+        self.assertEqual(GraphRenderCache.get_or_render('graph:test', render), '<svg/>')
+        self.assertEqual(len(renders), 1)
+
+        # A render in progress elsewhere is waited for, then taken over once its lock expired
+        cache.add('graph:other:lock', 1, 60)
+        self.assertEqual(GraphRenderCache.get_or_render('graph:other', render, lock_timeout=0.3), '<svg/>')
+        self.assertEqual(len(renders), 2)
+        self.assertEqual(cache.get('graph:other:lock'), 1)
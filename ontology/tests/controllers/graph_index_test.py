@@ -0,0 +1,81 @@
+from django.test import TestCase
+
+from ontology.controllers.graph_index import (DIRECTION_IN, DIRECTION_OUT,
+                                              GraphIndex)
+from ontology.models import OSlot
+from utils.test.helpers import create_instance, create_slot, populate_test_env
+
+
+class GraphIndexTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        GraphIndex.invalidate()
+
+    def neighbour_ids(self, index, instance, **kwargs):
+        return {index.instance_id(x[1]) for x in index.neighbours(index.node(instance.id), **kwargs)}
+
+    def test_build(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        self.assertEqual(index.node_count, 9)
+        self.assertEqual(index.edge_count, 4)
+        self.assertEqual(len(index.out_offsets), index.node_count + 1)
+        self.assertEqual(sorted(index.out_edges), list(range(index.edge_count)))
+        self.assertEqual(sorted(index.in_edges), list(range(index.edge_count)))
+        self.assertEqual(index.concept_id(index.node(self.org_1_instance_2.id)), self.org_1_concept_2.id)
+
+    def test_neighbours(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_1), {self.org_1_instance_0.id, self.org_1_instance_2.id, self.org_1_instance_4.id})
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_2, direction=DIRECTION_OUT), {self.org_1_instance_3.id})
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_2, direction=DIRECTION_IN), {self.org_1_instance_1.id})
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_8), set())
+
+    def test_neighbours_filtered(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        relation_codes = index.relation_codes([str(self.org_1_relation_1.id)])
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_1, relation_codes=relation_codes), {self.org_1_instance_2.id})
+        predicate_codes = index.predicate_codes([self.org_1_predicate_3.id])
+        self.assertEqual(self.neighbour_ids(index, self.org_1_instance_1, predicate_codes=predicate_codes), {self.org_1_instance_4.id})
+
+    def test_cached_per_model(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        self.assertIs(GraphIndex.for_model(self.org_1_model_1.id), index)
+        self.assertEqual(GraphIndex.for_model(self.org_1_model_2).node_count, 0)
+
+    def test_rebuilt_when_slots_change(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        create_slot(model=self.org_1_model_1, subject=self.org_1_instance_7, predicate=self.org_1_predicate_2, object=self.org_1_instance_8)
+        rebuilt = GraphIndex.for_model(self.org_1_model_1)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.edge_count, 5)
+        self.assertEqual(self.neighbour_ids(rebuilt, self.org_1_instance_8), {self.org_1_instance_7.id})
+
+        self.model_1_slot_1.delete()
+        self.assertEqual(GraphIndex.for_model(self.org_1_model_1).edge_count, 4)
+
+    def test_rebuilt_when_slots_are_rewired(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        self.assertNotIn(self.org_1_instance_8.id, self.neighbour_ids(index, self.org_1_instance_1))
+
+        # Neither the counts nor modified_at change, outside of a request and with a queryset update
+        OSlot.objects.filter(id=self.model_1_slot_1.id).update(object=self.org_1_instance_8)
+        self.assertIn(self.org_1_instance_8.id, self.neighbour_ids(GraphIndex.for_model(self.org_1_model_1), self.org_1_instance_1))
+
+        slot = OSlot.objects.get(id=self.model_1_slot_1.id)
+        slot.object = self.org_1_instance_7
+        slot.save()
+        self.assertIn(self.org_1_instance_7.id, self.neighbour_ids(GraphIndex.for_model(self.org_1_model_1), self.org_1_instance_1))
+
+    def test_rebuilt_when_instances_change(self):
+        GraphIndex.for_model(self.org_1_model_1)
+        instance = create_instance(model=self.org_1_model_1, concept=self.org_1_concept_0, name='org_1_instance_9')
+        index = GraphIndex.for_model(self.org_1_model_1)
+        self.assertEqual(index.concept_id(index.node(instance.id)), self.org_1_concept_0.id)
+
+    def test_materialisation(self):
+        index = GraphIndex.for_model(self.org_1_model_1)
+        edges = [x[0] for x in index.neighbours(index.node(self.org_1_instance_1.id))]
+        slots = index.slots(edges)
+        self.assertEqual({x.id for x in slots.values()}, {self.model_1_slot_1.id, self.model_1_slot_3.id, self.model_1_slot_4.id})
+        instances = index.instances([index.node(self.org_1_instance_3.id)])
+        self.assertEqual(list(instances.values()), [self.org_1_instance_3])
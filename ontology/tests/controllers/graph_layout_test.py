@@ -0,0 +1,97 @@
+import math
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from authorization.controllers.acl import Acl
+from ontology.controllers.graph_layout import (INCREMENTAL_SHARE,
+                                               NODE_DISTANCE, GraphLayout)
+from ontology.controllers.impact_analysis import ImpactAnalysis
+from ontology.models import OInstance, OSlot
+from utils.test.helpers import populate_test_env
+
+
+class GraphLayoutTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        cache.clear()
+        self.user = self.org_1_user_1
+        self.user.active_profile = self.org_1_user_1_profile
+        self.user.organisation = self.org_1
+        self.user.acl = Acl(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def chain(self, size):
+        nodes = [str(i) for i in range(size)]
+        return nodes, [(str(i), str(i + 1)) for i in range(size - 1)]
+
+    def test_compute(self):
+        nodes, edges = self.chain(40)
+        positions = GraphLayout.compute(nodes, edges)
+        self.assertEqual(set(positions), set(nodes))
+        self.assertEqual(GraphLayout.compute(nodes, edges), positions)
+        # Linked nodes end up closer than the average pair
+        linked = sum(math.dist(positions[x], positions[y]) for x, y in edges) / len(edges)
+        pairs = [(x, y) for x in nodes for y in nodes if x < y]
+        self.assertLess(linked, sum(math.dist(positions[x], positions[y]) for x, y in pairs) / len(pairs))
+
+        # A small change moves the new nodes only, next to their neighbours
+        updated = GraphLayout.compute(nodes[1:] + ['new', 'island'], edges[1:] + [('new', '5')], previous=positions)
+        self.assertEqual({x: updated[x] for x in nodes[1:]}, {x: positions[x] for x in nodes[1:]})
+        self.assertNotIn('0', updated)
+        self.assertLess(math.dist(updated['new'], updated['5']), 3 * NODE_DISTANCE)
+        self.assertIn('island', updated)
+
+        # Nothing new, nothing computed
+        self.assertEqual(GraphLayout.compute(nodes[:10], edges, previous=positions), {x: positions[x] for x in nodes[:10]})
+
+        # A large change lays the whole graph out again
+        grown, grown_edges = self.chain(int(40 / (1 - INCREMENTAL_SHARE)) + 10)
+        self.assertNotEqual({x: y for x, y in GraphLayout.compute(grown, grown_edges, previous=positions).items() if x in positions}, positions)
+
+    def test_build(self):
+        data = {'model': self.org_1_model_1, 'slots': OSlot.objects.filter(model=self.org_1_model_1)}
+        graph = GraphLayout.build(data, knowledge_set='instances')
+        slots = list(data['slots'])
+        self.assertEqual(len(graph['edges']), len(slots))
+        self.assertEqual(graph['groups'][str(self.org_1_instance_1.concept_id)], self.org_1_instance_1.concept.name)
+        self.assertFalse(graph['truncated'])
+
+        graph = GraphLayout.build(data, knowledge_set='instances', max_nodes=2)
+        self.assertTrue(graph['truncated'])
+        self.assertLessEqual(len(graph['nodes']), 2)
+
+        layout = GraphLayout.layout(GraphLayout.build(data, knowledge_set='instances'), revision=3)
+        self.assertEqual(layout['revision'], 3)
+        for source, target, label in layout['edges']:
+            self.assertIn((layout['nodes'][source]['id'], layout['nodes'][target]['id'], label),
+                          [(str(x.subject_id), str(x.object_id), x.predicate.name) for x in slots])
+
+        levels = ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=3).run().as_objects()
+        graph = GraphLayout.build_impact_analysis(levels)
+        self.assertEqual(set(graph['nodes']), {str(x[1].id) for level in levels.values() for x in level})
+
+    def test_get_or_layout(self):
+        data = {'knowledge_set': 'instances'}
+        builds = []
+
+        def build():
+            builds.append(1)
+            return GraphLayout.build({'slots': OSlot.objects.filter(model=self.org_1_model_1)})
+
+        layout = GraphLayout.get_or_layout(self.org_1_model_1, data, self.user, build)
+        self.assertEqual(GraphLayout.get_or_layout(self.org_1_model_1, data, self.user, build), layout)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(layout['reused'], 0)
+
+        # The next revision starts from the positions of the previous one
+        instance = OInstance.objects.create(name='new', model=self.org_1_model_1, organisation=self.org_1, concept=self.org_1_concept_1)
+        OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=instance, predicate=self.org_1_predicate_1, object=self.org_1_instance_2)
+        updated = GraphLayout.get_or_layout(self.org_1_model_1, data, self.user, build)
+        self.assertEqual(len(builds), 2)
+        self.assertGreater(updated['revision'], layout['revision'])
+        self.assertEqual(updated['reused'], len(layout['nodes']))
+        positions = {x['id']: (x['x'], x['y']) for x in updated['nodes']}
+        self.assertEqual({x['id']: (x['x'], x['y']) for x in layout['nodes']}, {x: positions[x] for x in positions if x != str(instance.id)})
@@ -0,0 +1,97 @@
+from django.test import TestCase
+
+from authorization.controllers.acl import Acl
+from log.middleware.request import local_thread
+from ontology.controllers.graph_query import GraphQueryPlanner
+from ontology.models import (OConcept, OInstance, OModel, OPredicate,
+                             ORelation, OSlot)
+from utils.test.helpers import (
+    add_object_type_accesspermissions_to_security_group,
+    populate_test_env,
+)
+
+
+class GraphQueryPlannerTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        for object_type in [OModel.get_object_type(), OConcept.get_object_type(), ORelation.get_object_type(),
+                            OPredicate.get_object_type(), OInstance.get_object_type(), OSlot.get_object_type()]:
+            add_object_type_accesspermissions_to_security_group(organisation=self.org_1, security_group=self.org_1_security_group_1, object_type=object_type)
+        self.user = self.org_1_user_1
+        self.user.active_profile = self.org_1_user_1_profile
+        self.user.organisation = self.org_1
+        self.user.acl = Acl(self.user)
+        self.model = self.org_1_model_1
+        self.data = {
+            'model_id': str(self.model.id),
+            'concept_ids': [str(x) for x in OConcept.objects.filter(model=self.model).values_list('id', flat=True)],
+            'relation_ids': [str(x) for x in ORelation.objects.filter(model=self.model).values_list('id', flat=True)],
+        }
+
+    def tearDown(self):
+        local_thread.request = None
+
+    def graph(self, **kwargs):
+        return GraphQueryPlanner(self.user, dict(self.data, **kwargs), model=self.model).graph()
+
+    def add_org_unit(self, owned):
+        concept = OConcept.objects.create(name='Organisation Unit', model=self.model, organisation=self.org_1)
+        relation = ORelation.objects.create(name='ownedBy', model=self.model, organisation=self.org_1)
+        predicate = OPredicate.objects.create(subject=owned.concept, relation=relation, object=concept, model=self.model, organisation=self.org_1)
+        org_unit = OInstance.objects.create(name='Unit', concept=concept, model=self.model, organisation=self.org_1)
+        OSlot.objects.create(subject=owned, predicate=predicate, object=org_unit, model=self.model, organisation=self.org_1)
+        return org_unit
+
+    def test_filter(self):
+        data = self.graph()
+        self.assertEqual(set(data['slots']), set(OSlot.objects.filter(model=self.model)))
+        self.assertEqual(list(data['instances']), list(OInstance.objects.filter(model=self.model).order_by('name')))
+        self.assertFalse(data['_transitive_filtered'])
+
+        # Only the instances of the concepts of the selected predicates
+        data = self.graph(predicate_ids=[str(self.org_1_predicate_1.id)])
+        self.assertEqual(list(data['slots']), [self.model_1_slot_1])
+        self.assertEqual({x.concept_id for x in data['instances']}, {self.org_1_concept_1.id, self.org_1_concept_2.id})
+
+        data = self.graph(instance_ids=[str(self.org_1_instance_2.id)])
+        self.assertEqual(set(data['slots']), {self.model_1_slot_1, self.model_1_slot_2})
+
+        data = GraphQueryPlanner(self.user, self.data, model=self.model).filter(target='predicates')
+        self.assertTrue(data['predicates'])
+        self.assertEqual(data['instances'], [])
+
+    def test_strict(self):
+        selected = [str(self.org_1_concept_1.id), str(self.org_1_concept_2.id)]
+        data = self.graph(display_mode='strict', selected_concept_ids=selected)
+        self.assertEqual(list(data['slots']), [self.model_1_slot_1])
+        self.assertEqual({x.concept_id for x in data['instances']}, {self.org_1_concept_1.id, self.org_1_concept_2.id})
+
+        # Context mode keeps the slots to other concepts
+        data = self.graph(display_mode='context', selected_concept_ids=selected)
+        self.assertEqual(set(data['slots']), set(OSlot.objects.filter(model=self.model)))
+
+    def test_transitive(self):
+        org_unit = self.add_org_unit(self.org_1_instance_1)
+        data = self.graph(display_mode='strict', selected_concept_ids=[str(self.org_1_concept_2.id)], org_unit_id=str(org_unit.id))
+        self.assertTrue(data['_transitive_filtered'])
+        # The instances of the selected concepts connected to the owned ones, with all their slots
+        self.assertEqual(list(data['instances']), [self.org_1_instance_2])
+        self.assertEqual(set(data['slots']), {self.model_1_slot_1, self.model_1_slot_2})
+
+        # Nothing connected, nothing shown
+        data = self.graph(display_mode='strict', selected_concept_ids=[str(self.org_1_concept_0.id)], org_unit_id=str(self.add_org_unit(self.org_1_instance_5).id))
+        self.assertEqual(list(data['slots']), [])
+
+        # Without the strict mode, the owned instances
+        data = self.graph(org_unit_id=str(org_unit.id))
+        self.assertFalse(data['_transitive_filtered'])
+        self.assertEqual(list(data['instances']), [self.org_1_instance_1])
+
+    def test_query_count(self):
+        selected = [str(self.org_1_concept_1.id), str(self.org_1_concept_2.id)]
+        for kwargs in [{}, {'display_mode': 'strict', 'selected_concept_ids': selected}]:
+            data = self.graph(**kwargs)
+            # What the graph drawings use of the slots is read with them
+            with self.assertNumQueries(1):
+                for slot in data['slots']:
+                    str(slot.subject.concept.id) + slot.subject.concept.name + slot.object.concept.name + slot.predicate.name
@@ -0,0 +1,81 @@
+import time
+
+import graphviz
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from ontology.controllers.graph_render import (REASON_NOT_FOUND,
+                                               REASON_TIMEOUT,
+                                               GraphRenderBusy,
+                                               GraphRenderService,
+                                               GraphRenderTimeout)
+from organisation.models import (TASK_STATUS_CANCELLED, TASK_STATUS_FAILURE,
+                                 TASK_STATUS_SUCCESS)
+
+# Stand-ins for the Graphviz engines: echo the source, after a delay
+ECHO = ['cat']
+SLOW_ECHO = ['sh', '-c', 'sleep 0.5; cat']
+STUCK = ['sh', '-c', 'sleep 30']
+
+
+class GraphRenderServiceTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = GraphRenderService(workers=1, queue_size=2, job_timeout=5, state_timeout=5)
+
+    def tearDown(self):
+        self.service.executor.shutdown(wait=True)
+        cache.clear()
+
+    def wait(self, job_id):
+        deadline = time.monotonic() + 10
+        state = self.service.state(job_id)
+        while state['status'] not in (TASK_STATUS_SUCCESS, TASK_STATUS_FAILURE, TASK_STATUS_CANCELLED) and time.monotonic() < deadline:
+            time.sleep(0.05)
+            state = self.service.state(job_id)
+        return state
+
+    def test_render(self):
+        self.assertEqual(self.service.render('digraph {}', 'fdp', args=ECHO), 'digraph {}')
+
+        # A finished layout is returned without running it again
+        state = self.service.submit('digraph {}', 'fdp', args=['false'])
+        self.assertEqual((state['status'], state['output']), (TASK_STATUS_SUCCESS, 'digraph {}'))
+
+        with self.assertRaises(graphviz.ExecutableNotFound):
+            self.service.render('digraph { a }', 'fdp', args=['no-such-graphviz-engine'])
+
+    def test_dedupe_and_busy(self):
+        first = self.service.submit('digraph { a }', 'sfdp', args=SLOW_ECHO)
+        again = self.service.submit('digraph { a }', 'sfdp', args=SLOW_ECHO)
+        self.assertEqual(first['id'], again['id'])
+        self.assertEqual(len(self.service.jobs), 1)
+
+        self.service.submit('digraph { b }', 'sfdp', args=SLOW_ECHO)
+        with self.assertRaises(GraphRenderBusy):
+            self.service.submit('digraph { c }', 'sfdp', args=SLOW_ECHO)
+
+        self.assertEqual(self.wait(first['id'])['output'], 'digraph { a }')
+        self.assertEqual(self.wait(GraphRenderService.job_id('sfdp', 'svg', 'digraph { b }'))['status'], TASK_STATUS_SUCCESS)
+        self.assertEqual(self.service.jobs, {})
+
+    def test_timeout_and_cancel(self):
+        service = GraphRenderService(workers=2, queue_size=2, job_timeout=1, state_timeout=5)
+        self.addCleanup(service.executor.shutdown, wait=True)
+        started = time.monotonic()
+        with self.assertRaises(GraphRenderTimeout):
+            service.render('digraph { slow }', 'fdp', args=STUCK)
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(service.state(GraphRenderService.job_id('fdp', 'svg', 'digraph { slow }'))['reason'], REASON_TIMEOUT)
+
+        state = self.service.submit('digraph { stuck }', 'fdp', args=STUCK)
+        time.sleep(0.3)
+        self.assertTrue(self.service.cancel(state['id']))
+        self.assertEqual(self.wait(state['id'])['status'], TASK_STATUS_CANCELLED)
+        self.assertFalse(self.service.cancel(state['id']))
+
+        # Cancelled and failed jobs run again when submitted again
+        state = self.service.submit('digraph { missing }', 'fdp', args=['no-such-graphviz-engine'])
+        self.assertEqual(self.wait(state['id'])['reason'], REASON_NOT_FOUND)
+        self.assertEqual(self.service.submit('digraph { missing }', 'fdp', args=ECHO)['status'], 'PENDING')
+        self.assertEqual(self.wait(state['id'])['output'], 'digraph { missing }')
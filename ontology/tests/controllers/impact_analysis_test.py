@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from ontology.controllers.impact_analysis import (SOURCE_INDEX, SOURCE_QUERY,
+                                                  ImpactAnalysis)
+from ontology.controllers.o_model import ModelUtils
+from utils.test.helpers import populate_test_env
+
+
+class ImpactAnalysisTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def level_instances(self, result, level):
+        return {x[1] for x in result.levels.get(level, [])}
+
+    def test_levels(self):
+        for source in (SOURCE_INDEX, SOURCE_QUERY):
+            result = ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=3, source=source).run()
+            self.assertEqual(self.level_instances(result, 1), {self.org_1_instance_0.id, self.org_1_instance_2.id, self.org_1_instance_4.id}, source)
+            self.assertEqual(self.level_instances(result, 2), {self.org_1_instance_3.id}, source)
+            self.assertFalse(result.truncated, source)
+            self.assertEqual(result.visited, 5, source)
+
+    def test_predicate_filter(self):
+        for source in (SOURCE_INDEX, SOURCE_QUERY):
+            result = ImpactAnalysis(root_instance=self.org_1_instance_1, predicate_ids=[self.org_1_predicate_1.id, self.org_1_predicate_2.id], max_level=5, source=source).run()
+            self.assertEqual(self.level_instances(result, 1), {self.org_1_instance_2.id}, source)
+            self.assertEqual(self.level_instances(result, 2), {self.org_1_instance_3.id}, source)
+
+    def test_node_budget(self):
+        result = ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=5, node_budget=3).run()
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.visited, 3)
+        self.assertEqual(len(self.level_instances(result, 1)), 2)
+        self.assertNotIn(2, result.levels)
+
+    def test_one_query_per_level(self):
+        with self.assertNumQueries(3):
+            ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=10, source=SOURCE_QUERY).run()
+
+    def test_as_objects(self):
+        results = ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=3).run().as_objects()
+        self.assertEqual(results[0], [(None, self.org_1_instance_1)])
+        self.assertIn((self.model_1_slot_2, self.org_1_instance_3), results[2])
+
+    def test_dictify_impact_analysis(self):
+        results = ImpactAnalysis(root_instance=self.org_1_instance_1, max_level=3).run().as_objects()
+        # The slots of the instances, then one lookup per table they refer to, whatever the number of rows
+        with self.assertNumQueries(5):
+            dictified_results = ModelUtils.dictify_impact_analysis(results)
+        self.assertEqual(dictified_results[0][0][1], ModelUtils.instance_to_dict(self.org_1_instance_1))
+        self.assertEqual(len(dictified_results[1]), 3)
+        for slot_data, instance_data in dictified_results[2]:
+            self.assertEqual(instance_data, ModelUtils.instance_to_dict(self.org_1_instance_3))
+            self.assertEqual(slot_data, ModelUtils.slot_to_dict(self.model_1_slot_2))
@@ -0,0 +1,66 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from log.models import Log
+from ontology.controllers.model_copy import ModelCopier
+from ontology.models import OConcept, OInstance, OPredicate, ORelation, OSlot
+from organisation.controllers.tasks import TaskController
+from organisation.models import TASK_STATUS_PENDING, TASK_STATUS_SUCCESS, TASK_TYPE_COPY
+from utils.test.helpers import create_instance, create_slot, create_task, populate_test_env
+
+
+class ModelCopierTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def counts(self, model):
+        return [x._base_manager.filter(model=model).count() for x in (OConcept, ORelation, OPredicate, OInstance, OSlot)]
+
+    def test_copy(self):
+        progress = []
+        new_model = ModelCopier(self.org_1_model_1, user=self.org_1_user_1, progress=lambda done, total: progress.append((done, total))).copy()
+
+        self.assertEqual(new_model.name, self.org_1_model_1.name + '_copy')
+        self.assertEqual(new_model.repository, self.org_1_model_1.repository)
+        self.assertEqual(self.counts(new_model), self.counts(self.org_1_model_1))
+        total = sum(self.counts(self.org_1_model_1))
+        self.assertEqual(progress[0], (0, total))
+        self.assertEqual(progress[-1], (total, total))
+
+        # Every reference points into the copy
+        for slot in OSlot._base_manager.filter(model=new_model):
+            self.assertEqual(slot.predicate.model, new_model)
+            self.assertEqual(slot.predicate.subject.model, new_model)
+            self.assertEqual(slot.predicate.relation.model, new_model)
+            self.assertTrue(slot.subject is None or slot.subject.model == new_model)
+            self.assertTrue(slot.object is None or slot.object.model == new_model)
+        copied = OSlot._base_manager.get(model=new_model, subject__name=self.model_1_slot_2.subject.name, object__name=self.model_1_slot_2.object.name)
+        self.assertEqual(copied.predicate.relation.name, self.model_1_slot_2.predicate.relation.name)
+        self.assertEqual(copied.created_by, self.org_1_user_1)
+
+        self.assertTrue(Log.objects.filter(target=new_model.id, source='ModelCopier:created OModel').exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as context:
+            ModelCopier(self.org_1_model_1).copy()
+        query_count = len(context.captured_queries)
+
+        for i in range(20):
+            instance = create_instance(model=self.org_1_model_1, concept=self.org_1_concept_2, name='extra_{}'.format(i))
+            create_slot(model=self.org_1_model_1, subject=instance, predicate=self.org_1_predicate_1, object=self.org_1_instance_3)
+        with CaptureQueriesContext(connection) as context:
+            ModelCopier(self.org_1_model_1).copy()
+        self.assertEqual(len(context.captured_queries), query_count)
+
+    def test_copy_task(self):
+        task = create_task(organisation=self.org_1, user=self.org_1_user_1, type=TASK_TYPE_COPY, status=TASK_STATUS_PENDING,
+                           config=json.dumps({'model_id': str(self.org_1_model_1.id)}))
+        TaskController.process_task(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, TASK_STATUS_SUCCESS, task.error)
+        self.assertEqual(task.progress, 100)
+        new_model_id = json.loads(task.config)['new_model_id']
+        self.assertEqual(self.counts(new_model_id), self.counts(self.org_1_model_1))
@@ -0,0 +1,54 @@
+from django.test import TestCase
+
+from ontology.controllers.model_copy import ModelCopier
+from ontology.controllers.model_diff import DIFF_ADDED, DIFF_CHANGED, DIFF_REMOVED, DIFF_UNCHANGED, ModelDiff
+from ontology.models import OConcept, OInstance, OSlot
+from utils.test.helpers import create_concept, populate_test_env
+
+
+class ModelDiffTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        self.copy = ModelCopier(self.org_1_model_1).copy()
+
+    def test_identical_copy(self):
+        model_diff = ModelDiff(self.org_1_model_1, self.copy)
+        pairs = model_diff.pairs(['relations', 'concepts', 'predicates', 'instances', 'slots'])
+        self.assertEqual(pairs, {x: [] for x in pairs})
+        self.assertEqual(model_diff.counts['slots'][DIFF_UNCHANGED], OSlot.objects.filter(model=self.org_1_model_1).count())
+        self.assertEqual(model_diff.counts['concepts'][DIFF_UNCHANGED], OConcept.objects.filter(model=self.org_1_model_1).count())
+
+    def test_added_removed_changed(self):
+        # Sorts before every other concept, a positional comparison would pair every concept wrongly
+        create_concept(model=self.copy, name='AAA')
+        create_concept(model=self.copy, name='zzz')
+        OConcept._base_manager.filter(model=self.copy, name='org_1_concept_2').update(description='changed')
+        OInstance._base_manager.filter(model=self.copy, name='org_1_instance_3').delete()
+
+        model_diff = ModelDiff(self.org_1_model_1, self.copy)
+        concepts = list(model_diff.diff('concepts'))
+        self.assertEqual([(x[0], (x[1] or x[2])['key'][0]) for x in concepts if x[0] != DIFF_UNCHANGED],
+                         [(DIFF_ADDED, 'AAA'), (DIFF_CHANGED, 'org_1_concept_2'), (DIFF_ADDED, 'zzz')])
+        changed = [x for x in concepts if x[0] == DIFF_CHANGED][0]
+        self.assertEqual(changed[3], {'description': ('', 'changed')})
+
+        instances = [x for x in model_diff.diff('instances') if x[0] != DIFF_UNCHANGED]
+        self.assertEqual([(x[0], x[1]['key'][1]) for x in instances], [(DIFF_REMOVED, 'org_1_instance_3')])
+        removed_slots = OSlot.objects.filter(model=self.org_1_model_1, object__name='org_1_instance_3').count() + \
+                        OSlot.objects.filter(model=self.org_1_model_1, subject__name='org_1_instance_3').count()
+        self.assertEqual(model_diff.counts['instances'], {DIFF_ADDED: 0, DIFF_REMOVED: 1, DIFF_CHANGED: 0, DIFF_UNCHANGED: OInstance.objects.filter(model=self.copy).count()})
+        list(model_diff.diff('slots'))
+        self.assertEqual(model_diff.counts['slots'][DIFF_REMOVED], removed_slots)
+
+        pairs = ModelDiff(self.org_1_model_1, self.copy, max_entries=2).pairs(['concepts'])
+        self.assertEqual(len(pairs['concepts']), 2)
+        self.assertEqual(pairs['concepts'][0], (None, {'id': str(OConcept.objects.get(model=self.copy, name='AAA').id), 'name': 'AAA'}))
+        self.assertEqual(pairs['concepts'][1][1]['changes'], {'description': ('', 'changed')})
+
+    def test_duplicate_keys(self):
+        create_concept(model=self.org_1_model_1, name='dup', description='1')
+        create_concept(model=self.org_1_model_1, name='dup', description='2')
+        create_concept(model=self.copy, name='dup', description='2')
+        statuses = sorted(x[0] for x in ModelDiff(self.org_1_model_1, self.copy).diff('concepts') if x[0] != DIFF_UNCHANGED)
+        # The identical rows are paired first, the other one is removed
+        self.assertEqual(statuses, [DIFF_REMOVED])
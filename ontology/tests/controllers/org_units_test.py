@@ -0,0 +1,146 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from log.middleware.request import local_thread
+from ontology.controllers.org_units import OrgUnitIndex
+from ontology.controllers.revision import ModelRevision
+from ontology.models import (OConcept, OInstance, OOrgUnitClosure,
+                             OOrgUnitOwnership, OPredicate, ORelation, OSlot)
+from ontology.services.graph_presets import DEFAULT_PRESETS, GraphPresetService
+from utils.test.helpers import populate_test_env
+
+
+class OrgUnitIndexTestCase(TestCase):
+    def setUp(self):
+        # The organisation filter of the managers follows the request of earlier tests
+        local_thread.request = None
+        populate_test_env(self)
+        self.model = self.org_1_model_1
+        unit = self.create(OConcept, name='Organisation Unit')
+        application = self.create(OConcept, name='Application')
+        self.relations = {x: self.create(ORelation, name=x) for x in ['reports-to', 'contains', 'ownedBy', 'owns']}
+        self.predicates = {
+            'reports-to': self.create(OPredicate, subject=unit, relation=self.relations['reports-to'], object=unit),
+            'contains': self.create(OPredicate, subject=unit, relation=self.relations['contains'], object=unit),
+            'ownedBy': self.create(OPredicate, subject=application, relation=self.relations['ownedBy'], object=unit),
+            'owns': self.create(OPredicate, subject=unit, relation=self.relations['owns'], object=application),
+        }
+        self.units = {x: self.create(OInstance, name=x, concept=unit) for x in ['ministry', 'a', 'b', 'c', 'other']}
+        self.applications = {x: self.create(OInstance, name=x, concept=application) for x in ['app_1', 'app_2', 'app_3', 'app_4']}
+        self.slots = {}
+        for subject, relation, object in [('a', 'reports-to', 'ministry'), ('ministry', 'contains', 'b'), ('c', 'reports-to', 'a'),
+                                          ('a', 'reports-to', 'c'), ('app_1', 'ownedBy', 'c'), ('ministry', 'owns', 'app_2'),
+                                          ('b', 'owns', 'app_3'), ('other', 'owns', 'app_4')]:
+            self.slots[(subject, object)] = self.slot(subject, relation, object)
+
+    def create(self, model_class, **kwargs):
+        return model_class.objects.create(model=self.model, organisation=self.org_1, **kwargs)
+
+    def instance(self, name):
+        return self.units.get(name) or self.applications[name]
+
+    def slot(self, subject, relation, object):
+        return self.create(OSlot, subject=self.instance(subject), predicate=self.predicates[relation], object=self.instance(object))
+
+    def index(self):
+        return (set(OOrgUnitClosure.objects.filter(model=self.model).values_list('ancestor__name', 'descendant__name', 'depth')),
+                set(OOrgUnitOwnership.objects.filter(model=self.model).values_list('org_unit__name', 'instance__name')))
+
+    def assertRebuilt(self):
+        """The incrementally maintained index is the one rebuilt from the slots, and gives what the slots give."""
+        index = self.index()
+        OrgUnitIndex.rebuild(self.model.id)
+        self.assertEqual(index, self.index())
+        for unit in self.units.values():
+            self.assertEqual(set(GraphPresetService.get_instances_by_org_unit(self.model, str(unit.id))),
+                             set(GraphPresetService._get_instances_by_org_unit_from_slots(self.model, unit, 'ownedBy')))
+            self.assertEqual({x.id for x in GraphPresetService._get_all_subordinate_units(self.model, unit)},
+                             {x.id for x in GraphPresetService._get_all_subordinate_units_from_slots(self.model, unit)} - {unit.id})
+
+    def test_maintained_on_slot_save_and_delete(self):
+        closure, ownership = self.index()
+        self.assertEqual(closure, {('ministry', 'a', 1), ('ministry', 'b', 1), ('ministry', 'c', 2), ('a', 'c', 1), ('c', 'a', 1)})
+        self.assertEqual(ownership, {('c', 'app_1'), ('ministry', 'app_2'), ('b', 'app_3'), ('other', 'app_4')})
+        self.assertRebuilt()
+
+        # A second slot giving the same ownership pair keeps it when the first one goes
+        self.slot('app_2', 'ownedBy', 'ministry')
+        self.slots[('ministry', 'app_2')].delete()
+        self.assertIn(('ministry', 'app_2'), self.index()[1])
+        self.slots[('app_1', 'c')].delete()
+        self.assertNotIn(('c', 'app_1'), self.index()[1])
+        self.assertRebuilt()
+
+        # Moving "other" under b, then removing a hierarchy slot
+        self.slot('other', 'reports-to', 'b')
+        self.assertIn(('ministry', 'other', 2), self.index()[0])
+        self.slots[('a', 'ministry')].delete()
+        self.assertNotIn(('ministry', 'a', 1), self.index()[0])
+        self.assertRebuilt()
+
+        # Rewiring a slot
+        slot = self.slots[('b', 'app_3')]
+        slot.subject = self.units['other']
+        slot.save()
+        self.assertEqual(set(GraphPresetService.get_instances_by_org_unit(self.model, str(self.units['other'].id), include_children=False)),
+                         {str(self.applications['app_3'].id), str(self.applications['app_4'].id)})
+        self.assertRebuilt()
+
+    def test_cleaned_once_per_cascade(self):
+        # The slots of a deleted instance go with it in a fast delete, whatever their number
+        for i in range(30):
+            self.slot('app_4', 'ownedBy', 'other')
+        with CaptureQueriesContext(connection) as context:
+            self.applications.pop('app_4').delete()
+        self.assertLess(len(context.captured_queries), 15)
+        self.assertNotIn(('other', 'app_4'), self.index()[1])
+
+        # The paths through a deleted unit are rebuilt
+        self.units.pop('a').delete()
+        self.assertEqual(self.index()[0], {('ministry', 'b', 1)})
+        self.assertRebuilt()
+
+        # The ownership pairs of the slots of a deleted relation
+        self.relations['owns'].delete()
+        self.assertEqual(self.index()[1], {('c', 'app_1')})
+        self.assertRebuilt()
+
+    def test_rebuilt_on_name_changes(self):
+        # The relation no longer reads as an ownership one
+        relation = self.relations['owns']
+        relation.name = 'uses'
+        relation.save()
+        self.assertEqual(self.index()[1], {('c', 'app_1')})
+
+        # Units are matched on their concept name
+        concept = self.units['b'].concept
+        concept.name = 'Team'
+        concept.save()
+        self.assertNotIn(('ministry', 'b', 1), self.index()[0])
+        self.assertRebuilt()
+
+    def test_ownership_relation_of_the_presets(self):
+        revision = ModelRevision.get(self.model.id)
+        presets = dict(DEFAULT_PRESETS, org_unit_config={'ownership_relation': 'owns'})
+        GraphPresetService.save_presets(self.org_1, presets)
+        # The cached graphs of the model are not served anymore
+        self.assertGreater(ModelRevision.get(self.model.id), revision)
+        # The ownedBy slot no longer gives an ownership pair
+        self.assertNotIn(('c', 'app_1'), self.index()[1])
+        self.assertIn(('ministry', 'app_2'), self.index()[1])
+
+    def test_lookup_is_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            owned = GraphPresetService.get_instances_by_org_unit(self.model, str(self.units['ministry'].id))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(set(owned), {str(self.applications[x].id) for x in ['app_1', 'app_2', 'app_3']})
+        self.assertEqual(GraphPresetService.get_instances_by_org_unit(self.model, str(self.units['ministry'].id), include_children=False),
+                         [str(self.applications['app_2'].id)])
+
+    def test_org_units(self):
+        with CaptureQueriesContext(connection) as context:
+            org_units = GraphPresetService.get_org_units(self.model)
+        # The model organisation, the presets and the units
+        self.assertLessEqual(len(context.captured_queries), 3)
+        self.assertEqual([(x['name'], x['level']) for x in org_units], [('a', 1), ('b', 1), ('c', 2), ('ministry', 0), ('other', 0)])
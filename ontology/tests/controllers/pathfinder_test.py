@@ -0,0 +1,85 @@
+from django.test import TestCase
+
+from ontology.controllers.pathfinder import (RELATION_SCOPE_ALL,
+                                             RELATION_SCOPE_FIRST, PathFinder)
+from ontology.controllers.utils import KnowledgeBaseUtils
+from utils.test.helpers import create_slot, populate_test_env
+
+
+class PathFinderTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        # Paths from instance_1 to instance_3:
+        #   instance_1 -relation_1-> instance_2 -relation_2-> instance_3
+        #   instance_1 -relation_2-> instance_0 -relation_2-> instance_3
+        #   instance_1 -relation_3-> instance_4 -relation_1-> instance_5 -relation_2-> instance_3
+        self.model_1_slot_5 = create_slot(model=self.org_1_model_1, subject=self.org_1_instance_0, predicate=self.org_1_predicate_2, object=self.org_1_instance_3)
+        self.model_1_slot_6 = create_slot(model=self.org_1_model_1, subject=self.org_1_instance_4, predicate=self.org_1_predicate_1, object=self.org_1_instance_5)
+        self.model_1_slot_7 = create_slot(model=self.org_1_model_1, subject=self.org_1_instance_5, predicate=self.org_1_predicate_2, object=self.org_1_instance_3)
+
+    def slot_paths(self, path_finder, paths):
+        return [[x.id for x in path] for path in path_finder.slots(paths)]
+
+    def test_shortest_path(self):
+        path_finder = PathFinder(model=self.org_1_model_1)
+        path = path_finder.shortest_path(self.org_1_instance_1.id, self.org_1_instance_3.id)
+        self.assertEqual(len(path), 2)
+        self.assertIsNone(path_finder.shortest_path(self.org_1_instance_1.id, self.org_1_instance_8.id))
+        self.assertIsNone(path_finder.shortest_path(self.org_1_instance_1.id, self.org_1_instance_1.id))
+
+    def test_k_shortest_paths(self):
+        path_finder = PathFinder(model=self.org_1_model_1)
+        paths = self.slot_paths(path_finder, path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5))
+        self.assertEqual([len(x) for x in paths], [2, 2, 3])
+        self.assertIn([self.model_1_slot_1.id, self.model_1_slot_2.id], paths)
+        self.assertIn([self.model_1_slot_4.id, self.model_1_slot_5.id], paths)
+        self.assertEqual(paths[2], [self.model_1_slot_3.id, self.model_1_slot_6.id, self.model_1_slot_7.id])
+
+        self.assertEqual(len(path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=1)), 1)
+
+    def test_max_depth(self):
+        path_finder = PathFinder(model=self.org_1_model_1, max_depth=2)
+        paths = path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5)
+        self.assertEqual([len(x) for x in paths], [2, 2])
+
+        path_finder = PathFinder(model=self.org_1_model_1, max_depth=1)
+        self.assertEqual(path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5), [])
+
+    def test_relation_scope_first(self):
+        path_finder = PathFinder(model=self.org_1_model_1, relation_ids={self.org_1_relation_1.id}, relation_scope=RELATION_SCOPE_FIRST)
+        paths = self.slot_paths(path_finder, path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5))
+        self.assertEqual(paths, [[self.model_1_slot_1.id, self.model_1_slot_2.id]])
+
+    def test_relation_scope_all(self):
+        path_finder = PathFinder(model=self.org_1_model_1, relation_ids={self.org_1_relation_2.id}, relation_scope=RELATION_SCOPE_ALL)
+        paths = self.slot_paths(path_finder, path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5))
+        self.assertEqual(paths, [[self.model_1_slot_4.id, self.model_1_slot_5.id]])
+
+        path_finder = PathFinder(model=self.org_1_model_1, relation_ids={self.org_1_relation_1.id}, relation_scope=RELATION_SCOPE_ALL)
+        self.assertEqual(path_finder.k_shortest_paths(self.org_1_instance_1.id, self.org_1_instance_3.id, k=5), [])
+
+    def test_get_instances_paths_ordered(self):
+        paths = KnowledgeBaseUtils.get_instances_paths(start_instance=self.org_1_instance_1, end_instance=self.org_1_instance_3, max_paths=3)
+        lengths = []
+        while not paths.empty():
+            lengths.append(paths.get()[0])
+        self.assertEqual(lengths, [2, 2, 3])
+
+    def test_get_instances_paths_to_multiple_relation_scope_all(self):
+        result = KnowledgeBaseUtils.get_instances_paths_to_multiple(
+            start_instance=self.org_1_instance_1,
+            end_instances=[self.org_1_instance_3, self.org_1_instance_5],
+            relation_ids={self.org_1_relation_2.id},
+            relation_scope=RELATION_SCOPE_ALL
+        )
+        self.assertEqual([x.id for x in result[self.org_1_instance_3.id]], [self.model_1_slot_4.id, self.model_1_slot_5.id])
+        # instance_5 is only reachable with relation_2 slots through instance_3
+        self.assertEqual([x.id for x in result[self.org_1_instance_5.id]], [self.model_1_slot_4.id, self.model_1_slot_5.id, self.model_1_slot_7.id])
+
+        result = KnowledgeBaseUtils.get_instances_paths_to_multiple(
+            start_instance=self.org_1_instance_1,
+            end_instances=[self.org_1_instance_3, self.org_1_instance_5],
+            relation_ids={self.org_1_relation_1.id},
+            relation_scope=RELATION_SCOPE_ALL
+        )
+        self.assertEqual(result, {})
@@ -0,0 +1,45 @@
+import io
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ontology.controllers.o_model import ModelUtils
+from ontology.controllers.streaming_export import StreamingExporter
+from ontology.plugins.json import GenericEncoder
+from utils.test.helpers import create_instance, create_slot, populate_test_env
+
+
+class StreamingExporterTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def export(self, model, filters=None, chunk_size=None):
+        f = io.StringIO()
+        StreamingExporter(model, filters=filters, chunk_size=chunk_size).write_instances(f)
+        return json.loads(f.getvalue())
+
+    def test_same_document_as_instances_to_dict(self):
+        expected = json.loads(json.dumps(ModelUtils.instances_to_dict(self.org_1_model_1), cls=GenericEncoder))
+        self.assertEqual(self.export(self.org_1_model_1, chunk_size=2), expected)
+        self.assertEqual(list(self.export(self.org_1_model_1)['instances'].keys()), list(expected['instances'].keys()))
+
+    def test_filters(self):
+        filters = {'instance_ids': [str(self.org_1_instance_2.id)], 'predicate_ids': [str(self.org_1_predicate_1.id)]}
+        expected = json.loads(json.dumps(ModelUtils.instances_to_dict(self.org_1_model_1, filters=filters), cls=GenericEncoder))
+        self.assertEqual(self.export(self.org_1_model_1, filters=filters), expected)
+
+    def test_queries_do_not_grow_with_model_size(self):
+        with CaptureQueriesContext(connection) as context:
+            self.export(self.org_1_model_1, chunk_size=100)
+        query_count = len(context.captured_queries)
+
+        for i in range(20):
+            instance = create_instance(model=self.org_1_model_1, concept=self.org_1_concept_2, name='extra_{}'.format(i))
+            create_slot(model=self.org_1_model_1, subject=self.org_1_instance_1, predicate=self.org_1_predicate_1, object=instance)
+
+        with CaptureQueriesContext(connection) as context:
+            data = self.export(self.org_1_model_1, chunk_size=100)
+        self.assertEqual(len(context.captured_queries), query_count)
+        self.assertEqual(len(data['instances'][str(self.org_1_instance_1.id)]['ownslots']), 23)
@@ -0,0 +1,57 @@
+from collections import Counter
+
+from django.test import TestCase
+
+from ontology.controllers.benchmark import BENCHMARKS, BenchmarkSuite
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.models import OSlot
+from utils.test.helpers import populate_test_env
+
+
+class SyntheticModelGeneratorTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        self.generator = SyntheticModelGenerator(self.org_1, name='synthetic', chunk_size=100)
+
+    def slots(self, model):
+        return Counter(OSlot.objects.filter(model=model).values_list('subject__name', 'predicate__relation__name', 'object__name'))
+
+    def test_reproducible(self):
+        model_1 = self.generator.generate_graph(500, concepts=4, relations=2, predicates=6, seed=1, suffix='1')
+        model_2 = self.generator.generate_graph(500, concepts=4, relations=2, predicates=6, seed=1, suffix='2')
+        model_3 = self.generator.generate_graph(500, concepts=4, relations=2, predicates=6, seed=2, suffix='3')
+        self.assertEqual(OSlot.objects.filter(model=model_1).count(), 500)
+        self.assertEqual(self.slots(model_1), self.slots(model_2))
+        self.assertNotEqual(self.slots(model_1), self.slots(model_3))
+        # Slots are distinct
+        self.assertEqual(max(self.slots(model_1).values()), 1)
+
+    def test_power_law(self):
+        model = self.generator.generate_graph(2000, concepts=2, relations=1, predicates=2, instances=400, exponent=1.5)
+        degrees = Counter(OSlot.objects.filter(model=model).values_list('subject_id', flat=True))
+        self.assertGreater(max(degrees.values()), 10 * sum(degrees.values()) / 400)
+
+        model = self.generator.generate_graph(2000, concepts=2, relations=1, predicates=2, instances=400, exponent=0, suffix='uniform')
+        degrees = Counter(OSlot.objects.filter(model=model).values_list('subject_id', flat=True))
+        self.assertLess(max(degrees.values()), 4 * sum(degrees.values()) / 400)
+
+
+class BenchmarkSuiteTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+
+    def test_run_and_compare(self):
+        suite = BenchmarkSuite(self.org_1, rounds=2, generator_options={'concepts': 3, 'predicates': 4})
+        results = suite.run([200])
+        self.assertEqual([x['name'] for x in results['benchmarks']], ['{}[200]'.format(x) for x in BENCHMARKS])
+        for benchmark in results['benchmarks']:
+            # Graphviz may not be installed
+            if 'skipped' not in benchmark:
+                self.assertEqual(benchmark['stats']['rounds'], 2)
+                self.assertLessEqual(benchmark['stats']['min'], benchmark['stats']['median'])
+                self.assertGreater(benchmark['queries'], 0)
+        # Everything is rolled back
+        self.assertFalse(OSlot.objects.filter(model__name__startswith='benchmark_suite').exists())
+
+        rows = BenchmarkSuite.compare(results, results)
+        self.assertEqual(rows[0], ('filter[200]', results['benchmarks'][0]['stats']['median'], results['benchmarks'][0]['stats']['median'], 1.0))
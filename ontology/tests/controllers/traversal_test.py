@@ -0,0 +1,44 @@
+from django.test import TestCase
+
+from ontology.controllers.impact_analysis import (SOURCE_CTE, SOURCE_INDEX,
+                                                  ImpactAnalysis)
+from ontology.controllers.synthetic import SyntheticModelGenerator
+from ontology.controllers.traversal import SlotTraversal
+from ontology.models import OInstance, OPredicate, OSlot
+from utils.test.helpers import populate_test_env
+
+
+class SlotTraversalTestCase(TestCase):
+    """The recursive query runs on SQLite as well, it is checked against the graph index here."""
+
+    def setUp(self):
+        populate_test_env(self)
+
+    def levels(self, root, source, **kwargs):
+        return ImpactAnalysis(root_instance=root, source=source, **kwargs).run().levels
+
+    def test_impact_analysis(self):
+        model = SyntheticModelGenerator(self.org_1, chunk_size=100).generate_graph(300, concepts=4, relations=3, predicates=8, exponent=0.5, seed=3)
+        roots = list(OInstance.objects.filter(model=model).order_by('name')[:5])
+        predicate_ids = list(OPredicate.objects.filter(model=model).order_by('id').values_list('id', flat=True)[:4])
+        for root in roots:
+            for max_level in (1, 2, 4, 8):
+                self.assertEqual(self.levels(root, SOURCE_CTE, max_level=max_level), self.levels(root, SOURCE_INDEX, max_level=max_level))
+                self.assertEqual(self.levels(root, SOURCE_CTE, max_level=max_level, predicate_ids=predicate_ids),
+                                 self.levels(root, SOURCE_INDEX, max_level=max_level, predicate_ids=predicate_ids))
+
+        # Cycles end at the depth limit
+        OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=self.org_1_instance_3, predicate=self.org_1_predicate_1, object=self.org_1_instance_1)
+        self.assertEqual(self.levels(self.org_1_instance_1, SOURCE_CTE, max_level=10), self.levels(self.org_1_instance_1, SOURCE_INDEX, max_level=10))
+
+    def test_walk(self):
+        model_id = self.org_1_model_1.id
+        root_ids = [self.org_1_instance_1.id]
+        self.assertEqual(set(SlotTraversal.walk(model_id, root_ids, 1)),
+                         {(self.org_1_instance_1.id, x.id, x.object_id) for x in [self.model_1_slot_1, self.model_1_slot_3, self.model_1_slot_4]})
+        # A relation filter, as the filter on the predicates of the relation
+        relation_ids = [self.org_1_relation_2.id]
+        self.assertEqual(set(SlotTraversal.walk(model_id, root_ids, 3, relation_ids=relation_ids)),
+                         set(SlotTraversal.walk(model_id, root_ids, 3, predicate_ids=list(OPredicate.objects.filter(relation_id__in=relation_ids).values_list('id', flat=True)))))
+        self.assertEqual(SlotTraversal.walk(model_id, root_ids, 3, predicate_ids=[]), [])
+        self.assertEqual(SlotTraversal.walk(model_id, root_ids, 0), [])
@@ -0,0 +1,133 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from log.middleware.request import local_thread
+from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation, OSlot
+from utils.test.helpers import (
+    add_object_type_accesspermissions_to_security_group,
+    populate_test_env,
+)
+
+
+class OModelGraphJobTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        cache.clear()
+        for object_type in [OModel.get_object_type(), OConcept.get_object_type(),
+                            ORelation.get_object_type(), OPredicate.get_object_type(),
+                            OInstance.get_object_type(), OSlot.get_object_type()]:
+            add_object_type_accesspermissions_to_security_group(
+                organisation=self.org_1,
+                security_group=self.org_1_security_group_1,
+                object_type=object_type
+            )
+
+    def tearDown(self):
+        cache.clear()
+        local_thread.request = None
+
+    def _login_and_activate_profile(self):
+        logged_in = self.client.login(username='org_1_user_1', password='12345')
+        self.assertTrue(logged_in)
+        response = self.client.post(reverse('profile_activate', kwargs={'pk': str(self.org_1_user_1_profile.id)}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_submit_and_poll(self):
+        self._login_and_activate_profile()
+        url = reverse('o_model_graph_job', kwargs={'model_id': self.org_1_model_1.id})
+        data = json.dumps({'knowledge_set': 'ontology', 'model_id': str(self.org_1_model_1.id), 'concept_ids': [str(self.org_1_concept_1.id)]})
+        response = self.client.post(url, data=data, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        job = response.json()
+
+        deadline = time.monotonic() + 30
+        while job['status'] not in ('SUCCESS', 'FAILURE', 'CANCELLED') and time.monotonic() < deadline:
+            time.sleep(0.1)
+            response = self.client.get(reverse('o_model_graph_job_status', kwargs={'job_id': job['id']}))
+            self.assertEqual(response.status_code, 200, response.content)
+            job = response.json()
+
+        if job['status'] == 'SUCCESS':
+            self.assertTrue(job['graph'].startswith('<svg'))
+            # The next submission of the same graph is served from the render cache
+            response = self.client.post(url, data=data, content_type='application/json')
+            self.assertEqual(response.json(), {'id': None, 'status': 'SUCCESS', 'graph': job['graph']})
+        else:
+            # Graphviz is not installed
+            self.assertEqual((job['status'], job['reason']), ('FAILURE', 'not_found'))
+
+        # Finished jobs are not cancelled, unknown ones are not found
+        response = self.client.delete(reverse('o_model_graph_job_status', kwargs={'job_id': job['id']}))
+        self.assertEqual(response.json()['status'], job['status'])
+        response = self.client.get(reverse('o_model_graph_job_status', kwargs={'job_id': 'unknown'}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_no_organisation(self):
+        self._login_and_activate_profile()
+        response = self.client.post(reverse('o_model_graph_job', kwargs={'model_id': self.org_1_model_1.id}),
+                                    data=json.dumps({'knowledge_set': 'ontology', 'model_id': str(self.org_1_model_1.id)}), content_type='application/json')
+        job_id = response.json()['id']
+
+        self.client.logout()
+        logged_in = self.client.login(username='org_1_user_2', password='12345')
+        self.assertTrue(logged_in)
+        response = self.client.get(reverse('o_model_graph_job_status', kwargs={'job_id': job_id}))
+        # Without an active profile the user sees no job
+        self.assertEqual(response.status_code, 404)
+
+    def test_layout(self):
+        self._login_and_activate_profile()
+        url = reverse('o_model_graph_layout', kwargs={'model_id': self.org_1_model_1.id})
+        data = json.dumps({'knowledge_set': 'instances', 'model_id': str(self.org_1_model_1.id),
+                           'concept_ids': [str(x) for x in OConcept.objects.filter(model=self.org_1_model_1).values_list('id', flat=True)],
+                           'relation_ids': [str(x) for x in ORelation.objects.filter(model=self.org_1_model_1).values_list('id', flat=True)]})
+        response = self.client.post(url, data=data, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        layout = response.json()
+        self.assertTrue(layout['nodes'])
+        self.assertEqual(set(layout['nodes'][0]), {'id', 'label', 'group', 'x', 'y'})
+        self.assertEqual(self.client.post(url, data=data, content_type='application/json').json(), layout)
+
+        response = self.client.post(reverse('o_model_impact_analysis', kwargs={'model_id': self.org_1_model_1.id}),
+                                    data=json.dumps({'root_instance_id': str(self.org_1_instance_1.id), 'level': 2, 'format': 'layout'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn('graph', response.json())
+        self.assertIn(str(self.org_1_instance_1.id), [x['id'] for x in response.json()['layout']['nodes']])
+
+    def test_impact_analysis_node_budget(self):
+        self._login_and_activate_profile()
+        url = reverse('o_model_impact_analysis', kwargs={'model_id': self.org_1_model_1.id})
+        for node_budget, status_code in [('many', 400), ([1], 400), (10 ** 9, 200), (-1, 200)]:
+            response = self.client.post(url, data=json.dumps({'root_instance_id': str(self.org_1_instance_1.id), 'node_budget': node_budget, 'format': 'layout'}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, status_code, node_budget)
+
+    def test_layout_query_count(self):
+        self._login_and_activate_profile()
+        url = reverse('o_model_graph_layout', kwargs={'model_id': self.org_1_model_1.id})
+        payload = {'knowledge_set': 'instances', 'model_id': str(self.org_1_model_1.id),
+                   'concept_ids': [str(x) for x in OConcept.objects.filter(model=self.org_1_model_1).values_list('id', flat=True)],
+                   'relation_ids': [str(x) for x in ORelation.objects.filter(model=self.org_1_model_1).values_list('id', flat=True)]}
+        # The first request fills the access control cache
+        self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+        for display_mode in ['context', 'strict']:
+            data = json.dumps(dict(payload, display_mode=display_mode, selected_concept_ids=[str(self.org_1_concept_1.id), str(self.org_1_concept_2.id)]))
+            counts = []
+            for i in range(2):
+                # A new revision, the graph is filtered again
+                subject = OInstance.objects.create(name='new', model=self.org_1_model_1, organisation=self.org_1, concept=self.org_1_concept_1)
+                for j in range(10 * i):
+                    OSlot.objects.create(model=self.org_1_model_1, organisation=self.org_1, subject=subject, predicate=self.org_1_predicate_1, object=self.org_1_instance_2)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.post(url, data=data, content_type='application/json')
+                self.assertEqual(response.status_code, 200, response.content)
+                counts.append(len(queries))
+            self.assertEqual(counts[0], counts[1])
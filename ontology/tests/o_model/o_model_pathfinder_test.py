@@ -235,3 +235,46 @@ class OModelPathFinderTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         data = json.loads(response.content)
         self.assertTrue(len(data) > 0)  # Should find path
+
+    def test_pathfinder_relation_filter_every_hop(self):
+        """Test that relation_scope 'all' applies the relation filter to every edge."""
+        self._login_and_activate_profile()
+        url = reverse('o_model_pathfinder', kwargs={'model_id': self.org_1_model_1.id})
+
+        # instance_1 -> instance_2 uses relation_1, instance_2 -> instance_3 uses relation_2
+        response = self.client.post(url, data=json.dumps({
+            'start_instance_id': str(self.org_1_instance_1.id),
+            'end_instance_id': str(self.org_1_instance_3.id),
+            'relation_ids': [str(self.org_1_relation_1.id)],
+            'relation_scope': 'all',
+            'max_depth': 4,
+            'max_paths': 3,
+            'find_all_of_concept': False
+        }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(len(data), 0)
+
+    def test_pathfinder_search_limits(self):
+        """Test that malformed limits are rejected and large ones capped by the settings."""
+        self._login_and_activate_profile()
+        url = reverse('o_model_pathfinder', kwargs={'model_id': self.org_1_model_1.id})
+
+        for limits in [{'max_depth': 'deep'}, {'max_paths': 'all'}, {'max_depth': [4]}]:
+            response = self.client.post(url, data=json.dumps(dict({
+                'start_instance_id': str(self.org_1_instance_1.id),
+                'end_instance_id': str(self.org_1_instance_3.id),
+                'find_all_of_concept': False
+            }, **limits)), content_type='application/json')
+            self.assertEqual(response.status_code, 400, limits)
+
+        response = self.client.post(url, data=json.dumps({
+            'start_instance_id': str(self.org_1_instance_1.id),
+            'end_instance_id': str(self.org_1_instance_3.id),
+            'max_depth': 10 ** 6,
+            'max_paths': 10 ** 6,
+            'find_all_of_concept': False
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(len(json.loads(response.content)) > 0)
@@ -151,6 +151,47 @@ class TestGraphPresetServiceGetPresets:
         assert 'custom_role' in presets['roles']
 
 
+class TestGraphPresetServiceCache:
+    """Tests for the cached presets and compiled preset matches."""
+
+    def test_presets_are_cached_until_saved(self, organisation, django_assert_num_queries):
+        """Should read the configuration once, and again after a save."""
+        GraphPresetService.get_presets(organisation)
+        # The presets version
+        with django_assert_num_queries(1):
+            GraphPresetService.get_presets(organisation.id)
+
+        custom_presets = {'roles': {'custom_role': {}}, 'layers': {}}
+        GraphPresetService.save_presets(organisation, custom_presets)
+        assert GraphPresetService.get_presets(organisation) == custom_presets
+
+    def test_presets_are_invalidated_on_configuration_writes(self, organisation):
+        """Should drop the cached presets when their configuration is edited or deleted."""
+        config = GraphPresetService.save_presets(organisation, {'roles': {}, 'layers': {}})
+        GraphPresetService.get_presets(organisation)
+
+        config.content = {'roles': {'edited': {}}, 'layers': {}}
+        config.save()
+        assert 'edited' in GraphPresetService.get_presets(organisation)['roles']
+
+        config.delete()
+        assert GraphPresetService.get_presets(organisation) == DEFAULT_PRESETS
+
+    def test_compiled_matches_follow_the_model_revision(self, model, organisation, django_assert_max_num_queries):
+        """Should resolve presets from the compiled matches until the model changes."""
+        concept_ids = GraphPresetService.get_concept_ids_for_preset(model, role_id='business_architect', layer_ids=['application'])
+        # The model revision and the presets version
+        with django_assert_max_num_queries(1):
+            assert GraphPresetService.get_concept_ids_for_preset(model, role_id='business_architect', layer_ids=['application']) == concept_ids
+
+        strategy = OConcept.objects.create(model=model, name='Strategy Map', organisation=organisation)
+        assert str(strategy.id) in GraphPresetService.get_concept_ids_for_preset(model, role_id='business_architect')
+
+        GraphPresetService.save_presets(organisation, {'roles': {'business_architect': {'default_concepts': ['Capability']}}, 'layers': {}})
+        capability = OConcept.objects.get(model=model, name='Capability')
+        assert GraphPresetService.get_concept_ids_for_preset(model, role_id='business_architect') == [str(capability.id)]
+
+
 class TestGraphPresetServiceSavePresets:
     """Tests for save_presets method."""
 
@@ -24,7 +24,10 @@ from ontology.views.o_instance.o_instance_update import OInstanceUpdateView
 from ontology.views.o_model.o_model_copy import OModelCopyView
 from ontology.views.o_model.o_model_export import ModelExportView
 from ontology.views.o_model.o_model_gap_analysis import OModelGapAnalysisView
-from ontology.views.o_model.o_model_graph import OModelGraphView
+from ontology.views.o_model.o_model_graph import (OModelGraphJobStatusView,
+                                                  OModelGraphJobView,
+                                                  OModelGraphLayoutView,
+                                                  OModelGraphView)
 from ontology.views.o_model.o_model_impact_analysis import \
     OModelImpactAnalysisView
 from ontology.views.o_model.o_model_import import ModelImportView
@@ -98,6 +101,9 @@ urlpatterns = [
 
     path('o_model/json_list/', OModelJSONListView.as_view(), name='o_model_json_list'),
     path('o_model/graph/<uuid:model_id>/', OModelGraphView.as_view(), name='o_model_graph'),
+    path('o_model/graph/<uuid:model_id>/layout/', OModelGraphLayoutView.as_view(), name='o_model_graph_layout'),
+    path('o_model/graph/<uuid:model_id>/jobs/', OModelGraphJobView.as_view(), name='o_model_graph_job'),
+    path('o_model/graph/jobs/<str:job_id>/', OModelGraphJobStatusView.as_view(), name='o_model_graph_job_status'),
     path('o_model/filter/<uuid:model_id>/json', OModelJSONFilterView.as_view(), name='o_model_filter_json'),
     path('o_model/<uuid:model_id>/pathfinder/', OModelPathFinderView.as_view(), name='o_model_pathfinder'),
     path('o_model/<uuid:model_id>/gap_analysis/', OModelGapAnalysisView.as_view(), name='o_model_gap_analysis'),
@@ -2,14 +2,17 @@ import json
 
 from django.contrib.auth.mixins import LoginRequiredMixin
 
+from django.core.exceptions import SuspiciousOperation
 from django.http import  HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse
 from django.views.generic import View
 
-from ontology.controllers.o_model import ModelUtils
 from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation
 from openea.constants import Utils
+from organisation.constants import TIME_SCHEDULE_CHOICES, TIME_SCHEDULE_NOW, TIME_SCHEDULE_SCHEDULED
+from organisation.controllers.tasks import TaskController
+from organisation.models import TASK_STATUS_SUCCESS, TASK_TYPE_COPY, Task
 
 from utils.views.custom import ReferrerView
 
@@ -26,13 +29,37 @@ class OModelCopyView(LoginRequiredMixin, ReferrerView, View):
         model_1 = OModel.objects.get(id=model_id)
         
         self.get_current_organisation(request=request, args=args, kwargs=kwargs)
-        
-        new_model = ModelUtils.model_copy(model_1)
-        
-        return HttpResponseRedirect(reverse('o_model_detail', kwargs={'pk': new_model.id}))
+
+        config = {
+            'model_id': str(model_1.id),
+            'time_schedule': request.POST.get('time_schedule', TIME_SCHEDULE_SCHEDULED),
+        }
+        t = Task.objects.create(
+            name='copy',
+            description='',
+            type=TASK_TYPE_COPY,
+            config=json.dumps(config),
+            user=self.request.user,
+            organisation=model_1.organisation,
+            created_by=self.request.user
+        )
+
+        if config.get("time_schedule") == TIME_SCHEDULE_NOW:
+            if not TaskController.process_task(t):
+                # A task worker claimed it first, the task shows the progress
+                return HttpResponseRedirect(reverse('task_detail', kwargs={'pk': t.id}))
+            if t.status != TASK_STATUS_SUCCESS:
+                raise SuspiciousOperation('Unable to process the task %s: %s' %(str(t.id), str(t.error)))
+            return HttpResponseRedirect(reverse('o_model_detail', kwargs={'pk': json.loads(t.config)['new_model_id']}))
+
+        elif config.get("time_schedule") == TIME_SCHEDULE_SCHEDULED:
+            # Large models are copied by the task worker, the task shows the progress
+            return HttpResponseRedirect(reverse('task_detail', kwargs={'pk': t.id}))
+        else:
+            raise SuspiciousOperation('Unknown time_schedule: '+ config.get("time_schedule"))
     
     def get(self, request, *args, **kwargs):
         model_id = kwargs.pop('model_id')
         self.object = OModel.objects.get(id=model_id)
-        context = {"object": self.object}
+        context = {"object": self.object, "time_schedule_choices": TIME_SCHEDULE_CHOICES, "time_schedule": TIME_SCHEDULE_SCHEDULED}
         return render(request, "o_model/o_model_copy.html", context)
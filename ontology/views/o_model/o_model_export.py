@@ -5,7 +5,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import SuspiciousOperation
 from django.http import FileResponse, HttpResponseRedirect
 from django.shortcuts import render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views import View
 
 
@@ -65,7 +65,9 @@ class ModelExportView(LoginRequiredMixin, View):
             
             if config.get("time_schedule") == TIME_SCHEDULE_NOW:
                 
-                TaskController.process_task(t)
+                if not TaskController.process_task(t):
+                    # A task worker claimed it first, the task links to the export
+                    return HttpResponseRedirect(reverse('task_detail', kwargs={'pk': t.id}))
                 if t.status == TASK_STATUS_SUCCESS:
                     filename = t.attachment.file.name.split('/')[-1]
                     response = FileResponse(t.attachment, as_attachment=True, filename=filename)
@@ -7,6 +7,7 @@ from django.http import HttpResponse
 from django.shortcuts import render
 from django.views.generic import View
 
+from ontology.controllers.model_diff import ModelDiff
 from ontology.controllers.o_model import ModelUtils
 
 from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation
@@ -26,22 +27,18 @@ class OModelGapAnalysisView(LoginRequiredMixin, View):
         model_2 = OModel.objects.get(id=model_2_id)
         filters = data.get('filters', [])
 
-        show_model = self.request.user.acl.check(organisation=model_1.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OModel.get_object_type(), None)) \
-                     and self.request.user.acl.check(organisation=model_2.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OModel.get_object_type(), None))
-        show_relations = self.request.user.acl.check(organisation=model_1.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None)) \
-                         and self.request.user.acl.check(organisation=model_2.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None))
-        show_concepts = self.request.user.acl.check(organisation=model_1.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OConcept.get_object_type(), None)) \
-                        and self.request.user.acl.check(organisation=model_2.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OConcept.get_object_type(), None))
-        show_predicates = self.request.user.acl.check(organisation=model_1.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OPredicate.get_object_type(), None)) \
-                         and self.request.user.acl.check(organisation=model_2.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OPredicate.get_object_type(), None))
-        show_instances = self.request.user.acl.check(organisation=model_1.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OInstance.get_object_type(), None)) \
-                        and self.request.user.acl.check(organisation=model_2.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OInstance.get_object_type(), None))
+        permissions_list = [(Utils.PERMISSION_ACTION_VIEW, x.get_object_type(), None) for x in (OModel, ORelation, OConcept, OPredicate, OInstance)]
+        checks = [all(x) for x in zip(self.request.user.acl.check_many(organisation=model_1.organisation, permissions_list=permissions_list),
+                                      self.request.user.acl.check_many(organisation=model_2.organisation, permissions_list=permissions_list))]
+        show_model, show_relations, show_concepts, show_predicates, show_instances = checks
 
         if not (show_model and show_relations and show_concepts and show_predicates and show_instances):
             raise PermissionDenied('Permission Denied')
         
+        model_diff = ModelDiff(model_1, model_2)
         results = {
-            'results': ModelUtils.model_diff(model_1=model_1, model_2=model_2, filters=filters),
+            'results': model_diff.pairs(filters),
+            'summary': model_diff.counts,
             'model_1': ModelUtils.model_to_dict(model_1),
             'model_2': ModelUtils.model_to_dict(model_2)
         }
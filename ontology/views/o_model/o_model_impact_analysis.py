@@ -2,12 +2,16 @@ import base64
 import json
 
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 from django.views.generic import View
 
+from ontology.controllers.graph_layout import GraphLayout
+from ontology.controllers.graph_render import (GraphRenderBusy,
+                                               GraphRenderTimeout)
 from ontology.controllers.graphviz import GraphvizController
 from ontology.controllers.o_model import ModelUtils
 from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation
@@ -31,7 +35,15 @@ class OModelImpactAnalysisView(LoginRequiredMixin, View):
         predicate_ids = data.get('predicate_ids', [])
         if isinstance(predicate_ids, str):
             predicate_ids = [predicate_ids]
-        level = int(data.get('level', 3)) + 1
+        try:
+            level = int(data.get('level', 3)) + 1
+            node_budget = int(data.get('node_budget') or settings.IMPACT_ANALYSIS_NODE_BUDGET)
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest(json.dumps({'error': 'level and node_budget must be integers'}), content_type="application/json")
+        if settings.IMPACT_ANALYSIS_NODE_BUDGET:
+            # The deployment setting caps what a request may ask for
+            node_budget = min(node_budget, settings.IMPACT_ANALYSIS_NODE_BUDGET)
+        node_budget = max(node_budget, 1) if node_budget else None
         
         show_relations = self.request.user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None))
         show_concepts = self.request.user.acl.check(organisation=model.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, OConcept.get_object_type(), None))
@@ -41,20 +53,32 @@ class OModelImpactAnalysisView(LoginRequiredMixin, View):
         if not (show_relations and show_concepts and show_predicates and show_instances):
             raise PermissionDenied('Permission Denied')
         
-        results = ModelUtils.analyze_impact(root_instance=root_instance, predicate_ids=predicate_ids, level=level)
+        analysis = ModelUtils.analyze_impact(root_instance=root_instance, predicate_ids=predicate_ids, level=level, node_budget=node_budget)
+        results = analysis.as_objects()
         dictified_results = ModelUtils.dictify_impact_analysis(results)
         
+        result = {
+            'data': dictified_results,
+            'truncated': analysis.truncated,
+            'visited': analysis.visited
+        }
+        if data.get('format') == 'layout':
+            # Node positions for the browser to draw, rather than a Graphviz drawing
+            result['layout'] = GraphLayout.layout(GraphLayout.build_impact_analysis(results))
+            return HttpResponse(json.dumps(result, cls=GenericEncoder), content_type="application/json")
+
         graph_data = {
             'model': model,
             'nodes': results
         }
-        svg_str = GraphvizController.render_impact_analysis(format='svg', data=graph_data)
+        try:
+            svg_str = GraphvizController.render_impact_analysis(format='svg', data=graph_data)
+        except GraphRenderBusy as e:
+            return HttpResponse(json.dumps({'error': str(e)}), status=503, headers={'Retry-After': '5'}, content_type="application/json")
+        except GraphRenderTimeout as e:
+            return HttpResponse(json.dumps({'error': str(e)}), status=504, content_type="application/json")
         xmlSoup = BeautifulSoup(svg_str, 'html.parser')
         graph = xmlSoup.find('svg')
-
-        result = {
-            'data': dictified_results,
-            'graph': base64.b64encode(graph.encode('ascii')).decode("utf-8")
-        }
+        result['graph'] = base64.b64encode(graph.encode('ascii')).decode("utf-8")
 
         return HttpResponse(json.dumps(result, cls=GenericEncoder), content_type="application/json")
@@ -70,8 +70,8 @@ class ModelImportView(LoginRequiredMixin, View):
             
             if config.get("time_schedule") == TIME_SCHEDULE_NOW:
                 
-                TaskController.process_task(t)
-                if t.status == TASK_STATUS_SUCCESS:
+                # Run by a task worker when one claimed it first
+                if not TaskController.process_task(t) or t.status == TASK_STATUS_SUCCESS:
                     return HttpResponseRedirect(reverse('task_detail', kwargs={'pk': t.id}))
                 else:
                     raise SuspiciousOperation('Unable to process the task %s: %s' %(str(t.id), str(t.error)))
@@ -5,6 +5,7 @@ from django.http import HttpResponse
 from django.views.generic import View
 
 from openea.constants import Utils
+from ontology.controllers.batch_serializer import BatchSerializer
 from ontology.controllers.o_model import ModelUtils
 from ontology.models import OModel
 from ontology.plugins.json import GenericEncoder
@@ -17,12 +18,14 @@ class OModelJSONFilterView(LoginRequiredMixin, View):
         data = json.loads(request.body)
         filtered_data = ModelUtils.filter(user=self.request.user, data=data)
         
+        # A few queries per table rather than a few per row
+        predicates = {}
         result = {
-            'relations': [ModelUtils.relation_to_dict(x) for x in filtered_data['relations']],
-            'concepts': [ModelUtils.concept_to_dict(x) for x in filtered_data['concepts']],
-            'predicates': [ModelUtils.predicate_to_dict(x) for x in filtered_data['predicates']],
-            'instances': [ModelUtils.instance_to_dict(x) for x in filtered_data['instances']],
-            'slots': [ModelUtils.slot_to_dict(x) for x in filtered_data['slots']]
+            'relations': BatchSerializer.relations(filtered_data['relations']),
+            'concepts': BatchSerializer.concepts(filtered_data['concepts']),
+            'predicates': BatchSerializer.predicates(filtered_data['predicates']),
+            'instances': BatchSerializer.instances(filtered_data['instances'], predicates=predicates),
+            'slots': BatchSerializer.slots(filtered_data['slots'], predicates=predicates)
         }
 
         return HttpResponse(json.dumps(result, cls=GenericEncoder), content_type="application/json")
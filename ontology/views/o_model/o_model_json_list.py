@@ -3,6 +3,7 @@ from django.http import HttpResponse
 from django.views.generic import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 
+from ontology.controllers.batch_serializer import BatchSerializer
 from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation
 from ontology.plugins.json import GenericEncoder
 from openea.constants import Utils
@@ -34,12 +35,12 @@ class OModelJSONListView(LoginRequiredMixin, View):
                     "id": relation.id,
                     "name": relation.name,
                 }
-            for predicate in OPredicate.objects.filter(model=model).order_by('object__name').order_by('relation__name').order_by('subject__name'):
-                data[str(model.id)]["predicates"][str(predicate.id)] = {
-                    "id": predicate.id,
-                    "subject": predicate.subject.name,
-                    "relation": predicate.relation.name,
-                    "object": predicate.object.name,
+            for predicate in BatchSerializer.predicate_list(OPredicate.objects.filter(model=model).order_by('object__name').order_by('relation__name').order_by('subject__name')):
+                data[str(model.id)]["predicates"][str(predicate['id'])] = {
+                    "id": predicate['id'],
+                    "subject": predicate['subject'],
+                    "relation": predicate['relation'],
+                    "object": predicate['object'],
                 }
             for instance in OInstance.objects.filter(model=model).order_by('name'):
                 data[str(model.id)]["instances"][str(instance.id)] = {
@@ -1,12 +1,16 @@
 import json
 from uuid import UUID
 
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest
 
 from django.views.generic import View
 from ontology.controllers.o_model import ModelUtils
+from ontology.controllers.pathfinder import (DEFAULT_MAX_DEPTH,
+                                             DEFAULT_MAX_PATHS,
+                                             RELATION_SCOPE_FIRST)
 
 from ontology.models import OConcept, OInstance, OModel, OPredicate, ORelation
 from ontology.plugins.json import GenericEncoder
@@ -37,6 +41,14 @@ class OModelPathFinderView(LoginRequiredMixin, View):
                     except (ValueError, TypeError):
                         pass
             relation_ids = set(valid_ids) if valid_ids else None
+        relation_scope = data.get('relation_scope') or RELATION_SCOPE_FIRST
+
+        # Search limits, capped by the deployment settings
+        try:
+            max_depth = min(max(int(data.get('max_depth') or DEFAULT_MAX_DEPTH), 1), settings.PATHFINDER_MAX_DEPTH)
+            max_paths = min(max(int(data.get('max_paths') or DEFAULT_MAX_PATHS), 1), settings.PATHFINDER_MAX_PATHS)
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest(json.dumps({'error': 'max_depth and max_paths must be integers'}), content_type="application/json")
 
         # Check permissions for start instance
         show_relations = self.request.user.acl.check(organisation=start_instance.organisation, permissions_required=(Utils.PERMISSION_ACTION_VIEW, ORelation.get_object_type(), None))
@@ -60,7 +72,9 @@ class OModelPathFinderView(LoginRequiredMixin, View):
                 start_instance=start_instance,
                 end_concept=end_concept,
                 max_results=max_results,
-                relation_ids=relation_ids
+                relation_ids=relation_ids,
+                max_depth=max_depth,
+                relation_scope=relation_scope
             )
         else:
             # Single-instance mode: find path between two specific instances
@@ -73,7 +87,10 @@ class OModelPathFinderView(LoginRequiredMixin, View):
             result = ModelUtils.find_paths(
                 start_instance=start_instance,
                 end_instance=end_instance,
-                relation_ids=relation_ids
+                relation_ids=relation_ids,
+                max_paths=max_paths,
+                max_depth=max_depth,
+                relation_scope=relation_scope
             )
 
         return HttpResponse(json.dumps(result, cls=GenericEncoder), content_type="application/json")
@@ -71,6 +71,7 @@ INSTALLED_APPS += [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'log.middleware.profiling.SQLProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -243,6 +244,45 @@ SELECT2_CACHE_BACKEND = "select2"
 
 MAX_GRAPH_NODES = ini_config.getint('Graph', "MAX_GRAPH_NODES", fallback=50)
 MAX_LENGTH_GRAPH_NODE_TEXT = ini_config.getint('Graph', "MAX_LENGTH_GRAPH_NODE_TEXT", fallback=30)
+GRAPH_INDEX_CACHE_SIZE = ini_config.getint('Graph', "GRAPH_INDEX_CACHE_SIZE", fallback=8)
+IMPACT_ANALYSIS_NODE_BUDGET = ini_config.getint('Graph', "IMPACT_ANALYSIS_NODE_BUDGET", fallback=2000)
+PATHFINDER_MAX_DEPTH = ini_config.getint('Graph', "PATHFINDER_MAX_DEPTH", fallback=8)
+PATHFINDER_MAX_PATHS = ini_config.getint('Graph', "PATHFINDER_MAX_PATHS", fallback=20)
+GRAPH_RENDER_CACHE_TIMEOUT = ini_config.getint('Graph', "GRAPH_RENDER_CACHE_TIMEOUT", fallback=86400)
+GRAPH_RENDER_LOCK_TIMEOUT = ini_config.getint('Graph', "GRAPH_RENDER_LOCK_TIMEOUT", fallback=60)
+GRAPH_RENDER_WORKERS = ini_config.getint('Graph', "GRAPH_RENDER_WORKERS", fallback=2)
+GRAPH_RENDER_QUEUE_SIZE = ini_config.getint('Graph', "GRAPH_RENDER_QUEUE_SIZE", fallback=16)
+GRAPH_RENDER_JOB_TIMEOUT = ini_config.getint('Graph', "GRAPH_RENDER_JOB_TIMEOUT", fallback=120)
+GRAPH_LAYOUT_MAX_NODES = ini_config.getint('Graph', "GRAPH_LAYOUT_MAX_NODES", fallback=20000)
+GRAPH_LAYOUT_CACHE_TIMEOUT = ini_config.getint('Graph', "GRAPH_LAYOUT_CACHE_TIMEOUT", fallback=604800)
+GRAPH_TRAVERSAL_BACKEND = ini_config.get('Graph', "GRAPH_TRAVERSAL_BACKEND", fallback='python')
+GRAPH_PRESETS_CACHE_TIMEOUT = ini_config.getint('Graph', "GRAPH_PRESETS_CACHE_TIMEOUT", fallback=3600)
+
+IMPORT_CHUNK_SIZE = ini_config.getint('Import', "CHUNK_SIZE", fallback=1000)
+EXPORT_CHUNK_SIZE = ini_config.getint('Export', "CHUNK_SIZE", fallback=500)
+CHANGE_FEED_PAGE_SIZE = ini_config.getint('ChangeFeed', "PAGE_SIZE", fallback=1000)
+
+ACL_CACHE_TIMEOUT = ini_config.getint('Authorization', "ACL_CACHE_TIMEOUT", fallback=300)
+
+AUDIT_LOG_MODE = ini_config.get('Audit', "MODE", fallback='request')
+AUDIT_LOG_QUEUE_SIZE = ini_config.getint('Audit', "QUEUE_SIZE", fallback=1000)
+AUDIT_LOG_BATCH_SIZE = ini_config.getint('Audit', "BATCH_SIZE", fallback=500)
+AUDIT_LOG_SPOOL_PATH = ini_config.get('Audit', "SPOOL_PATH", fallback=str(BASE_DIR / 'audit_spool.jsonl'))
+
+SQL_PROFILE_ENABLED = ini_config.getboolean('Profiling', "ENABLED", fallback=True)
+SQL_PROFILE_SERVER_TIMING = ini_config.getboolean('Profiling', "SERVER_TIMING", fallback=True)
+SQL_PROFILE_SLOW_THRESHOLD = ini_config.getint('Profiling', "SLOW_THRESHOLD", fallback=1000)
+SQL_PROFILE_BUFFER_SIZE = ini_config.getint('Profiling', "BUFFER_SIZE", fallback=100)
+SQL_PROFILE_DUPLICATE_THRESHOLD = ini_config.getint('Profiling', "DUPLICATE_THRESHOLD", fallback=5)
+SQL_PROFILE_PUBLISH_INTERVAL = ini_config.getint('Profiling', "PUBLISH_INTERVAL", fallback=30)
+
+TASK_WORKER_PROCESSES = ini_config.getint('Tasks', "WORKER_PROCESSES", fallback=2)
+TASK_WORKER_ORGANISATION_CONCURRENCY = ini_config.getint('Tasks', "ORGANISATION_CONCURRENCY", fallback=1)
+TASK_WORKER_MAX_ATTEMPTS = ini_config.getint('Tasks', "MAX_ATTEMPTS", fallback=3)
+TASK_WORKER_RETRY_BACKOFF = ini_config.getint('Tasks', "RETRY_BACKOFF", fallback=60)
+TASK_WORKER_HEARTBEAT_INTERVAL = ini_config.getint('Tasks', "HEARTBEAT_INTERVAL", fallback=15)
+TASK_WORKER_STALE_TIMEOUT = ini_config.getint('Tasks', "STALE_TIMEOUT", fallback=120)
+TASK_WORKER_POLL_INTERVAL = ini_config.getint('Tasks', "POLL_INTERVAL", fallback=5)
 
 EMAIL_BACKEND = ini_config.get('Email', "EMAIL_BACKEND", fallback='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = ini_config.get('Email', "EMAIL_HOST", fallback='localhost')
@@ -19,6 +19,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from log.admin import SQLProfileView
+
 urlpatterns = [
     path('', include('webapp.urls'), name="webapp")
 ]
@@ -34,6 +36,7 @@ urlpatterns += [
     path('', include('pagedown.urls')),
     path('i18n/', include('django.conf.urls.i18n')),
     path('select2/', include('django_select2.urls')),
+    path('admin/sql-profile/', admin.site.admin_view(SQLProfileView.as_view()), name='sql_profile'),
     path('admin/', admin.site.urls),
     path('rosetta/', include('rosetta.urls')),
     path('api/', include('api.urls'))
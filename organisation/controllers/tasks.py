@@ -1,16 +1,16 @@
 
 import json
 import os
-import traceback
 
 from django.utils import timezone
 
+from ontology.controllers.model_copy import ModelCopier
 from ontology.models import OModel
 from ontology.plugins import EXPORTERS, IMPORTERS
 from organisation.controllers.filestore import MediaFileStorage
 from organisation.models import (TASK_PROCESSABLE_STATUSES,
-                                 TASK_STATUS_FAILURE, TASK_STATUS_SUCCESS,
-                                 TASK_TYPE_EXPORT, TASK_TYPE_IMPORT, Task)
+                                 TASK_TYPE_COPY, TASK_TYPE_EXPORT,
+                                 TASK_TYPE_IMPORT, Task)
 
 
 class TaskController:
@@ -27,17 +27,17 @@ class TaskController:
             
 
     def process_task(task):
-        try:
-            task.started_at = timezone.now()
-            result = TaskController.run_task(task=task)
-            task.status = TASK_STATUS_SUCCESS
-        except Exception as e:
-            task.status = TASK_STATUS_FAILURE
-            #task.error = traceback.format_exc()
-            task.error = str(e)
-            traceback.print_exc()
-        task.ended_at = timezone.now()
-        task.save()
+        """Claim a task and run it in this process, see TaskWorker.run_inline.
+
+        Returns:
+            bool: False when the task was claimed by a task worker, it runs there
+        """
+        # Imported here, the worker runs its tasks through this controller
+        from organisation.controllers.worker import TaskWorker
+
+        processed = TaskWorker(processes=1).run_inline(task)
+        task.refresh_from_db()
+        return processed
 
 
     def run_task(task):
@@ -89,10 +89,34 @@ class TaskController:
             task.attachment = str(media_storage.get_media_root_file_path(path / filename))
             return filename
 
+        elif task.type == TASK_TYPE_COPY:
+            config = json.loads(task.config)
+
+            model = OModel.objects.get(id=config['model_id'])
+            TaskController.check_task_model_authorization(task=task, model=model)
+
+            copier = ModelCopier(model, user=task.user or task.created_by, progress=TaskController.progress_reporter(task))
+            new_model = copier.copy(name=config.get('name'))
+            # Kept in the config so the task links to the copy
+            config['new_model_id'] = str(new_model.id)
+            task.config = json.dumps(config)
+            task.progress = 100
+            return str(new_model.id)
+
         else:
             raise ValueError('UNEXPECTED_TASK_TYPE')
 
 
+    def progress_reporter(task):
+        """A progress callback storing the percentage done on the task, written only when it changes."""
+        def report(done, total):
+            progress = min(done * 100 // total, 100) if total else 0
+            if progress != task.progress:
+                task.progress = progress
+                Task._base_manager.filter(id=task.id).update(progress=progress)
+        return report
+
+
     def check_task_model_authorization(task, model):
         #TODO: User is admin? (only admin can create a task on behalf of another user)
         
@@ -0,0 +1,240 @@
+"""
+Long-running, parallel task worker.
+
+Pending tasks are claimed in a transaction with
+``select_for_update(skip_locked=True)``, so several workers (on one or many
+hosts) never pick the same task, and marked STARTED with the claiming
+worker's name. The worker runs them in a process pool; while a task runs its
+process refreshes ``heartbeat_at``. A STARTED task whose heartbeat is older
+than the stale timeout lost its worker and is put back for a retry.
+
+No organisation may have more than ``organisation_concurrency`` tasks
+started at once (claims lock the rows of the organisations they count), so one big export does not hold back the imports of every
+other organisation. Failed tasks are retried with exponential backoff until
+``max_attempts`` is reached.
+"""
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from organisation.controllers.tasks import TaskController
+from organisation.models import (TASK_PROCESSABLE_STATUSES,
+                                 TASK_STATUS_FAILURE, TASK_STATUS_PENDING,
+                                 TASK_STATUS_STARTED, TASK_STATUS_SUCCESS,
+                                 Organisation, Task)
+
+logger = logging.getLogger(__name__)
+
+WORKER_LOST = 'WORKER_LOST'
+
+
+class TaskWorker:
+
+    def __init__(self, processes=None, organisation_concurrency=None, max_attempts=None, retry_backoff=None,
+                 heartbeat_interval=None, stale_timeout=None, poll_interval=None, name=None):
+        """
+        Args:
+            processes: Size of the process pool, defaults to settings.TASK_WORKER_PROCESSES
+            organisation_concurrency: Maximum started tasks per organisation, defaults to settings.TASK_WORKER_ORGANISATION_CONCURRENCY
+            max_attempts: Attempts before a failing task is given up, defaults to settings.TASK_WORKER_MAX_ATTEMPTS
+            retry_backoff: Seconds before the first retry, doubled at each attempt, defaults to settings.TASK_WORKER_RETRY_BACKOFF
+            heartbeat_interval: Seconds between two heartbeats of a running task, defaults to settings.TASK_WORKER_HEARTBEAT_INTERVAL
+            stale_timeout: Seconds without heartbeat after which a started task is considered lost, defaults to settings.TASK_WORKER_STALE_TIMEOUT
+            poll_interval: Seconds between two looks for new tasks, defaults to settings.TASK_WORKER_POLL_INTERVAL
+            name: Name recorded on the claimed tasks, defaults to host:pid
+        """
+        self.processes = max(processes or settings.TASK_WORKER_PROCESSES, 1)
+        self.organisation_concurrency = max(organisation_concurrency or settings.TASK_WORKER_ORGANISATION_CONCURRENCY, 1)
+        self.max_attempts = max(max_attempts or settings.TASK_WORKER_MAX_ATTEMPTS, 1)
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.TASK_WORKER_RETRY_BACKOFF
+        self.heartbeat_interval = heartbeat_interval or settings.TASK_WORKER_HEARTBEAT_INTERVAL
+        self.stale_timeout = stale_timeout or settings.TASK_WORKER_STALE_TIMEOUT
+        self.poll_interval = poll_interval or settings.TASK_WORKER_POLL_INTERVAL
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.stopping = threading.Event()
+
+    #======================================================================================
+    # Main loop
+
+    def run(self, once=False):
+        """Claim and run tasks until stopped, or until nothing is left to do when once is set."""
+        # Children must not share the parent's database connections
+        connections.close_all()
+        running = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=init_worker_process) as pool:
+            while not self.stopping.is_set():
+                self.recover_stale()
+                for task in self.claim(self.processes - len(running)):
+                    logger.info('Worker %s started task %s:%s', self.name, task.id, task.name)
+                    running[pool.submit(run_in_process, task.id, self.name, self.config())] = task.id
+
+                if once and not running:
+                    break
+                done, pending = concurrent.futures.wait(running, timeout=self.poll_interval, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task_id = running.pop(future)
+                    try:
+                        logger.info('Worker %s finished task %s: %s', self.name, task_id, future.result())
+                    except Exception:
+                        # The process died, the heartbeat stops and the task is recovered as stale
+                        logger.error('Worker %s lost task %s: %s', self.name, task_id, traceback.format_exc())
+
+            concurrent.futures.wait(running)
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def config(self):
+        return {
+            'max_attempts': self.max_attempts,
+            'retry_backoff': self.retry_backoff,
+            'heartbeat_interval': self.heartbeat_interval,
+        }
+
+    #======================================================================================
+    # Claiming
+
+    def claim(self, limit):
+        """Mark up to `limit` runnable tasks STARTED by this worker and return them."""
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        claimed = []
+        with transaction.atomic():
+            # Enough candidates to fill the slots even if some organisations are at their limit
+            candidates = list(Task._base_manager.select_for_update(skip_locked=True).filter(self.runnable(now)).order_by('created_at')[:limit * 10])
+            started = self.lock_organisations({x.organisation_id for x in candidates if x.organisation_id is not None})
+            for task in candidates:
+                if started.get(task.organisation_id, 0) >= self.organisation_concurrency:
+                    continue
+                if not self.claim_task(task, now):
+                    continue
+                started[task.organisation_id] = started.get(task.organisation_id, 0) + 1
+                claimed.append(task)
+                if len(claimed) >= limit:
+                    break
+        return claimed
+
+    def claim_task(self, task, now):
+        """Mark one task STARTED by this worker, unless another worker claimed it since it was read."""
+        # Conditional update, a concurrent claim on a backend without row locks updates nothing
+        if Task._base_manager.filter(id=task.id, status=task.status, attempts=task.attempts).update(
+                status=TASK_STATUS_STARTED, worker=self.name, started_at=now, heartbeat_at=now, ended_at=None, attempts=task.attempts + 1) == 0:
+            return False
+        task.status = TASK_STATUS_STARTED
+        task.worker = self.name
+        task.attempts += 1
+        return True
+
+    def run_inline(self, task):
+        """Claim a task and run it in this process, for the requests that wait for its outcome.
+
+        Returns:
+            bool: False when the task is not runnable or another worker claimed it first, it is then left to that worker
+        """
+        if task.status not in TASK_PROCESSABLE_STATUSES or not self.claim_task(task, timezone.now()):
+            return False
+        execute_task(task.id, self.name, self.config())
+        return True
+
+    def lock_organisations(self, organisation_ids):
+        """Lock the organisation rows until the claim commits and count their started tasks.
+
+        Claims of the same organisation wait for each other, so the count includes the tasks
+        another worker started meanwhile and the concurrency limit holds across workers.
+
+        Returns:
+            dict: Number of started tasks per organisation id
+        """
+        # In id order, two claims never wait for each other's locks
+        list(Organisation._base_manager.select_for_update().filter(id__in=organisation_ids).order_by('id').values_list('id', flat=True))
+        return dict(Task._base_manager.filter(status=TASK_STATUS_STARTED).values_list('organisation_id').annotate(count=Count('id')).values_list('organisation_id', 'count'))
+
+    def runnable(self, now):
+        retry = Q(status=TASK_STATUS_FAILURE, attempts__lt=self.max_attempts) & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        return Q(status=TASK_STATUS_PENDING) | retry
+
+    def recover_stale(self):
+        """Put back the started tasks whose worker stopped sending heartbeats."""
+        now = timezone.now()
+        stale = Q(heartbeat_at__lt=now - timedelta(seconds=self.stale_timeout)) | Q(heartbeat_at__isnull=True)
+        return Task._base_manager.filter(stale, status=TASK_STATUS_STARTED).update(
+            status=TASK_STATUS_FAILURE, error=WORKER_LOST, ended_at=now, next_attempt_at=now, worker=None)
+
+
+#======================================================================================
+# Worker processes
+
+def init_worker_process():
+    import django
+    django.setup()
+    # The pool's workers leave signals to the parent, which drains them on shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_in_process(task_id, worker_name, config):
+    try:
+        return execute_task(task_id, worker_name, config)
+    finally:
+        connection.close()
+
+
+def execute_task(task_id, worker_name, config):
+    """Run one claimed task, sending heartbeats meanwhile, and record its outcome."""
+    task = Task._base_manager.get(id=task_id)
+    done = threading.Event()
+    heartbeat = threading.Thread(target=send_heartbeats, args=(task_id, worker_name, config['heartbeat_interval'], done), daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            TaskController.run_task(task=task)
+            task.status = TASK_STATUS_SUCCESS
+            task.error = None
+            task.next_attempt_at = None
+        except Exception as e:
+            task.status = TASK_STATUS_FAILURE
+            task.error = str(e)
+            task.next_attempt_at = retry_at(task.attempts, config['max_attempts'], config['retry_backoff'])
+            logger.error("{} {}: {}".format(task.id, task.name, traceback.format_exc()))
+        task.ended_at = timezone.now()
+        # Conditional update, a task recovered as stale and claimed again meanwhile belongs to its new run
+        if Task._base_manager.filter(id=task.id, worker=worker_name, status=TASK_STATUS_STARTED, attempts=task.attempts).update(
+                status=task.status, error=task.error, next_attempt_at=task.next_attempt_at, ended_at=task.ended_at, worker=None,
+                attachment=task.attachment, progress=task.progress, config=task.config, modified_at=task.ended_at) == 0:
+            logger.warning('Worker %s lost task %s before it ended, its %s outcome is dropped', worker_name, task.id, task.status)
+            return WORKER_LOST
+    finally:
+        done.set()
+        heartbeat.join()
+    return task.status
+
+
+def send_heartbeats(task_id, worker_name, interval, done):
+    try:
+        while not done.wait(interval):
+            Task._base_manager.filter(id=task_id, worker=worker_name, status=TASK_STATUS_STARTED).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def retry_at(attempts, max_attempts, retry_backoff):
+    """When a task failing at its `attempts`-th attempt is tried again, None once out of attempts."""
+    if attempts >= max_attempts:
+        return None
+    return timezone.now() + timedelta(seconds=retry_backoff * 2 ** (max(attempts, 1) - 1))
@@ -1,16 +1,10 @@
-import json
 import logging
-import os
-import threading
-import traceback
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
 from organisation.controllers.tasks import TaskController
 from organisation.models import (TASK_PROCESSABLE_STATUSES,
-                                 TASK_STATUS_FAILURE, TASK_STATUS_SUCCESS,
-                                 Task)
+                                 TASK_STATUS_SUCCESS, Task)
 
 logger = logging.getLogger(__name__)
 
@@ -41,16 +35,10 @@ class Command(BaseCommand):
 
     def process_task(self, task):
         self.stdout.write(self.style.NOTICE('Started task "%s:%s"' % (task.id, task.name)))
-        try:
-            task.started_at = timezone.now()
-            result = TaskController.run_task(task=task)
-            task.status = TASK_STATUS_SUCCESS
+        # Claimed like the task worker does, a task a running worker took is left to it
+        if not TaskController.process_task(task):
+            self.stdout.write(self.style.WARNING('Task "%s:%s" is run by worker %s' % (task.id, task.name, task.worker)))
+        elif task.status == TASK_STATUS_SUCCESS:
             self.stdout.write(self.style.SUCCESS('Successfully closed task "%s:%s"' % (task.id, task.name)))
-            task.error = None
-        except Exception as e:
-            task.status = TASK_STATUS_FAILURE
-            task.error = str(e)
-            self.stdout.write(self.style.ERROR('Unable to process task "%s(%s):%s"' % (task.id, task.name, traceback.format_exc())))
-            logger.error("{} {}: {}".format(task.id, task.name, traceback.format_exc()))
-        task.ended_at = timezone.now()
-        task.save()
+        else:
+            self.stdout.write(self.style.ERROR('Unable to process task "%s(%s):%s"' % (task.id, task.name, task.error)))
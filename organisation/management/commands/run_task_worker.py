@@ -0,0 +1,23 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from organisation.controllers.worker import TaskWorker
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Runs pending import/export tasks in a pool of processes until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, help='Size of the process pool')
+        parser.add_argument('--organisation-concurrency', type=int, help='Maximum tasks running at once per organisation')
+        parser.add_argument('--once', action='store_true', help='Stop when no task is left to run')
+
+    def handle(self, *args, **options):
+        worker = TaskWorker(processes=options['processes'], organisation_concurrency=options['organisation_concurrency'])
+        worker.install_signal_handlers()
+        self.stdout.write(self.style.NOTICE('Task worker %s started with %s processes' % (worker.name, worker.processes)))
+        worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS('Task worker %s stopped' % worker.name))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0002_task_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='type',
+            field=models.CharField(choices=[('IMPORT', 'Import'), ('EXPORT', 'Export'), ('COPY', 'Copy')], default='IMPORT', max_length=10),
+        ),
+    ]
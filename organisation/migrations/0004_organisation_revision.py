@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0003_task_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organisation',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
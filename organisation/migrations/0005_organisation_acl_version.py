@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0004_organisation_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organisation',
+            name='acl_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
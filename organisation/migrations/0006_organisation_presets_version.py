@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0005_organisation_acl_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organisation',
+            name='presets_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -4,7 +4,7 @@ from django.db import models
 from django.utils.translation import gettext as _
 from log.middleware.request import get_request
 from openea.constants import Utils
-from utils.generic import GenericModel
+from utils.generic import AuditQuerySet, GenericModel
 
 User = get_user_model()
 
@@ -14,9 +14,11 @@ User = get_user_model()
 ###############################################################################
 TASK_TYPE_IMPORT = 'IMPORT'
 TASK_TYPE_EXPORT = 'EXPORT'
+TASK_TYPE_COPY = 'COPY'
 TASK_TYPE = [
     (TASK_TYPE_IMPORT, 'Import'),
-    (TASK_TYPE_EXPORT, 'Export')
+    (TASK_TYPE_EXPORT, 'Export'),
+    (TASK_TYPE_COPY, 'Copy')
 ]
 
 TASK_STATUS_PENDING = 'PENDING'
@@ -53,7 +55,7 @@ TASK_PROCESSABLE_STATUSES = [TASK_STATUS_PENDING, TASK_STATUS_FAILURE]
 #         obj_data['deleted_by'] = None
 #         return super().create(**obj_data) # Python 3 syntax!!
 
-class OrganisationManager(models.Manager):
+class OrganisationManager(models.Manager.from_queryset(AuditQuerySet)):
     def get_queryset(self):
         request = get_request()
         if request and request.user and request.user.is_authenticated:
@@ -68,6 +70,13 @@ class Organisation(GenericModel, models.Model):
     location = models.CharField(max_length=1024)
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Incremented on every write to one of the models of the organisation, see ontology.controllers.revision
+    revision = models.PositiveBigIntegerField(default=0, editable=False)
+    # Incremented when its permissions change, see authorization.controllers.acl
+    acl_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Incremented when its graph presets change, see ontology.services.graph_presets
+    presets_version = models.PositiveBigIntegerField(default=0, editable=False)
+    counter_fields = ('revision', 'acl_version', 'presets_version')
 
     created_at = models.DateTimeField(verbose_name=_("Created at"), auto_now_add=True, null=True)
     created_by = models.ForeignKey(User, verbose_name=_("Created by"), on_delete=models.PROTECT, null=True, related_name='organisation_created')
@@ -155,6 +164,11 @@ class Task(GenericModel, models.Model):
     error = models.TextField(blank=True, null=True)
     started_at = models.DateTimeField(null=True)
     ended_at = models.DateTimeField(null=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.PROTECT, null=True, related_name='tasks')
     organisation = models.ForeignKey(Organisation, on_delete=models.CASCADE, null=True, related_name='organisation_tasks')
 
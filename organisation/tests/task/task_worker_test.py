@@ -0,0 +1,123 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from organisation.controllers.tasks import TaskController
+from organisation.controllers.worker import WORKER_LOST, TaskWorker, execute_task
+from organisation.models import (TASK_STATUS_FAILURE, TASK_STATUS_PENDING,
+                                 TASK_STATUS_STARTED, TASK_STATUS_SUCCESS,
+                                 TASK_TYPE_EXPORT, Task)
+from utils.test.helpers import create_organisation, create_task, populate_test_env
+
+
+class TaskWorkerTestCase(TestCase):
+    def setUp(self):
+        populate_test_env(self)
+        self.org_2 = create_organisation(name='Org 2', description='', location='test')
+        self.worker = TaskWorker(processes=2, organisation_concurrency=1, max_attempts=3, retry_backoff=60, heartbeat_interval=60, stale_timeout=120, name='test-worker')
+        self.config = self.worker.config()
+
+    def create_task(self, organisation, name, config=None, status=TASK_STATUS_PENDING):
+        config = config or {'model_id': str(self.org_1_model_1.id), 'format': 'JSON', 'knowledge_set': 'ONTOLOGY'}
+        return create_task(organisation=organisation, user=self.org_1_user_1, name=name, type=TASK_TYPE_EXPORT, status=status, config=json.dumps(config))
+
+    def test_claim_per_organisation(self):
+        task_1 = self.create_task(self.org_1, 'org_1_task_1')
+        self.create_task(self.org_1, 'org_1_task_2')
+        task_3 = self.create_task(self.org_2, 'org_2_task_1')
+
+        # One task per organisation, the second one of Org 1 waits
+        claimed = self.worker.claim(2)
+        self.assertEqual({x.id for x in claimed}, {task_1.id, task_3.id})
+        task_1.refresh_from_db()
+        self.assertEqual((task_1.status, task_1.worker, task_1.attempts), (TASK_STATUS_STARTED, 'test-worker', 1))
+        self.assertEqual(self.worker.claim(2), [])
+
+    def test_claim_per_organisation_across_workers(self):
+        task_1 = self.create_task(self.org_1, 'org_1_task_1')
+        task_2 = self.create_task(self.org_1, 'org_1_task_2')
+        other_worker = TaskWorker(organisation_concurrency=1, max_attempts=3, name='other-worker')
+
+        class InterleavedTaskWorker(TaskWorker):
+            # The other worker claims once this one selected its candidates
+            def lock_organisations(self, organisation_ids):
+                self.claimed_meanwhile = other_worker.claim(1)
+                return super().lock_organisations(organisation_ids)
+
+        worker = InterleavedTaskWorker(organisation_concurrency=1, max_attempts=3, name='test-worker')
+
+        # Both see a free slot for Org 1 before claiming, only one task of it is started
+        self.assertEqual(worker.claim(2), [])
+        self.assertEqual([x.id for x in worker.claimed_meanwhile], [task_1.id])
+        self.assertEqual(Task.objects.filter(organisation=self.org_1, status=TASK_STATUS_STARTED).count(), 1)
+        task_2.refresh_from_db()
+        self.assertEqual(task_2.status, TASK_STATUS_PENDING)
+
+    def test_inline_run_claims_the_task(self):
+        task = self.create_task(self.org_1, 'org_1_task_1')
+        self.assertTrue(TaskController.process_task(task))
+        self.assertEqual((task.status, task.worker, task.attempts), (TASK_STATUS_SUCCESS, None, 1))
+        self.assertEqual(self.worker.claim(1), [])
+
+        # Claimed by a worker after the view created it, the inline run leaves it to the worker
+        task = self.create_task(self.org_2, 'org_2_task_1')
+        self.worker.claim(1)
+        self.assertFalse(TaskController.process_task(task))
+        self.assertEqual((task.status, task.worker, task.attempts), (TASK_STATUS_STARTED, 'test-worker', 1))
+
+    def test_retry_with_backoff(self):
+        task = self.create_task(self.org_1, 'org_1_task_1', config={'model_id': str(self.org_2.id), 'format': 'JSON', 'knowledge_set': 'ONTOLOGY'})
+        self.worker.claim(1)
+        self.assertEqual(execute_task(task.id, self.worker.name, self.config), TASK_STATUS_FAILURE)
+        task.refresh_from_db()
+        self.assertEqual(task.worker, None)
+        self.assertGreater(task.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet, then due
+        self.assertEqual(self.worker.claim(1), [])
+        Task.objects.filter(id=task.id).update(next_attempt_at=timezone.now())
+        self.assertEqual([x.id for x in self.worker.claim(1)], [task.id])
+        execute_task(task.id, self.worker.name, self.config)
+        task.refresh_from_db()
+        self.assertGreater(task.next_attempt_at, timezone.now() + timedelta(seconds=110))
+
+        # Out of attempts
+        Task.objects.filter(id=task.id).update(next_attempt_at=timezone.now())
+        self.worker.claim(1)
+        execute_task(task.id, self.worker.name, self.config)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.next_attempt_at), (TASK_STATUS_FAILURE, 3, None))
+        self.assertEqual(self.worker.claim(1), [])
+
+    def test_execute_success(self):
+        task = self.create_task(self.org_1, 'org_1_task_1')
+        self.worker.claim(1)
+        self.assertEqual(execute_task(task.id, self.worker.name, self.config), TASK_STATUS_SUCCESS)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.error, task.worker), (TASK_STATUS_SUCCESS, None, None))
+        self.assertTrue(task.attachment.name.endswith('.json'))
+
+    def test_recover_stale(self):
+        task = self.create_task(self.org_1, 'org_1_task_1')
+        self.worker.claim(1)
+        self.assertEqual(self.worker.recover_stale(), 0)
+
+        Task.objects.filter(id=task.id).update(heartbeat_at=timezone.now() - timedelta(seconds=600))
+        self.assertEqual(self.worker.recover_stale(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.error), (TASK_STATUS_FAILURE, WORKER_LOST))
+        self.assertEqual([x.id for x in self.worker.claim(1)], [task.id])
+
+    def test_outcome_of_a_lost_task_is_dropped(self):
+        task = self.create_task(self.org_1, 'org_1_task_1')
+        self.worker.claim(1)
+
+        # Recovered as stale and claimed by another worker before the first run ends
+        Task.objects.filter(id=task.id).update(heartbeat_at=timezone.now() - timedelta(seconds=600))
+        self.worker.recover_stale()
+        TaskWorker(name='other-worker', max_attempts=3).claim(1)
+        self.assertEqual(execute_task(task.id, self.worker.name, self.config), WORKER_LOST)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.worker, task.attempts, task.ended_at), (TASK_STATUS_STARTED, 'other-worker', 2, None))
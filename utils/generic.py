@@ -1,3 +1,5 @@
+from django.db import connection, models, transaction
+from django.dispatch import Signal
 from django.utils import timezone
 
 from log.middleware.request import get_request
@@ -14,6 +16,38 @@ def set_system_fields(obj, user, delete=False):
         obj.modified_at = timezone.now()
 
 
+# Sent by GenericModel.save and delete once the row is written, in the same transaction, with the
+# instance, its primary key (cleared on the instance by a delete) and an action ('created',
+# 'updated' or 'deleted'). Unlike post_delete it is not sent for the rows
+# removed by a cascade, so listening to it keeps the fast deletes of the related tables.
+entity_written = Signal()
+
+# Sent by AuditQuerySet.update and bulk_update once the rows are written, in the same transaction,
+# with the primary keys of the updated rows ('pks'). The matched rows are only read when a receiver
+# is connected for the sender.
+entities_updated = Signal()
+
+AUDIT_EXCLUDED_FIELDS = ['created_at', 'created_by', 'modified_at', 'modified_by', 'deleted_at', 'deleted_by']
+
+_audited_fields = {}
+
+
+def get_audited_fields(model_class):
+    """Attribute names of the concrete fields whose changes are logged."""
+    fields = _audited_fields.get(model_class)
+    if fields is None:
+        fields = [x.attname for x in model_class._meta.concrete_fields if x.name not in AUDIT_EXCLUDED_FIELDS]
+        _audited_fields[model_class] = fields
+    return fields
+
+
+def get_log_object():
+    request = get_request()
+    if request is not None and isinstance(getattr(request, 'log_object', None), list):
+        return request.log_object
+    return None
+
+
 def get_or_none(model, *args, **kwargs):
     try:
         return model.objects.get(*args, **kwargs)
@@ -21,6 +55,9 @@ def get_or_none(model, *args, **kwargs):
         return None
     
 class GenericModel:
+    # Fields only ever incremented in the database (revisions), save() never writes back the loaded value
+    counter_fields = ()
+
     def __init_subclass__(cls, **kwargs):
         from openea.constants import OBJECT_TYPES_REGISTRY
         OBJECT_TYPES_REGISTRY[cls.get_object_type()] = cls
@@ -35,27 +72,42 @@ class GenericModel:
         return [Utils.PERMISSION_ACTION_CREATE, Utils.PERMISSION_ACTION_LIST, Utils.PERMISSION_ACTION_VIEW, Utils.PERMISSION_ACTION_UPDATE, Utils.PERMISSION_ACTION_DELETE]
 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot of the loaded values, save() diffs against it instead of re-fetching the row
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self.take_snapshot()
+        else:
+            # Only the reloaded fields, unsaved changes of the others are kept in the diff
+            loaded_values = self.__dict__.setdefault('_loaded_values', {})
+            for name in fields:
+                attname = self._meta.get_field(name).attname
+                if attname in self.__dict__:
+                    loaded_values[attname] = self.__dict__[attname]
+
+    def take_snapshot(self):
+        self._loaded_values = {x: self.__dict__[x] for x in get_audited_fields(self.__class__) if x in self.__dict__}
+
+    def get_changes(self, fields=None):
+        """Fields changed since the object was loaded or saved, as {attname: (old, new)} strings."""
+        loaded_values = getattr(self, '_loaded_values', {})
+        changes = {}
+        for attname in fields or get_audited_fields(self.__class__):
+            if attname in loaded_values and attname in self.__dict__ and loaded_values[attname] != self.__dict__[attname]:
+                changes[attname] = (str(loaded_values[attname]), str(self.__dict__[attname]))
+        return changes
+
     def save(self, *args, **kwargs):
-        new_object = True
-        model_class = self.__class__
-        field_names = [field.name for field in model_class._meta.fields if field.name not in ['created_at', 'created_by', 'modified_at', 'modified_by', 'deleted_at', 'deleted_by']]
-        fields_stats = {}
-        fields_changes = {}
-
-        try:
-            if self.pk is not None:
-                orig = model_class.objects.get(pk=self.pk)
-                new_object = False
-                for field_name in field_names:
-                    orig_field_value =  getattr(orig, field_name)
-                    current_field_value = getattr(self, field_name)
-                    fields_stats[field_name] = orig_field_value != current_field_value
-                    if fields_stats[field_name]:
-                        fields_changes[field_name] = (str(orig_field_value), str(current_field_value))
-        except model_class.DoesNotExist:
-            new_object = True
+        # Objects not loaded from the database nor saved yet are new, no query needed to know it
+        new_object = self._state.adding
+        fields_changes = {} if new_object else self.get_changes()
 
-        
         log_object = []
         request = get_request()
         if request:
@@ -63,8 +115,14 @@ class GenericModel:
             if request.user:
                 set_system_fields(self, request.user)
 
-        # The real thing
-        super().save(*args, **kwargs)
+        if self.counter_fields and not new_object and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [x.name for x in self._meta.concrete_fields if not x.primary_key and x.name not in self.counter_fields]
+
+        # The real thing, with the writes of the entity_written receivers (revisions, change feed)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            entity_written.send(sender=self.__class__, instance=self, pk=self.pk, action='created' if new_object else 'updated')
+        self.take_snapshot()
 
         log_entry = {}
         if new_object:
@@ -73,11 +131,8 @@ class GenericModel:
             log_entry['source'] ='updated '+ self.__class__.__name__
             log_entry['detail'] = str(fields_changes)
         log_entry['target'] = self.id
-        log_entry['organisation'] = None
-        if hasattr(self, 'organisation') and self.organisation is not None:
-            log_entry['organisation'] = self.organisation
+        log_entry['organisation_id'] = getattr(self, 'organisation_id', None)
         log_object.append(log_entry)
-        
 
     def delete(self, *args, **kwargs):
         log_object = []
@@ -91,12 +146,105 @@ class GenericModel:
         #super().delete(*args, **kwargs)
         self.deleted_at = timezone.now()
         #super().save(*args, **kwargs)
-        super().delete(*args, **kwargs)
+        # Django clears the primary key of deleted objects
+        pk = self.pk
+        with transaction.atomic(savepoint=False):
+            super().delete(*args, **kwargs)
+            entity_written.send(sender=self.__class__, instance=self, pk=pk, action='deleted')
 
         log_entry = {}
-        log_entry['organisation'] = None
-        if hasattr(self, 'organisation') and self.organisation is not None:
-            log_entry['organisation'] = self.organisation
-        log_entry['target'] = self.id
+        log_entry['organisation_id'] = getattr(self, 'organisation_id', None)
+        log_entry['target'] = pk
         log_entry['source'] = 'deleted '+ self.__class__.__name__
         log_object.append(log_entry)
+
+
+class AuditQuerySet(models.QuerySet):
+    """
+    QuerySet whose bulk writes log the same diffs as GenericModel.save.
+
+    bulk_update diffs every object against its snapshot, update reads the old
+    values of the updated fields of all matched rows with a single query, and
+    the new values of the fields set to an expression after the update.
+    Both send entities_updated with the updated rows. Nothing extra is done
+    outside of a request, where there is no log to fill, unless a receiver of
+    entities_updated is connected for the model.
+    """
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        log_object = get_log_object()
+        objs = list(objs)
+        changes = []
+        if log_object is not None:
+            attnames = [self.model._meta.get_field(x).attname for x in fields]
+            changes = [(x, x.get_changes(attnames)) for x in objs]
+        with transaction.atomic(savepoint=False):
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            if objs and entities_updated.has_listeners(self.model):
+                entities_updated.send(sender=self.model, pks=[x.pk for x in objs])
+        for obj, fields_changes in changes:
+            log_object.append({
+                'source': 'updated ' + self.model.__name__,
+                'detail': str(fields_changes),
+                'target': obj.pk,
+                'organisation_id': getattr(obj, 'organisation_id', None),
+            })
+        for obj in objs:
+            if isinstance(obj, GenericModel):
+                obj.take_snapshot()
+        return rows
+
+    bulk_update.alters_data = True
+
+    def update(self, **kwargs):
+        log_object = get_log_object()
+        notify = entities_updated.has_listeners(self.model)
+        if log_object is None and not notify:
+            return super().update(**kwargs)
+
+        attnames = {x: self.model._meta.get_field(x).attname for x in kwargs}
+        audited_fields = get_audited_fields(self.model)
+        value_fields = ['pk']
+        if log_object is not None:
+            value_fields += [x for x in attnames.values() if x in audited_fields]
+            if 'organisation_id' in audited_fields and 'organisation_id' not in value_fields:
+                value_fields.append('organisation_id')
+        old_rows = list(self.values(*value_fields))
+
+        with transaction.atomic(savepoint=False):
+            rows = super().update(**kwargs)
+            if notify and old_rows:
+                entities_updated.send(sender=self.model, pks=[x['pk'] for x in old_rows])
+        if log_object is None:
+            return rows
+
+        # Values computed by the database (F(), Case, ...) are read back from the updated rows
+        expression_fields = [attname for name, attname in attnames.items()
+                             if attname in audited_fields and hasattr(kwargs[name], 'resolve_expression')]
+        new_rows = {}
+        if expression_fields and old_rows:
+            pks = [x['pk'] for x in old_rows]
+            size = connection.features.max_query_params or len(pks)
+            for i in range(0, len(pks), size):
+                new_rows.update((x['pk'], x) for x in self.model._base_manager.filter(pk__in=pks[i:i + size]).values('pk', *expression_fields))
+
+        for row in old_rows:
+            fields_changes = {}
+            for name, attname in attnames.items():
+                if attname not in audited_fields:
+                    continue
+                if attname in expression_fields:
+                    new_value = new_rows.get(row['pk'], {}).get(attname)
+                else:
+                    new_value = getattr(kwargs[name], 'pk', kwargs[name])
+                if row[attname] != new_value:
+                    fields_changes[attname] = (str(row[attname]), str(new_value))
+            log_object.append({
+                'source': 'updated ' + self.model.__name__,
+                'detail': str(fields_changes),
+                'target': row['pk'],
+                'organisation_id': row.get('organisation_id'),
+            })
+        return rows
+
+    update.alters_data = True
@@ -0,0 +1,39 @@
+// Draws a graph laid out by the server (see ontology/controllers/graph_layout.py) with vis-network.
+// The positions are used as they are, the browser does not lay the graph out again.
+
+const graphLayoutPalette = ['#eeefef', '#fff3bf', '#d5ecc0', '#a2e0ec'];
+
+function draw_graph_layout(container, layout) {
+  var colors = {};
+  var nodes = layout.nodes.map(function (node) {
+    if (!(node.group in colors)) {
+      colors[node.group] = graphLayoutPalette[Object.keys(colors).length % graphLayoutPalette.length];
+    }
+    var label = node.label;
+    if (layout.groups[node.group]) {
+      label += '\n(' + layout.groups[node.group] + ')';
+    }
+    return {id: node.id, label: label, x: node.x, y: node.y, shape: 'box',
+            color: {background: colors[node.group], border: '#6c757d'}, font: {face: 'arial', size: 12, color: '#212529'}};
+  });
+  var edges = layout.edges.map(function (edge) {
+    return {from: layout.nodes[edge[0]].id, to: layout.nodes[edge[1]].id, label: edge[2], arrows: 'to',
+            color: '#6c757d', font: {face: 'arial', size: 12, color: '#212529', strokeWidth: 0}};
+  });
+  var options = {
+    physics: false,
+    layout: {improvedLayout: false},
+    interaction: {hideEdgesOnDrag: nodes.length > 1000, hideEdgesOnZoom: nodes.length > 1000},
+    edges: {smooth: false}
+  };
+  $(container).css('height', '80vh');
+  var network = new vis.Network(container, {nodes: nodes, edges: edges}, options);
+  // As the links of the Graphviz drawings
+  var url = layout.knowledge_set == 'ontology' ? '/o_concept/detail/' : '/o_instance/detail/';
+  network.on('doubleClick', function (params) {
+    if (params.nodes.length) {
+      window.location = url + params.nodes[0];
+    }
+  });
+  return network;
+}